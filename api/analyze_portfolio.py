@@ -13,12 +13,15 @@ Required environment variables:
 - XAI_API_KEY (Xai API key)
 """
 
-import boto3
 import json
 import os
 import requests
 from datetime import datetime
 
+from analysis_format import parsed_fields, put_latest_pointer
+from aws import Attr, Key, lazy_table
+from profiling import profiled
+
 # Environment variables
 PORTFOLIOS_TABLE = os.environ.get('PORTFOLIOS_TABLE')
 TICKER_DATA_TABLE = os.environ.get('TICKER_DATA_TABLE')
@@ -30,11 +33,10 @@ XAI_API_KEY = os.environ.get('XAI_API_KEY')
 #MODEL = 'grok-4-fast-reasoning'
 MODEL = 'grok-4-latest'
 
-# DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-portfolios_table = dynamodb.Table(PORTFOLIOS_TABLE)
-ticker_table = dynamodb.Table(TICKER_DATA_TABLE)
-analyses_table = dynamodb.Table(ANALYSES_TABLE)
+# DynamoDB client, built on first use (see aws.py)
+portfolios_table = lazy_table(PORTFOLIOS_TABLE)
+ticker_table = lazy_table(TICKER_DATA_TABLE)
+analyses_table = lazy_table(ANALYSES_TABLE)
 
 def decimal_to_float(obj):
     """
@@ -60,13 +62,14 @@ def get_latest_ticker_data(ticker):
         dict or None: Latest ticker data
     """
     response = ticker_table.query(
-        KeyConditionExpression=boto3.dynamodb.conditions.Key('ticker').eq(ticker),
+        KeyConditionExpression=Key('ticker').eq(ticker),
         ScanIndexForward=False,  # Most recent first
         Limit=1
     )
     items = response['Items']
     return items[0] if items else None
 
+@profiled
 def lambda_handler(event, context):
     """
     AWS Lambda handler function.
@@ -114,8 +117,9 @@ def lambda_handler(event, context):
 
     # Check if analysis already exists for this portfolio, model, and dataAsOf
     existing_analysis = analyses_table.query(
-        KeyConditionExpression=boto3.dynamodb.conditions.Key('portfolio').eq(portfolio_name),
-        FilterExpression=boto3.dynamodb.conditions.Attr('model').eq(MODEL) & boto3.dynamodb.conditions.Attr('dataAsOf').eq(data_as_of)
+        KeyConditionExpression=Key('portfolio').eq(portfolio_name),
+        # Replies that could not be parsed do not count, so they are retried
+        FilterExpression=Attr('model').eq(MODEL) & Attr('dataAsOf').eq(data_as_of) & Attr('parseError').not_exists()
     )
     if existing_analysis['Items']:
         print(f"Analysis already exists for {portfolio_name} with model {MODEL} and dataAsOf {data_as_of}, skipping")
@@ -170,8 +174,10 @@ def lambda_handler(event, context):
         result = response.json()
         analysis = result['choices'][0]['message']['content']
 
-        # Parse JSON from analysis if present
-        parsed_data = analysis
+        # Extract and validate the per-ticker JSON once, so readers never re-parse it
+        parsed = parsed_fields(analysis)
+        if 'parseError' in parsed:
+            print(f"WARNING: Could not parse analysis for {portfolio_name}: {parsed['parseError']}")
 
         # Store in DynamoDB
         current_timestamp = datetime.utcnow().isoformat()
@@ -181,11 +187,14 @@ def lambda_handler(event, context):
             'analysis': analysis,
             'prompt': prompt,
             'model': MODEL,
-            'dataAsOf': data_as_of
+            'dataAsOf': data_as_of,
+            **parsed
         }
-        if parsed_data:
-            item['parsed_data'] = json.dumps(parsed_data)
         analyses_table.put_item(Item=item)
+        if 'parseError' in parsed:
+            # Keep serving the last good analysis; the raw reply stays for inspection
+            return {'status': 'error', 'portfolio': portfolio_name, 'error': parsed['parseError']}
+        put_latest_pointer(analyses_table, item)
 
         print(f"Analysis completed and stored for {portfolio_name}")
         return {'status': 'success', 'portfolio': portfolio_name}
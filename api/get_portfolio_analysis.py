@@ -1,114 +1,361 @@
 """
-AWS Lambda function to retrieve the latest portfolio analysis,
-convert markdown to HTML, and return it.
+AWS Lambda function to retrieve the latest portfolio analysis.
 
-Takes a portfolio name, fetches the most recent analysis from DynamoDB,
-converts the markdown content to HTML, and returns it.
+Takes a portfolio name, fetches the most recent analysis from DynamoDB and
+returns its per-ticker entries as JSON. bulk_lambda_handler does the same for
+up to MAX_BULK_PORTFOLIOS portfolios in one request, resolving them all with a
+single batch_get_item on the per-portfolio latest-pointer items (which leave
+out the large prompt).
+
+Analyses written with the current schema carry pre-validated, compact JSON in
+parsed_data, which is returned as-is without parsing; older items fall back to
+extracting it from the raw model text.
+
+A portfolio's analysis is replaced whenever its tickers finish landing (or
+the analyzePortfolios backstop runs), not at a fixed time, so responses are:
+- cached per warm container for ANALYSIS_CACHE_TTL_SECONDS
+- tagged with an ETag derived from the analysis timestamp, answering
+  If-None-Match with 304 Not Modified
+- sent with Cache-Control max-age of the cached entry's remaining lifetime,
+  so a new analysis is served within ANALYSIS_CACHE_TTL_SECONDS and clients
+  revalidate cheaply after that
+
+Compression is left to API Gateway (minimumCompressionSize in
+serverless.yml), which gzips bodies for clients that accept it.
 """
 
-import boto3
+import hashlib
 import json
 import os
-import markdown
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis_format import (
+    LATEST_PARTITION_SUFFIX,
+    SCHEMA_VERSION,
+    AnalysisFormatError,
+    dumps_compact,
+    latest_pointer_key,
+    parse_analysis
+)
+from aws import Lazy, lazy_resource
+from profiling import profiled
 
 # Environment variables
 ANALYSES_TABLE = os.environ.get('ANALYSES_TABLE')
+ANALYSIS_CACHE_TTL_SECONDS = int(os.environ.get('ANALYSIS_CACHE_TTL_SECONDS', '300'))
+
+# batch_get_item accepts at most 100 keys
+MAX_BULK_PORTFOLIOS = 100
+MAX_BATCH_GET_ATTEMPTS = 5
+# Concurrent queries for portfolios without a latest pointer
+LEGACY_LOOKUP_WORKERS = 16
+
+# Attributes needed to serve an analysis; never the large prompt
+POINTER_FIELDS = ('portfolio', 'analysisTimestamp', 'portfolioName', 'model', 'dataAsOf',
+                  'parsed_data', 'schemaVersion', 'parseError')
+# Legacy items without a pointer also need the raw text to parse
+LEGACY_FIELDS = ('portfolio', 'timestamp', 'portfolioName', 'model', 'dataAsOf',
+                 'parsed_data', 'schemaVersion', 'analysis')
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type',
+    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+    'Access-Control-Expose-Headers': 'ETag'
+}
+
+# DynamoDB client, built on first use (see aws.py)
+dynamodb = lazy_resource('dynamodb')
+# The resource's client is thread-safe and converts attribute values like the Table API
+ddb_client = Lazy(lambda: dynamodb.meta.client)
+
+# Warm-container response cache: {portfolio_name: entry}
+_response_cache = {}
+
+def make_etag(portfolio_name, timestamp):
+    """
+    Strong ETag for an analysis, keyed on its portfolio and timestamp.
+    """
+    digest = hashlib.sha1(f"{portfolio_name}|{timestamp}|{SCHEMA_VERSION}".encode('utf-8')).hexdigest()
+    return f'"{digest[:20]}"'
+
+def etag_matches(if_none_match, etag):
+    """
+    Evaluate an If-None-Match header against an ETag (weak comparison).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return any(tag[2:] == etag if tag.startswith('W/') else tag == etag for tag in candidates)
+
+def get_header(event, name):
+    """
+    Case-insensitive request header lookup.
+    """
+    headers = event.get('headers') or {}
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+def build_response(status_code, body='', headers=None):
+    return {
+        'statusCode': status_code,
+        'body': body,
+        'headers': {**CORS_HEADERS, **(headers or {})}
+    }
+
+def error_response(status_code, message):
+    return build_response(status_code, json.dumps({'error': message}))
+
+def projection(fields):
+    """
+    ProjectionExpression arguments for a list of attributes (avoids reserved words).
+    """
+    names = {f'#f{i}': field for i, field in enumerate(fields)}
+    return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+def batch_get_latest_pointers(portfolios):
+    """
+    Fetch latest-analysis pointer items for many portfolios at once.
+
+    Args:
+        portfolios (list): Portfolio keys (at most MAX_BULK_PORTFOLIOS)
+
+    Returns:
+        dict: {portfolio: pointer item} for portfolios that have a pointer
+    """
+    request = {
+        ANALYSES_TABLE: {
+            'Keys': [latest_pointer_key(portfolio) for portfolio in portfolios],
+            **projection(POINTER_FIELDS)
+        }
+    }
+    pointers = {}
+    for attempt in range(MAX_BATCH_GET_ATTEMPTS):
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response['Responses'].get(ANALYSES_TABLE, []):
+            pointers[item['portfolio'][:-len(LATEST_PARTITION_SUFFIX)]] = item
+        request = response.get('UnprocessedKeys')
+        if not request:
+            break
+        time.sleep(0.05 * 2 ** attempt)
+    else:
+        print(f"WARNING: {len(request[ANALYSES_TABLE]['Keys'])} pointer(s) still unprocessed")
+    return pointers
+
+def query_latest_item(portfolio):
+    """
+    Latest analysis item for a portfolio written before latest pointers existed.
+    """
+    names = projection(LEGACY_FIELDS)
+    response = ddb_client.query(
+        TableName=ANALYSES_TABLE,
+        KeyConditionExpression='#pk = :portfolio',
+        ExpressionAttributeNames={**names['ExpressionAttributeNames'], '#pk': 'portfolio'},
+        ExpressionAttributeValues={':portfolio': portfolio},
+        ProjectionExpression=names['ProjectionExpression'],
+        ScanIndexForward=False,  # Most recent first
+        Limit=1
+    )
+    items = response['Items']
+    if not items:
+        return None
+    item = items[0]
+    item['analysisTimestamp'] = item['timestamp']
+    return item
+
+def build_entry(portfolio, item, now):
+    """
+    Prepare the cached response entry for an analysis item.
+
+    Raises:
+        AnalysisFormatError: If a legacy analysis cannot be parsed
+    """
+    # Pre-validated at write time: serve the stored bytes directly
+    if item.get('schemaVersion') == SCHEMA_VERSION and 'parsed_data' in item:
+        body = item['parsed_data']
+    elif 'analysis' in item:
+        body = dumps_compact(parse_analysis(item['analysis']))
+    else:
+        raise AnalysisFormatError(item.get('parseError', 'Analysis could not be parsed'))
+
+    return {
+        'body': body,
+        'etag': make_etag(portfolio, item['analysisTimestamp']),
+        'meta': {
+            'timestamp': item['analysisTimestamp'],
+            'portfolioName': item.get('portfolioName'),
+            'model': item.get('model'),
+            'dataAsOf': item.get('dataAsOf')
+        },
+        'expiresAt': now + ANALYSIS_CACHE_TTL_SECONDS
+    }
+
+def load_latest_analyses(portfolios):
+    """
+    Get the latest analysis response entries for a set of portfolios.
+
+    Fresh entries come from the warm-container cache; the rest are resolved
+    with one batch_get_item on their latest pointers, falling back to
+    concurrent queries for portfolios whose analyses predate the pointer items.
+
+    Args:
+        portfolios (list): Portfolio keys
+
+    Returns:
+        tuple: ({portfolio: entry}, {portfolio: error message})
+    """
+    now = time.time()
+    entries = {}
+    errors = {}
+    pending = []
+    for portfolio in portfolios:
+        entry = _response_cache.get(portfolio)
+        if entry and entry['expiresAt'] > now:
+            entries[portfolio] = entry
+        else:
+            pending.append(portfolio)
+
+    items = batch_get_latest_pointers(pending) if pending else {}
+    unpointed = [portfolio for portfolio in pending if portfolio not in items]
+    if unpointed:
+        with ThreadPoolExecutor(max_workers=LEGACY_LOOKUP_WORKERS) as executor:
+            items.update(zip(unpointed, executor.map(query_latest_item, unpointed)))
+    for portfolio in pending:
+        item = items[portfolio]
+        if item is None:
+            _response_cache.pop(portfolio, None)
+            continue
+        try:
+            entries[portfolio] = _response_cache[portfolio] = build_entry(portfolio, item, now)
+        except AnalysisFormatError as e:
+            errors[portfolio] = str(e)
+    return entries, errors
+
+def bulk_body(portfolio_ids, entries, errors):
+    """
+    JSON body of a bulk read, splicing the stored per-ticker JSON in without parsing it.
+
+    Args:
+        portfolio_ids (list): Requested portfolios, in order
+        entries (dict): {portfolio: response entry} from load_latest_analyses
+        errors (dict): {portfolio: error message}
+
+    Returns:
+        str: {"analyses": {id: {...meta, "tickers": [...]}}, "missing": [...], "errors": {...}}
+    """
+    parts = []
+    for portfolio in portfolio_ids:
+        entry = entries.get(portfolio)
+        if entry:
+            meta = json.dumps(entry['meta'], separators=(',', ':'))
+            parts.append(f'{json.dumps(portfolio)}:{meta[:-1]},"tickers":{entry["body"]}}}')
+    missing = [pid for pid in portfolio_ids if pid not in entries and pid not in errors]
+    return (
+        '{"analyses":{' + ','.join(parts) + '},'
+        f'"missing":{json.dumps(missing)},"errors":{json.dumps(errors)}}}'
+    )
+
+def finalize_response(event, body, etag, expires_at):
+    """
+    Build a 200/304 response with caching headers.
 
-# DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-analyses_table = dynamodb.Table(ANALYSES_TABLE)
+    Args:
+        event (dict): API Gateway event
+        body (str): JSON response body
+        etag (str): ETag for the body
+        expires_at (float): Epoch time until which the body may be served without revalidation
 
+    Returns:
+        dict: API Gateway response
+    """
+    max_age = max(0, int(expires_at - time.time()))
+    cache_headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={max_age}, must-revalidate'
+    }
+
+    if etag_matches(get_header(event, 'If-None-Match'), etag):
+        return build_response(304, headers=cache_headers)
+
+    return build_response(200, body, {'Content-Type': 'application/json', **cache_headers})
+
+@profiled
 def lambda_handler(event, context):
     """
     AWS Lambda handler function.
 
-    Retrieves the latest analysis for a portfolio and converts to HTML.
+    Retrieves the latest analysis for a portfolio.
 
     Args:
-        event (dict): Event with portfolio_name
+        event (dict): API Gateway event with portfolio_name query parameter
         context: Lambda context
 
     Returns:
-        dict: HTML content or error
+        dict: API Gateway response with the analysis JSON, 304, or error
     """
     # Handle CORS preflight
     if event.get('httpMethod') == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
-            },
-            'body': ''
-        }
+        return build_response(200)
 
-    portfolio_name = event.get('queryStringParameters', {}).get('portfolio_name')
+    portfolio_name = (event.get('queryStringParameters') or {}).get('portfolio_name')
     if not portfolio_name:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'portfolio_name required'}),
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
-            }
-        }
+        return error_response(400, 'portfolio_name required')
 
     try:
-        # Query for the latest analysis
-        response = analyses_table.query(
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('portfolio').eq(portfolio_name),
-            ScanIndexForward=False,  # Most recent first
-            Limit=1
-        )
-        items = response['Items']
-        if not items:
-            return {
-                'statusCode': 404,
-                'body': json.dumps({'error': f'No analysis found for portfolio {portfolio_name}'}),
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type',
-                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
-                }
-            }
-
-        analysis = items[0]['analysis']
-
-        # Parse JSON analysis
-        try:
-            analysis_data = json.loads(analysis)
-        except json.JSONDecodeError:
-            return {
-                'statusCode': 500,
-                'body': json.dumps({'error': 'Invalid JSON in analysis'}),
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type',
-                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
-                }
-            }
-
-        return {
-            'statusCode': 200,
-            'body': json.dumps(analysis_data),
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
-            }
-        }
+        entries, errors = load_latest_analyses([portfolio_name])
+    except Exception as e:
+        return error_response(500, str(e))
+
+    if portfolio_name in errors:
+        return error_response(500, 'Invalid JSON in analysis')
+    entry = entries.get(portfolio_name)
+    if entry is None:
+        return error_response(404, f'No analysis found for portfolio {portfolio_name}')
+
+    return finalize_response(event, entry['body'], entry['etag'], entry['expiresAt'])
 
+@profiled
+def bulk_lambda_handler(event, context):
+    """
+    AWS Lambda handler function for bulk reads.
+
+    Retrieves the latest analysis for many portfolios in one request.
+
+    Args:
+        event (dict): API Gateway event with a comma-separated portfolio_ids query parameter
+        context: Lambda context
+
+    Returns:
+        dict: API Gateway response with {"analyses": {id: {...}}, "missing": [...], "errors": {...}}
+    """
+    # Handle CORS preflight
+    if event.get('httpMethod') == 'OPTIONS':
+        return build_response(200)
+
+    raw_ids = (event.get('queryStringParameters') or {}).get('portfolio_ids') or ''
+    portfolio_ids = list(dict.fromkeys(pid.strip() for pid in raw_ids.split(',') if pid.strip()))
+    if not portfolio_ids:
+        return error_response(400, 'portfolio_ids required')
+    if len(portfolio_ids) > MAX_BULK_PORTFOLIOS:
+        return error_response(400, f'At most {MAX_BULK_PORTFOLIOS} portfolio_ids per request')
+
+    try:
+        entries, errors = load_latest_analyses(portfolio_ids)
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)}),
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
-            }
-        }
\ No newline at end of file
+        return error_response(500, str(e))
+
+    body = bulk_body(portfolio_ids, entries, errors)
+
+    etag_source = '|'.join(entries[pid]['etag'] if pid in entries else '-' for pid in portfolio_ids)
+    etag = '"' + hashlib.sha1(etag_source.encode('utf-8')).hexdigest()[:20] + '"'
+    expires_at = min(
+        [entry['expiresAt'] for entry in entries.values()]
+        or [time.time() + ANALYSIS_CACHE_TTL_SECONDS]
+    )
+    return finalize_response(event, body, etag, expires_at)
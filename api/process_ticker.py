@@ -15,17 +15,18 @@ Returns:
 import requests
 import json
 import os
-import boto3
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from aws import Key, lazy_table
+from profiling import profiled
+
 # Retrieve environment variables
 API_KEY = os.environ.get('POLYGON_API_KEY')
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE')
 
-# DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(DYNAMODB_TABLE)
+# DynamoDB client, built on first use (see aws.py)
+table = lazy_table(DYNAMODB_TABLE)
 
 def get_ticker_type(ticker):
     """
@@ -144,7 +145,7 @@ def get_latest_record(ticker):
     """
     print(f"DEBUG get_latest_record: Getting latest for {ticker}")
     response = table.query(
-        KeyConditionExpression=boto3.dynamodb.conditions.Key('ticker').eq(ticker),
+        KeyConditionExpression=Key('ticker').eq(ticker),
         ScanIndexForward=False,
         Limit=1
     )
@@ -157,6 +158,7 @@ def get_latest_record(ticker):
         print(f"DEBUG get_latest_record: No records for {ticker}")
         return None
 
+@profiled
 def lambda_handler(event, context):
     """
     AWS Lambda handler for SQS messages.
@@ -5,24 +5,30 @@ and send messages to SQS delay queue.
 Scans the portfolios table for ticker symbols, creates messages with each ticker,
 and sends them to an SQS queue with a 2-minute delay.
 
+No longer scheduled: backend-processing-api's processTickers reads this table
+as its legacyPortfolios ticker source and refreshes the shared ticker-data
+table for both pipelines.
+
 Required environment variables:
 - PORTFOLIOS_TABLE (DynamoDB table name for portfolios)
 - SQS_QUEUE_URL (SQS queue URL for delayed processing)
 """
 
-import boto3
 import json
 import os
 
+from aws import lazy_client, lazy_table
+from profiling import profiled
+
 # Environment variables
 PORTFOLIOS_TABLE = os.environ.get('PORTFOLIOS_TABLE')
 SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
 
-# DynamoDB and SQS clients
-dynamodb = boto3.resource('dynamodb')
-sqs = boto3.client('sqs')
-portfolios_table = dynamodb.Table(PORTFOLIOS_TABLE)
+# DynamoDB and SQS clients, built on first use (see aws.py)
+sqs = lazy_client('sqs')
+portfolios_table = lazy_table(PORTFOLIOS_TABLE)
 
+@profiled
 def lambda_handler(event, context):
     """
     AWS Lambda handler function.
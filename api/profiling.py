@@ -0,0 +1,295 @@
+"""
+On-demand profiling of Lambda invocations.
+
+Every handler is wrapped with @profiled. Normally the wrapper only checks
+whether profiling was asked for and calls the handler. An invocation is
+profiled when:
+
+- PROFILE_INVOCATIONS is true (every invocation of the function), or
+- its payload has "profile": true (direct and scheduled invocations), or
+- an SQS record of its batch has a `profile` message attribute of "true"
+
+A profiled invocation runs under cProfile and tracemalloc, with every boto3
+API call and requests HTTP call timed. Its artifacts are written to
+PROFILE_DIR/<function>/<UTC time>-<request id>/:
+
+- profile.pstats: cProfile stats (python -m pstats, snakeviz)
+- profile.txt: the top PROFILE_TOP functions by cumulative time
+- memory.txt: peak traced memory and the top allocation sites
+- calls.json: wall time, peak memory and the boto3/requests calls, per
+  target (service.Operation, or method and host) and one by one
+
+and, when PROFILE_BUCKET is set, uploaded under PROFILE_PREFIX in that
+bucket. Outside Lambda PROFILE_DIR can point at any local directory.
+
+A copy of this module lives in backend-processing-api/src/utils/profiling.py;
+keep the two in sync.
+
+Optional environment variables:
+- PROFILE_INVOCATIONS (profile every invocation, default false)
+- PROFILE_DIR (artifact directory, default /tmp/profiles)
+- PROFILE_BUCKET (S3 bucket the artifacts are also uploaded to)
+- PROFILE_PREFIX (key prefix in PROFILE_BUCKET, default profiles/)
+- PROFILE_TOP (functions and allocation sites reported, default 40)
+"""
+
+import functools
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from aws import lazy_client
+
+PROFILE_INVOCATIONS = os.environ.get('PROFILE_INVOCATIONS', 'false').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/profiles')
+PROFILE_BUCKET = os.environ.get('PROFILE_BUCKET')
+PROFILE_PREFIX = os.environ.get('PROFILE_PREFIX', 'profiles/')
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', '40'))
+
+# Event key and SQS message attribute that ask for a profile
+PROFILE_FLAG = 'profile'
+
+# Individual calls kept in calls.json, slowest first
+MAX_LISTED_CALLS = 200
+
+s3 = lazy_client('s3')
+
+
+def profile_requested(event):
+    """
+    Whether an invocation's event asks to be profiled.
+    """
+    if not isinstance(event, dict):
+        return False
+    if event.get(PROFILE_FLAG) is True:
+        return True
+    for record in event.get('Records') or ():
+        attribute = (record.get('messageAttributes') or {}).get(PROFILE_FLAG)
+        if attribute and str(attribute.get('stringValue', '')).lower() == 'true':
+            return True
+    return False
+
+
+class CallRecorder:
+    """
+    Times boto3 API calls and requests HTTP calls while active.
+
+    Patches botocore's BaseClient._make_api_call and requests.Session.send
+    for the duration of a with block, so clients built before the block are
+    covered too. URLs are recorded without their query strings, which carry
+    API keys.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.started = time.perf_counter()
+        self._restore = []
+
+    def record(self, kind, target, detail, started, outcome):
+        finished = time.perf_counter()
+        with self.lock:
+            self.calls.append({
+                'kind': kind,
+                'target': target,
+                'detail': detail,
+                'offsetSeconds': round(started - self.started, 6),
+                'seconds': round(finished - started, 6),
+                'outcome': outcome
+            })
+
+    def _patch(self, owner, name, wrap):
+        original = getattr(owner, name)
+        setattr(owner, name, wrap(original))
+        self._restore.append((owner, name, original))
+
+    def _wrap_boto(self, original):
+        recorder = self
+
+        def _make_api_call(client, operation_name, api_params):
+            started = time.perf_counter()
+            outcome = 'ok'
+            try:
+                return original(client, operation_name, api_params)
+            except Exception as e:
+                outcome = (getattr(e, 'response', None) or {}).get('Error', {}).get('Code') or type(e).__name__
+                raise
+            finally:
+                service = client.meta.service_model.service_name
+                recorder.record('boto3', f'{service}.{operation_name}', api_params.get('TableName')
+                                or api_params.get('QueueUrl') or api_params.get('Bucket'), started, outcome)
+        return _make_api_call
+
+    def _wrap_requests(self, original):
+        recorder = self
+
+        def send(session, request, **kwargs):
+            started = time.perf_counter()
+            outcome = 'ok'
+            try:
+                response = original(session, request, **kwargs)
+                outcome = response.status_code
+                return response
+            except Exception as e:
+                outcome = type(e).__name__
+                raise
+            finally:
+                url = urlsplit(request.url)
+                recorder.record('requests', f'{request.method} {url.netloc}', url.path, started, outcome)
+        return send
+
+    def __enter__(self):
+        try:
+            from botocore.client import BaseClient
+            self._patch(BaseClient, '_make_api_call', self._wrap_boto)
+        except ImportError:
+            pass
+        try:
+            import requests
+            self._patch(requests.Session, 'send', self._wrap_requests)
+        except ImportError:
+            pass
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        while self._restore:
+            owner, name, original = self._restore.pop()
+            setattr(owner, name, original)
+        return False
+
+    def summary(self):
+        """
+        {'count', 'seconds', 'byTarget': [...], 'calls': [...]}, slowest first.
+        """
+        with self.lock:
+            calls = list(self.calls)
+        by_target = {}
+        for call in calls:
+            stats = by_target.setdefault((call['kind'], call['target']), {
+                'kind': call['kind'], 'target': call['target'], 'count': 0, 'seconds': 0.0,
+                'maxSeconds': 0.0, 'outcomes': {}
+            })
+            stats['count'] += 1
+            stats['seconds'] += call['seconds']
+            stats['maxSeconds'] = max(stats['maxSeconds'], call['seconds'])
+            outcome = str(call['outcome'])
+            stats['outcomes'][outcome] = stats['outcomes'].get(outcome, 0) + 1
+        for stats in by_target.values():
+            stats['seconds'] = round(stats['seconds'], 6)
+        return {
+            'count': len(calls),
+            'seconds': round(sum(call['seconds'] for call in calls), 6),
+            'byTarget': sorted(by_target.values(), key=lambda stats: -stats['seconds']),
+            'calls': sorted(calls, key=lambda call: -call['seconds'])[:MAX_LISTED_CALLS]
+        }
+
+
+def write_artifacts(name, files):
+    """
+    Write profile artifacts to PROFILE_DIR/name/, and to PROFILE_BUCKET if set.
+
+    Args:
+        name (str): <function>/<UTC time>-<request id>
+        files (dict): {file name: bytes}
+
+    Returns:
+        str: Where the artifacts were written
+    """
+    directory = os.path.join(PROFILE_DIR, name)
+    os.makedirs(directory, exist_ok=True)
+    for filename, data in files.items():
+        with open(os.path.join(directory, filename), 'wb') as f:
+            f.write(data)
+    if not PROFILE_BUCKET:
+        return directory
+
+    prefix = f'{PROFILE_PREFIX}{name}/'
+    for filename, data in files.items():
+        s3.put_object(Bucket=PROFILE_BUCKET, Key=prefix + filename, Body=data)
+    return f's3://{PROFILE_BUCKET}/{prefix}'
+
+
+def run_profiled(handler, event, context):
+    """
+    Call a handler under cProfile, tracemalloc and a CallRecorder, and write
+    the artifacts even if it raises.
+    """
+    import cProfile
+    import marshal
+    import pstats
+    import tracemalloc
+
+    function = getattr(context, 'function_name', None) or handler.__module__
+    request_id = getattr(context, 'aws_request_id', None) or 'local'
+    started_at = datetime.now(timezone.utc)
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    error = None
+    started = time.perf_counter()
+    try:
+        with CallRecorder() as recorder:
+            profiler.enable()
+            try:
+                return handler(event, context)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                raise
+            finally:
+                profiler.disable()
+    finally:
+        wall_seconds = time.perf_counter() - started
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        if not tracing:
+            tracemalloc.stop()
+
+        try:
+            stats = pstats.Stats(profiler)
+            report = io.StringIO()
+            stats.stream = report
+            stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+            memory = [f'Peak traced memory: {peak:,} bytes (current {current:,})', '']
+            memory.extend(str(stat) for stat in snapshot.statistics('lineno')[:PROFILE_TOP])
+
+            calls = {
+                'function': function,
+                'requestId': request_id,
+                'startedAt': started_at.isoformat(),
+                'wallSeconds': round(wall_seconds, 6),
+                'error': error,
+                'memory': {'peakBytes': peak, 'currentBytes': current},
+                'calls': recorder.summary()
+            }
+            location = write_artifacts(f"{function}/{started_at.strftime('%Y%m%dT%H%M%SZ')}-{request_id}", {
+                'profile.pstats': marshal.dumps(stats.stats),
+                'profile.txt': report.getvalue().encode('utf-8'),
+                'memory.txt': '\n'.join(memory).encode('utf-8'),
+                'calls.json': json.dumps(calls, indent=2, default=str).encode('utf-8')
+            })
+            print(f"✓ Profile of {function} ({wall_seconds:.2f}s, {calls['calls']['count']} AWS/HTTP calls, "
+                  f"peak {peak / 1e6:.1f} MB) written to {location}")
+        except Exception as e:
+            # Profiling must never fail the invocation
+            print(f"✗ ERROR writing profile of {function}: {e}")
+
+
+def profiled(handler):
+    """
+    Decorator profiling a Lambda handler's invocations on demand (see module docstring).
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        if PROFILE_INVOCATIONS or profile_requested(event):
+            return run_profiled(handler, event, context)
+        return handler(event, context)
+    return wrapper
@@ -0,0 +1,83 @@
+"""
+How the legacy analyzePortfolio stores model replies, against moto.
+
+Run from api/:
+    python -m pytest -q tests/test_analyze_portfolio.py
+"""
+
+from decimal import Decimal
+
+import pytest
+
+import analyze_portfolio
+
+GOOD_REPLY = '```json\n[{"ticker": "AAPL", "score": 4, "reason": "Momentum"}]\n```'
+BAD_REPLY = 'The markets were closed, so I cannot score these tickers.'
+
+TABLES = {
+    'portfolios_table': ('portfolios', ('portfolio_name',)),
+    'ticker_table': ('ticker-data', ('ticker', 'timestamp')),
+    'analyses_table': ('portfolio-analyses', ('portfolio', 'timestamp'))
+}
+
+
+class Reply:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'choices': [{'message': {'content': self.content}}]}
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    moto = pytest.importorskip('moto')
+    import boto3
+    for name, value in {'AWS_DEFAULT_REGION': 'us-east-1', 'AWS_ACCESS_KEY_ID': 'test',
+                        'AWS_SECRET_ACCESS_KEY': 'test'}.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        resource = boto3.resource('dynamodb', region_name='us-east-1')
+        created = {}
+        for attribute, (name, keys) in TABLES.items():
+            created[attribute] = resource.create_table(
+                TableName=name,
+                KeySchema=[{'AttributeName': key, 'KeyType': kind} for key, kind in zip(keys, ('HASH', 'RANGE'))],
+                AttributeDefinitions=[{'AttributeName': key, 'AttributeType': 'S'} for key in keys],
+                BillingMode='PAY_PER_REQUEST'
+            )
+            monkeypatch.setattr(analyze_portfolio, attribute, created[attribute])
+        created['portfolios_table'].put_item(Item={'portfolio_name': 'ZSM Seven', 'tickers': ['AAPL']})
+        created['ticker_table'].put_item(Item={
+            'ticker': 'AAPL', 'timestamp': '2026-10-16T20:00:00', 'asOf': '2026-10-16T16:00:00',
+            'price': Decimal('230.5')
+        })
+        yield created
+
+
+def analyze(monkeypatch, content):
+    monkeypatch.setattr(analyze_portfolio.requests, 'post', lambda *args, **kwargs: Reply(content))
+    return analyze_portfolio.lambda_handler({'portfolio_name': 'ZSM Seven'}, None)
+
+
+def pointer(tables):
+    return tables['analyses_table'].get_item(
+        Key={'portfolio': 'ZSM Seven#latest', 'timestamp': 'LATEST'}).get('Item')
+
+
+def test_unparseable_reply_does_not_move_the_pointer(tables, monkeypatch):
+    result = analyze(monkeypatch, BAD_REPLY)
+
+    assert result['status'] == 'error'
+    assert pointer(tables) is None
+
+
+def test_unparseable_reply_is_retried_for_the_same_data(tables, monkeypatch):
+    analyze(monkeypatch, BAD_REPLY)
+
+    assert analyze(monkeypatch, GOOD_REPLY)['status'] == 'success'
+    assert pointer(tables)['parsed_data'].startswith('[{"ticker":"AAPL"')
+    assert analyze(monkeypatch, GOOD_REPLY)['status'] == 'skipped'
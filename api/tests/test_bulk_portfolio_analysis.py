@@ -0,0 +1,147 @@
+"""
+Bulk reads of getPortfolioAnalysis (bulk_lambda_handler) against moto:
+warm-cache hits, latest pointers, portfolios analyzed before pointers
+existed, and per-portfolio errors.
+
+Run from api/:
+    python -m pytest -q tests/test_bulk_portfolio_analysis.py
+"""
+
+import json
+import threading
+
+import pytest
+
+import get_portfolio_analysis
+from analysis_format import SCHEMA_VERSION, latest_pointer_key
+
+TABLE = 'portfolio-analyses'
+
+
+@pytest.fixture
+def analyses(monkeypatch):
+    moto = pytest.importorskip('moto')
+    import boto3
+    for name, value in {'AWS_DEFAULT_REGION': 'us-east-1', 'AWS_ACCESS_KEY_ID': 'test',
+                        'AWS_SECRET_ACCESS_KEY': 'test'}.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        resource = boto3.resource('dynamodb', region_name='us-east-1')
+        table = resource.create_table(
+            TableName=TABLE,
+            KeySchema=[{'AttributeName': 'portfolio', 'KeyType': 'HASH'},
+                       {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'portfolio', 'AttributeType': 'S'},
+                                  {'AttributeName': 'timestamp', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        monkeypatch.setattr(get_portfolio_analysis, 'ANALYSES_TABLE', TABLE)
+        monkeypatch.setattr(get_portfolio_analysis, 'dynamodb', resource)
+        monkeypatch.setattr(get_portfolio_analysis, 'ddb_client', resource.meta.client)
+        monkeypatch.setattr(get_portfolio_analysis, '_response_cache', {})
+        yield table
+
+
+def put_pointer(table, portfolio, timestamp, score=3):
+    table.put_item(Item={
+        **latest_pointer_key(portfolio),
+        'analysisTimestamp': timestamp,
+        'portfolioName': portfolio.title(),
+        'schemaVersion': SCHEMA_VERSION,
+        'parsed_data': f'[{{"ticker":"AAPL","score":{score}}}]'
+    })
+
+
+def put_legacy(table, portfolio, timestamp, analysis):
+    table.put_item(Item={'portfolio': portfolio, 'timestamp': timestamp, 'analysis': analysis,
+                         'prompt': 'Score these tickers'})
+
+
+def get_bulk(*portfolios, etag=None):
+    event = {'queryStringParameters': {'portfolio_ids': ','.join(portfolios)}, 'headers': {}}
+    if etag:
+        event['headers']['If-None-Match'] = etag
+    return get_portfolio_analysis.bulk_lambda_handler(event, None)
+
+
+def test_mixed_pointers_legacy_items_missing_and_errors(analyses):
+    put_pointer(analyses, 'growth', '2026-10-17T07:12:00')
+    put_legacy(analyses, 'income', '2026-09-01T06:00:00', '[{"ticker": "KO", "score": 1}]')
+    put_legacy(analyses, 'income', '2026-09-02T06:00:00', '```json\n[{"ticker": "PEP", "score": 2}]\n```')
+    put_legacy(analyses, 'broken', '2026-09-02T06:00:00', 'No scores today.')
+
+    response = get_bulk('growth', 'income', 'broken', 'nobody')
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['analyses']['growth']['tickers'] == [{'ticker': 'AAPL', 'score': 3}]
+    assert body['analyses']['growth']['portfolioName'] == 'Growth'
+    # The newest legacy item is parsed from its raw text
+    assert body['analyses']['income']['timestamp'] == '2026-09-02T06:00:00'
+    assert body['analyses']['income']['tickers'][0]['ticker'] == 'PEP'
+    assert body['errors'] == {'broken': 'No JSON found in analysis'}
+    assert body['missing'] == ['nobody']
+
+
+def test_cached_portfolios_skip_dynamodb(analyses, monkeypatch):
+    put_pointer(analyses, 'growth', '2026-10-17T07:12:00')
+    get_bulk('growth')
+    requested = []
+    batch_get = get_portfolio_analysis.batch_get_latest_pointers
+    monkeypatch.setattr(get_portfolio_analysis, 'batch_get_latest_pointers',
+                        lambda portfolios: requested.extend(portfolios) or batch_get(portfolios))
+    put_pointer(analyses, 'growth', '2026-10-17T08:40:00', score=-2)
+    put_pointer(analyses, 'value', '2026-10-17T08:40:00')
+
+    body = json.loads(get_bulk('growth', 'value')['body'])
+
+    assert requested == ['value']
+    # Served from the warm cache until its entry expires
+    assert body['analyses']['growth']['timestamp'] == '2026-10-17T07:12:00'
+    assert body['analyses']['value']['timestamp'] == '2026-10-17T08:40:00'
+
+
+def test_portfolios_without_pointers_are_queried_concurrently(analyses, monkeypatch):
+    portfolios = [f'legacy-{i}' for i in range(3)]
+    for portfolio in portfolios:
+        put_legacy(analyses, portfolio, '2026-09-02T06:00:00', '[{"ticker": "KO", "score": 1}]')
+    # Every lookup waits for the others, so sequential lookups would time out
+    barrier = threading.Barrier(len(portfolios), timeout=5)
+    query = get_portfolio_analysis.query_latest_item
+
+    def query_together(portfolio):
+        barrier.wait()
+        return query(portfolio)
+    monkeypatch.setattr(get_portfolio_analysis, 'query_latest_item', query_together)
+
+    body = json.loads(get_bulk(*portfolios)['body'])
+
+    assert list(body['analyses']) == portfolios
+
+
+def test_bulk_etag_and_not_modified(analyses, monkeypatch):
+    put_pointer(analyses, 'growth', '2026-10-17T07:12:00')
+    put_pointer(analyses, 'value', '2026-10-17T07:12:00')
+    first = get_bulk('growth', 'value')
+    etag = first['headers']['ETag']
+
+    assert get_bulk('growth', 'value', etag=etag)['statusCode'] == 304
+    assert get_bulk('growth', 'value', etag=f'W/{etag}')['statusCode'] == 304
+    # The ETag covers the requested set and its order
+    assert get_bulk('value', 'growth', etag=etag)['statusCode'] == 200
+
+    # A new analysis for one portfolio changes the bulk ETag once the cache expires
+    put_pointer(analyses, 'value', '2026-10-17T08:40:00')
+    now = get_portfolio_analysis.time.time()
+    monkeypatch.setattr(get_portfolio_analysis.time, 'time',
+                        lambda: now + get_portfolio_analysis.ANALYSIS_CACHE_TTL_SECONDS + 1)
+    second = get_bulk('growth', 'value', etag=etag)
+
+    assert second['statusCode'] == 200
+    assert second['headers']['ETag'] != etag
+
+
+def test_bulk_request_validation(analyses):
+    assert get_bulk()['statusCode'] == 400
+    too_many = [f'p{i}' for i in range(get_portfolio_analysis.MAX_BULK_PORTFOLIOS + 1)]
+    assert get_bulk(*too_many)['statusCode'] == 400
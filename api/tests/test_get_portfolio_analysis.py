@@ -0,0 +1,73 @@
+"""
+Freshness of getPortfolioAnalysis responses: analyses land whenever a
+portfolio's tickers finish, so responses are cached only for
+ANALYSIS_CACHE_TTL_SECONDS and revalidated by ETag after that.
+
+Run from api/:
+    python -m pytest -q tests/test_get_portfolio_analysis.py
+"""
+
+import re
+
+import pytest
+
+import get_portfolio_analysis
+from analysis_format import SCHEMA_VERSION
+
+
+def pointer(portfolio, timestamp):
+    return {
+        'portfolio': portfolio,
+        'analysisTimestamp': timestamp,
+        'schemaVersion': SCHEMA_VERSION,
+        'parsed_data': f'[{{"ticker":"AAPL","score":3,"analyzedAt":"{timestamp}"}}]'
+    }
+
+
+@pytest.fixture
+def pointers(monkeypatch):
+    stored = {}
+    monkeypatch.setattr(get_portfolio_analysis, 'batch_get_latest_pointers',
+                        lambda portfolios: {p: stored[p] for p in portfolios if p in stored})
+    monkeypatch.setattr(get_portfolio_analysis, 'query_latest_item', lambda portfolio: None)
+    monkeypatch.setattr(get_portfolio_analysis, '_response_cache', {})
+    return stored
+
+
+def get(portfolio, etag=None):
+    event = {'queryStringParameters': {'portfolio_name': portfolio}, 'headers': {}}
+    if etag:
+        event['headers']['If-None-Match'] = etag
+    return get_portfolio_analysis.lambda_handler(event, None)
+
+
+def max_age(response):
+    return int(re.search(r'max-age=(\d+)', response['headers']['Cache-Control']).group(1))
+
+
+def test_max_age_never_exceeds_the_cache_ttl(pointers):
+    pointers['growth'] = pointer('growth', '2026-10-17T07:12:00')
+
+    response = get('growth')
+
+    assert response['statusCode'] == 200
+    assert 0 < max_age(response) <= get_portfolio_analysis.ANALYSIS_CACHE_TTL_SECONDS
+    assert 'must-revalidate' in response['headers']['Cache-Control']
+    assert get('growth', response['headers']['ETag'])['statusCode'] == 304
+
+
+def test_new_analysis_is_served_once_the_cached_entry_expires(pointers, monkeypatch):
+    pointers['growth'] = pointer('growth', '2026-10-17T07:12:00')
+    first = get('growth')
+
+    # An analysis landing mid-morning, after the cached entry's lifetime
+    pointers['growth'] = pointer('growth', '2026-10-17T08:40:00')
+    now = get_portfolio_analysis.time.time()
+    monkeypatch.setattr(get_portfolio_analysis.time, 'time',
+                        lambda: now + get_portfolio_analysis.ANALYSIS_CACHE_TTL_SECONDS + 1)
+
+    second = get('growth', first['headers']['ETag'])
+
+    assert second['statusCode'] == 200
+    assert second['headers']['ETag'] != first['headers']['ETag']
+    assert '08:40:00' in second['body']
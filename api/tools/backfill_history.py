@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Script to invoke the backfillHistory Lambda function, which loads daily price
+history into ticker-data with per-ticker checkpoints.
+
+Invoking it again resumes any backfill that was interrupted.
+
+Usage:
+    python backfill_history.py                      # resume open checkpoints
+    python backfill_history.py --universe           # every held ticker
+    python backfill_history.py --tickers AAPL,MSFT --years 3 [--restart]
+"""
+
+import argparse
+import boto3
+import json
+import sys
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill daily price history')
+    parser.add_argument('--stage', default='dev')
+    parser.add_argument('--tickers', help='Comma-separated tickers to backfill')
+    parser.add_argument('--universe', action='store_true', help='Backfill every held ticker')
+    parser.add_argument('--years', type=int, help='Years of history (default: the function\'s BACKFILL_YEARS)')
+    parser.add_argument('--restart', action='store_true', help='Redo tickers that were already backfilled')
+    args = parser.parse_args()
+
+    # Initialize Lambda client
+    lambda_client = boto3.client('lambda', region_name='us-east-1')
+
+    # Payload
+    payload = {}
+    if args.tickers:
+        payload['tickers'] = [t.strip().upper() for t in args.tickers.split(',') if t.strip()]
+    if args.universe:
+        payload['universe'] = True
+    if args.years:
+        payload['years'] = args.years
+    if args.restart:
+        payload['restart'] = True
+
+    try:
+        response = lambda_client.invoke(
+            FunctionName=f'zsmseven-backend-processing-api-{args.stage}-backfillHistory',
+            InvocationType='Event',  # Asynchronous
+            Payload=json.dumps(payload)
+        )
+        print(f"Successfully invoked backfillHistory with {payload or 'open checkpoints'}")
+        print(f"Response: {response}")
+    except Exception as e:
+        print(f"Error invoking Lambda: {e}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Script to generate a synthetic book of portfolios and positions for scale
+testing, and load it into the user-portfolios and portfolio-positions tables
+(or print its statistics).
+
+Users hold a few portfolios each, and positions pick tickers with Zipf
+popularity: the rank-r ticker is held with weight 1 / r^s, so a handful of
+megacaps appear in most portfolios and a long tail in few, like the real
+book. The top ranks are real symbols (so the fake Polygon and ticker-data
+look familiar), the tail synthetic. Items follow the portfolio-api schema,
+with derived fields computed as createPosition does.
+
+Everything, IDs included, comes from --seed, so a dataset is reproducible:
+loading it again overwrites the same items, and --delete removes exactly
+them. --legacy-portfolios also writes legacy portfolios-table items
+(portfolio_name, tickers) drawn from the same distribution, which overlap
+the positions' tickers for exercising the ingestion run's dedupe.
+
+Items are written in parallel batch_write_item chunks of 25, retrying
+unprocessed items with backoff. --endpoint-url targets DynamoDB Local (or a
+moto server), and --create-tables creates the tables there first.
+
+Usage:
+    python generate_portfolios.py --users 1000 --dry-run
+    python generate_portfolios.py --users 1000 --seed 7 [--stage dev] [--workers 8]
+    python generate_portfolios.py --users 1000 --endpoint-url http://localhost:8000 --create-tables
+    python generate_portfolios.py --users 1000 --seed 7 --delete
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from itertools import accumulate
+
+import boto3
+
+# batch_write_item accepts at most 25 items
+BATCH_SIZE = 25
+MAX_BATCH_ATTEMPTS = 8
+
+# Most held symbols first; the Zipf tail continues with synthetic ones
+POPULAR_TICKERS = (
+    'NVDA', 'AAPL', 'MSFT', 'AMZN', 'GOOGL', 'META', 'TSLA', 'AVGO', 'PLTR', 'BTC-USD',
+    'IBIT', 'SPY', 'QQQ', 'AMD', 'NFLX', 'HOOD', 'COST', 'JPM', 'V', 'MSTR',
+    'ETH-USD', 'LLY', 'UNH', 'IAU', 'BRK.B', 'ORCL', 'CRM', 'COIN', 'SMCI', 'ARM',
+    'NVDY', 'MSTY', 'PLTY', 'TSLY', 'SCHD', 'VOO', 'VTI', 'JEPI', 'JEPQ', 'O'
+)
+
+PORTFOLIO_NAMES = ('Core', 'Growth', 'Dividend', 'Retirement', 'Speculative', 'Income', 'Tech', 'Crypto')
+
+
+def synthetic_symbol(index):
+    """
+    Four-or-more-letter symbol of a tail rank, e.g. 0 -> 'BAAA'.
+    """
+    letters = []
+    index += 26 ** 3
+    while index:
+        index, digit = divmod(index, 26)
+        letters.append(chr(ord('A') + digit))
+    return ''.join(reversed(letters))
+
+
+def ticker_universe(size):
+    """
+    Ticker symbols by popularity rank.
+    """
+    symbols = list(POPULAR_TICKERS[:size])
+    taken = set(symbols)
+    index = 0
+    while len(symbols) < size:
+        symbol = synthetic_symbol(index)
+        index += 1
+        if symbol not in taken:
+            symbols.append(symbol)
+    return symbols
+
+
+class ZipfSampler:
+    """
+    Draws ranks 0..n-1 with probability proportional to 1 / (rank + 1)^s.
+    """
+
+    def __init__(self, n, s, rng):
+        self.rng = rng
+        self.cumulative = list(accumulate(1 / (rank + 1) ** s for rank in range(n)))
+
+    def draw(self):
+        return bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+
+    def draw_distinct(self, count):
+        """
+        count distinct ranks (fewer only if the universe is smaller).
+        """
+        count = min(count, len(self.cumulative))
+        ranks = []
+        seen = set()
+        while len(ranks) < count:
+            rank = self.draw()
+            if rank not in seen:
+                seen.add(rank)
+                ranks.append(rank)
+        return ranks
+
+
+def base_price(ticker):
+    """
+    A stable price for a ticker, shared by every position holding it.
+    """
+    rng = random.Random(ticker)
+    return round(math.exp(rng.uniform(math.log(5), math.log(1500))), 2)
+
+
+def generate_dataset(users, portfolios_per_user=2.0, positions_per_portfolio=12, tickers=5000, zipf_s=1.1,
+                     legacy_portfolios=0, seed=7):
+    """
+    Generate a reproducible book of portfolios and positions.
+
+    Args:
+        users (int): Number of users
+        portfolios_per_user (float): Mean portfolios per user (at least one each)
+        positions_per_portfolio (float): Mean positions per portfolio
+        tickers (int): Ticker universe size
+        zipf_s (float): Zipf exponent of ticker popularity
+        legacy_portfolios (int): Legacy portfolios-table items to generate
+        seed (int): Random seed
+
+    Returns:
+        dict: {'portfolios': [...], 'positions': [...], 'legacy': [...]} of plain items
+    """
+    rng = random.Random(seed)
+    symbols = ticker_universe(tickers)
+    sampler = ZipfSampler(len(symbols), zipf_s, rng)
+    epoch = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def new_id():
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    def timestamp():
+        return (epoch + timedelta(seconds=rng.randrange(365 * 86400))).isoformat().replace('+00:00', 'Z')
+
+    portfolios = []
+    positions = []
+    for _ in range(users):
+        user_id = new_id()
+        count = 1 + min(len(PORTFOLIO_NAMES) - 1, int(rng.expovariate(1 / max(portfolios_per_user - 1, 1e-9))))
+        for number, name in enumerate(rng.sample(PORTFOLIO_NAMES, count)):
+            created = timestamp()
+            portfolio = {
+                'id': new_id(),
+                'userId': user_id,
+                'name': name,
+                'description': f'Synthetic {name.lower()} portfolio (seed {seed})',
+                'isActive': rng.random() < 0.95,
+                'isDefault': number == 0,
+                'createdAt': created,
+                'updatedAt': created
+            }
+            portfolios.append(portfolio)
+
+            holdings = max(1, round(rng.lognormvariate(math.log(positions_per_portfolio), 0.5)))
+            for rank in sampler.draw_distinct(holdings):
+                ticker = symbols[rank]
+                price = base_price(ticker)
+                shares = Decimal(str(round(rng.lognormvariate(math.log(5000 / price + 1), 1.0), 4)))
+                average_cost = Decimal(str(round(price * rng.uniform(0.6, 1.3), 4)))
+                current_price = Decimal(str(price))
+                cost_basis = (shares * average_cost).quantize(Decimal('0.01'))
+                market_value = (shares * current_price).quantize(Decimal('0.01'))
+                positions.append({
+                    'id': new_id(),
+                    'portfolioId': portfolio['id'],
+                    'ticker': ticker,
+                    'shares': shares,
+                    'costBasis': cost_basis,
+                    'averageCost': (cost_basis / shares).quantize(Decimal('0.0001')),
+                    'currentPrice': current_price,
+                    'marketValue': market_value,
+                    'unrealizedPL': market_value - cost_basis,
+                    'createdAt': created,
+                    'updatedAt': created
+                })
+
+    legacy = [
+        {
+            'portfolio_name': f'Synthetic {seed}-{i:05d}',
+            'tickers': [symbols[rank] for rank in sampler.draw_distinct(7)],
+            'last_update': timestamp()
+        }
+        for i in range(legacy_portfolios)
+    ]
+    return {'portfolios': portfolios, 'positions': positions, 'legacy': legacy}
+
+
+def describe(dataset):
+    """
+    Print the shape of a dataset: counts and how concentrated its tickers are.
+    """
+    positions = dataset['positions']
+    holders = Counter(position['ticker'] for position in positions)
+    legacy_tickers = {ticker for item in dataset['legacy'] for ticker in item['tickers']}
+    users = len({portfolio['userId'] for portfolio in dataset['portfolios']})
+    print(f"Users: {users}, portfolios: {len(dataset['portfolios'])}, positions: {len(positions)}")
+    print(f"Distinct tickers: {len(holders)} held by positions, "
+          f"{len(legacy_tickers | set(holders))} including {len(dataset['legacy'])} legacy portfolio(s)")
+    if holders:
+        top = holders.most_common(10)
+        top_share = sum(count for _, count in top) / len(positions)
+        singles = sum(1 for count in holders.values() if count == 1)
+        print(f"Top 10 tickers hold {top_share:.0%} of positions: "
+              + ', '.join(f'{ticker} {count}' for ticker, count in top))
+        print(f"Tickers held by a single position: {singles}")
+
+
+def write_batches(client, table_name, requests, workers):
+    """
+    Send write requests in parallel batch_write_item chunks.
+
+    Args:
+        client: boto3 DynamoDB client
+        table_name (str): Target table
+        requests (list): PutRequest/DeleteRequest entries in wire format
+        workers (int): Parallel batch writers
+
+    Returns:
+        tuple: (items written, consumed write capacity units)
+    """
+    def send(chunk):
+        request = {table_name: chunk}
+        consumed = 0.0
+        for attempt in range(MAX_BATCH_ATTEMPTS):
+            response = client.batch_write_item(RequestItems=request, ReturnConsumedCapacity='TOTAL')
+            consumed += sum(c.get('CapacityUnits', 0) for c in response.get('ConsumedCapacity', []))
+            request = response.get('UnprocessedItems')
+            if not request:
+                return len(chunk), consumed
+            # Throttled: back off with jitter before retrying the rest
+            time.sleep(min(5.0, 0.05 * 2 ** attempt) * random.uniform(0.5, 1.5))
+        raise RuntimeError(f"{len(request[table_name])} item(s) still unprocessed in {table_name}")
+
+    chunks = [requests[i:i + BATCH_SIZE] for i in range(0, len(requests), BATCH_SIZE)]
+    written = 0
+    consumed = 0.0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for count, units in pool.map(send, chunks):
+            written += count
+            consumed += units
+    return written, consumed
+
+
+def create_tables(client, portfolios_table, positions_table, legacy_table=None):
+    """
+    Create the tables with the portfolio-api (and legacy api) schemas, for local endpoints.
+    """
+    def gsi(name, *keys):
+        key_schema = [{'AttributeName': keys[0], 'KeyType': 'HASH'}]
+        if len(keys) > 1:
+            key_schema.append({'AttributeName': keys[1], 'KeyType': 'RANGE'})
+        return {'IndexName': name, 'KeySchema': key_schema, 'Projection': {'ProjectionType': 'ALL'}}
+
+    def attributes(*names):
+        return [{'AttributeName': name, 'AttributeType': 'S'} for name in names]
+
+    tables = [
+        (portfolios_table, 'id', attributes('id', 'userId', 'name'),
+         [gsi('UserIdIndex', 'userId'), gsi('UserNameIndex', 'userId', 'name')]),
+        (positions_table, 'id', attributes('id', 'portfolioId', 'ticker'),
+         [gsi('PortfolioIdIndex', 'portfolioId'), gsi('PortfolioTickerIndex', 'portfolioId', 'ticker')])
+    ]
+    if legacy_table:
+        tables.append((legacy_table, 'portfolio_name', attributes('portfolio_name'), None))
+
+    existing = set(client.list_tables()['TableNames'])
+    for name, key, definitions, indexes in tables:
+        if name in existing:
+            print(f"Table {name} already exists")
+            continue
+        kwargs = {'GlobalSecondaryIndexes': indexes} if indexes else {}
+        client.create_table(
+            TableName=name,
+            KeySchema=[{'AttributeName': key, 'KeyType': 'HASH'}],
+            AttributeDefinitions=definitions,
+            BillingMode='PAY_PER_REQUEST',
+            **kwargs
+        )
+        client.get_waiter('table_exists').wait(TableName=name)
+        print(f"Created table {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic portfolios and positions for scale testing')
+    parser.add_argument('--users', type=int, required=True)
+    parser.add_argument('--portfolios-per-user', type=float, default=2.0, help='Mean portfolios per user')
+    parser.add_argument('--positions-per-portfolio', type=float, default=12, help='Mean positions per portfolio')
+    parser.add_argument('--tickers', type=int, default=5000, help='Ticker universe size')
+    parser.add_argument('--zipf-s', type=float, default=1.1, help='Zipf exponent of ticker popularity')
+    parser.add_argument('--legacy-portfolios', type=int, default=0, help='Legacy portfolios-table items to add')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--stage', default='dev')
+    parser.add_argument('--portfolios-table', help='Default: user-portfolios-<stage>')
+    parser.add_argument('--positions-table', help='Default: portfolio-positions-<stage>')
+    parser.add_argument('--legacy-table', help='Default: portfolios-<stage>')
+    parser.add_argument('--endpoint-url', help='DynamoDB endpoint, e.g. http://localhost:8000 for DynamoDB Local')
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--workers', type=int, default=8, help='Parallel batch writers')
+    parser.add_argument('--create-tables', action='store_true', help='Create missing tables first')
+    parser.add_argument('--delete', action='store_true', help="Delete the dataset's items instead of writing them")
+    parser.add_argument('--dry-run', action='store_true', help='Only print the dataset statistics')
+    args = parser.parse_args()
+
+    portfolios_table = args.portfolios_table or f'user-portfolios-{args.stage}'
+    positions_table = args.positions_table or f'portfolio-positions-{args.stage}'
+    legacy_table = args.legacy_table or f'portfolios-{args.stage}'
+
+    started = time.perf_counter()
+    dataset = generate_dataset(args.users, args.portfolios_per_user, args.positions_per_portfolio,
+                               args.tickers, args.zipf_s, args.legacy_portfolios, args.seed)
+    print(f"Generated in {time.perf_counter() - started:.1f}s (seed {args.seed})")
+    describe(dataset)
+    if args.dry_run:
+        return
+
+    client = boto3.client('dynamodb', region_name=args.region, endpoint_url=args.endpoint_url)
+    if args.create_tables:
+        create_tables(client, portfolios_table, positions_table, legacy_table if dataset['legacy'] else None)
+
+    from boto3.dynamodb.types import TypeSerializer
+    serializer = TypeSerializer()
+    targets = [
+        (portfolios_table, dataset['portfolios'], ('id',)),
+        (positions_table, dataset['positions'], ('id',)),
+        (legacy_table, dataset['legacy'], ('portfolio_name',))
+    ]
+    for table_name, items, keys in targets:
+        if not items:
+            continue
+        if args.delete:
+            requests = [{'DeleteRequest': {'Key': {k: serializer.serialize(item[k]) for k in keys}}} for item in items]
+        else:
+            requests = [{'PutRequest': {'Item': {k: serializer.serialize(v) for k, v in item.items()}}}
+                        for item in items]
+        started = time.perf_counter()
+        try:
+            count, units = write_batches(client, table_name, requests, args.workers)
+        except Exception as e:
+            print(f"Error writing to {table_name}: {e}")
+            sys.exit(1)
+        elapsed = time.perf_counter() - started
+        action = 'Deleted' if args.delete else 'Wrote'
+        print(f"{action} {count} item(s) in {table_name} in {elapsed:.1f}s "
+              f"({count / elapsed if elapsed else 0:.0f}/s, {units:.0f} WCU)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,41 @@
 #!/usr/bin/env python3
 """
 Script to invoke the processTickers Lambda function.
+
+Nightly ingestion for both the legacy portfolios table and portfolio
+positions runs in backend-processing-api, so that is the function kicked.
+Each kick is dispatched as its own run.
+
+Usage:
+    python kick_tickers.py [--stage dev]
 """
 
+import argparse
 import boto3
+import json
+from datetime import datetime
 
 def main():
+    parser = argparse.ArgumentParser(description='Kick a ticker ingestion run')
+    parser.add_argument('--stage', default='dev')
+    args = parser.parse_args()
+
     # Initialize Lambda client
     lambda_client = boto3.client('lambda', region_name='us-east-1')
 
+    # A fresh run ID, since a run already dispatched today is not dispatched again
+    run_id = datetime.utcnow().strftime('%Y-%m-%d-kick-%H%M%S')
+
     try:
         response = lambda_client.invoke(
-            FunctionName='zsmseven-tracker-api-dev-processTickers',
-            InvocationType='Event'  # Asynchronous
+            FunctionName=f'zsmseven-backend-processing-api-{args.stage}-processTickers',
+            InvocationType='Event',  # Asynchronous
+            Payload=json.dumps({'run_id': run_id})
         )
-        print("Successfully invoked processTickers Lambda")
+        print(f"Successfully invoked processTickers Lambda (run {run_id})")
         print(f"Response: {response}")
     except Exception as e:
         print(f"Error invoking Lambda: {e}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of decoding scanned positions: today's resource path against
+src/utils/ddb.py.
+
+Both paths start from the same synthetic wire-format scan page, as the
+low-level client returns it:
+
+- resource: TypeDeserializer into dicts of Decimal (what Table.scan does),
+  then float() per field in the analytics
+- codec: Position.from_item straight to slotted records of floats
+
+Reports wall time per item and the tracemalloc peak of holding every decoded
+item at once, which is what a full positions scan keeps in memory.
+
+Usage (from backend-processing-api/):
+    python benchmarks/bench_ddb_codec.py [--items 100000] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from boto3.dynamodb.types import TypeDeserializer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.ddb import Position  # noqa: E402
+
+NUMBER_FIELDS = ('shares', 'costBasis', 'currentPrice', 'marketValue', 'unrealizedPL')
+
+
+def wire_items(count, seed=7):
+    """
+    Synthetic wire-format position items.
+    """
+    rng = random.Random(seed)
+    tickers = [f'T{i:04d}' for i in range(2000)]
+    items = []
+    for i in range(count):
+        item = {
+            'id': {'S': f'pos-{i:08d}'},
+            'portfolioId': {'S': f'pf-{i // 20:06d}'},
+            'ticker': {'S': rng.choice(tickers)}
+        }
+        for field in NUMBER_FIELDS:
+            item[field] = {'N': f'{rng.uniform(1, 5000):.4f}'}
+        items.append(item)
+    return items
+
+
+def resource_path(items):
+    deserializer = TypeDeserializer()
+    decoded = [{k: deserializer.deserialize(v) for k, v in item.items()} for item in items]
+    # The analytics convert every number back to float
+    for item in decoded:
+        for field in NUMBER_FIELDS:
+            float(item[field])
+    return decoded
+
+
+def codec_path(items):
+    return [Position.from_item(item) for item in items]
+
+
+def measure(func, items, repeat):
+    """
+    Best wall time over the repeats, and the tracemalloc peak of one run.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(items)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    result = func(items)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DynamoDB item decoding')
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    items = wire_items(args.items)
+    results = {name: measure(func, items, args.repeat)
+               for name, func in (('resource', resource_path), ('codec', codec_path))}
+
+    print(f"{args.items} position items, best of {args.repeat}")
+    for name, (seconds, peak) in results.items():
+        print(f"  {name:<9} {seconds * 1e6 / args.items:7.2f} us/item  {peak / args.items:7.0f} B/item peak")
+    (base_time, base_peak), (codec_time, codec_peak) = results['resource'], results['codec']
+    print(f"  speedup {base_time / codec_time:.1f}x, memory {base_peak / codec_peak:.1f}x smaller")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the nightly pipeline on the offline harness
+(tests/harness/pipeline.py): processTickers -> processTicker ->
+analyzePortfolios -> analyzePortfolio -> getPortfolioAnalysis, against
+in-memory DynamoDB/SQS and the fake Polygon and XAI servers.
+
+For each universe size (that many tickers and positions, ten positions to a
+portfolio) reports:
+
+- wall time, and time and invocations per function
+- Polygon requests by endpoint and 429s
+- DynamoDB operations and estimated read/write capacity units per table
+- SQS messages sent and Lambda invocations
+- LLM calls and tokens
+- analyses served by the read API
+
+With --users, the books are instead generated by
+api/tools/generate_portfolios.py for that many users (Zipf ticker
+popularity, --seed), with --legacy-portfolios legacy portfolios sharing the
+tickers.
+
+Sizes run in a fresh environment each. moto is far slower than DynamoDB, so
+the absolute times are for comparing changes, not for predicting Lambda
+durations; a 1000 run takes minutes and 10000 close to an hour. Requires
+requirements-dev.txt.
+
+Usage (from backend-processing-api/):
+    python benchmarks/bench_pipeline.py [--sizes 10,1000,10000] [--polygon-latency-ms 0]
+        [--rate-limit-every 0] [--llm-latency-ms 0] [--json report.json]
+    python benchmarks/bench_pipeline.py --users 50,500 [--seed 7] [--legacy-portfolios 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+sys.path.insert(0, os.path.join(ROOT, '..', 'api', 'tools'))
+
+from harness.fake_llm import FakeLLM  # noqa: E402
+from harness.fake_polygon import FakePolygon  # noqa: E402
+from harness.pipeline import Pipeline  # noqa: E402
+from generate_portfolios import generate_dataset  # noqa: E402
+
+
+def print_report(report):
+    universe = report['universe']
+    print(f"\n{universe['tickers']} tickers, {universe['positions']} positions, "
+          f"{universe['portfolios']} portfolios: {report['wall_seconds']:.1f}s wall")
+
+    print("  function                   invocations   seconds  errors")
+    for name, stats in report['functions'].items():
+        print(f"  {name:<26} {stats['invocations']:>11} {stats['seconds']:>9.2f} {stats['errors']:>7}")
+    if report['dropped_messages']:
+        print(f"  dropped messages: {report['dropped_messages']}")
+
+    polygon = report['polygon']
+    calls = ', '.join(f'{endpoint} {n}' for endpoint, n in sorted(polygon['requests'].items()))
+    print(f"  Polygon requests: {sum(polygon['requests'].values())} ({calls}), 429s: {polygon['rate_limited']}")
+
+    print("  DynamoDB table             ops      RCU      WCU")
+    total_rcu = total_wcu = 0
+    for table, stats in report['dynamodb'].items():
+        total_rcu += stats['rcu']
+        total_wcu += stats['wcu']
+        print(f"  {table:<22} {sum(stats['ops'].values()):>7} {stats['rcu']:>8.1f} {stats['wcu']:>8}")
+    print(f"  {'total':<22} {'':>7} {total_rcu:>8.1f} {total_wcu:>8}")
+
+    print(f"  SQS messages sent: {report['sqs']['sent']}, Lambda invokes: {report['lambda_invokes']}")
+    llm = report['llm']
+    print(f"  LLM calls: {llm['calls']} ({llm['failures']} failed), tokens: {llm['prompt_tokens']} prompt, "
+          f"{llm['completion_tokens']} completion")
+    if report['reads']:
+        print(f"  Analyses served: {report['reads']['served']}/{universe['portfolios']} "
+              f"(single {report['reads']['single']}, bulk {report['reads']['bulk']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline end to end on the offline harness')
+    parser.add_argument('--sizes', default='10,1000,10000', help='Comma-separated universe sizes')
+    parser.add_argument('--users', help='Comma-separated user counts of generated books (instead of --sizes)')
+    parser.add_argument('--seed', type=int, default=7, help='Seed of the generated books')
+    parser.add_argument('--legacy-portfolios', type=int, default=0, help='Legacy portfolios in generated books')
+    parser.add_argument('--positions-per-portfolio', type=int, default=10)
+    parser.add_argument('--polygon-latency-ms', type=float, default=0)
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='Answer every Nth Polygon request with 429')
+    parser.add_argument('--llm-latency-ms', type=float, default=0)
+    parser.add_argument('--llm-fail-every', type=int, default=0, help='Fail every Nth LLM request')
+    parser.add_argument('--json', help='Also write the reports to this file')
+    parser.add_argument('--verbose', action='store_true', help="Show the handlers' output")
+    args = parser.parse_args()
+
+    if args.users:
+        books = [{'dataset': generate_dataset(int(users), positions_per_portfolio=args.positions_per_portfolio,
+                                              legacy_portfolios=args.legacy_portfolios, seed=args.seed)}
+                 for users in args.users.split(',') if users.strip()]
+    else:
+        books = [{'tickers': int(size), 'positions': int(size)} for size in args.sizes.split(',') if size.strip()]
+
+    reports = []
+    for book in books:
+        polygon = FakePolygon(latency_ms=args.polygon_latency_ms, rate_limit_every=args.rate_limit_every)
+        llm = FakeLLM(latency_ms=args.llm_latency_ms, fail_every=args.llm_fail_every)
+        with Pipeline(positions_per_portfolio=args.positions_per_portfolio, polygon=polygon, llm=llm,
+                      verbose=args.verbose, **book) as pipeline:
+            report = pipeline.run()
+        print_report(report)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
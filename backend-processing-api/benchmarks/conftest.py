@@ -0,0 +1,212 @@
+"""
+Microbenchmark fixture with regression gates against benchmarks/baseline.json.
+
+A test calls the `benchmark` fixture with the function under test:
+
+    def test_parse(benchmark):
+        entries = benchmark(parse_analysis, text, items=50)
+
+The function is run in timed rounds (enough calls for each round to take
+MIN_ROUND_SECONDS, with the garbage collector paused as in timeit) and the
+best round gives its time per call (a time over the tolerance is measured
+again for longer before it fails). Its allocations are the tracemalloc
+peak of one more call. Times are divided by the best time of a fixed
+pure-Python calibration workload, timed in rounds alternating with the
+function's, so a baseline recorded on one machine still gates runs on a
+faster or slower (or busier) one.
+
+A benchmark fails when its normalized time exceeds the baseline by more
+than BENCHMARK_TOLERANCE (default 0.5, as repeated runs on one machine
+spread by up to a third) or its peak allocation by more than
+BENCHMARK_MEMORY_TOLERANCE (default 0.1, plus MEMORY_SLACK_BYTES).
+Benchmarks missing from the baseline only report.
+
+Run from backend-processing-api/:
+    python -m pytest -q benchmarks                   # check against the baseline
+    python -m pytest -q benchmarks --benchmark-save  # record a new baseline
+"""
+
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+API_DIR = ROOT.parent / 'api'
+for path in (str(ROOT), str(API_DIR)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+MIN_ROUND_SECONDS = 0.05
+ROUNDS = 5
+MEMORY_SLACK_BYTES = 2048
+
+TOLERANCE = float(os.environ.get('BENCHMARK_TOLERANCE', '0.5'))
+MEMORY_TOLERANCE = float(os.environ.get('BENCHMARK_MEMORY_TOLERANCE', '0.1'))
+
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmark-save', action='store_true',
+                     help='Record the results as benchmarks/baseline.json instead of checking them')
+
+
+def _calibration_work():
+    rows = [{'ticker': f'T{i:04d}', 'price': str(i * 1.25), 'shares': i % 97} for i in range(2000)]
+    rows = json.loads(json.dumps(rows))
+    rows.sort(key=lambda row: (row['shares'], row['ticker']))
+    return sum(Decimal(row['price']) * row['shares'] for row in rows)
+
+
+def _calls_per_round(func, args, kwargs):
+    """
+    Calls needed for a timed round to take at least MIN_ROUND_SECONDS.
+    """
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            func(*args, **kwargs)
+        if time.perf_counter() - started >= MIN_ROUND_SECONDS or calls >= 1 << 20:
+            return calls
+        calls *= 2
+
+
+def _round(func, args, kwargs, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        func(*args, **kwargs)
+    return (time.perf_counter() - started) / calls
+
+
+def _best_times(func, args, kwargs, calibration_calls, rounds=ROUNDS):
+    """
+    Best seconds per call of func and of the calibration workload, over
+    alternating rounds so both see the machine at the same speed.
+    """
+    calls = _calls_per_round(func, args, kwargs)
+    best = calibration = float('inf')
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            calibration = min(calibration, _round(_calibration_work, (), {}, calibration_calls))
+            best = min(best, _round(func, args, kwargs, calls))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best, calibration
+
+
+@pytest.fixture(scope='session')
+def calibration_calls():
+    return _calls_per_round(_calibration_work, (), {})
+
+
+@pytest.fixture(scope='session')
+def benchmark_results(request):
+    results = {}
+    request.config._benchmark_results = results
+    return results
+
+
+@pytest.fixture(scope='session')
+def baseline():
+    if BASELINE.exists():
+        return json.loads(BASELINE.read_text())['benchmarks']
+    return {}
+
+
+@pytest.fixture
+def benchmark(request, calibration_calls, benchmark_results, baseline):
+    """
+    Time a function, record its result and check it against the baseline.
+
+    Returns a callable benchmark(func, *args, items=1, **kwargs) that returns
+    func's result; items is how many items one call processes, for reporting
+    throughput.
+    """
+    name = request.node.name
+    save = request.config.getoption('--benchmark-save')
+
+    def run(func, *args, items=1, **kwargs):
+        result = func(*args, **kwargs)
+        seconds, calibration_seconds = _best_times(func, args, kwargs, calibration_calls)
+        base = baseline.get(name)
+        if base and not save and seconds / calibration_seconds > base['normalized'] * (1 + TOLERANCE):
+            # Confirm a regression with a longer run before failing on a noisy round
+            seconds, calibration_seconds = min(
+                (seconds, calibration_seconds),
+                _best_times(func, args, kwargs, calibration_calls, rounds=ROUNDS * 3),
+                key=lambda times: times[0] / times[1]
+            )
+
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        measured = {
+            'seconds': seconds,
+            'normalized': seconds / calibration_seconds,
+            'items': items,
+            'peak_bytes': peak
+        }
+        if base:
+            measured['time_ratio'] = measured['normalized'] / base['normalized']
+        benchmark_results[name] = measured
+
+        if base and not save:
+            assert measured['time_ratio'] <= 1 + TOLERANCE, (
+                f"{name} is {measured['time_ratio']:.2f}x its baseline time "
+                f"({items / seconds:,.0f} items/s, tolerance {TOLERANCE:.0%})"
+            )
+            allowed = base['peak_bytes'] * (1 + MEMORY_TOLERANCE) + MEMORY_SLACK_BYTES
+            assert peak <= allowed, (
+                f"{name} allocates {peak:,} bytes at peak, baseline {base['peak_bytes']:,} "
+                f"(tolerance {MEMORY_TOLERANCE:.0%})"
+            )
+        return result
+
+    return run
+
+
+def pytest_sessionfinish(session, exitstatus):
+    results = getattr(session.config, '_benchmark_results', None)
+    if not results or not session.config.getoption('--benchmark-save'):
+        return
+    existing = json.loads(BASELINE.read_text())['benchmarks'] if BASELINE.exists() else {}
+    existing.update({
+        name: {key: value for key, value in measured.items() if key != 'time_ratio'}
+        for name, measured in results.items()
+    })
+    BASELINE.write_text(json.dumps({
+        'recorded_on': {'python': platform.python_version(), 'machine': platform.machine()},
+        'benchmarks': dict(sorted(existing.items()))
+    }, indent=2) + '\n')
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    results = getattr(config, '_benchmark_results', None)
+    if not results:
+        return
+    terminalreporter.section('benchmarks')
+    terminalreporter.write_line(f"{'benchmark':<44} {'items/s':>14} {'vs baseline':>12} {'peak KB':>10}")
+    for name, measured in sorted(results.items()):
+        ratio = measured.get('time_ratio')
+        terminalreporter.write_line(
+            f"{name:<44} {measured['items'] / measured['seconds']:>14,.0f} "
+            f"{f'{ratio:.2f}x' if ratio else 'new':>12} {measured['peak_bytes'] / 1024:>10,.1f}"
+        )
+    if config.getoption('--benchmark-save'):
+        terminalreporter.write_line(f"Baseline written to {BASELINE}")
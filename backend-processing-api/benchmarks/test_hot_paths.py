@@ -0,0 +1,255 @@
+"""
+Microbenchmarks of the pure, per-item code of the pipeline and read API, on
+inputs the size of a nightly run: ticker formatting, item decoding, the
+analysis prompt, position P&L, analysis parsing and serving, the
+vectorised indicator and scoring engines, and the profiling check every
+handler runs.
+
+The fixture in conftest.py gates each against benchmarks/baseline.json.
+New indicator or scoring code gets a benchmark here and a re-recorded
+baseline.
+"""
+
+import json
+import random
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+
+import analyze_portfolio as api_analyze_portfolio
+import get_portfolio_analysis
+from src.analytics.indicators import compute_indicators
+from src.analytics.scoring import parameter_grid, rule_scores
+from src.handlers.analyze_portfolio import build_prompt
+from src.handlers.process_ticker import position_values
+from src.utils.analysis_format import dumps_compact, parse_analysis
+from src.utils.ddb import Position, decode_item, encode_item
+from src.utils.polygon import get_ticker_type
+from src.utils.profiling import profiled
+
+TICKERS_PER_PORTFOLIO = 50
+POSITIONS = 1000
+BULK_PORTFOLIOS = 100
+UNIVERSE = 500
+HISTORY_ROWS = 260
+SCORING_SLICE = 50
+INDICATORS = ('sma20', 'sma50', 'sma200', 'ema12', 'ema26', 'rsi14', 'macd', 'macdSignal', 'macdHist',
+              'bollingerUpper', 'bollingerMiddle', 'bollingerLower', 'bollingerPctB', 'atr14', 'roc10', 'roc20')
+
+rng = random.Random(49)
+
+
+def symbols(count):
+    """
+    A mix of stocks, crypto pairs and indexes like the held universe.
+    """
+    result = []
+    for i in range(count):
+        if i % 20 == 0:
+            result.append(f'X{i}-USD')
+        elif i % 50 == 1:
+            result.append(f'^IX{i}')
+        else:
+            result.append(f'T{i:04d}')
+    return result
+
+
+def ticker_record(ticker):
+    """
+    A latest ticker-data record as DynamoDB returns it (numbers as Decimal).
+    """
+    price = Decimal(str(round(rng.uniform(5, 900), 2)))
+    return {
+        'ticker': ticker,
+        'timestamp': '2026-10-16T20:00:00',
+        'asOf': '2026-10-16',
+        'price': price,
+        'ma50': price * Decimal('0.97'),
+        'rsi': Decimal(str(round(rng.uniform(20, 80), 2))),
+        'high': price * Decimal('1.02'),
+        'low': price * Decimal('0.98'),
+        'volume': Decimal(rng.randrange(10 ** 5, 10 ** 8)),
+        'indicators': {name: Decimal(str(round(rng.uniform(-5, 500), 4))) for name in INDICATORS},
+        'indicatorsAsOf': '2026-10-16'
+    }
+
+
+PORTFOLIO = symbols(TICKERS_PER_PORTFOLIO)
+RECORDS = {ticker: ticker_record(ticker) for ticker in PORTFOLIO}
+WIRE_RECORDS = [encode_item(record) for record in RECORDS.values()]
+
+POSITION_ITEMS = [
+    {
+        'id': f'position-{i}',
+        'portfolioId': f'portfolio-{i // 10}',
+        'ticker': f'T{i % 400:04d}',
+        'shares': Decimal(rng.randrange(1, 2000)),
+        'averageCost': Decimal(str(round(rng.uniform(5, 900), 2))),
+        'costBasis': Decimal(str(round(rng.uniform(500, 500000), 2))),
+        'currentPrice': Decimal(str(round(rng.uniform(5, 900), 2))),
+        'marketValue': Decimal(str(round(rng.uniform(500, 500000), 2))),
+        'unrealizedPL': Decimal(str(round(rng.uniform(-5000, 5000), 2)))
+    }
+    for i in range(POSITIONS)
+]
+WIRE_POSITIONS = [encode_item(item) for item in POSITION_ITEMS]
+
+# A model reply for one portfolio: prose around a fenced JSON list
+REPLY = 'Here is the analysis.\n```json\n' + json.dumps([
+    {
+        'ticker': ticker,
+        'score': rng.randint(-10, 10),
+        'price': float(record['price']),
+        'rsi': float(record['rsi']),
+        'ma50': float(record['ma50']),
+        'asOf': record['asOf'],
+        'reason': 'RSI near the neutral zone with price close to its 50-day average; no strong signal.'
+    }
+    for ticker, record in RECORDS.items()
+], indent=2) + '\n```\nScores reflect current momentum.'
+
+
+def test_get_ticker_type(benchmark):
+    tickers = symbols(10000)
+
+    def run():
+        return [get_ticker_type(ticker) for ticker in tickers]
+
+    types = benchmark(run, items=len(tickers))
+    assert types[0] == ('crypto', 'X:X0-USD')
+    assert types[1] == ('index', 'I:IX1')
+    assert types[2] == ('stock', 'T0002')
+
+
+def test_api_decimal_to_float(benchmark):
+    records = list(RECORDS.values())
+    converted = benchmark(api_analyze_portfolio.decimal_to_float, records, items=len(records))
+    assert isinstance(converted[0]['indicators']['rsi14'], float)
+
+
+def test_decode_ticker_items(benchmark):
+    def run():
+        return [decode_item(item) for item in WIRE_RECORDS]
+
+    decoded = benchmark(run, items=len(WIRE_RECORDS))
+    assert decoded[0]['price'] == float(RECORDS[PORTFOLIO[0]]['price'])
+
+
+def test_build_prompt(benchmark):
+    ticker_data = {ticker: decode_item(item) for ticker, item in zip(PORTFOLIO, WIRE_RECORDS)}
+    prompt = benchmark(build_prompt, 'portfolio-1', 'Growth', ticker_data, '2026-10-17T06:00:00',
+                       items=len(ticker_data))
+    assert prompt.count('"ticker":') == TICKERS_PER_PORTFOLIO
+
+
+def test_position_values(benchmark):
+    price = Decimal('123.45')
+
+    def run():
+        return [position_values(position, price) for position in POSITION_ITEMS]
+
+    values = benchmark(run, items=len(POSITION_ITEMS))
+    shares, _, cost_basis, market_value, unrealized_pl = values[0]
+    assert market_value == shares * price
+    assert unrealized_pl == market_value - cost_basis
+
+
+def test_position_from_item(benchmark):
+    def run():
+        return [Position.from_item(item) for item in WIRE_POSITIONS]
+
+    positions = benchmark(run, items=len(WIRE_POSITIONS))
+    assert positions[0].id == 'position-0'
+
+
+def test_parse_analysis(benchmark):
+    entries = benchmark(parse_analysis, REPLY, items=TICKERS_PER_PORTFOLIO)
+    assert len(entries) == TICKERS_PER_PORTFOLIO
+
+
+def test_build_entry_legacy(benchmark):
+    item = {'analysis': REPLY, 'analysisTimestamp': '2026-10-17T06:00:00', 'portfolioName': 'Growth'}
+    now = datetime.now(timezone.utc).timestamp()
+    entry = benchmark(get_portfolio_analysis.build_entry, 'portfolio-1', item, now, items=TICKERS_PER_PORTFOLIO)
+    assert len(json.loads(entry['body'])) == TICKERS_PER_PORTFOLIO
+
+
+def test_build_entry_stored(benchmark):
+    item = {
+        'schemaVersion': get_portfolio_analysis.SCHEMA_VERSION,
+        'parsed_data': dumps_compact(parse_analysis(REPLY)),
+        'analysisTimestamp': '2026-10-17T06:00:00',
+        'portfolioName': 'Growth'
+    }
+    now = datetime.now(timezone.utc).timestamp()
+    entry = benchmark(get_portfolio_analysis.build_entry, 'portfolio-1', item, now)
+    assert entry['body'] is item['parsed_data']
+
+
+def bulk_entries():
+    body = dumps_compact(parse_analysis(REPLY))
+    now = datetime.now(timezone.utc).timestamp()
+    portfolio_ids = [f'portfolio-{i}' for i in range(BULK_PORTFOLIOS)]
+    entries = {
+        portfolio: get_portfolio_analysis.build_entry(portfolio, {
+            'schemaVersion': get_portfolio_analysis.SCHEMA_VERSION,
+            'parsed_data': body,
+            'analysisTimestamp': '2026-10-17T06:00:00',
+            'portfolioName': portfolio
+        }, now)
+        for portfolio in portfolio_ids
+    }
+    return portfolio_ids, entries
+
+
+def test_bulk_body(benchmark):
+    portfolio_ids, entries = bulk_entries()
+    body = benchmark(get_portfolio_analysis.bulk_body, portfolio_ids, entries, {}, items=BULK_PORTFOLIOS)
+    assert len(json.loads(body)['analyses']) == BULK_PORTFOLIOS
+
+
+def test_finalize_bulk_response(benchmark):
+    portfolio_ids, entries = bulk_entries()
+    body = get_portfolio_analysis.bulk_body(portfolio_ids, entries, {})
+    event = {'headers': {'Accept-Encoding': 'gzip, deflate'}}
+    expires_at = datetime.now(timezone.utc).timestamp() + 300
+    response = benchmark(get_portfolio_analysis.finalize_response, event, body, '"etag"', expires_at,
+                         items=BULK_PORTFOLIOS)
+    assert response['body'] is body
+
+
+def universe_inputs():
+    state = np.random.default_rng(49)
+    close = 100 * np.exp(np.cumsum(state.normal(0, 0.02, (HISTORY_ROWS, UNIVERSE)), axis=0))
+    spread = np.abs(state.normal(0, 0.01, close.shape))
+    return {
+        'close': close,
+        'high': close * (1 + spread),
+        'low': close * (1 - spread),
+        'volume': state.integers(10 ** 5, 10 ** 7, close.shape).astype(float)
+    }
+
+
+def test_compute_indicators(benchmark):
+    inputs = universe_inputs()
+    outputs = benchmark(compute_indicators, inputs, items=UNIVERSE)
+    assert outputs['rsi14'].shape == (HISTORY_ROWS, UNIVERSE)
+
+
+def test_rule_scores_grid(benchmark):
+    # Every parameter set scores every date and ticker; a slice of the universe
+    # keeps the run's memory to tens of megabytes
+    inputs = {name: values[:, :SCORING_SLICE] for name, values in universe_inputs().items()}
+    outputs = compute_indicators(inputs, ['rsi', 'sma'])
+    grid = parameter_grid(range(25, 50, 5), range(55, 80, 5), [0.01, 0.02, 0.05])
+    scores = benchmark(rule_scores, outputs['rsi14'], inputs['close'], outputs['sma50'],
+                       grid['rsi_low'], grid['rsi_high'], grid['sma_band'], items=len(grid['rsi_low']))
+    assert scores.shape == (len(grid['rsi_low']), HISTORY_ROWS, SCORING_SLICE)
+
+
+def test_unprofiled_handler_overhead(benchmark):
+    # The profiling check every handler runs when profiling is off
+    handler = profiled(lambda event, context: None)
+    event = {'Records': [{'body': '{}', 'messageAttributes': {}} for _ in range(10)]}
+    benchmark(handler, event, None)
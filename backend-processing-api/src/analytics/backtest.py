@@ -0,0 +1,331 @@
+"""
+Backtests of opportunity scores against forward returns.
+
+Joins the -10..10 opportunity scores stored by analyze_portfolio (the
+parsed_data of each analysis) with the forward returns of the scored tickers,
+computed from the ticker-data price history, and reports per horizon:
+- hit rate: share of non-zero scores whose sign matches the forward return's
+- information coefficient: mean cross-sectional Spearman correlation between
+  score and forward return, over dates with at least MIN_IC_TICKERS scores
+- bucket returns: mean forward return of each score bucket (SCORE_BUCKETS)
+
+Everything is computed on (dates, tickers) arrays. The rule-based scores of
+src/analytics/scoring.py are backtested the same way over a whole parameter
+grid (RSI neutral band, SMA distance band) in one batched computation of
+shape (parameter sets, dates, tickers).
+
+Run locally against a stage's tables:
+    ANALYSES_TABLE=portfolio-analyses-dev TICKER_DATA_TABLE=ticker-data-dev \\
+        python -m src.analytics.backtest --lookback-days 365
+
+or against the Parquet store exportHistory writes (see src/analytics/columnar.py):
+    python -m src.analytics.backtest --export-path ./exports
+"""
+
+import argparse
+import boto3
+import json
+import numpy as np
+import os
+
+from src.analytics.columnar import read_model_scores, read_ticker_records
+from src.analytics.history import field_matrix, history_start, load_records, price_matrix
+from src.analytics.scoring import DEFAULT_RSI_BAND, DEFAULT_SMA_BAND, parameter_grid, rule_scores
+from src.utils.ddb import Analysis, scan_items
+
+# Forward return horizons, in trading days (rows of the price axis)
+HORIZONS = (1, 5, 20)
+
+# Score bucket edges: strong avoid, avoid, neutral, buy, strong buy
+SCORE_BUCKETS = (-10, -5, -1, 1, 5, 10)
+BUCKET_LABELS = ('[-10,-5)', '[-5,-1)', '[-1,1)', '[1,5)', '[5,10]')
+
+# Dates scoring fewer tickers than this are left out of the IC
+MIN_IC_TICKERS = 5
+
+# Rule parameter grid searched by default
+GRID_RSI_LOWS = (30, 35, 40, 45)
+GRID_RSI_HIGHS = (55, 60, 65, 70)
+GRID_SMA_BANDS = (0.0, 0.02, 0.05, 0.10)
+
+
+def load_model_scores(client, analyses_table_name, since):
+    """
+    Opportunity scores from every stored analysis since a date.
+
+    Pointer, error and risk partitions (`{portfolio}#...`) are skipped.
+
+    Args:
+        client: Low-level boto3 DynamoDB client
+        analyses_table_name (str): Analyses table
+        since (str): Earliest analysis timestamp (ISO) to load
+
+    Returns:
+        list: (ticker, market date, score) tuples
+    """
+    items = scan_items(
+        client,
+        TableName=analyses_table_name,
+        ProjectionExpression=Analysis.PROJECTION,
+        FilterExpression='attribute_exists(parsed_data) AND #ts >= :since',
+        ExpressionAttributeNames=Analysis.NAMES,
+        ExpressionAttributeValues={':since': {'S': since}}
+    )
+    scores = []
+    for item in items:
+        analysis = Analysis.from_item(item)
+        if not analysis.is_analysis:
+            continue
+        for entry in json.loads(analysis.parsed_data):
+            as_of = entry.get('asOf') or analysis.data_as_of or analysis.timestamp
+            scores.append((entry['ticker'], str(as_of)[:10], float(entry['score'])))
+    return scores
+
+
+def score_matrix(scores, tickers, dates):
+    """
+    Mean score of each ticker on each price date.
+
+    A score is placed on the last price date on or before its market date;
+    scores of the same ticker and date (from several portfolios) are averaged.
+
+    Returns:
+        ndarray: Shape (dates, tickers), NaN where a ticker was not scored
+    """
+    column = {ticker: i for i, ticker in enumerate(tickers)}
+    kept = [(t, d, s) for t, d, s in scores if t in column and d >= dates[0]]
+    sums = np.zeros((len(dates), len(tickers)))
+    counts = np.zeros((len(dates), len(tickers)))
+    if kept:
+        rows = np.searchsorted(np.array(dates), np.array([d for _, d, _ in kept]), side='right') - 1
+        cols = np.array([column[t] for t, _, _ in kept])
+        np.add.at(sums, (rows, cols), [s for _, _, s in kept])
+        np.add.at(counts, (rows, cols), 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def forward_returns(prices, horizons=HORIZONS):
+    """
+    Return from each date to `horizon` rows later, for every horizon.
+
+    Returns:
+        ndarray: Shape (horizons, dates, tickers), NaN past the end of history
+    """
+    result = np.full((len(horizons),) + prices.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, horizon in enumerate(horizons):
+            if horizon < len(prices):
+                result[i, :-horizon] = prices[horizon:] / prices[:-horizon] - 1.0
+    return result
+
+
+def _average_ranks(values, valid):
+    """
+    Ranks along the last axis, ties sharing their average rank.
+
+    Invalid entries are ranked after all valid ones and must be masked out.
+    """
+    size = values.shape[-1]
+    keyed = np.where(valid, values, np.inf)
+    order = np.argsort(keyed, axis=-1, kind='stable')
+    ordered = np.take_along_axis(keyed, order, axis=-1)
+    index = np.broadcast_to(np.arange(size), ordered.shape)
+
+    starts = np.ones(ordered.shape, dtype=bool)
+    starts[..., 1:] = ordered[..., 1:] != ordered[..., :-1]
+    ends = np.ones(ordered.shape, dtype=bool)
+    ends[..., :-1] = starts[..., 1:]
+    first = np.maximum.accumulate(np.where(starts, index, 0), axis=-1)
+    last = np.minimum.accumulate(np.where(ends, index, size - 1)[..., ::-1], axis=-1)[..., ::-1]
+
+    ranks = np.empty(ordered.shape)
+    np.put_along_axis(ranks, order, (first + last) / 2.0, axis=-1)
+    return ranks
+
+
+def evaluate(scores, returns):
+    """
+    Hit rate, information coefficient and bucket returns of one horizon.
+
+    Args:
+        scores (ndarray): Shape (..., dates, tickers); leading axes (e.g.
+                          parameter sets) are evaluated independently
+        returns (ndarray): Forward returns of shape (dates, tickers)
+
+    Returns:
+        dict: Arrays of shape scores.shape[:-2] (bucket arrays add a last
+              axis of len(BUCKET_LABELS))
+    """
+    valid = ~np.isnan(scores) & ~np.isnan(returns)
+    signed = valid & (scores != 0) & (returns != 0)
+    hits = signed & (np.sign(scores) == np.sign(returns))
+    signed_count = signed.sum(axis=(-2, -1))
+
+    # Cross-sectional Spearman IC per date
+    score_ranks = _average_ranks(scores, valid)
+    return_ranks = _average_ranks(np.broadcast_to(returns, scores.shape), valid)
+    n = valid.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score_dev = np.where(valid, score_ranks - (score_ranks * valid).sum(axis=-1, keepdims=True) / n[..., None], 0)
+        return_dev = np.where(valid, return_ranks - (return_ranks * valid).sum(axis=-1, keepdims=True) / n[..., None], 0)
+        ic = (score_dev * return_dev).sum(axis=-1) / np.sqrt((score_dev ** 2).sum(axis=-1) * (return_dev ** 2).sum(axis=-1))
+    ic_dates = (n >= MIN_IC_TICKERS) & np.isfinite(ic)
+
+    buckets = np.digitize(scores, SCORE_BUCKETS[1:-1])
+    bucket_means = []
+    bucket_counts = []
+    for bucket in range(len(BUCKET_LABELS)):
+        members = valid & (buckets == bucket)
+        count = members.sum(axis=(-2, -1))
+        total = np.where(members, returns, 0.0).sum(axis=(-2, -1))
+        bucket_counts.append(count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bucket_means.append(np.where(count > 0, total / count, np.nan))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'observations': valid.sum(axis=(-2, -1)),
+            'hit_rate': np.where(signed_count > 0, hits.sum(axis=(-2, -1)) / signed_count, np.nan),
+            'ic': np.where(ic_dates, ic, 0.0).sum(axis=-1) / ic_dates.sum(axis=-1),
+            'ic_dates': ic_dates.sum(axis=-1),
+            'bucket_returns': np.stack(bucket_means, axis=-1),
+            'bucket_counts': np.stack(bucket_counts, axis=-1)
+        }
+
+
+def _scalar_report(result):
+    """
+    JSON-friendly form of an evaluate() result without leading axes.
+    """
+    def number(value):
+        value = float(value)
+        return round(value, 6) if np.isfinite(value) else None
+    return {
+        'observations': int(result['observations']),
+        'hit_rate': number(result['hit_rate']),
+        'ic': number(result['ic']),
+        'ic_dates': int(result['ic_dates']),
+        'buckets': {
+            label: {'mean_return': number(mean), 'count': int(count)}
+            for label, mean, count in zip(BUCKET_LABELS, result['bucket_returns'], result['bucket_counts'])
+        }
+    }
+
+
+def backtest_model_scores(scores, prices, tickers, dates, horizons=HORIZONS):
+    """
+    Backtest the model's opportunity scores.
+
+    Returns:
+        dict: {horizon: report}
+    """
+    score_grid = score_matrix(scores, tickers, dates)
+    forward = forward_returns(prices, horizons)
+    return {horizon: _scalar_report(evaluate(score_grid, forward[i])) for i, horizon in enumerate(horizons)}
+
+
+def backtest_rule_grid(records, prices, tickers, dates, grid, horizons=HORIZONS):
+    """
+    Backtest rule-based scores for every parameter set in one batch.
+
+    Args:
+        records (dict): Ticker records with price, rsi and ma50 (load_records)
+        prices (ndarray): Forward-filled prices of shape (dates, tickers)
+        tickers, dates (list): Axes of prices
+        grid (dict): Parameter arrays from parameter_grid
+        horizons (tuple): Forward return horizons
+
+    Returns:
+        list: One dict per parameter set with its parameters and {horizon: report},
+              best information coefficient at the first horizon first
+    """
+    rsi = field_matrix(records, tickers, dates, 'rsi')
+    ma50 = field_matrix(records, tickers, dates, 'ma50')
+    scores = rule_scores(rsi, prices, ma50, grid['rsi_low'], grid['rsi_high'], grid['sma_band'])
+    forward = forward_returns(prices, horizons)
+    results = [evaluate(scores, forward[i]) for i in range(len(horizons))]
+
+    rows = []
+    for g in range(len(grid['rsi_low'])):
+        rows.append({
+            'rsi_low': float(grid['rsi_low'][g]),
+            'rsi_high': float(grid['rsi_high'][g]),
+            'sma_band': float(grid['sma_band'][g]),
+            'horizons': {
+                horizon: _scalar_report({key: value[g] for key, value in results[i].items()})
+                for i, horizon in enumerate(horizons)
+            }
+        })
+    first = horizons[0]
+    return sorted(rows, key=lambda row: -(row['horizons'][first]['ic'] if row['horizons'][first]['ic'] is not None else -np.inf))
+
+
+def run_backtest(client, analyses_table_name, ticker_data_table_name, lookback_days,
+                 horizons=HORIZONS, grid=None, export_path=None):
+    """
+    Load scores and history and backtest model and rule-based scores.
+
+    Args:
+        client: Low-level boto3 DynamoDB client (boto3.client('dynamodb'))
+        analyses_table_name (str): Analyses table
+        ticker_data_table_name (str): Ticker-data table
+        lookback_days (int): Calendar days of scores and history to use
+        horizons (tuple): Forward return horizons in trading days
+        grid (dict): Rule parameter grid (default: the GRID_* values)
+        export_path (str): Parquet store root; when given, scores and history
+                           are read from it instead of the tables
+
+    Returns:
+        dict: model (per-horizon report), default_rule (the band given to the
+              model) and rule_grid (ranked parameter sets)
+    """
+    since = history_start(lookback_days)
+    if export_path:
+        scores = read_model_scores(export_path, since)
+    else:
+        scores = load_model_scores(client, analyses_table_name, since)
+    tickers = sorted({ticker for ticker, _, _ in scores})
+    print(f"Loaded {len(scores)} scores for {len(tickers)} tickers")
+    if not tickers:
+        return {'model': {}, 'default_rule': {}, 'rule_grid': []}
+
+    if export_path:
+        records = read_ticker_records(export_path, tickers, since, ('price', 'rsi', 'ma50'))
+    else:
+        records = load_records(client, ticker_data_table_name, tickers, since, ('price', 'rsi', 'ma50'))
+    histories = {ticker: {date: r['price'] for date, r in by_date.items()} for ticker, by_date in records.items()}
+    dates, prices = price_matrix(histories, tickers)
+    if len(dates) < 2:
+        return {'model': {}, 'default_rule': {}, 'rule_grid': []}
+
+    default = parameter_grid([DEFAULT_RSI_BAND[0]], [DEFAULT_RSI_BAND[1]], [DEFAULT_SMA_BAND])
+    grid = grid or parameter_grid(GRID_RSI_LOWS, GRID_RSI_HIGHS, GRID_SMA_BANDS)
+    return {
+        'model': backtest_model_scores(scores, prices, tickers, dates, horizons),
+        'default_rule': backtest_rule_grid(records, prices, tickers, dates, default, horizons)[0],
+        'rule_grid': backtest_rule_grid(records, prices, tickers, dates, grid, horizons)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest opportunity scores against forward returns')
+    parser.add_argument('--lookback-days', type=int, default=365)
+    parser.add_argument('--horizons', default=','.join(str(h) for h in HORIZONS),
+                        help='Comma-separated forward return horizons in trading days')
+    parser.add_argument('--top', type=int, default=10, help='Rule parameter sets to print')
+    parser.add_argument('--export-path', help='Read from this Parquet store instead of the tables')
+    args = parser.parse_args()
+
+    horizons = tuple(int(h) for h in args.horizons.split(','))
+    report = run_backtest(
+        None if args.export_path else boto3.client('dynamodb'),
+        os.environ.get('ANALYSES_TABLE'), os.environ.get('TICKER_DATA_TABLE'),
+        args.lookback_days, horizons, export_path=args.export_path
+    )
+    report['rule_grid'] = report['rule_grid'][:args.top]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
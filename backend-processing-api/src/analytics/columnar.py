@@ -0,0 +1,229 @@
+"""
+Columnar Parquet store of ticker history and analysis scores.
+
+Heavy analytics (indicators, risk, backtests) used to page through
+DynamoDB queries into dicts of Decimal. exportHistory copies new ticker-data
+rows and parsed analysis scores into Parquet files instead, and the readers
+here load them as Arrow tables, memory-mapped when the store is local, so
+those computations can run without touching the hot tables.
+
+Layout under the store root (a local directory or an S3 URI such as
+s3://bucket/exports; S3-compatible services take
+?endpoint_override=host:port):
+
+    ticker-data/month=YYYY-MM/part-{run}-{i}.parquet
+        ticker, timestamp, asOf, date, price, high, low, volume, rsi, ma50
+    analysis-scores/month=YYYY-MM/part-{run}-{i}.parquet
+        portfolio, analyzedAt, ticker, date, score
+
+Rows are partitioned by the month of their market date and sorted by ticker
+and date within a file; each export run adds one file per month it touched.
+Rows may be exported more than once (e.g. after a retried run): the readers
+keep the latest timestamp of each ticker and date, as
+history.load_ticker_records does.
+
+pyarrow is imported on first use, so importing this module costs nothing
+for handlers that read from DynamoDB.
+"""
+
+import numpy as np
+import os
+
+TICKER_DATASET = 'ticker-data'
+SCORES_DATASET = 'analysis-scores'
+
+# ticker-data attributes exported as float64 columns
+TICKER_FIELDS = ('price', 'high', 'low', 'volume', 'rsi', 'ma50')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.fs
+        import pyarrow.parquet
+    except ImportError:  # Optional dependency
+        raise RuntimeError('The Parquet store requires the pyarrow package')
+    return pyarrow
+
+
+def resolve(root):
+    """
+    Filesystem and base path of a store root.
+
+    Returns:
+        tuple: (pyarrow FileSystem, path, is_local)
+    """
+    pa = _pyarrow()
+    filesystem, path = pa.fs.FileSystem.from_uri(root if '://' in root else f'file://{os.path.abspath(root)}')
+    return filesystem, path.rstrip('/'), isinstance(filesystem, pa.fs.LocalFileSystem)
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def ticker_rows_table(items):
+    """
+    Arrow table of decoded ticker-data items (see src/utils/ddb.py).
+
+    Items without a price or asOf are dropped.
+    """
+    pa = _pyarrow()
+    rows = sorted(
+        (item for item in items if item.get('price') is not None and item.get('asOf')),
+        key=lambda item: (item['ticker'], item['asOf'][:10], item['timestamp'])
+    )
+    columns = {
+        'ticker': [item['ticker'] for item in rows],
+        'timestamp': [item['timestamp'] for item in rows],
+        'asOf': [item['asOf'] for item in rows],
+        'date': [item['asOf'][:10] for item in rows],
+        'month': [item['asOf'][:7] for item in rows],
+    }
+    for field in TICKER_FIELDS:
+        columns[field] = pa.array([_float(item.get(field)) for item in rows], type=pa.float64())
+    return pa.table(columns)
+
+
+def score_rows_table(scores):
+    """
+    Arrow table of analysis scores.
+
+    Args:
+        scores (list): (portfolio, analysis timestamp, ticker, market date, score) tuples
+    """
+    pa = _pyarrow()
+    rows = sorted(scores, key=lambda row: (row[2], row[3], row[1]))
+    return pa.table({
+        'portfolio': [row[0] for row in rows],
+        'analyzedAt': [row[1] for row in rows],
+        'ticker': [row[2] for row in rows],
+        'date': [row[3] for row in rows],
+        'month': [row[3][:7] for row in rows],
+        'score': pa.array([float(row[4]) for row in rows], type=pa.float64()),
+    })
+
+
+def write_dataset(table, root, dataset, run_id):
+    """
+    Add a table's rows to a dataset as one file per month partition.
+
+    Args:
+        table: Arrow table with a month column
+        root (str): Store root
+        dataset (str): TICKER_DATASET or SCORES_DATASET
+        run_id (str): Unique name of the export run, part of every file name
+
+    Returns:
+        int: Rows written
+    """
+    if not table.num_rows:
+        return 0
+    pa = _pyarrow()
+    filesystem, path, _ = resolve(root)
+    pa.parquet.write_to_dataset(
+        table, f'{path}/{dataset}',
+        partition_cols=['month'],
+        filesystem=filesystem,
+        basename_template=f'part-{run_id}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore'
+    )
+    return table.num_rows
+
+
+def read_dataset(root, dataset, columns=None, filters=None):
+    """
+    Read a dataset, memory-mapping local files.
+
+    Returns:
+        Arrow table, or None if nothing has been exported yet
+    """
+    pa = _pyarrow()
+    filesystem, path, is_local = resolve(root)
+    if filesystem.get_file_info(f'{path}/{dataset}').type == pa.fs.FileType.NotFound:
+        return None
+    return pa.parquet.read_table(
+        f'{path}/{dataset}', columns=columns, filters=filters,
+        filesystem=filesystem, memory_map=is_local, partitioning='hive'
+    )
+
+
+def _latest_per_date(table, keys):
+    """
+    Rows of the latest timestamp of each key (e.g. ticker and date), sorted by key.
+    """
+    if not table.num_rows:
+        return table
+    table = table.sort_by([(key, 'ascending') for key in keys] + [('timestamp', 'ascending')])
+    last = np.ones(table.num_rows, dtype=bool)
+    same = np.ones(table.num_rows - 1, dtype=bool)
+    for key in keys:
+        values = table.column(key).to_numpy(zero_copy_only=False)
+        same &= values[1:] == values[:-1]
+    last[:-1] = ~same
+    return table.filter(last)
+
+
+def read_ticker_table(root, tickers, since, fields=('price',)):
+    """
+    Daily ticker rows since a timestamp as an Arrow table.
+
+    Args:
+        root (str): Store root
+        tickers (list): Tickers to load
+        since (str): ISO timestamp of the oldest record to load
+        fields (tuple): Value columns to load (from TICKER_FIELDS)
+
+    Returns:
+        Arrow table with ticker, date, timestamp and the fields, one row per
+        ticker and market date, or None if nothing has been exported yet
+    """
+    pa = _pyarrow()
+    table = read_dataset(
+        root, TICKER_DATASET,
+        columns=['ticker', 'date', 'timestamp'] + [f for f in fields if f not in ('ticker', 'date', 'timestamp')],
+        filters=[('month', '>=', since[:7]), ('ticker', 'in', list(tickers))]
+    )
+    if table is None:
+        return None
+    table = table.filter(pa.compute.greater_equal(table.column('timestamp'), since))
+    return _latest_per_date(table, ('ticker', 'date'))
+
+
+def read_ticker_records(root, tickers, since, fields=('price',)):
+    """
+    Daily ticker records from the store, shaped like history.load_records.
+
+    Returns:
+        dict: {ticker: {market date: {field: value}}}, empty for tickers with no rows
+    """
+    records = {ticker: {} for ticker in tickers}
+    table = read_ticker_table(root, tickers, since, fields)
+    if table is None:
+        return records
+    columns = {name: table.column(name).to_pylist() for name in ('ticker', 'date') + tuple(fields)}
+    for row in range(table.num_rows):
+        records[columns['ticker'][row]][columns['date'][row]] = {field: columns[field][row] for field in fields}
+    return records
+
+
+def read_model_scores(root, since):
+    """
+    Opportunity scores from the store, shaped like backtest.load_model_scores.
+
+    Returns:
+        list: (ticker, market date, score) tuples of analyses since the timestamp
+    """
+    table = read_dataset(
+        root, SCORES_DATASET,
+        columns=['ticker', 'date', 'score', 'analyzedAt'],
+        filters=[('analyzedAt', '>=', since)]
+    )
+    if table is None:
+        return []
+    return list(zip(
+        table.column('ticker').to_pylist(),
+        table.column('date').to_pylist(),
+        table.column('score').to_pylist()
+    ))
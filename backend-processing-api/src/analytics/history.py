@@ -0,0 +1,160 @@
+"""
+Daily price history from the ticker-data table, as aligned NumPy arrays.
+
+processTicker stores a ticker-data record whenever a ticker gets a newer
+close, so a ticker's records over time form its daily price history (asOf
+gives the market date). This module loads that history for many tickers at
+once and lines it up on a shared date axis, so each ticker's return vector
+is computed once and reused by every portfolio that holds it.
+"""
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from src.utils.ddb import decode_value, query_items
+
+# Concurrent history queries
+HISTORY_LOOKUP_WORKERS = 16
+
+
+def history_start(lookback_days, now=None):
+    """
+    Earliest record timestamp to load for a lookback window (calendar days).
+    """
+    return ((now or datetime.now()) - timedelta(days=lookback_days)).isoformat()
+
+
+def load_ticker_records(client, table_name, ticker, since, fields=('price',)):
+    """
+    Daily ticker-data records of one ticker since a timestamp.
+
+    Args:
+        client: Low-level boto3 DynamoDB client (boto3.client('dynamodb'));
+                numbers are decoded straight to float (see src/utils/ddb.py)
+        table_name (str): ticker-data table name
+        ticker (str): The ticker symbol
+        since (str): ISO timestamp of the oldest record to load
+        fields (tuple): Attributes to load (e.g. price, rsi, ma50)
+
+    Returns:
+        dict: {market date (YYYY-MM-DD): {field: value}} for records with a
+              price; the latest record of a date wins
+    """
+    items = query_items(
+        client,
+        TableName=table_name,
+        KeyConditionExpression='ticker = :ticker AND #ts >= :since',
+        ExpressionAttributeNames={'#ts': 'timestamp'},
+        ExpressionAttributeValues={':ticker': {'S': ticker}, ':since': {'S': since}},
+        ProjectionExpression=', '.join(('asOf', 'price') + tuple(f for f in fields if f != 'price'))
+    )
+    records = {}
+    for item in items:
+        as_of = item.get('asOf')
+        if item.get('price') is None or as_of is None or not as_of.get('S'):
+            continue
+        records[as_of['S'][:10]] = {
+            field: decode_value(item[field]) if field in item else None for field in fields
+        }
+    return records
+
+
+def load_ticker_history(client, table_name, ticker, since):
+    """
+    Daily closes of one ticker since a timestamp.
+
+    Returns:
+        dict: {market date (YYYY-MM-DD): price}
+    """
+    return {date: record['price'] for date, record in load_ticker_records(client, table_name, ticker, since).items()}
+
+
+def load_records(client, table_name, tickers, since, fields):
+    """
+    Daily records of many tickers, loaded concurrently.
+
+    Returns:
+        dict: {ticker: {market date: {field: value}}}
+    """
+    with ThreadPoolExecutor(max_workers=HISTORY_LOOKUP_WORKERS) as executor:
+        results = executor.map(lambda t: load_ticker_records(client, table_name, t, since, fields), tickers)
+        return dict(zip(tickers, results))
+
+
+def load_histories(client, table_name, tickers, since):
+    """
+    Daily closes of many tickers, loaded concurrently.
+
+    Returns:
+        dict: {ticker: {market date: price}}
+    """
+    records = load_records(client, table_name, tickers, since, ('price',))
+    return {ticker: {date: r['price'] for date, r in by_date.items()} for ticker, by_date in records.items()}
+
+
+def price_matrix(histories, tickers):
+    """
+    Align ticker histories on the union of their market dates.
+
+    A ticker without a close on a date (e.g. stocks on weekends, when crypto
+    trades) carries its previous close forward; dates before its first close
+    stay NaN.
+
+    Args:
+        histories (dict): {ticker: {market date: price}} from load_histories
+        tickers (list): Column order
+
+    Returns:
+        tuple: (sorted list of dates, float64 array of shape (dates, tickers))
+    """
+    dates = sorted({date for ticker in tickers for date in histories.get(ticker, {})})
+    date_index = {date: i for i, date in enumerate(dates)}
+    prices = np.full((len(dates), len(tickers)), np.nan)
+    for column, ticker in enumerate(tickers):
+        for date, price in histories.get(ticker, {}).items():
+            prices[date_index[date], column] = float(price)
+
+    # Forward fill: index of the last observed row at or before each row
+    observed = ~np.isnan(prices)
+    last_seen = np.where(observed, np.arange(len(dates))[:, None], 0)
+    np.maximum.accumulate(last_seen, axis=0, out=last_seen)
+    filled = prices[last_seen, np.arange(len(tickers))]
+    filled[np.cumsum(observed, axis=0) == 0] = np.nan
+    return dates, filled
+
+
+def returns_matrix(prices):
+    """
+    Simple daily returns of each column of a price matrix.
+
+    Args:
+        prices (ndarray): Array of shape (dates, tickers)
+
+    Returns:
+        ndarray: Array of shape (dates - 1, tickers); NaN before a ticker's first close
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return prices[1:] / prices[:-1] - 1.0
+
+
+def field_matrix(records, tickers, dates, field):
+    """
+    One field of the ticker records on a (dates, tickers) grid, without filling.
+
+    Args:
+        records (dict): {ticker: {market date: {field: value}}} from load_records
+        tickers (list): Column order
+        dates (list): Row order
+        field (str): Attribute to extract
+
+    Returns:
+        ndarray: float64 array, NaN where a ticker has no value for a date
+    """
+    date_index = {date: i for i, date in enumerate(dates)}
+    values = np.full((len(dates), len(tickers)), np.nan)
+    for column, ticker in enumerate(tickers):
+        for date, record in records.get(ticker, {}).items():
+            if date in date_index and record.get(field) is not None:
+                values[date_index[date], column] = float(record[field])
+    return values
@@ -0,0 +1,251 @@
+"""
+Technical indicators computed locally for the whole universe at once.
+
+Indicators used to be fetched from Polygon one ticker and one indicator at a
+time. Here every indicator is computed from the stored daily bars instead,
+for all tickers in one vectorized pass: inputs are (rows, tickers) arrays of
+close, high, low and volume (see inputs_from_records), and each output is an
+array of the same shape. Values need their full window of
+history; before that they are NaN.
+
+Indicators are pluggable: a function registered with @register_indicator
+declares the inputs it needs and returns a dict of named outputs, and
+compute_indicators runs every registered indicator whose inputs are present.
+
+Output names are the attribute names stored in the `indicators` map of
+ticker-data records (e.g. ema12, macdHist, atr14).
+"""
+
+import numpy as np
+
+# name -> (function, inputs)
+INDICATORS = {}
+
+# Calendar days of history that cover the longest window (sma200) and EMA warm-up
+INDICATOR_LOOKBACK_DAYS = 400
+
+# ticker-data attributes loaded as indicator inputs
+RECORD_FIELDS = ('price', 'high', 'low', 'volume')
+
+
+def register_indicator(name, inputs=('close',)):
+    """
+    Register an indicator function.
+
+    The function is called with the named input arrays as keyword arguments
+    and returns {output name: (rows, tickers) array}.
+    """
+    def decorator(func):
+        INDICATORS[name] = (func, tuple(inputs))
+        return func
+    return decorator
+
+
+# --- Primitives ------------------------------------------------------------
+
+def rolling_mean(values, window):
+    """
+    Mean of the trailing `window` rows; NaN until a full window of values.
+    """
+    present = ~np.isnan(values)
+    sums = np.cumsum(np.where(present, values, 0.0), axis=0)
+    counts = np.cumsum(present, axis=0)
+    result = np.full(values.shape, np.nan)
+    if len(values) < window:
+        return result
+    window_sums = sums[window - 1:].copy()
+    window_counts = counts[window - 1:].copy()
+    window_sums[1:] -= sums[:-window]
+    window_counts[1:] -= counts[:-window]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return result
+
+
+def rolling_std(values, window):
+    """
+    Population standard deviation of the trailing `window` rows.
+    """
+    mean = rolling_mean(values, window)
+    mean_of_squares = rolling_mean(values * values, window)
+    return np.sqrt(np.maximum(mean_of_squares - mean * mean, 0.0))
+
+
+def exponential_mean(values, alpha):
+    """
+    Exponentially weighted mean down each column, seeded with its first value.
+
+    Missing values carry the previous mean forward.
+    """
+    result = np.full(values.shape, np.nan)
+    current = np.full(values.shape[1:], np.nan)
+    for row in range(len(values)):
+        value = values[row]
+        present = ~np.isnan(value)
+        seeded = present & np.isnan(current)
+        current = np.where(seeded, value, current)
+        update = present & ~seeded
+        current = np.where(update, alpha * value + (1.0 - alpha) * current, current)
+        result[row] = current
+    return result
+
+
+def ema(values, span):
+    return exponential_mean(values, 2.0 / (span + 1.0))
+
+
+def wilder(values, period):
+    """
+    Wilder's smoothing: seeded with the mean of the first `period` values,
+    then an exponential mean with alpha 1/period. NaN before the seed.
+
+    Missing values after the seed carry the previous mean forward.
+    """
+    seed = rolling_mean(values, period)
+    alpha = 1.0 / period
+    result = np.full(values.shape, np.nan)
+    current = np.full(values.shape[1:], np.nan)
+    for row in range(len(values)):
+        value = values[row]
+        update = ~np.isnan(current) & ~np.isnan(value)
+        current = np.where(update, alpha * value + (1.0 - alpha) * current, current)
+        current = np.where(np.isnan(current), seed[row], current)
+        result[row] = current
+    return result
+
+
+def shift(values, rows):
+    """
+    Values `rows` rows earlier (NaN at the top).
+    """
+    result = np.full(values.shape, np.nan)
+    result[rows:] = values[:-rows]
+    return result
+
+
+# --- Indicators ------------------------------------------------------------
+
+@register_indicator('sma')
+def simple_moving_averages(close):
+    return {'sma20': rolling_mean(close, 20), 'sma50': rolling_mean(close, 50), 'sma200': rolling_mean(close, 200)}
+
+
+@register_indicator('ema')
+def exponential_moving_averages(close):
+    return {'ema12': ema(close, 12), 'ema26': ema(close, 26)}
+
+
+@register_indicator('rsi')
+def relative_strength_index(close, period=14):
+    change = close - shift(close, 1)
+    gain = wilder(np.where(change > 0, change, np.where(np.isnan(change), np.nan, 0.0)), period)
+    loss = wilder(np.where(change < 0, -change, np.where(np.isnan(change), np.nan, 0.0)), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+    return {'rsi14': np.where(np.isnan(gain), np.nan, rsi)}
+
+
+@register_indicator('macd')
+def macd(close):
+    line = ema(close, 12) - ema(close, 26)
+    signal = ema(line, 9)
+    return {'macd': line, 'macdSignal': signal, 'macdHist': line - signal}
+
+
+@register_indicator('bollinger')
+def bollinger_bands(close, window=20, width=2.0):
+    middle = rolling_mean(close, window)
+    spread = width * rolling_std(close, window)
+    upper = middle + spread
+    lower = middle - spread
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent_b = np.where(spread > 0, (close - lower) / (upper - lower), np.nan)
+    return {'bollingerUpper': upper, 'bollingerLower': lower, 'bollingerPctB': percent_b}
+
+
+@register_indicator('atr', inputs=('high', 'low', 'close'))
+def average_true_range(high, low, close, period=14):
+    previous = shift(close, 1)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+    return {'atr14': wilder(true_range, period)}
+
+
+@register_indicator('roc')
+def rate_of_change(close):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {
+            'roc10': (close / shift(close, 10) - 1.0) * 100.0,
+            'roc20': (close / shift(close, 20) - 1.0) * 100.0
+        }
+
+
+# --- Engine ----------------------------------------------------------------
+
+def compute_indicators(inputs, names=None):
+    """
+    Run registered indicators over the whole universe.
+
+    Args:
+        inputs (dict): (rows, tickers) arrays keyed by close, high, low, volume
+        names (iterable): Indicators to run (default: all registered)
+
+    Returns:
+        dict: {output name: (rows, tickers) array}
+    """
+    outputs = {}
+    for name in names or sorted(INDICATORS):
+        func, needed = INDICATORS[name]
+        if any(inputs.get(field) is None for field in needed):
+            print(f"Skipping indicator {name}: missing input {[f for f in needed if inputs.get(f) is None]}")
+            continue
+        outputs.update(func(**{field: inputs[field] for field in needed}))
+    return outputs
+
+
+def inputs_from_records(records, tickers):
+    """
+    Indicator inputs from ticker-data records (history.load_records with RECORD_FIELDS).
+
+    Each ticker's own trading days are stacked bottom-aligned, so row -1 is
+    every ticker's latest record and windows count the ticker's own bars
+    (a stock's series is not stretched over the weekends a crypto pair
+    trades). Shorter histories are NaN-padded at the top.
+
+    Returns:
+        dict: (rows, tickers) arrays keyed by close, high, low and volume
+              (None for an input no record has)
+    """
+    rows = max((len(records.get(t, {})) for t in tickers), default=0)
+    inputs = {name: np.full((rows, len(tickers)), np.nan) for name in ('close', 'high', 'low', 'volume')}
+    fields = {'close': 'price', 'high': 'high', 'low': 'low', 'volume': 'volume'}
+    for column, ticker in enumerate(tickers):
+        by_date = records.get(ticker, {})
+        offset = rows - len(by_date)
+        for row, date in enumerate(sorted(by_date), offset):
+            for name, field in fields.items():
+                value = by_date[date].get(field)
+                if value is not None:
+                    inputs[name][row, column] = float(value)
+    for name in ('high', 'low', 'volume'):
+        if np.isnan(inputs[name]).all():
+            inputs[name] = None
+    return inputs
+
+
+def latest_values(outputs, tickers, precision=4):
+    """
+    Every output of each ticker at its latest record (the last row).
+
+    Args:
+        outputs (dict): From compute_indicators over inputs_from_records
+        tickers (list): Column order
+        precision (int): Decimal places kept
+
+    Returns:
+        dict: {ticker: {output name: float}}, NaN outputs left out
+    """
+    latest = {name: values[-1] for name, values in outputs.items() if len(values)}
+    return {
+        ticker: {name: round(float(row[i]), precision) for name, row in latest.items() if np.isfinite(row[i])}
+        for i, ticker in enumerate(tickers)
+    }
@@ -0,0 +1,168 @@
+"""
+Vectorized portfolio risk metrics.
+
+Every function works on a whole book at once: a returns matrix R of shape
+(days, tickers) shared by all portfolios, and a weight matrix W of shape
+(portfolios, tickers) holding each portfolio's market-value weights. Portfolio
+daily returns are then one matrix product, P = R @ W.T, of shape
+(days, portfolios), and each metric reduces P along the day axis for every
+portfolio in one call.
+
+Missing returns (a ticker with no history yet on a date) are masked, not
+counted as flat days: a portfolio's return on a date is weighted over the
+tickers it holds that have a return that date, a date on which none do is
+NaN in P and left out of that portfolio's metrics, and covariances use the
+dates both tickers have. Returns are simple daily returns; volatility is
+annualized with TRADING_DAYS, VaR and CVaR are one-day historical figures
+reported as positive loss fractions.
+"""
+
+import warnings
+
+import numpy as np
+
+TRADING_DAYS = 252
+
+# Historical VaR/CVaR confidence level
+VAR_CONFIDENCE = 0.95
+
+# Tickers with fewer daily returns than this are left out of the weights
+MIN_OBSERVATIONS = 20
+
+
+def weight_matrix(holdings, tickers):
+    """
+    Market-value weights of each portfolio over the shared ticker axis.
+
+    Args:
+        holdings (dict): {portfolio_id: {ticker: market value}}
+        tickers (list): Column order of the returns matrix
+
+    Returns:
+        tuple: (list of portfolio IDs, float64 array of shape (portfolios, tickers));
+               rows of portfolios without value are all zero
+    """
+    portfolio_ids = sorted(holdings)
+    column = {ticker: i for i, ticker in enumerate(tickers)}
+    weights = np.zeros((len(portfolio_ids), len(tickers)))
+    for row, portfolio_id in enumerate(portfolio_ids):
+        for ticker, value in holdings[portfolio_id].items():
+            if ticker in column:
+                weights[row, column[ticker]] += float(value)
+    totals = weights.sum(axis=1, keepdims=True)
+    np.divide(weights, totals, out=weights, where=totals > 0)
+    return portfolio_ids, weights
+
+
+def portfolio_returns(returns, weights):
+    """
+    Daily returns of every portfolio.
+
+    On each day the weights are renormalized over the tickers with a return.
+
+    Args:
+        returns (ndarray): Shape (days, tickers), NaN where missing
+        weights (ndarray): Shape (portfolios, tickers)
+
+    Returns:
+        ndarray: Shape (days, portfolios), NaN on days none of a portfolio's tickers has a return
+    """
+    observed = ~np.isnan(returns)
+    weighted = np.nan_to_num(returns) @ weights.T
+    covered = observed.astype(np.float64) @ weights.T
+    daily = np.full(weighted.shape, np.nan)
+    np.divide(weighted, covered, out=daily, where=covered > 0)
+    return daily
+
+
+def volatility(returns):
+    """
+    Annualized standard deviation of each column, ignoring NaN days.
+    """
+    with warnings.catch_warnings():
+        # Columns with fewer than two returns are NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanstd(returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+
+
+def covariance(returns):
+    """
+    Covariance and correlation matrices of the ticker returns.
+
+    Computed once for the whole book; a portfolio's matrices are the rows and
+    columns of its tickers. Each pair of tickers uses the days both have a
+    return (pairwise-complete), with sums over those days taken as matrix
+    products of the zero-filled returns and their observed mask.
+
+    Returns:
+        tuple: (covariance, correlation), each of shape (tickers, tickers);
+               NaN covariance and zero correlation for pairs sharing fewer than two days
+    """
+    observed = (~np.isnan(returns)).astype(np.float64)
+    values = np.nan_to_num(returns)
+    # [i, j]: days both have a return, and sums of i's returns and squares over them
+    pairs = observed.T @ observed
+    sums = values.T @ observed
+    squares = (values ** 2).T @ observed
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = (values.T @ values - sums * sums.T / pairs) / (pairs - 1)
+        cov[pairs < 2] = np.nan
+        pair_variance = (squares - sums ** 2 / pairs) / (pairs - 1)
+        corr = cov / np.sqrt(pair_variance * pair_variance.T)
+    return cov, np.clip(np.nan_to_num(corr), -1.0, 1.0)
+
+
+def historical_var_cvar(returns, confidence=VAR_CONFIDENCE):
+    """
+    One-day historical Value at Risk and Conditional VaR of each column,
+    ignoring NaN days.
+
+    Returns:
+        tuple: (var, cvar) arrays of positive loss fractions (NaN for empty columns)
+    """
+    with warnings.catch_warnings():
+        # All-NaN columns are NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        cutoff = np.nanquantile(returns, 1.0 - confidence, axis=0)
+    tail = returns <= cutoff
+    tail_mean = np.where(tail, returns, 0.0).sum(axis=0) / np.maximum(tail.sum(axis=0), 1)
+    return -cutoff, -tail_mean
+
+
+def beta(returns, benchmark):
+    """
+    Beta of each column against a benchmark return vector, over the days
+    both have a return.
+
+    Args:
+        returns (ndarray): Shape (days, portfolios)
+        benchmark (ndarray): Shape (days,)
+
+    Returns:
+        ndarray: Beta per column (NaN if the benchmark does not move on the shared days)
+    """
+    shared = ~np.isnan(returns) & ~np.isnan(benchmark)[:, None]
+    days = shared.sum(axis=0)
+    values = np.where(shared, returns, 0.0)
+    bench = np.where(shared, benchmark[:, None], 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centered = np.where(shared, values - values.sum(axis=0) / days, 0.0)
+        bench_centered = np.where(shared, bench - bench.sum(axis=0) / days, 0.0)
+        variance = (bench_centered ** 2).sum(axis=0)
+        result = (centered * bench_centered).sum(axis=0) / variance
+    result[variance == 0] = np.nan
+    return result
+
+
+def max_drawdown(returns):
+    """
+    Largest peak-to-trough fall of each column's compounded value.
+
+    The value holds still on NaN days.
+
+    Returns:
+        ndarray: Positive loss fractions (0 if the value never fell)
+    """
+    wealth = np.cumprod(1.0 + np.nan_to_num(returns), axis=0)
+    peaks = np.maximum.accumulate(np.vstack([np.ones(returns.shape[1]), wealth]), axis=0)[1:]
+    return -(wealth / peaks - 1.0).min(axis=0, initial=0.0)
@@ -0,0 +1,79 @@
+"""
+Rule-based opportunity scores from RSI and distance to the 50-day SMA.
+
+A deterministic counterpart to the model's -10..10 opportunity score, built
+from the same guidance analyze_portfolio gives the model: oversold RSI and a
+price below its SMA point to a buying opportunity, overbought RSI and a price
+above its SMA away from one, and RSI inside the neutral band with the price
+close to the SMA scores 0.
+
+Parameters are arrays, so a whole grid of rules is scored in one broadcast:
+with G parameter sets and inputs of shape (dates, tickers), rule_scores
+returns shape (G, dates, tickers).
+"""
+
+import numpy as np
+
+SCORE_MIN = -10
+SCORE_MAX = 10
+
+# Neutral RSI band given to the model
+DEFAULT_RSI_BAND = (45.0, 55.0)
+# Price within this fraction of the SMA counts as close to it
+DEFAULT_SMA_BAND = 0.02
+# Distance to the SMA (beyond the band) that earns the full SMA component
+SMA_FULL_SCALE = 0.20
+# Relative weight of the RSI component; the SMA component gets the rest
+RSI_WEIGHT = 0.5
+
+
+def parameter_grid(rsi_lows, rsi_highs, sma_bands):
+    """
+    Every combination of rule parameters, skipping bands with low >= high.
+
+    Returns:
+        dict: Arrays rsi_low, rsi_high and sma_band of equal length G
+    """
+    lows, highs, bands = np.meshgrid(
+        np.asarray(rsi_lows, dtype=float),
+        np.asarray(rsi_highs, dtype=float),
+        np.asarray(sma_bands, dtype=float),
+        indexing='ij'
+    )
+    valid = lows < highs
+    return {'rsi_low': lows[valid], 'rsi_high': highs[valid], 'sma_band': bands[valid]}
+
+
+def rule_scores(rsi, price, ma50, rsi_low, rsi_high, sma_band):
+    """
+    Opportunity scores for every parameter set, date and ticker.
+
+    Args:
+        rsi, price, ma50 (ndarray): Inputs of equal shape (e.g. dates x tickers),
+                                    NaN where unknown
+        rsi_low, rsi_high, sma_band (ndarray or float): Parameters of shape (G,)
+                                                        or scalars
+
+    Returns:
+        ndarray: Scores in [SCORE_MIN, SCORE_MAX] of shape (G,) + input shape
+                 (input shape for scalar parameters); NaN where an input is unknown
+    """
+    extra = (slice(None),) + (None,) * np.ndim(rsi)
+    low = np.asarray(rsi_low, dtype=float)
+    high = np.asarray(rsi_high, dtype=float)
+    band = np.asarray(sma_band, dtype=float)
+    if low.ndim:
+        low, high, band = low[extra], high[extra], band[extra]
+
+    # +1 at RSI 0 down to 0 at the band's low edge; -1 at RSI 100 down to 0 at its high edge
+    oversold = np.clip((low - rsi) / low, 0.0, 1.0)
+    overbought = np.clip((rsi - high) / (100.0 - high), 0.0, 1.0)
+    rsi_component = oversold - overbought
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance = price / ma50 - 1.0
+    beyond = np.sign(distance) * np.maximum(np.abs(distance) - band, 0.0)
+    sma_component = -np.clip(beyond / SMA_FULL_SCALE, -1.0, 1.0)
+
+    score = SCORE_MAX * (RSI_WEIGHT * rsi_component + (1.0 - RSI_WEIGHT) * sma_component)
+    return np.clip(score, SCORE_MIN, SCORE_MAX)
@@ -5,6 +5,14 @@ calling Xai API for analysis, and storing results.
 Takes a portfolio ID from SQS, retrieves portfolio and position data,
 calls Xai API, and stores the analysis result in DynamoDB.
 
+A reply that cannot be parsed is stored in the portfolio's error partition
+without its input fingerprint, so the latest good analysis keeps being served
+and the next run analyzes the portfolio again.
+
+An XAI call is only started when the invocation has time left for the full
+XAI timeout (see src/utils/work_loop.py); otherwise the portfolio is reported
+as a batch item failure and SQS redelivers it to a fresh invocation.
+
 Required environment variables:
 - PORTFOLIOS_TABLE (DynamoDB table name for portfolios)
 - POSITIONS_TABLE (DynamoDB table name for portfolio positions)
@@ -12,14 +20,30 @@ Required environment variables:
 - ANALYSES_TABLE (DynamoDB table name for storing analyses)
 - XAI_API_URL (Xai API endpoint URL)
 - XAI_API_KEY (Xai API key)
+- PIPELINE_STATE_TABLE (DynamoDB table holding the shared XAI circuit state)
+- ANALYSIS_QUEUE_URL (SQS queue URL, used to defer analyses while XAI is down)
+
+Optional environment variables:
+- XAI_TIMEOUT_SECONDS (XAI request timeout, default 240)
+- XAI_FAILURE_THRESHOLD (consecutive XAI failures that open the circuit, default 3)
+- XAI_RESET_TIMEOUT_SECONDS (seconds the circuit stays open before a probe, default 600)
+- ANALYSIS_BLOB_BUCKET / ANALYSIS_BLOB_DIR (where large prompt/analysis text is offloaded,
+  see src/utils/blob_store.py; without either they are only compressed inline)
 """
 
-import boto3
 import json
 import os
-import requests
 from datetime import datetime
 
+from src.utils.analysis_format import latest_pointer_key, parsed_fields, put_latest_pointer
+from src.utils.aws import Key, lazy_client, lazy_table
+from src.utils.blob_store import get_blob_store, offload_fields
+from src.utils.circuit_breaker import CircuitBreaker, CircuitOpenError, DynamoCircuitStore
+from src.utils.ddb import decode_item
+from src.utils.pipeline_runs import input_fingerprint, positions_fingerprint
+from src.utils.profiling import profiled
+from src.utils.work_loop import WorkLoop, batch_item_failures
+
 # Environment variables
 PORTFOLIOS_TABLE = os.environ.get('PORTFOLIOS_TABLE')
 POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
@@ -27,30 +51,41 @@ TICKER_DATA_TABLE = os.environ.get('TICKER_DATA_TABLE')
 ANALYSES_TABLE = os.environ.get('ANALYSES_TABLE')
 XAI_API_URL = os.environ.get('XAI_API_URL')
 XAI_API_KEY = os.environ.get('XAI_API_KEY')
+PIPELINE_STATE_TABLE = os.environ.get('PIPELINE_STATE_TABLE')
+ANALYSIS_QUEUE_URL = os.environ.get('ANALYSIS_QUEUE_URL')
+# Kept below the 300s Lambda timeout so failures are recorded before the function is killed
+XAI_TIMEOUT_SECONDS = int(os.environ.get('XAI_TIMEOUT_SECONDS', '240'))
+XAI_FAILURE_THRESHOLD = int(os.environ.get('XAI_FAILURE_THRESHOLD', '3'))
+XAI_RESET_TIMEOUT_SECONDS = int(os.environ.get('XAI_RESET_TIMEOUT_SECONDS', '600'))
+
+# SQS caps DelaySeconds at 15 minutes
+MAX_SQS_DELAY_SECONDS = 900
+
+# Large text attributes compressed or offloaded to blob storage
+BLOB_FIELDS = ('prompt', 'analysis')
 
 # Model configuration
 #MODEL = 'grok-4-fast-reasoning'
 MODEL = 'grok-4-latest'
 
-# DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-portfolios_table = dynamodb.Table(PORTFOLIOS_TABLE)
-positions_table = dynamodb.Table(POSITIONS_TABLE)
-ticker_table = dynamodb.Table(TICKER_DATA_TABLE)
-analyses_table = dynamodb.Table(ANALYSES_TABLE)
-
-def decimal_to_float(obj):
-    """
-    Convert Decimal objects to float for JSON serialization.
-    """
-    if isinstance(obj, dict):
-        return {k: decimal_to_float(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [decimal_to_float(item) for item in obj]
-    elif hasattr(obj, '__float__'):  # Decimal
-        return float(obj)
-    else:
-        return obj
+# AWS clients, built on first use (see src/utils/aws.py)
+portfolios_table = lazy_table(PORTFOLIOS_TABLE)
+positions_table = lazy_table(POSITIONS_TABLE)
+analyses_table = lazy_table(ANALYSES_TABLE)
+state_table = lazy_table(PIPELINE_STATE_TABLE)
+# Ticker data is read in wire format and decoded straight to floats for the prompt
+raw_client = lazy_client('dynamodb')
+sqs = lazy_client('sqs')
+blob_store = get_blob_store()
+
+# Circuit breaker shared by all analyzePortfolio workers
+xai_breaker = CircuitBreaker(
+    'xai',
+    DynamoCircuitStore(state_table),
+    failure_threshold=XAI_FAILURE_THRESHOLD,
+    reset_timeout=XAI_RESET_TIMEOUT_SECONDS,
+    probe_timeout=XAI_TIMEOUT_SECONDS + 60
+)
 
 def get_latest_ticker_data(ticker):
     """
@@ -60,15 +95,17 @@ def get_latest_ticker_data(ticker):
         ticker (str): The ticker symbol
 
     Returns:
-        dict or None: Latest ticker data
+        dict or None: Latest ticker data, with numbers as float
     """
-    response = ticker_table.query(
-        KeyConditionExpression=boto3.dynamodb.conditions.Key('ticker').eq(ticker),
+    response = raw_client.query(
+        TableName=TICKER_DATA_TABLE,
+        KeyConditionExpression='ticker = :ticker',
+        ExpressionAttributeValues={':ticker': {'S': ticker}},
         ScanIndexForward=False,  # Most recent first
         Limit=1
     )
     items = response['Items']
-    return items[0] if items else None
+    return decode_item(items[0]) if items else None
 
 def get_portfolio_positions(portfolio_id):
     """
@@ -82,10 +119,107 @@ def get_portfolio_positions(portfolio_id):
     """
     response = positions_table.query(
         IndexName='PortfolioIdIndex',
-        KeyConditionExpression=boto3.dynamodb.conditions.Key('portfolioId').eq(portfolio_id)
+        KeyConditionExpression=Key('portfolioId').eq(portfolio_id)
     )
     return response.get('Items', [])
 
+def error_partition(portfolio_id):
+    """
+    Partition key for failed analysis attempts.
+
+    Errors are kept out of the portfolio's own partition so that they never
+    displace its latest good analysis or satisfy the dataAsOf dedupe check.
+    """
+    return f"{portfolio_id}#errors"
+
+def requeue_portfolio(portfolio_id, delay_seconds):
+    """
+    Send a portfolio back to the analysis queue to be retried later.
+
+    Args:
+        portfolio_id (str): The portfolio ID
+        delay_seconds (int): Requested delay, capped at the SQS maximum
+    """
+    delay_seconds = max(0, min(int(delay_seconds), MAX_SQS_DELAY_SECONDS))
+    sqs.send_message(
+        QueueUrl=ANALYSIS_QUEUE_URL,
+        MessageBody=json.dumps({'portfolio_id': portfolio_id}),
+        DelaySeconds=delay_seconds
+    )
+    print(f"Requeued portfolio {portfolio_id} for analysis (delay: {delay_seconds}s)")
+
+def build_prompt(portfolio_id, portfolio_name, ticker_data, timestamp):
+    """
+    The analysis prompt for a portfolio's latest ticker data.
+
+    Args:
+        portfolio_id (str): The portfolio ID
+        portfolio_name (str): The portfolio name
+        ticker_data (dict): {ticker: latest ticker-data record with numbers as float}
+        timestamp (str): ISO timestamp of the request
+
+    Returns:
+        str: The prompt
+    """
+    portfolio_data = {
+        'portfolio_id': portfolio_id,
+        'portfolio_name': portfolio_name,
+        'tickers': ticker_data,
+        'timestamp': timestamp
+    }
+    portfolio_json = json.dumps(portfolio_data, indent=2)
+    return (
+        "Analyze this portfolio data and give each ticker an opportunity score. "
+        "The opportunity score should indicate whether it is a good time to buy the ticker. "
+        "The score should be on a scale from -10 to 10 with 10 being the best opportunity to buy. "
+        "No item in the list needs to have a +10 or -10 ranking.  Try to assess in such a way that "
+        "the ideal score (10/10) represents a very good buying opportunity. neutral rsi and price "
+        "close to sma implies score of 0. Neutral zone for rsi is 45-55. "
+        "Where a ticker has an 'indicators' object (sma20/50/200, ema12/26, rsi14, macd, macdSignal, "
+        "macdHist, bollinger bands and bollingerPctB, atr14, roc10/20), use it to refine the score. "
+        "Include a brief reason why the score was assigned. "
+        "Format the results as JSON , containing: "
+        "ticker, score, price, rsi, ma50, data asOf date, and reason. "
+        f"\n\nPortfolio Data:\n{portfolio_json}"
+    )
+
+def call_xai(prompt):
+    """
+    Send the prompt to the Xai API and return the model's reply.
+
+    Args:
+        prompt (str): The analysis prompt
+
+    Returns:
+        str: The model's message content
+    """
+    headers = {
+        'Authorization': f'Bearer {XAI_API_KEY}',
+        'Content-Type': 'application/json'
+    }
+    data = {
+        'model': MODEL,
+        'messages': [
+            {
+                'role': 'user',
+                'content': prompt
+            }
+        ],
+        'max_tokens': 20000
+    }
+    # Imported here: invocations that defer, dedupe or fail fast never call XAI
+    import requests
+    response = requests.post(
+        XAI_API_URL,
+        headers=headers,
+        data=json.dumps(data),
+        timeout=XAI_TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    result = response.json()
+    return result['choices'][0]['message']['content']
+
+@profiled
 def lambda_handler(event, context):
     """
     AWS Lambda handler function.
@@ -97,11 +231,14 @@ def lambda_handler(event, context):
         context: Lambda context
 
     Returns:
-        dict: Success message
+        dict: Success message, with the SQS records to redeliver
     """
+    loop = WorkLoop(context)
+
     # Handle SQS event
     if 'Records' in event:
-        for record in event['Records']:
+        unfinished = []
+        for record in loop.iterate(event['Records']):
             message_body = json.loads(record['body'])
             portfolio_id = message_body.get('portfolio_id')
 
@@ -109,23 +246,31 @@ def lambda_handler(event, context):
                 print(f"ERROR: No portfolio_id in message: {message_body}")
                 continue
 
-            process_portfolio_analysis(portfolio_id)
-    else:
-        # Direct invocation for testing
-        portfolio_id = event.get('portfolio_id')
-        if not portfolio_id:
-            return {'status': 'error', 'message': 'portfolio_id required'}
-        process_portfolio_analysis(portfolio_id)
+            result = process_portfolio_analysis(portfolio_id, loop)
+            if result.get('status') == 'out_of_time':
+                unfinished.append(record)
+        return {'status': 'success', **batch_item_failures(unfinished + loop.remainder)}
+
+    # Direct invocation for testing
+    portfolio_id = event.get('portfolio_id')
+    if not portfolio_id:
+        return {'status': 'error', 'message': 'portfolio_id required'}
+    process_portfolio_analysis(portfolio_id, loop)
 
     return {'status': 'success'}
 
-def process_portfolio_analysis(portfolio_id):
+def process_portfolio_analysis(portfolio_id, loop=None):
     """
     Process analysis for a single portfolio.
 
     Args:
         portfolio_id (str): The portfolio ID to analyze
+        loop (WorkLoop): Deadline tracker for the invocation
+
+    Returns:
+        dict: Result with a status; 'out_of_time' if the XAI call was not started
     """
+    loop = loop or WorkLoop(None)
     print(f"Starting analysis for portfolio ID: {portfolio_id}")
 
     # Get portfolio from table
@@ -162,102 +307,100 @@ def process_portfolio_analysis(portfolio_id):
         print(f"No ticker data for portfolio {portfolio_id}")
         return {'status': 'error', 'message': 'No ticker data available'}
 
-    # Get dataAsOf from one of the ticker data
-    data_as_of = list(ticker_data.values())[0].get('asOf')
+    # The analysis is as fresh as the newest ticker data it uses
+    ticker_as_of = {ticker: data.get('asOf', '') for ticker, data in ticker_data.items()}
+    data_as_of = max(ticker_as_of.values())
+    fingerprints = {
+        'positionsFingerprint': positions_fingerprint(tickers),
+        'inputFingerprint': input_fingerprint(ticker_as_of, MODEL)
+    }
 
-    # Check if analysis already exists for this portfolio, model, and dataAsOf
-    existing_analysis = analyses_table.query(
-        KeyConditionExpression=boto3.dynamodb.conditions.Key('portfolio').eq(portfolio_id),
-        FilterExpression=boto3.dynamodb.conditions.Attr('model').eq(MODEL) & boto3.dynamodb.conditions.Attr('dataAsOf').eq(data_as_of)
-    )
-    if existing_analysis['Items']:
-        print(f"Analysis already exists for {portfolio_id} with model {MODEL} and dataAsOf {data_as_of}, skipping")
+    # Skip if the latest analysis was computed from exactly these inputs
+    latest = analyses_table.get_item(
+        Key=latest_pointer_key(portfolio_id),
+        ProjectionExpression='inputFingerprint'
+    ).get('Item')
+    if latest and latest.get('inputFingerprint') == fingerprints['inputFingerprint']:
+        print(f"Analysis already exists for {portfolio_id} with model {MODEL} and unchanged inputs (dataAsOf {data_as_of}), skipping")
         return {'status': 'skipped', 'portfolioId': portfolio_id, 'reason': 'already_exists'}
 
-    # Convert Decimal to float
-    ticker_data = decimal_to_float(ticker_data)
+    # Don't start a call that the Lambda timeout could cut short
+    if not loop.has_time(XAI_TIMEOUT_SECONDS * 1000):
+        print(f"Not enough time left for an XAI call, leaving {portfolio_id} for redelivery")
+        return {'status': 'out_of_time', 'portfolioId': portfolio_id}
+
+    # Fail fast while XAI is known to be down instead of waiting out the timeout
+    try:
+        xai_breaker.before_call()
+    except CircuitOpenError as e:
+        print(f"XAI circuit open, deferring analysis for {portfolio_id}")
+        requeue_portfolio(portfolio_id, e.retry_after)
+        return {'status': 'deferred', 'portfolioId': portfolio_id, 'retryAfter': e.retry_after}
 
     # Create prompt
-    portfolio_data = {
-        'portfolio_id': portfolio_id,
-        'portfolio_name': portfolio_name,
-        'tickers': ticker_data,
-        'timestamp': datetime.utcnow().isoformat()
-    }
-    portfolio_json = json.dumps(portfolio_data, indent=2)
-    prompt = (
-        "Analyze this portfolio data and give each ticker an opportunity score. "
-        "The opportunity score should indicate whether it is a good time to buy the ticker. "
-        "The score should be on a scale from -10 to 10 with 10 being the best opportunity to buy. "
-        "No item in the list needs to have a +10 or -10 ranking.  Try to assess in such a way that "
-        "the ideal score (10/10) represents a very good buying opportunity. neutral rsi and price "
-        "close to sma implies score of 0. Neutral zone for rsi is 45-55."
-        "Include a brief reason why the score was assigned. "
-        "Format the results as JSON , containing: "
-        "ticker, score, price, rsi, ma50, data asOf date, and reason. "
-        f"\n\nPortfolio Data:\n{portfolio_json}"
-    )
+    prompt = build_prompt(portfolio_id, portfolio_name, ticker_data, datetime.utcnow().isoformat())
 
     # Call Xai API
     try:
-        headers = {
-            'Authorization': f'Bearer {XAI_API_KEY}',
-            'Content-Type': 'application/json'
-        }
-        data = {
+        analysis = call_xai(prompt)
+    except Exception as e:
+        print(f"ERROR processing analysis for {portfolio_id}: {e}")
+        circuit_state = xai_breaker.record_failure()
+
+        # Store error in DB, outside the portfolio's analysis partition
+        current_timestamp = datetime.utcnow().isoformat()
+        error_item = {
+            'portfolio': error_partition(portfolio_id),
+            'timestamp': current_timestamp,
+            'portfolioName': portfolio_name,
+            'analysis': f"Error: {str(e)}",
+            'prompt': prompt,
             'model': MODEL,
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            'max_tokens': 20000
+            'dataAsOf': data_as_of
         }
-        response = requests.post(
-            XAI_API_URL,
-            headers=headers,
-            data=json.dumps(data),
-            timeout=300  # 5 minutes timeout
-        )
-        response.raise_for_status()
-        result = response.json()
-        analysis = result['choices'][0]['message']['content']
-
-        # Parse JSON from analysis if present
-        parsed_data = analysis
-
-        # Store in DynamoDB
-        current_timestamp = datetime.utcnow().isoformat()
-        item = {
-            'portfolio': portfolio_id,
+        analyses_table.put_item(Item=offload_fields(error_item, BLOB_FIELDS, blob_store))
+
+        # Retry once XAI is expected back rather than dropping the portfolio
+        if xai_breaker.is_open(circuit_state):
+            requeue_portfolio(portfolio_id, xai_breaker.retry_after(circuit_state))
+        return {'status': 'error', 'portfolioId': portfolio_id, 'error': str(e)}
+
+    xai_breaker.record_success()
+
+    # Extract and validate the per-ticker JSON once, so readers never re-parse it
+    parsed = parsed_fields(analysis)
+    current_timestamp = datetime.utcnow().isoformat()
+    if 'parseError' in parsed:
+        print(f"WARNING: Could not parse analysis for {portfolio_id}: {parsed['parseError']}")
+        # Kept for inspection, but neither pointed to nor fingerprinted, so the
+        # latest good analysis stays in place and the next run tries again
+        error_item = {
+            'portfolio': error_partition(portfolio_id),
             'timestamp': current_timestamp,
             'portfolioName': portfolio_name,
             'analysis': analysis,
             'prompt': prompt,
             'model': MODEL,
-            'dataAsOf': data_as_of
+            'dataAsOf': data_as_of,
+            **parsed
         }
-        if parsed_data:
-            item['parsed_data'] = json.dumps(parsed_data)
-        analyses_table.put_item(Item=item)
-
-        print(f"Analysis completed and stored for {portfolio_name} (ID: {portfolio_id})")
-        return {'status': 'success', 'portfolioId': portfolio_id}
+        analyses_table.put_item(Item=offload_fields(error_item, BLOB_FIELDS, blob_store))
+        return {'status': 'error', 'portfolioId': portfolio_id, 'error': parsed['parseError']}
+
+    # Store in DynamoDB
+    item = {
+        'portfolio': portfolio_id,
+        'timestamp': current_timestamp,
+        'portfolioName': portfolio_name,
+        'analysis': analysis,
+        'prompt': prompt,
+        'model': MODEL,
+        'dataAsOf': data_as_of,
+        **fingerprints,
+        **parsed
+    }
+    analyses_table.put_item(Item=offload_fields(dict(item), BLOB_FIELDS, blob_store))
+    put_latest_pointer(analyses_table, item)
 
-    except Exception as e:
-        print(f"ERROR processing analysis for {portfolio_id}: {e}")
-        # Store error in DB
-        current_timestamp = datetime.utcnow().isoformat()
-        analyses_table.put_item(
-            Item={
-                'portfolio': portfolio_id,
-                'timestamp': current_timestamp,
-                'portfolioName': portfolio_name,
-                'analysis': f"Error: {str(e)}",
-                'prompt': prompt,
-                'model': MODEL,
-                'dataAsOf': data_as_of
-            }
-        )
-        return {'status': 'error', 'portfolioId': portfolio_id, 'error': str(e)}
\ No newline at end of file
+    print(f"Analysis completed and stored for {portfolio_name} (ID: {portfolio_id})")
+    return {'status': 'success', 'portfolioId': portfolio_id}
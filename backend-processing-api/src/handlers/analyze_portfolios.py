@@ -1,44 +1,146 @@
 """
-AWS Lambda function to collect all portfolio IDs and queue them for analysis.
-
-Scans the user-portfolios table and sends each active portfolio ID to SQS
-for processing by the analyze_portfolio lambda.
+AWS Lambda function to collect portfolio IDs and queue them for analysis.
+
+Scans the user-portfolios table and sends each active portfolio ID whose
+analysis inputs changed to SQS for processing by the analyze_portfolio lambda.
+A portfolio is queued when:
+- it holds a ticker that received new data in the ingestion run (the run's
+  dirty set, recorded by process_ticker), or
+- its position list changed since its last analysis (positions fingerprint
+  differs from the one on its latest-analysis pointer), or
+- it has never been analyzed.
+
+Normally process_ticker's completion barrier queues each portfolio as soon as
+its last ticker lands, and invokes this function with
+{"trigger": "run_complete"} once the whole run has landed, to queue the
+portfolios the barrier does not cover (e.g. changed position lists). The
+schedule is only a backstop for runs that never complete. Each portfolio is
+queued at most once per run.
+
+The tickers each portfolio holds come from the run's registrations (the
+members pages in the pipeline-state table, see src/utils/pipeline_runs.py),
+so no invocation scans the positions table. Only a run that was never
+dispatched, and so registered nothing, falls back to a positions scan.
+
+Pass {"force": true} to queue every active portfolio.
+
+Portfolios are processed in ID order. If the invocation nears its deadline
+(see src/utils/work_loop.py), it invokes itself again with
+{"start_at": <first unprocessed portfolio ID>} to finish the rest.
 
 Required environment variables:
 - PORTFOLIOS_TABLE (DynamoDB table name for portfolios)
+- POSITIONS_TABLE (DynamoDB table name for portfolio positions)
+- ANALYSES_TABLE (DynamoDB table name for analyses)
+- PIPELINE_STATE_TABLE (DynamoDB table holding the run's dirty set and claims)
 - ANALYSIS_QUEUE_URL (SQS queue URL for portfolio analysis)
 """
 
-import boto3
 import json
 import os
 
+from src.utils.analysis_format import LATEST_PARTITION_SUFFIX, latest_pointer_key
+from src.utils.aws import lazy_client, lazy_resource, lazy_table
+from src.utils.pipeline_runs import (
+    claim_analysis,
+    current_run_id,
+    get_dirty_tickers,
+    get_run_portfolio_tickers,
+    positions_fingerprint
+)
+from src.utils.profiling import profiled
+from src.utils.work_loop import WorkLoop, continue_via_invoke
+
 # Environment variables
 PORTFOLIOS_TABLE = os.environ.get('PORTFOLIOS_TABLE')
+POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
+ANALYSES_TABLE = os.environ.get('ANALYSES_TABLE')
+PIPELINE_STATE_TABLE = os.environ.get('PIPELINE_STATE_TABLE')
 ANALYSIS_QUEUE_URL = os.environ.get('ANALYSIS_QUEUE_URL')
 
-# AWS clients
-dynamodb = boto3.resource('dynamodb')
-sqs = boto3.client('sqs')
-portfolios_table = dynamodb.Table(PORTFOLIOS_TABLE)
+# batch_get_item accepts at most 100 keys
+BATCH_GET_SIZE = 100
+
+# AWS clients, built on first use (see src/utils/aws.py)
+dynamodb = lazy_resource('dynamodb')
+sqs = lazy_client('sqs')
+lambda_client = lazy_client('lambda')
+portfolios_table = lazy_table(PORTFOLIOS_TABLE)
+positions_table = lazy_table(POSITIONS_TABLE)
+state_table = lazy_table(PIPELINE_STATE_TABLE)
 
+def get_portfolio_tickers():
+    """
+    Map every portfolio to the tickers it holds, with one projected scan of
+    the positions table. Only used for runs without registrations.
+
+    Returns:
+        dict: {portfolio_id: set of tickers}
+    """
+    scan_kwargs = {'ProjectionExpression': 'portfolioId, ticker'}
+    response = positions_table.scan(**scan_kwargs)
+    items = response['Items']
+    while 'LastEvaluatedKey' in response:
+        response = positions_table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+        items.extend(response['Items'])
+
+    portfolio_tickers = {}
+    for item in items:
+        if 'portfolioId' in item and 'ticker' in item:
+            portfolio_tickers.setdefault(item['portfolioId'], set()).add(item['ticker'])
+    return portfolio_tickers
+
+def get_analyzed_fingerprints(portfolio_ids):
+    """
+    Positions fingerprints recorded on each portfolio's latest-analysis pointer.
+
+    Args:
+        portfolio_ids (list): Portfolio IDs
+
+    Returns:
+        dict: {portfolio_id: positionsFingerprint} for portfolios with an analysis
+    """
+    fingerprints = {}
+    for start in range(0, len(portfolio_ids), BATCH_GET_SIZE):
+        request = {
+            ANALYSES_TABLE: {
+                'Keys': [latest_pointer_key(pid) for pid in portfolio_ids[start:start + BATCH_GET_SIZE]],
+                'ProjectionExpression': '#p, positionsFingerprint',
+                'ExpressionAttributeNames': {'#p': 'portfolio'}
+            }
+        }
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response['Responses'].get(ANALYSES_TABLE, []):
+                portfolio_id = item['portfolio'][:-len(LATEST_PARTITION_SUFFIX)]
+                fingerprints[portfolio_id] = item.get('positionsFingerprint')
+            request = response.get('UnprocessedKeys')
+    return fingerprints
+
+@profiled
 def lambda_handler(event, context):
     """
     AWS Lambda handler function.
 
-    Scans all portfolios and queues them for analysis.
+    Scans all portfolios and queues those with changed inputs for analysis.
 
     Args:
-        event (dict): Lambda event (not used)
+        event (dict): Lambda event, optionally with run_id, force and start_at
         context: Lambda context
 
     Returns:
         dict: Status with count of portfolios queued
     """
-    print("Starting portfolio collection for analysis")
+    event = event or {}
+    run_id = event.get('run_id') or current_run_id()
+    force = bool(event.get('force'))
+    trigger = event.get('trigger', 'schedule')
+    print(f"Starting portfolio collection for analysis (run: {run_id}, trigger: {trigger}, force: {force})")
 
     portfolios_queued = 0
     portfolios_skipped = 0
+    portfolios_unchanged = 0
+    portfolios_already_queued = 0
 
     # Scan all portfolios
     response = portfolios_table.scan()
@@ -51,8 +153,26 @@ def lambda_handler(event, context):
 
     print(f"Found {len(portfolios)} total portfolios")
 
+    # A stable order lets a continuation resume where this invocation stopped
+    portfolios.sort(key=lambda p: p.get('id') or '')
+    start_at = event.get('start_at')
+    if start_at:
+        portfolios = [p for p in portfolios if (p.get('id') or '') >= start_at]
+        print(f"Continuing from portfolio {start_at}: {len(portfolios)} left")
+
+    if not force:
+        portfolio_tickers = get_run_portfolio_tickers(state_table, run_id)
+        if not portfolio_tickers:
+            print(f"Run {run_id} registered no portfolios, reading tickers from {POSITIONS_TABLE}")
+            portfolio_tickers = get_portfolio_tickers()
+        dirty_tickers = get_dirty_tickers(state_table, run_id)
+        print(f"{len(dirty_tickers)} ticker(s) received new data in run {run_id}")
+        active_ids = [p['id'] for p in portfolios if p.get('id') and p.get('isActive', True)]
+        analyzed_fingerprints = get_analyzed_fingerprints(active_ids)
+
     # Send each portfolio to SQS
-    for portfolio in portfolios:
+    loop = WorkLoop(context)
+    for portfolio in loop.iterate(portfolios):
         portfolio_id = portfolio.get('id')
         portfolio_name = portfolio.get('name', 'Unknown')
         is_active = portfolio.get('isActive', True)
@@ -68,9 +188,29 @@ def lambda_handler(event, context):
             portfolios_skipped += 1
             continue
 
+        if not force:
+            tickers = portfolio_tickers.get(portfolio_id, set())
+            if not tickers:
+                print(f"Skipping portfolio without positions: {portfolio_name} ({portfolio_id})")
+                portfolios_skipped += 1
+                continue
+            positions_changed = (
+                portfolio_id not in analyzed_fingerprints
+                or analyzed_fingerprints[portfolio_id] != positions_fingerprint(tickers)
+            )
+            if not positions_changed and not tickers & dirty_tickers:
+                print(f"Skipping unchanged portfolio: {portfolio_name} ({portfolio_id})")
+                portfolios_unchanged += 1
+                continue
+            if not claim_analysis(state_table, run_id, portfolio_id):
+                print(f"Portfolio already queued in run {run_id}: {portfolio_name} ({portfolio_id})")
+                portfolios_already_queued += 1
+                continue
+
         try:
             message = {
-                'portfolio_id': portfolio_id
+                'portfolio_id': portfolio_id,
+                'run_id': run_id
             }
 
             sqs.send_message(
@@ -85,11 +225,19 @@ def lambda_handler(event, context):
             print(f"ERROR queuing portfolio {portfolio_id}: {e}")
             portfolios_skipped += 1
 
-    print(f"Portfolio collection complete. Queued: {portfolios_queued}, Skipped: {portfolios_skipped}")
+    if loop.remainder:
+        continue_via_invoke(lambda_client, context.function_name, {**event, 'start_at': loop.remainder[0].get('id')})
+
+    print(f"Portfolio collection complete. Queued: {portfolios_queued}, Unchanged: {portfolios_unchanged}, "
+          f"Already queued: {portfolios_already_queued}, Skipped: {portfolios_skipped}")
 
     return {
         'status': 'success',
+        'run_id': run_id,
         'portfolios_queued': portfolios_queued,
+        'portfolios_unchanged': portfolios_unchanged,
+        'portfolios_already_queued': portfolios_already_queued,
+        'portfolios_remaining': len(loop.remainder),
         'portfolios_skipped': portfolios_skipped,
         'total_portfolios': len(portfolios)
     }
@@ -0,0 +1,318 @@
+"""
+AWS Lambda function to backfill daily price history into the ticker-data table.
+
+New tickers enter ticker-data with a single record, so nothing that needs
+history (risk, backtests) works for them. This job pulls up to BACKFILL_YEARS
+of daily bars per ticker from Polygon's range aggregates, following next_url
+pages, and stores one record per bar (price, high, low, volume and asOf, timestamp = asOf, so
+bars sort before the pipeline's own records and range queries by timestamp
+see them). Bars are only requested up to the day before a ticker's first
+record from the pipeline itself; a restart reuses the end of the ticker's
+original window, so it redoes that window rather than extending history
+back from the oldest backfilled bar.
+
+Progress is checkpointed per ticker after every page (see
+src/utils/backfill_checkpoints.py), so an interrupted backfill resumes where
+it stopped. Tickers are fetched concurrently by BACKFILL_WORKERS threads that
+share one rate limiter of POLYGON_REQUESTS_PER_MINUTE.
+
+Events:
+- {} (schedule): work through every open checkpoint. process_ticker opens
+  one when a ticker gets its first record, so new tickers are backfilled
+  automatically on the next run.
+- {"tickers": ["AAPL", ...]}: backfill these tickers
+- {"universe": true}: backfill every held ticker and the risk benchmark
+- "years" overrides BACKFILL_YEARS and "restart": true redoes finished tickers
+
+If the invocation nears its deadline (see src/utils/work_loop.py) it invokes
+itself again, and the continuation resumes from the checkpoints.
+
+Required environment variables:
+- POLYGON_API_KEY (Polygon.io API key)
+- TICKER_DATA_TABLE (DynamoDB table name for ticker data)
+- POSITIONS_TABLE (DynamoDB table name for portfolio positions)
+- PIPELINE_STATE_TABLE (DynamoDB table holding the checkpoints)
+
+Optional environment variables:
+- BACKFILL_YEARS (years of history per ticker, default 5)
+- BACKFILL_WORKERS (tickers fetched concurrently, default 4)
+- POLYGON_REQUESTS_PER_MINUTE (request budget, default 5)
+- RISK_BENCHMARK_TICKER (included in universe backfills, default ^SPX)
+"""
+
+import os
+import requests
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from src.utils.aws import Lazy, lazy_client, lazy_resource, lazy_table
+from src.utils.backfill_checkpoints import (
+    DONE,
+    IN_PROGRESS,
+    complete_backfill,
+    get_checkpoint,
+    get_open_checkpoints,
+    record_failure,
+    request_backfill,
+    save_progress
+)
+from src.utils.polygon import RateLimiter, aggs_url
+from src.utils.profiling import profiled
+from src.utils.work_loop import WorkLoop, continue_via_invoke
+
+# Environment variables
+API_KEY = os.environ.get('POLYGON_API_KEY')
+TICKER_DATA_TABLE = os.environ.get('TICKER_DATA_TABLE')
+POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
+PIPELINE_STATE_TABLE = os.environ.get('PIPELINE_STATE_TABLE')
+BACKFILL_YEARS = int(os.environ.get('BACKFILL_YEARS', '5'))
+BACKFILL_WORKERS = int(os.environ.get('BACKFILL_WORKERS', '4'))
+POLYGON_REQUESTS_PER_MINUTE = int(os.environ.get('POLYGON_REQUESTS_PER_MINUTE', '5'))
+RISK_BENCHMARK_TICKER = os.environ.get('RISK_BENCHMARK_TICKER', '^SPX')
+
+# Bars per aggregates page (Polygon's maximum)
+PAGE_LIMIT = 50000
+# batch_write_item accepts at most 25 puts
+WRITE_BATCH_SIZE = 25
+# Tries per batch while items come back unprocessed, and the delay before the
+# first retry (doubled each time)
+WRITE_ATTEMPTS = 5
+WRITE_RETRY_SECONDS = 0.5
+REQUEST_TIMEOUT_SECONDS = 30
+# Pause for everyone after a 429
+RATE_LIMIT_BACKOFF_SECONDS = 60
+# Tickers failing this many attempts in a row are left alone until restarted
+MAX_BACKFILL_FAILURES = 3
+
+# Time a page can take: waiting for its slot behind the other workers, then the request
+PAGE_BUDGET_MS = int((BACKFILL_WORKERS * 60 / POLYGON_REQUESTS_PER_MINUTE + REQUEST_TIMEOUT_SECONDS) * 1000)
+
+# AWS clients, built on first use (see src/utils/aws.py)
+dynamodb = lazy_resource('dynamodb')
+# The resource's client is thread-safe and converts attribute values like the Table API
+ddb_client = Lazy(lambda: dynamodb.meta.client)
+lambda_client = lazy_client('lambda')
+positions_table = lazy_table(POSITIONS_TABLE)
+state_table = lazy_table(PIPELINE_STATE_TABLE)
+
+limiter = RateLimiter(POLYGON_REQUESTS_PER_MINUTE)
+_local = threading.local()
+
+def worker_state_table():
+    """
+    pipeline-state Table for the current thread (resources are not thread-safe).
+    """
+    if not hasattr(_local, 'state_table'):
+        import boto3
+        _local.state_table = boto3.session.Session().resource('dynamodb').Table(PIPELINE_STATE_TABLE)
+    return _local.state_table
+
+def held_tickers():
+    """
+    Every ticker referenced by a position, with one projected scan.
+    """
+    scan_kwargs = {'ProjectionExpression': 'ticker'}
+    tickers = set()
+    response = positions_table.scan(**scan_kwargs)
+    while True:
+        tickers.update(item['ticker'] for item in response['Items'] if item.get('ticker'))
+        if 'LastEvaluatedKey' not in response:
+            return tickers
+        response = positions_table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+
+def first_pipeline_date(ticker):
+    """
+    asOf of the ticker's oldest record that was not written by a backfill.
+
+    Returns:
+        str or None: The asOf, or None if the pipeline never stored the ticker
+    """
+    query_kwargs = {
+        'TableName': TICKER_DATA_TABLE,
+        'KeyConditionExpression': 'ticker = :ticker',
+        'FilterExpression': 'attribute_not_exists(#source) OR #source <> :backfill',
+        'ExpressionAttributeNames': {'#source': 'source'},
+        'ExpressionAttributeValues': {':ticker': ticker, ':backfill': 'backfill'},
+        'ProjectionExpression': 'asOf',
+        'ScanIndexForward': True
+    }
+    response = ddb_client.query(**query_kwargs)
+    while True:
+        if response['Items']:
+            return response['Items'][0].get('asOf')
+        if 'LastEvaluatedKey' not in response:
+            return None
+        response = ddb_client.query(ExclusiveStartKey=response['LastEvaluatedKey'], **query_kwargs)
+
+def backfill_range(ticker, years, today=None):
+    """
+    Dates to backfill: `years` back from the day before the ticker's first record.
+
+    A ticker that already has a checkpoint keeps its window's end date, and
+    backfilled bars never count as the first record, so restarting a
+    finished backfill covers the same dates again.
+
+    Returns:
+        tuple: (from_date, to_date) as YYYY-MM-DD
+    """
+    checkpoint = get_checkpoint(state_table, ticker)
+    if checkpoint:
+        end = datetime.fromisoformat(checkpoint['toDate'])
+    else:
+        first = first_pipeline_date(ticker)
+        end = datetime.fromisoformat(first[:10]) - timedelta(days=1) if first else (today or datetime.now())
+    start = end - timedelta(days=365 * years)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+def bar_item(ticker, bar):
+    """
+    ticker-data record for one daily bar.
+    """
+    as_of = datetime.fromtimestamp(bar['t'] / 1000).isoformat()
+    item = {
+        'ticker': ticker,
+        'timestamp': as_of,
+        'price': Decimal(str(bar['c'])),
+        'asOf': as_of,
+        'source': 'backfill'
+    }
+    for field, key in (('high', 'h'), ('low', 'l'), ('volume', 'v')):
+        if bar.get(key) is not None:
+            item[field] = Decimal(str(bar[key]))
+    return item
+
+def write_bars(ticker, bars):
+    """
+    Store bars with batch_write_item, retrying unprocessed items with
+    exponential backoff.
+
+    Raises:
+        RuntimeError: If a batch still has unprocessed items after WRITE_ATTEMPTS tries
+    """
+    for start in range(0, len(bars), WRITE_BATCH_SIZE):
+        request = {TICKER_DATA_TABLE: [
+            {'PutRequest': {'Item': bar_item(ticker, bar)}} for bar in bars[start:start + WRITE_BATCH_SIZE]
+        ]}
+        for attempt in range(WRITE_ATTEMPTS):
+            if attempt:
+                time.sleep(WRITE_RETRY_SECONDS * 2 ** (attempt - 1))
+            request = ddb_client.batch_write_item(RequestItems=request).get('UnprocessedItems')
+            if not request:
+                break
+        else:
+            raise RuntimeError(f"{len(request[TICKER_DATA_TABLE])} bar(s) of {ticker} still unprocessed "
+                               f"after {WRITE_ATTEMPTS} attempts")
+
+def fetch_page(url, params):
+    """
+    Fetch one aggregates page within the rate budget.
+
+    Returns:
+        dict or None: Response data, or None if rate-limited (retry the same page)
+    """
+    limiter.acquire()
+    response = requests.get(url, params={**params, 'apiKey': API_KEY}, timeout=REQUEST_TIMEOUT_SECONDS)
+    if response.status_code == 429:
+        print(f"Rate limit exceeded fetching {url}, backing off {RATE_LIMIT_BACKOFF_SECONDS}s")
+        limiter.penalize(RATE_LIMIT_BACKOFF_SECONDS)
+        return None
+    response.raise_for_status()
+    return response.json()
+
+def backfill_ticker(checkpoint, loop):
+    """
+    Fetch and store a ticker's remaining pages until done or out of time.
+
+    Args:
+        checkpoint (dict): The ticker's checkpoint item
+        loop (WorkLoop): Deadline tracker for the invocation
+
+    Returns:
+        tuple: (DONE, IN_PROGRESS or 'failed', bars stored in this invocation)
+    """
+    ticker = checkpoint['ticker']
+    table = worker_state_table()
+    if checkpoint.get('nextUrl'):
+        url, params = checkpoint['nextUrl'], {}
+    else:
+        url = aggs_url(ticker, checkpoint['fromDate'], checkpoint['toDate'])
+        params = {'adjusted': 'true', 'sort': 'asc', 'limit': PAGE_LIMIT}
+
+    stored = 0
+    try:
+        while loop.has_time(PAGE_BUDGET_MS):
+            data = fetch_page(url, params)
+            if data is None:
+                continue
+            bars = [bar for bar in data.get('results') or [] if bar.get('c') is not None and bar.get('t')]
+            write_bars(ticker, bars)
+            stored += len(bars)
+            next_url = data.get('next_url')
+            if not next_url:
+                complete_backfill(table, ticker, len(bars))
+                print(f"✓ Backfilled {ticker}: {int(checkpoint.get('barsWritten', 0)) + stored} bars")
+                return DONE, stored
+            save_progress(table, ticker, next_url, len(bars))
+            url, params = next_url, {}
+    except Exception as e:
+        failures = record_failure(table, ticker, e)
+        print(f"✗ ERROR backfilling {ticker} (attempt {failures}): {e}")
+        return 'failed', stored
+    return IN_PROGRESS, stored
+
+@profiled
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function.
+
+    Opens checkpoints for requested tickers, then backfills every open one.
+
+    Args:
+        event (dict): Lambda event, optionally with tickers, universe, years and restart
+        context: Lambda context
+
+    Returns:
+        dict: Status with counts of tickers completed and bars stored
+    """
+    event = event or {}
+    years = int(event.get('years') or BACKFILL_YEARS)
+    restart = bool(event.get('restart'))
+
+    requested = set(event.get('tickers') or [])
+    if event.get('universe'):
+        requested |= held_tickers() | {RISK_BENCHMARK_TICKER}
+    opened = 0
+    for ticker in sorted(requested):
+        from_date, to_date = backfill_range(ticker, years)
+        if request_backfill(state_table, ticker, from_date, to_date, restart):
+            opened += 1
+    if requested:
+        print(f"Opened {opened} backfill checkpoint(s) for {len(requested)} requested ticker(s)")
+
+    checkpoints = [c for c in get_open_checkpoints(state_table) if int(c.get('failures', 0)) < MAX_BACKFILL_FAILURES]
+    print(f"Backfilling {len(checkpoints)} ticker(s) with {BACKFILL_WORKERS} worker(s) "
+          f"at {POLYGON_REQUESTS_PER_MINUTE} requests/minute")
+
+    loop = WorkLoop(context)
+    with ThreadPoolExecutor(max_workers=BACKFILL_WORKERS) as executor:
+        results = list(executor.map(lambda c: backfill_ticker(c, loop), checkpoints))
+
+    completed = sum(1 for status, _ in results if status == DONE)
+    unfinished = sum(1 for status, _ in results if status == IN_PROGRESS)
+    failed = sum(1 for status, _ in results if status == 'failed')
+    bars = sum(stored for _, stored in results)
+    if unfinished and context is not None:
+        continue_via_invoke(lambda_client, context.function_name, {})
+
+    print(f"Backfill invocation complete. Completed: {completed}, Unfinished: {unfinished}, "
+          f"Failed: {failed}, Bars stored: {bars}")
+    return {
+        'status': 'success',
+        'tickers_completed': completed,
+        'tickers_unfinished': unfinished,
+        'tickers_failed': failed,
+        'bars_stored': bars
+    }
@@ -0,0 +1,164 @@
+"""
+AWS Lambda function to compute technical indicators for every held ticker.
+
+Loads the daily bars (close, high, low, volume) of all tickers held in any
+portfolio, plus the risk benchmark, from the ticker-data table and runs every
+registered indicator over the whole universe in one vectorized pass (see
+src/analytics/indicators.py): SMA 20/50/200, EMA 12/26, RSI 14, MACD,
+Bollinger bands, ATR 14 and rate of change. No Polygon calls are made.
+
+Each ticker's latest values are written to its latest ticker-data record as
+an `indicators` map (with indicatorsAsOf), where analyzePortfolio's prompt
+and rule scoring read them. processTicker fills the same map for the records
+it creates; this job refreshes every ticker after backfills and covers
+tickers whose latest record predates the engine.
+
+If the invocation nears its deadline (see src/utils/work_loop.py) it invokes
+itself again with {"tickers": [<tickers not yet written>]}.
+
+Required environment variables:
+- POSITIONS_TABLE (DynamoDB table name for portfolio positions)
+- TICKER_DATA_TABLE (DynamoDB table name for ticker data)
+
+Optional environment variables:
+- RISK_BENCHMARK_TICKER (included in the universe, default ^SPX)
+- HISTORY_SOURCE (`dynamodb` (default) or `parquet` to read history from the
+  store exportHistory writes to HISTORY_EXPORT_PATH)
+"""
+
+import os
+from datetime import datetime
+from decimal import Decimal
+
+from src.analytics.columnar import read_ticker_records
+from src.analytics.history import history_start, load_records
+from src.analytics.indicators import (
+    INDICATOR_LOOKBACK_DAYS,
+    RECORD_FIELDS,
+    compute_indicators,
+    inputs_from_records,
+    latest_values
+)
+from src.utils.aws import lazy_client, lazy_table
+from src.utils.ddb import TickerSnapshot
+from src.utils.profiling import profiled
+from src.utils.work_loop import WorkLoop, continue_via_invoke
+
+# Environment variables
+POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
+TICKER_DATA_TABLE = os.environ.get('TICKER_DATA_TABLE')
+RISK_BENCHMARK_TICKER = os.environ.get('RISK_BENCHMARK_TICKER', '^SPX')
+HISTORY_SOURCE = os.environ.get('HISTORY_SOURCE', 'dynamodb')
+HISTORY_EXPORT_PATH = os.environ.get('HISTORY_EXPORT_PATH')
+
+# AWS clients, built on first use (see src/utils/aws.py)
+lambda_client = lazy_client('lambda')
+# Wire-format history and latest-record queries, decoded by src/utils/ddb.py
+raw_client = lazy_client('dynamodb')
+positions_table = lazy_table(POSITIONS_TABLE)
+ticker_data_table = lazy_table(TICKER_DATA_TABLE)
+
+def held_tickers():
+    """
+    Every ticker referenced by a position, with one projected scan.
+    """
+    scan_kwargs = {'ProjectionExpression': 'ticker'}
+    tickers = set()
+    response = positions_table.scan(**scan_kwargs)
+    while True:
+        tickers.update(item['ticker'] for item in response['Items'] if item.get('ticker'))
+        if 'LastEvaluatedKey' not in response:
+            return tickers
+        response = positions_table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+
+def store_indicators(ticker, market_date, values):
+    """
+    Write a ticker's indicators to its latest record.
+
+    The record is only updated if it is the bar the values were computed for,
+    so a record processTicker added in the meantime is left alone.
+
+    Args:
+        ticker (str): The ticker symbol
+        market_date (str): Date of the bar the values belong to (YYYY-MM-DD)
+        values (dict): {indicator output: float}
+
+    Returns:
+        bool: True if the record was updated
+    """
+    response = raw_client.query(
+        TableName=TICKER_DATA_TABLE,
+        KeyConditionExpression='ticker = :ticker',
+        ExpressionAttributeValues={':ticker': {'S': ticker}},
+        ProjectionExpression='ticker, #ts, asOf',
+        ExpressionAttributeNames={'#ts': 'timestamp'},
+        ScanIndexForward=False,
+        Limit=1
+    )
+    latest = TickerSnapshot.from_item(response['Items'][0]) if response['Items'] else None
+    if latest is None or (latest.as_of or '')[:10] != market_date:
+        print(f"Latest record of {ticker} is not the {market_date} bar, skipping")
+        return False
+    ticker_data_table.update_item(
+        Key={'ticker': ticker, 'timestamp': latest.timestamp},
+        UpdateExpression='SET indicators = :indicators, indicatorsAsOf = :date',
+        ExpressionAttributeValues={
+            ':indicators': {name: Decimal(str(value)) for name, value in values.items()},
+            ':date': market_date
+        }
+    )
+    return True
+
+@profiled
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function.
+
+    Computes indicators for the universe and stores each ticker's latest values.
+
+    Args:
+        event (dict): Lambda event, optionally with tickers (continuations or ad-hoc runs)
+        context: Lambda context
+
+    Returns:
+        dict: Status with counts of tickers updated
+    """
+    event = event or {}
+    started = datetime.now()
+    tickers = sorted(set(event.get('tickers') or (held_tickers() | {RISK_BENCHMARK_TICKER})))
+    print(f"Computing indicators for {len(tickers)} tickers")
+
+    since = history_start(INDICATOR_LOOKBACK_DAYS)
+    if HISTORY_SOURCE == 'parquet':
+        records = read_ticker_records(HISTORY_EXPORT_PATH, tickers, since, RECORD_FIELDS)
+    else:
+        records = load_records(raw_client, TICKER_DATA_TABLE, tickers, since, RECORD_FIELDS)
+    tickers = [t for t in tickers if records.get(t)]
+    outputs = compute_indicators(inputs_from_records(records, tickers))
+    values = latest_values(outputs, tickers)
+
+    updated = 0
+    failed = 0
+    loop = WorkLoop(context)
+    for ticker in loop.iterate(tickers):
+        if not values[ticker]:
+            continue
+        try:
+            if store_indicators(ticker, max(records[ticker]), values[ticker]):
+                updated += 1
+        except Exception as e:
+            print(f"✗ ERROR storing indicators for {ticker}: {e}")
+            failed += 1
+
+    if loop.remainder:
+        continue_via_invoke(lambda_client, context.function_name, {'tickers': loop.remainder})
+
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Indicator computation complete in {elapsed:.1f}s. Updated: {updated}, Failed: {failed}, "
+          f"Remaining: {len(loop.remainder)}")
+    return {
+        'status': 'success',
+        'tickers_updated': updated,
+        'tickers_failed': failed,
+        'tickers_remaining': len(loop.remainder)
+    }
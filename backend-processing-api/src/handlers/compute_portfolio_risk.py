@@ -0,0 +1,253 @@
+"""
+AWS Lambda function to compute risk metrics for every portfolio.
+
+Builds one daily returns matrix for all tickers held in any portfolio (plus
+the benchmark index) from the price history stored in the ticker-data table,
+then computes for all portfolios at once (see src/analytics/risk.py):
+- annualized volatility
+- one-day historical VaR and CVaR at VAR_CONFIDENCE
+- beta against RISK_BENCHMARK_TICKER
+- maximum drawdown over the lookback window
+- the correlation matrix of the portfolio's tickers
+
+Portfolios are weighted by the current marketValue of their positions.
+Tickers with fewer than MIN_OBSERVATIONS daily returns are left out and
+listed on the result.
+
+Results are stored next to the portfolio's analyses, in the analyses table
+under partition `{portfolioId}#risk` with the latest market date of the
+returns as sort key, so rerunning on the same day overwrites that day's row.
+
+If the invocation nears its deadline (see src/utils/work_loop.py) while
+storing results, it invokes itself again with {"start_at": <portfolio ID>}
+and recomputes before storing the rest.
+
+Required environment variables:
+- POSITIONS_TABLE (DynamoDB table name for portfolio positions)
+- TICKER_DATA_TABLE (DynamoDB table name for ticker data)
+- ANALYSES_TABLE (DynamoDB table name for analyses)
+
+Optional environment variables:
+- RISK_BENCHMARK_TICKER (index ticker for beta, default ^SPX)
+- RISK_LOOKBACK_DAYS (calendar days of history used, default 365)
+- HISTORY_SOURCE (`dynamodb` (default) or `parquet` to read history from the
+  store exportHistory writes to HISTORY_EXPORT_PATH)
+"""
+
+import json
+import numpy as np
+import os
+from datetime import datetime
+from decimal import Decimal
+
+from src.analytics.columnar import read_ticker_records
+from src.analytics.history import history_start, load_histories, price_matrix, returns_matrix
+from src.analytics.risk import (
+    MIN_OBSERVATIONS,
+    VAR_CONFIDENCE,
+    beta,
+    covariance,
+    historical_var_cvar,
+    max_drawdown,
+    portfolio_returns,
+    volatility,
+    weight_matrix
+)
+from src.utils.aws import lazy_client, lazy_table
+from src.utils.ddb import Position, scan_items
+from src.utils.profiling import profiled
+from src.utils.work_loop import WorkLoop, continue_via_invoke
+
+# Environment variables
+POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
+TICKER_DATA_TABLE = os.environ.get('TICKER_DATA_TABLE')
+ANALYSES_TABLE = os.environ.get('ANALYSES_TABLE')
+RISK_BENCHMARK_TICKER = os.environ.get('RISK_BENCHMARK_TICKER', '^SPX')
+RISK_LOOKBACK_DAYS = int(os.environ.get('RISK_LOOKBACK_DAYS', '365'))
+HISTORY_SOURCE = os.environ.get('HISTORY_SOURCE', 'dynamodb')
+HISTORY_EXPORT_PATH = os.environ.get('HISTORY_EXPORT_PATH')
+
+# Decimal places kept for stored metrics
+METRIC_PRECISION = 6
+
+# AWS clients, built on first use (see src/utils/aws.py)
+lambda_client = lazy_client('lambda')
+# Wire-format positions scans and history queries, decoded by src/utils/ddb.py
+raw_client = lazy_client('dynamodb')
+analyses_table = lazy_table(ANALYSES_TABLE)
+
+def risk_partition(portfolio_id):
+    """
+    Partition key for a portfolio's risk results in the analyses table.
+    """
+    return f"{portfolio_id}#risk"
+
+def load_holdings():
+    """
+    Market value held in each ticker by each portfolio, with one projected scan.
+
+    Returns:
+        dict: {portfolio_id: {ticker: market value}} for positions with a positive value
+    """
+    holdings = {}
+    items = scan_items(raw_client, TableName=POSITIONS_TABLE, ProjectionExpression='id, portfolioId, ticker, marketValue')
+    for item in items:
+        position = Position.from_item(item)
+        value = position.market_value
+        if not position.portfolio_id or not position.ticker or not value or value <= 0:
+            continue
+        tickers = holdings.setdefault(position.portfolio_id, {})
+        tickers[position.ticker] = tickers.get(position.ticker, 0) + value
+    return holdings
+
+def to_decimal(value):
+    """
+    DynamoDB number for a float metric, or None if it is not finite.
+    """
+    if value is None or not np.isfinite(value):
+        return None
+    return Decimal(str(round(float(value), METRIC_PRECISION)))
+
+def compute_book_risk(holdings, histories, tickers):
+    """
+    Risk metrics of every portfolio in one vectorized pass.
+
+    Args:
+        holdings (dict): {portfolio_id: {ticker: market value}}
+        histories (dict): {ticker: {market date: price}}
+        tickers (list): Held tickers; the benchmark is appended if missing
+
+    Returns:
+        tuple: (as-of market date or None, {portfolio_id: result dict})
+    """
+    columns = list(tickers)
+    if RISK_BENCHMARK_TICKER not in columns:
+        columns.append(RISK_BENCHMARK_TICKER)
+    dates, prices = price_matrix(histories, columns)
+    if len(dates) < 2:
+        return None, {}
+    returns = returns_matrix(prices)
+
+    # Tickers without enough history are left out of every portfolio
+    observations = np.sum(~np.isnan(returns), axis=0)
+    usable = observations >= MIN_OBSERVATIONS
+    excluded = {ticker for ticker, ok in zip(columns, usable) if not ok}
+    usable_holdings = {
+        pid: {t: v for t, v in positions.items() if t not in excluded}
+        for pid, positions in holdings.items()
+    }
+
+    # Shared across portfolios: one return vector per ticker, one covariance matrix
+    portfolio_ids, weights = weight_matrix(usable_holdings, columns)
+    _, correlation = covariance(returns)
+    daily = portfolio_returns(returns, weights)
+
+    vol = volatility(daily)
+    var, cvar = historical_var_cvar(daily)
+    drawdown = max_drawdown(daily)
+    benchmark_column = columns.index(RISK_BENCHMARK_TICKER)
+    if usable[benchmark_column]:
+        betas = beta(daily, returns[:, benchmark_column])
+    else:
+        print(f"Not enough history for benchmark {RISK_BENCHMARK_TICKER}, beta not computed")
+        betas = np.full(len(portfolio_ids), np.nan)
+
+    column_index = {ticker: i for i, ticker in enumerate(columns)}
+    results = {}
+    for row, portfolio_id in enumerate(portfolio_ids):
+        held = sorted(usable_holdings[portfolio_id])
+        if not held:
+            continue
+        index = [column_index[t] for t in held]
+        results[portfolio_id] = {
+            'volatility': vol[row],
+            'var': var[row],
+            'cvar': cvar[row],
+            'beta': betas[row],
+            'maxDrawdown': drawdown[row],
+            'tickers': held,
+            'weights': [round(float(w), METRIC_PRECISION) for w in weights[row, index]],
+            'correlation': np.round(correlation[np.ix_(index, index)], 4).tolist(),
+            'excludedTickers': sorted(set(holdings[portfolio_id]) & excluded),
+            'observations': int(np.sum(~np.isnan(daily[:, row])))
+        }
+    return dates[-1], results
+
+def risk_item(portfolio_id, as_of, result):
+    """
+    Analyses-table item for one portfolio's risk results.
+    """
+    item = {
+        'portfolio': risk_partition(portfolio_id),
+        'timestamp': as_of,
+        'computedAt': datetime.now().isoformat(),
+        'benchmark': RISK_BENCHMARK_TICKER,
+        'confidence': Decimal(str(VAR_CONFIDENCE)),
+        'observations': result['observations'],
+        'tickers': result['tickers'],
+        # Compact JSON, as for parsed_data: served as-is, never queried
+        'weights': json.dumps(result['weights'], separators=(',', ':')),
+        'correlation': json.dumps(result['correlation'], separators=(',', ':')),
+    }
+    for field in ('volatility', 'var', 'cvar', 'beta', 'maxDrawdown'):
+        value = to_decimal(result[field])
+        if value is not None:
+            item[field] = value
+    if result['excludedTickers']:
+        item['excludedTickers'] = result['excludedTickers']
+    return item
+
+@profiled
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function.
+
+    Computes and stores risk metrics for every portfolio.
+
+    Args:
+        event (dict): Lambda event, optionally with start_at for continuations
+        context: Lambda context
+
+    Returns:
+        dict: Status with counts of portfolios stored
+    """
+    event = event or {}
+    started = datetime.now()
+    holdings = load_holdings()
+    tickers = sorted({ticker for positions in holdings.values() for ticker in positions})
+    print(f"Computing risk for {len(holdings)} portfolios across {len(tickers)} tickers "
+          f"(benchmark {RISK_BENCHMARK_TICKER}, lookback {RISK_LOOKBACK_DAYS} days)")
+
+    universe = sorted(set(tickers) | {RISK_BENCHMARK_TICKER})
+    since = history_start(RISK_LOOKBACK_DAYS)
+    if HISTORY_SOURCE == 'parquet':
+        records = read_ticker_records(HISTORY_EXPORT_PATH, universe, since)
+        histories = {ticker: {date: r['price'] for date, r in by_date.items()} for ticker, by_date in records.items()}
+    else:
+        histories = load_histories(raw_client, TICKER_DATA_TABLE, universe, since)
+    as_of, results = compute_book_risk(holdings, histories, tickers)
+    if as_of is None:
+        print("Not enough price history to compute risk")
+        return {'status': 'success', 'portfolios_stored': 0}
+
+    portfolio_ids = sorted(pid for pid in results if not event.get('start_at') or pid >= event['start_at'])
+    stored = 0
+    loop = WorkLoop(context)
+    with analyses_table.batch_writer(overwrite_by_pkeys=['portfolio', 'timestamp']) as writer:
+        for portfolio_id in loop.iterate(portfolio_ids):
+            writer.put_item(Item=risk_item(portfolio_id, as_of, results[portfolio_id]))
+            stored += 1
+
+    if loop.remainder:
+        continue_via_invoke(lambda_client, context.function_name, {'start_at': loop.remainder[0]})
+
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Risk computation complete in {elapsed:.1f}s. Stored: {stored} (as of {as_of}), "
+          f"Remaining: {len(loop.remainder)}")
+    return {
+        'status': 'success',
+        'as_of': as_of,
+        'portfolios_stored': stored,
+        'portfolios_remaining': len(loop.remainder),
+        'portfolios_skipped': len(holdings) - len(results)
+    }
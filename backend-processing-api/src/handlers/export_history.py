@@ -0,0 +1,249 @@
+"""
+AWS Lambda function to export ticker history and analysis scores to Parquet.
+
+Copies ticker-data rows and the parsed opportunity scores of analyses that
+are new since the last run into the columnar store at HISTORY_EXPORT_PATH
+(see src/analytics/columnar.py), where computeIndicators,
+computePortfolioRisk and the backtests read them when HISTORY_SOURCE is
+`parquet`.
+
+Exports are incremental. Watermarks in the pipeline-state table, under
+partition `export`, record for each ticker the oldest and newest timestamp
+exported (sk ticker#{ticker}) and for analyses the newest analysis timestamp
+(sk analyses). A run exports a ticker's rows newer than its newest watermark
+and older than its oldest one, which picks up bars backfillHistory stored
+before the ticker's first record. Watermarks are saved only after the files
+are written, so an interrupted run exports those rows again and the readers
+drop the duplicates.
+
+If the invocation nears its deadline (see src/utils/work_loop.py) it writes
+what it has and invokes itself again with {"tickers": [<tickers not yet exported>]}.
+
+Events:
+- {} (schedule): analyses, then every held ticker, the risk benchmark and
+  every ticker exported before
+- {"tickers": [...]}: only these tickers
+
+Required environment variables:
+- TICKER_DATA_TABLE (DynamoDB table name for ticker data)
+- ANALYSES_TABLE (DynamoDB table name for analyses)
+- POSITIONS_TABLE (DynamoDB table name for portfolio positions)
+- PIPELINE_STATE_TABLE (DynamoDB table holding the watermarks)
+- HISTORY_EXPORT_PATH (store root: a directory or s3://bucket/prefix)
+
+Optional environment variables:
+- RISK_BENCHMARK_TICKER (always exported, default ^SPX)
+
+Requires the pyarrow package.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from src.analytics.columnar import (
+    SCORES_DATASET,
+    TICKER_DATASET,
+    TICKER_FIELDS,
+    score_rows_table,
+    ticker_rows_table,
+    write_dataset
+)
+from src.utils.aws import Key, lazy_client, lazy_table
+from src.utils.ddb import Analysis, decode_item, encode_item, query_items, scan_items
+from src.utils.profiling import profiled
+from src.utils.work_loop import WorkLoop, continue_via_invoke
+
+# Environment variables
+TICKER_DATA_TABLE = os.environ.get('TICKER_DATA_TABLE')
+ANALYSES_TABLE = os.environ.get('ANALYSES_TABLE')
+POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
+PIPELINE_STATE_TABLE = os.environ.get('PIPELINE_STATE_TABLE')
+HISTORY_EXPORT_PATH = os.environ.get('HISTORY_EXPORT_PATH')
+RISK_BENCHMARK_TICKER = os.environ.get('RISK_BENCHMARK_TICKER', '^SPX')
+
+EXPORT_PARTITION = 'export'
+TICKER_PREFIX = 'ticker#'
+ANALYSES_SK = 'analyses'
+# Concurrent ticker-data queries
+EXPORT_WORKERS = 8
+# Tickers queried per batch between deadline checks
+EXPORT_BATCH_SIZE = 50
+
+# AWS clients, built on first use (see src/utils/aws.py)
+# Wire-format items for ticker-data and analyses reads, decoded by src/utils/ddb.py
+raw_client = lazy_client('dynamodb')
+lambda_client = lazy_client('lambda')
+positions_table = lazy_table(POSITIONS_TABLE)
+state_table = lazy_table(PIPELINE_STATE_TABLE)
+
+def held_tickers():
+    """
+    Every ticker referenced by a position, with one projected scan.
+    """
+    scan_kwargs = {'ProjectionExpression': 'ticker'}
+    tickers = set()
+    response = positions_table.scan(**scan_kwargs)
+    while True:
+        tickers.update(item['ticker'] for item in response['Items'] if item.get('ticker'))
+        if 'LastEvaluatedKey' not in response:
+            return tickers
+        response = positions_table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+
+def get_watermarks():
+    """
+    Every export watermark, keyed by sort key (ticker#{ticker} or analyses).
+    """
+    query_kwargs = {'KeyConditionExpression': Key('pk').eq(EXPORT_PARTITION)}
+    response = state_table.query(**query_kwargs)
+    items = response['Items']
+    while 'LastEvaluatedKey' in response:
+        response = state_table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **query_kwargs)
+        items.extend(response['Items'])
+    return {item['sk']: item for item in items}
+
+def save_watermark(sk, **values):
+    """
+    Record the extent of what has been exported.
+    """
+    state_table.put_item(Item={
+        'pk': EXPORT_PARTITION,
+        'sk': sk,
+        **values,
+        'exportedAt': datetime.utcnow().isoformat()
+    })
+
+def query_rows(ticker, condition, values):
+    """
+    A ticker's ticker-data rows matching a timestamp condition.
+    """
+    query_kwargs = {
+        'TableName': TICKER_DATA_TABLE,
+        'KeyConditionExpression': f'ticker = :ticker{condition}',
+        'ExpressionAttributeNames': {'#ts': 'timestamp'},
+        'ExpressionAttributeValues': encode_item({':ticker': ticker, **values}),
+        'ProjectionExpression': ', '.join(('ticker', '#ts', 'asOf') + TICKER_FIELDS)
+    }
+    return [decode_item(item) for item in query_items(raw_client, **query_kwargs)]
+
+def new_ticker_rows(ticker, watermark):
+    """
+    A ticker's rows outside the range already exported.
+
+    Returns:
+        list: ticker-data items (all of them if the ticker was never exported)
+    """
+    if not watermark:
+        return query_rows(ticker, '', {})
+    return (
+        query_rows(ticker, ' AND #ts < :oldest', {':oldest': watermark['oldest']})
+        + query_rows(ticker, ' AND #ts > :newest', {':newest': watermark['newest']})
+    )
+
+def export_tickers(tickers, watermarks, run_id):
+    """
+    Export the new rows of a batch of tickers and advance their watermarks.
+
+    Returns:
+        int: Rows exported
+    """
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as executor:
+        rows = list(executor.map(
+            lambda t: new_ticker_rows(t, watermarks.get(f'{TICKER_PREFIX}{t}')), tickers
+        ))
+    exported = write_dataset(ticker_rows_table([item for items in rows for item in items]),
+                             HISTORY_EXPORT_PATH, TICKER_DATASET, run_id)
+    for ticker, items in zip(tickers, rows):
+        if not items:
+            continue
+        watermark = watermarks.get(f'{TICKER_PREFIX}{ticker}')
+        timestamps = [item['timestamp'] for item in items]
+        if watermark:
+            timestamps += [watermark['oldest'], watermark['newest']]
+        save_watermark(f'{TICKER_PREFIX}{ticker}', oldest=min(timestamps), newest=max(timestamps))
+    return exported
+
+def new_analysis_scores(since):
+    """
+    Scores of every analysis stored after a timestamp.
+
+    Pointer, error and risk partitions (`{portfolio}#...`) are skipped.
+
+    Returns:
+        tuple: ((portfolio, analysis timestamp, ticker, market date, score) list,
+               newest analysis timestamp or None)
+    """
+    items = scan_items(
+        raw_client,
+        TableName=ANALYSES_TABLE,
+        ProjectionExpression=Analysis.PROJECTION,
+        FilterExpression='attribute_exists(parsed_data) AND #ts > :since',
+        ExpressionAttributeNames=Analysis.NAMES,
+        ExpressionAttributeValues={':since': {'S': since}}
+    )
+    scores = []
+    newest = None
+    for item in items:
+        analysis = Analysis.from_item(item)
+        if not analysis.is_analysis:
+            continue
+        newest = max(newest or analysis.timestamp, analysis.timestamp)
+        for entry in json.loads(analysis.parsed_data):
+            as_of = entry.get('asOf') or analysis.data_as_of or analysis.timestamp
+            scores.append((analysis.portfolio, analysis.timestamp, entry['ticker'], str(as_of)[:10], entry['score']))
+    return scores, newest
+
+@profiled
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function.
+
+    Exports new analysis scores and ticker rows to the Parquet store.
+
+    Args:
+        event (dict): Lambda event, optionally with tickers (continuations or ad-hoc runs)
+        context: Lambda context
+
+    Returns:
+        dict: Status with counts of rows exported
+    """
+    event = event or {}
+    started = datetime.now()
+    run_id = started.strftime('%Y%m%dT%H%M%S%f')
+    watermarks = get_watermarks()
+
+    scores_exported = 0
+    if not event.get('tickers'):
+        since = watermarks.get(ANALYSES_SK, {}).get('newest', '')
+        scores, newest = new_analysis_scores(since)
+        scores_exported = write_dataset(score_rows_table(scores), HISTORY_EXPORT_PATH, SCORES_DATASET, run_id)
+        if newest:
+            save_watermark(ANALYSES_SK, newest=newest)
+        print(f"Exported {scores_exported} analysis scores")
+
+    tickers = sorted(set(event.get('tickers') or (
+        held_tickers() | {RISK_BENCHMARK_TICKER}
+        | {sk[len(TICKER_PREFIX):] for sk in watermarks if sk.startswith(TICKER_PREFIX)}
+    )))
+    batches = [tickers[i:i + EXPORT_BATCH_SIZE] for i in range(0, len(tickers), EXPORT_BATCH_SIZE)]
+    print(f"Exporting ticker-data for {len(tickers)} tickers to {HISTORY_EXPORT_PATH}")
+
+    rows_exported = 0
+    loop = WorkLoop(context)
+    for number, batch in enumerate(loop.iterate(batches)):
+        rows_exported += export_tickers(batch, watermarks, f'{run_id}-{number}')
+
+    remaining = [ticker for batch in loop.remainder for ticker in batch]
+    if remaining:
+        continue_via_invoke(lambda_client, context.function_name, {'tickers': remaining})
+
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Export complete in {elapsed:.1f}s. Ticker rows: {rows_exported}, "
+          f"Scores: {scores_exported}, Remaining tickers: {len(remaining)}")
+    return {
+        'status': 'success',
+        'ticker_rows_exported': rows_exported,
+        'scores_exported': scores_exported,
+        'tickers_remaining': len(remaining)
+    }
@@ -4,6 +4,32 @@ AWS Lambda function to process individual ticker messages from SQS queue.
 Triggered by SQS messages containing ticker symbols, fetches financial data
 from Polygon.io, and stores in DynamoDB.
 
+When a ticker is done it is reported to the run's completion barrier. Portfolios
+whose last outstanding ticker just landed are queued for analysis directly, and
+when the whole run has landed analyzePortfolios is invoked to sweep up the rest.
+
+Work stops before the Lambda deadline (see src/utils/work_loop.py): positions
+not yet repriced are sent back to the ticker queue as a continuation carrying
+the fetched price and the first position left, which re-reads the ticker's
+registered positions from there, and SQS records not yet started are reported as batch item
+failures so only they are redelivered.
+
+Each repriced position's change in value is added to its portfolio's
+aggregate in the portfolio-metrics table, and the portfolio's snapshot for
+the price's market date is refreshed (see src/utils/portfolio_metrics.py).
+
+New records carry the indicators of src/analytics/indicators.py, computed
+from the ticker's stored history plus the new bar. When that history is long
+enough for RSI(14) and SMA(50), those come from it too and the two Polygon
+indicator calls are skipped.
+
+Polygon responses are cached (see src/utils/http_cache.py) until the session
+after their latest bar closes, so reruns do not refetch them, and symbols
+with no data are retried with exponential backoff instead of every night.
+
+A ticker's first ever record opens a backfill checkpoint, so backfillHistory
+loads its earlier daily bars on its next run.
+
 Args:
     event: SQS event with messages
     context: Lambda context
@@ -15,36 +41,71 @@ Returns:
 import requests
 import json
 import os
-import boto3
+import time
 from datetime import datetime, timedelta
 from decimal import Decimal
 
+from src.analytics.history import history_start, load_records
+from src.analytics.indicators import (
+    INDICATOR_LOOKBACK_DAYS,
+    RECORD_FIELDS,
+    compute_indicators,
+    inputs_from_records,
+    latest_values
+)
+from src.utils.aws import Key, lazy_client, lazy_table
+from src.utils.backfill_checkpoints import request_backfill
+from src.utils.pipeline_runs import (
+    claim_analysis,
+    current_run_id,
+    get_registered_positions,
+    mark_ticker_dirty,
+    ticker_landed
+)
+from src.utils.http_cache import ResponseCache
+from src.utils.polygon import POLYGON_BASE_URL, aggs_url, bar_expiry, get_ticker_type
+from src.utils.portfolio_metrics import apply_position_delta, position_delta, record_snapshot
+from src.utils.profiling import profiled
+from src.utils.work_loop import WorkLoop, batch_item_failures
+
 # Retrieve environment variables
 API_KEY = os.environ.get('POLYGON_API_KEY')
 TICKER_DATA_TABLE = os.environ.get('TICKER_DATA_TABLE')
 POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
-
-# DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-ticker_data_table = dynamodb.Table(TICKER_DATA_TABLE)
-positions_table = dynamodb.Table(POSITIONS_TABLE)
-
-def get_ticker_type(ticker):
-    """
-    Determine the asset type and format the ticker for Polygon API.
-
-    Args:
-        ticker (str): The ticker symbol
-
-    Returns:
-        tuple: (asset_type, formatted_ticker)
-    """
-    if ticker.startswith('^'):
-        return 'index', f'I:{ticker[1:]}'
-    elif '-USD' in ticker:
-        return 'crypto', f'X:{ticker}'
-    else:
-        return 'stock', ticker
+PIPELINE_STATE_TABLE = os.environ.get('PIPELINE_STATE_TABLE')
+PORTFOLIO_METRICS_TABLE = os.environ.get('PORTFOLIO_METRICS_TABLE')
+SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
+ANALYSIS_QUEUE_URL = os.environ.get('ANALYSIS_QUEUE_URL')
+ANALYZE_PORTFOLIOS_FUNCTION = os.environ.get('ANALYZE_PORTFOLIOS_FUNCTION')
+BACKFILL_YEARS = int(os.environ.get('BACKFILL_YEARS', '5'))
+HTTP_CACHE_TABLE = os.environ.get('HTTP_CACHE_TABLE')
+
+# Outcomes of processing one ticker message
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NO_DATA = 'no_data'
+RATE_LIMITED = 'rate_limited'
+# Not landed yet: the remaining positions were handed to a continuation message
+CONTINUED = 'continued'
+
+# SQS caps DelaySeconds at 15 minutes
+MAX_SQS_DELAY_SECONDS = 900
+
+# ticker-data attributes stored from the Polygon daily bar
+BAR_FIELDS = {'high': 'h', 'low': 'l', 'volume': 'v'}
+
+# AWS clients, built on first use (see src/utils/aws.py)
+sqs = lazy_client('sqs')
+lambda_client = lazy_client('lambda')
+# Wire-format history queries, decoded by src/utils/ddb.py
+raw_client = lazy_client('dynamodb')
+ticker_data_table = lazy_table(TICKER_DATA_TABLE)
+positions_table = lazy_table(POSITIONS_TABLE)
+state_table = lazy_table(PIPELINE_STATE_TABLE)
+metrics_table = lazy_table(PORTFOLIO_METRICS_TABLE)
+
+# Polygon responses, per warm container and shared through HTTP_CACHE_TABLE when set
+polygon_cache = ResponseCache(lazy_table(HTTP_CACHE_TABLE) if HTTP_CACHE_TABLE else None)
 
 def fetch_price(ticker):
     """
@@ -54,7 +115,8 @@ def fetch_price(ticker):
         ticker (str): The ticker symbol
 
     Returns:
-        float or None: The closing price and timestamp, or None if no data
+        tuple or None: The closing price, timestamp and the whole daily bar
+                       (o/h/l/c/v), or None if no data
     """
     ttype, pticker = get_ticker_type(ticker)
     print(f"DEBUG fetch_price: ticker={ticker}, type={ttype}, pticker={pticker}")
@@ -64,23 +126,34 @@ def fetch_price(ticker):
     to_str = to_date.strftime('%Y-%m-%d')
     print(f"DEBUG fetch_price: date range {from_str} to {to_str}")
 
-    if ttype == 'crypto':
-        url = f'https://api.polygon.io/v3/aggs/ticker/{pticker}/range/1/day/{from_str}/{to_str}'
-    else:
-        url = f'https://api.polygon.io/v2/aggs/ticker/{pticker}/range/1/day/{from_str}/{to_str}'
+    url = aggs_url(ticker, from_str, to_str)
 
     params = {'apiKey': API_KEY, 'limit': 1, 'sort': 'desc'}
-    safe_params = {k: v if k != 'apiKey' else '***' for k, v in params.items()}
-    print(f"DEBUG fetch_price: Requesting URL: {url} with params: {safe_params}")
-    response = requests.get(url, params=params)
-    print(f"DEBUG fetch_price: Response status: {response.status_code}")
+    # The latest bar, whatever the date range: keyed without it
+    entry = polygon_cache.lookup('aggs', ticker, params)
+    if entry is not None and entry['empty']:
+        print(f"DEBUG fetch_price: {ticker} had no results recently (cached), not asking again yet")
+        return None
+    if entry is not None:
+        print(f"DEBUG fetch_price: Using cached response for {ticker}")
+        data = entry['data']
+    else:
+        safe_params = {k: v if k != 'apiKey' else '***' for k, v in params.items()}
+        print(f"DEBUG fetch_price: Requesting URL: {url} with params: {safe_params}")
+        response = requests.get(url, params=params)
+        print(f"DEBUG fetch_price: Response status: {response.status_code}")
 
-    if response.status_code == 429:
-        print(f"DEBUG fetch_price: Rate limit exceeded for {ticker}")
-        return {'error': 'rate_limit'}
+        if response.status_code == 429:
+            print(f"DEBUG fetch_price: Rate limit exceeded for {ticker}")
+            return {'error': 'rate_limit'}
 
-    data = response.json()
-    print(f"DEBUG fetch_price: Response data: {json.dumps(data)}")
+        data = response.json()
+        print(f"DEBUG fetch_price: Response data: {json.dumps(data)}")
+
+        if response.status_code in (200, 404) and not data.get('results'):
+            polygon_cache.store_empty('aggs', ticker, params)
+        elif response.status_code == 200:
+            polygon_cache.store('aggs', ticker, params, data, bar_expiry(data['results'][0]['t'], ttype))
 
     if 'results' not in data or not data['results']:
         print(f"DEBUG fetch_price: No results in data for {ticker}")
@@ -90,7 +163,7 @@ def fetch_price(ticker):
     price = result['c']
     timestamp_ms = result['t']
     print(f"DEBUG fetch_price: Extracted price: {price}, timestamp: {timestamp_ms}")
-    return price, timestamp_ms
+    return price, timestamp_ms, result
 
 def fetch_indicator(ticker, indicator, window):
     """
@@ -106,7 +179,7 @@ def fetch_indicator(ticker, indicator, window):
     """
     ttype, pticker = get_ticker_type(ticker)
     print(f"DEBUG fetch_indicator: ticker={ticker}, indicator={indicator}, window={window}, type={ttype}, pticker={pticker}")
-    url = f'https://api.polygon.io/v1/indicators/{indicator}/{pticker}'
+    url = f'{POLYGON_BASE_URL}/v1/indicators/{indicator}/{pticker}'
     params = {
         'apiKey': API_KEY,
         'timespan': 'day',
@@ -115,17 +188,32 @@ def fetch_indicator(ticker, indicator, window):
         'order': 'desc',
         'limit': 1
     }
-    safe_params = {k: v if k != 'apiKey' else '***' for k, v in params.items()}
-    print(f"DEBUG fetch_indicator: Requesting URL: {url} with params: {safe_params}")
-    response = requests.get(url, params=params)
-    print(f"DEBUG fetch_indicator: Response status: {response.status_code}")
+    endpoint = f'indicators/{indicator}'
+    entry = polygon_cache.lookup(endpoint, ticker, params)
+    if entry is not None and entry['empty']:
+        print(f"DEBUG fetch_indicator: {ticker} {indicator} had no values recently (cached)")
+        return None
+    if entry is not None:
+        print(f"DEBUG fetch_indicator: Using cached response for {ticker} {indicator}")
+        data = entry['data']
+    else:
+        safe_params = {k: v if k != 'apiKey' else '***' for k, v in params.items()}
+        print(f"DEBUG fetch_indicator: Requesting URL: {url} with params: {safe_params}")
+        response = requests.get(url, params=params)
+        print(f"DEBUG fetch_indicator: Response status: {response.status_code}")
+
+        if response.status_code == 429:
+            print(f"DEBUG fetch_indicator: Rate limit exceeded for {ticker} {indicator}")
+            return {'error': 'rate_limit'}
 
-    if response.status_code == 429:
-        print(f"DEBUG fetch_indicator: Rate limit exceeded for {ticker} {indicator}")
-        return {'error': 'rate_limit'}
+        data = response.json()
+        print(f"DEBUG fetch_indicator: Response data: {json.dumps(data)}")
 
-    data = response.json()
-    print(f"DEBUG fetch_indicator: Response data: {json.dumps(data)}")
+        values = (data.get('results') or {}).get('values')
+        if response.status_code in (200, 404) and not values:
+            polygon_cache.store_empty(endpoint, ticker, params)
+        elif response.status_code == 200:
+            polygon_cache.store(endpoint, ticker, params, data, bar_expiry(values[0]['timestamp'], ttype))
 
     if 'results' not in data or 'values' not in data['results'] or not data['results']['values']:
         print(f"DEBUG fetch_indicator: No values in data for {ticker} {indicator}")
@@ -146,7 +234,7 @@ def get_latest_record(ticker):
     """
     print(f"DEBUG get_latest_record: Getting latest for {ticker} from {TICKER_DATA_TABLE}")
     response = ticker_data_table.query(
-        KeyConditionExpression=boto3.dynamodb.conditions.Key('ticker').eq(ticker),
+        KeyConditionExpression=Key('ticker').eq(ticker),
         ScanIndexForward=False,
         Limit=1
     )
@@ -159,7 +247,48 @@ def get_latest_record(ticker):
         print(f"DEBUG get_latest_record: No records for {ticker}")
         return None
 
-def update_position_prices(ticker, current_price, as_of, position_ids):
+def local_indicators(ticker, as_of, bar):
+    """
+    Indicators for a new bar, computed from the ticker's stored history.
+
+    Args:
+        ticker (str): The ticker symbol
+        as_of (str): Timestamp of the new bar
+        bar (dict): Polygon daily bar (c/h/l/v)
+
+    Returns:
+        dict: {indicator output: Decimal} for outputs with enough history
+    """
+    since = history_start(INDICATOR_LOOKBACK_DAYS)
+    records = load_records(raw_client, TICKER_DATA_TABLE, [ticker], since, RECORD_FIELDS)
+    records[ticker][as_of[:10]] = {'price': bar['c'], **{field: bar.get(key) for field, key in BAR_FIELDS.items()}}
+    outputs = compute_indicators(inputs_from_records(records, [ticker]))
+    values = latest_values(outputs, [ticker])[ticker]
+    return {name: Decimal(str(value)) for name, value in values.items()}
+
+def position_values(position, current_price):
+    """
+    Market value and unrealized P&L of a position at a price.
+
+    Args:
+        position (dict): Position item (shares, averageCost, costBasis)
+        current_price (Decimal): Current market price
+
+    Returns:
+        tuple: Decimals (shares, average_cost, cost_basis, market_value, unrealized_pl)
+    """
+    shares = Decimal(str(position.get('shares', 0)))
+    average_cost = Decimal(str(position.get('averageCost', 0)))
+    cost_basis = Decimal(str(position.get('costBasis', 0)))
+
+    # Calculate market value
+    market_value = shares * current_price
+
+    # Calculate unrealized P&L
+    unrealized_pl = market_value - cost_basis
+    return shares, average_cost, cost_basis, market_value, unrealized_pl
+
+def update_position_prices(ticker, current_price, as_of, position_ids, loop=None):
     """
     Update positions with current price and calculate P&L and market value.
 
@@ -168,14 +297,21 @@ def update_position_prices(ticker, current_price, as_of, position_ids):
         current_price (Decimal): Current market price
         as_of (str): Timestamp of the price data
         position_ids (list): List of position IDs to update
+        loop (WorkLoop): Deadline tracker; without one all positions are updated
+
+    Returns:
+        list: Position IDs left for a continuation because the deadline approached
     """
+    loop = loop or WorkLoop(None)
     print(f"DEBUG update_position_prices: Updating {len(position_ids)} position(s) for {ticker}")
     print(f"DEBUG update_position_prices: Writing to table: {POSITIONS_TABLE}")
 
     updated_count = 0
     error_count = 0
+    # Latest aggregate of each portfolio touched, snapshotted once at the end
+    aggregates = {}
 
-    for position_id in position_ids:
+    for position_id in loop.iterate(position_ids):
         try:
             # Get current position data
             response = positions_table.get_item(Key={'id': position_id})
@@ -186,15 +322,7 @@ def update_position_prices(ticker, current_price, as_of, position_ids):
                 continue
 
             position = response['Item']
-            shares = Decimal(str(position.get('shares', 0)))
-            average_cost = Decimal(str(position.get('averageCost', 0)))
-            cost_basis = Decimal(str(position.get('costBasis', 0)))
-
-            # Calculate market value
-            market_value = shares * current_price
-
-            # Calculate unrealized P&L
-            unrealized_pl = market_value - cost_basis
+            shares, average_cost, cost_basis, market_value, unrealized_pl = position_values(position, current_price)
 
             # Update the position
             current_timestamp = datetime.now().isoformat()
@@ -205,7 +333,9 @@ def update_position_prices(ticker, current_price, as_of, position_ids):
             print(f"    Market Value: {market_value} (calculated)")
             print(f"    Unrealized P&L: {unrealized_pl} (calculated)")
 
-            positions_table.update_item(
+            # The values replaced by this write give an exact aggregate delta
+            # even if the position changed since it was read
+            old = positions_table.update_item(
                 Key={'id': position_id},
                 UpdateExpression='SET currentPrice = :price, updatedAt = :updated, marketValue = :mv, unrealizedPL = :pl',
                 ExpressionAttributeValues={
@@ -213,18 +343,245 @@ def update_position_prices(ticker, current_price, as_of, position_ids):
                     ':updated': current_timestamp,
                     ':mv': market_value,
                     ':pl': unrealized_pl
-                }
-            )
+                },
+                ReturnValues='ALL_OLD'
+            ).get('Attributes', {})
 
             updated_count += 1
             print(f"  ✓ Updated position {position_id} (UPDATE operation)")
 
+            portfolio_id = position.get('portfolioId')
+            if portfolio_id:
+                deltas = position_delta(old, market_value, unrealized_pl)
+                if any(deltas) or portfolio_id not in aggregates:
+                    aggregates[portfolio_id] = apply_position_delta(metrics_table, portfolio_id, *deltas)
+
         except Exception as e:
             error_count += 1
             print(f"  ✗ ERROR updating position {position_id}: {e}")
 
+    for portfolio_id, aggregate in aggregates.items():
+        try:
+            record_snapshot(metrics_table, portfolio_id, aggregate, as_of[:10])
+        except Exception as e:
+            print(f"  ✗ ERROR recording snapshot for portfolio {portfolio_id}: {e}")
+
     print(f"DEBUG update_position_prices: Updated {updated_count} positions, {error_count} errors")
+    return loop.remainder
+
+def continue_position_updates(ticker, run_id, price, as_of, outcome, remainder):
+    """
+    Hand positions not yet repriced to a continuation message.
+
+    The message carries the fetched price, so the continuation makes no
+    Polygon calls, the outcome, so it can report the ticker as landed, and
+    the first position left as a cursor into the ticker's sorted
+    registration, so its size does not grow with the number of positions.
+
+    Returns:
+        str: CONTINUED
+    """
+    message = {
+        'ticker': ticker,
+        'source': 'continuation',
+        'run_id': run_id,
+        'resume': {'price': str(price), 'as_of': as_of, 'outcome': outcome, 'start_at': remainder[0]}
+    }
+    sqs.send_message(QueueUrl=SQS_QUEUE_URL, MessageBody=json.dumps(message))
+    print(f"Continuing {len(remainder)} position update(s) for {ticker} from {remainder[0]} in a new message")
+    return CONTINUED
+
+def resume_position_updates(ticker, position_ids, run_id, resume, loop):
+    """
+    Finish repricing positions from a continuation message.
+
+    Args:
+        ticker (str): The ticker symbol
+        position_ids (list): Every position ID registered for the ticker, sorted
+        run_id (str): The ingestion run ID
+        resume (dict): The continuation's price, as_of, outcome and start_at cursor
+        loop (WorkLoop): Deadline tracker for the invocation
+
+    Returns:
+        str: The original outcome once every position is updated, else CONTINUED
+    """
+    price = Decimal(resume['price'])
+    position_ids = [pid for pid in position_ids if pid >= resume['start_at']]
+    remainder = update_position_prices(ticker, price, resume['as_of'], position_ids, loop)
+    if remainder:
+        return continue_position_updates(ticker, run_id, price, resume['as_of'], resume['outcome'], remainder)
+    return resume['outcome']
+
+def process_ticker_message(ticker, position_ids, run_id, loop):
+    """
+    Fetch and store fresh data for one ticker and reprice its positions.
+
+    Args:
+        ticker (str): The ticker symbol
+        position_ids (list): Position IDs holding the ticker
+        run_id (str): The ingestion run ID
+        loop (WorkLoop): Deadline tracker for the invocation
+
+    Returns:
+        str: UPDATED, UNCHANGED, NO_DATA or RATE_LIMITED, or CONTINUED if
+             some positions were left to a continuation message
+    """
+    print(f"\nProcessing ticker: {ticker} (positions: {len(position_ids)})")
+
+    # Fetch price data first to get asOf time
+    print(f"Fetching price for {ticker} from Polygon API")
+    price_result = fetch_price(ticker)
+    if isinstance(price_result, dict) and price_result.get('error') == 'rate_limit':
+        print(f"Rate limit exceeded for {ticker}, skipping")
+        return RATE_LIMITED
+    if price_result is None:
+        print(f"No price data for {ticker}, skipping")
+        return NO_DATA
+
+    price_value, timestamp_ms, bar = price_result
+    price_value = Decimal(str(price_value))
+    as_of = datetime.fromtimestamp(timestamp_ms / 1000).isoformat()
+
+    print(f"Price fetched: {price_value} (as of {as_of})")
+
+    # Get latest record and check if data is newer
+    latest = get_latest_record(ticker)
+    if latest and as_of <= latest.get('asOf', ''):
+        # Data not newer, but still update positions with existing price
+        print(f"Data not newer for {ticker}, but updating positions with current price")
+        remainder = update_position_prices(ticker, price_value, as_of, position_ids, loop)
+        if remainder:
+            return continue_position_updates(ticker, run_id, price_value, as_of, UNCHANGED, remainder)
+        return UNCHANGED
+
+    # Data is newer: compute indicators from stored history plus the new bar
+    indicators = {}
+    try:
+        indicators = local_indicators(ticker, as_of, bar)
+    except Exception as e:
+        print(f"ERROR computing local indicators for {ticker}: {e}")
+
+    if 'rsi14' in indicators and 'sma50' in indicators:
+        # Enough history to skip two Polygon calls
+        print(f"Using locally computed RSI and MA50 for {ticker}")
+        rsi = indicators['rsi14']
+        ma50 = indicators['sma50']
+    else:
+        print(f"Fetching RSI for {ticker}")
+        rsi = fetch_indicator(ticker, 'rsi', 14)
+        if isinstance(rsi, dict) and rsi.get('error') == 'rate_limit':
+            print(f"Rate limit exceeded for {ticker} RSI, skipping")
+            return RATE_LIMITED
+        rsi = Decimal(str(rsi)) if rsi is not None else None
+
+        print(f"Fetching MA50 for {ticker}")
+        ma50 = fetch_indicator(ticker, 'sma', 50)
+        if isinstance(ma50, dict) and ma50.get('error') == 'rate_limit':
+            print(f"Rate limit exceeded for {ticker} MA50, skipping")
+            return RATE_LIMITED
+        ma50 = Decimal(str(ma50)) if ma50 is not None else None
+
+    current_timestamp = datetime.now().isoformat()
+
+    # Insert new record into ticker-data table
+    print(f"DEBUG: Writing to {TICKER_DATA_TABLE} (INSERT operation)")
+    item = {
+        'ticker': ticker,
+        'timestamp': current_timestamp,
+        'price': price_value,
+        'asOf': as_of,
+        'ma50': ma50,
+        'rsi': rsi
+    }
+    for field, key in BAR_FIELDS.items():
+        if bar.get(key) is not None:
+            item[field] = Decimal(str(bar[key]))
+    if indicators:
+        item['indicators'] = indicators
+        item['indicatorsAsOf'] = as_of[:10]
+    ticker_data_table.put_item(Item=item)
+    print(f"✓ Inserted new ticker-data record for {ticker}")
+
+    if latest is None:
+        # First record of a new ticker: backfillHistory loads the history before it
+        try:
+            to_date = datetime.fromisoformat(as_of[:10]) - timedelta(days=1)
+            from_date = to_date - timedelta(days=365 * BACKFILL_YEARS)
+            request_backfill(state_table, ticker, from_date.strftime('%Y-%m-%d'), to_date.strftime('%Y-%m-%d'))
+            print(f"Requested history backfill for new ticker {ticker}")
+        except Exception as e:
+            print(f"ERROR requesting backfill for {ticker}: {e}")
+
+    # Only portfolios holding tickers with new data need re-analysis
+    mark_ticker_dirty(state_table, run_id, ticker, as_of)
+
+    # Update all associated positions
+    if position_ids:
+        remainder = update_position_prices(ticker, price_value, as_of, position_ids, loop)
+        if remainder:
+            return continue_position_updates(ticker, run_id, price_value, as_of, UPDATED, remainder)
+    else:
+        print(f"No position IDs to update for {ticker}")
+
+    print(f"Completed processing ticker: {ticker}")
+    return UPDATED
+
+def notify_landed(ticker, run_id, outcome):
+    """
+    Report a processed ticker to the run's completion barrier and start any
+    analysis that was waiting on it.
+
+    Every outcome counts as landed, since the message is not retried; only
+    UPDATED tickers make their portfolios need re-analysis.
+
+    Args:
+        ticker (str): The ticker symbol
+        run_id (str): The ingestion run ID
+        outcome (str): Result of process_ticker_message
+    """
+    ready, run_complete = ticker_landed(state_table, run_id, ticker, outcome == UPDATED)
+
+    for portfolio_id in ready:
+        if not claim_analysis(state_table, run_id, portfolio_id):
+            print(f"Portfolio {portfolio_id} already queued for analysis in run {run_id}")
+            continue
+        sqs.send_message(
+            QueueUrl=ANALYSIS_QUEUE_URL,
+            MessageBody=json.dumps({'portfolio_id': portfolio_id, 'run_id': run_id})
+        )
+        print(f"✓ All tickers landed for portfolio {portfolio_id}, queued for analysis")
+
+    if run_complete:
+        print(f"All tickers landed for run {run_id}, invoking {ANALYZE_PORTFOLIOS_FUNCTION}")
+        lambda_client.invoke(
+            FunctionName=ANALYZE_PORTFOLIOS_FUNCTION,
+            InvocationType='Event',
+            Payload=json.dumps({'run_id': run_id, 'trigger': 'run_complete'})
+        )
+
+def delay_until_slot(body):
+    """
+    Send a message back to the queue if its scheduled slot is still ahead.
+
+    process_tickers schedules tickers further out than SQS can delay a
+    message by adding a not_before time; such messages hop through the
+    queue in 15 minute steps until their slot comes up.
+
+    Args:
+        body (dict): Message body
 
+    Returns:
+        bool: True if the message was re-delayed and must not be processed yet
+    """
+    wait = int(body.get('not_before', 0) - time.time())
+    if wait <= 0:
+        return False
+    delay_seconds = min(wait, MAX_SQS_DELAY_SECONDS)
+    sqs.send_message(QueueUrl=SQS_QUEUE_URL, MessageBody=json.dumps(body), DelaySeconds=delay_seconds)
+    print(f"{body.get('ticker')} is scheduled in {wait}s, delayed again by {delay_seconds}s")
+    return True
+
+@profiled
 def lambda_handler(event, context):
     """
     AWS Lambda handler for SQS messages.
@@ -237,81 +594,37 @@ def lambda_handler(event, context):
     print(f"DEBUG: Positions table: {POSITIONS_TABLE}")
     print("=" * 80)
 
-    for record in event['Records']:
+    loop = WorkLoop(context)
+    for record in loop.iterate(event['Records']):
         body = json.loads(record['body'])
         ticker = body.get('ticker')
-        position_ids = body.get('position_ids', [])
+        run_id = body.get('run_id') or current_run_id()
 
         if not ticker:
             print("No ticker in message, skipping")
             continue
 
-        print(f"\nProcessing ticker: {ticker} (positions: {len(position_ids)})")
-
-        # Fetch price data first to get asOf time
-        print(f"Fetching price for {ticker} from Polygon API")
-        price_result = fetch_price(ticker)
-        if isinstance(price_result, dict) and price_result.get('error') == 'rate_limit':
-            print(f"Rate limit exceeded for {ticker}, skipping")
-            continue
-        if price_result is None:
-            print(f"No price data for {ticker}, skipping")
-            continue
-
-        price_value, timestamp_ms = price_result
-        price_value = Decimal(str(price_value))
-        as_of = datetime.fromtimestamp(timestamp_ms / 1000).isoformat()
-
-        print(f"Price fetched: {price_value} (as of {as_of})")
-
-        # Get latest record and check if data is newer
-        latest = get_latest_record(ticker)
-        if latest and as_of <= latest.get('asOf', ''):
-            # Data not newer, but still update positions with existing price
-            print(f"Data not newer for {ticker}, but updating positions with current price")
-            if position_ids:
-                update_position_prices(ticker, price_value, as_of, position_ids)
+        if delay_until_slot(body):
             continue
 
-        # Data is newer, fetch additional indicators
-        print(f"Fetching RSI for {ticker}")
-        rsi = fetch_indicator(ticker, 'rsi', 14)
-        if isinstance(rsi, dict) and rsi.get('error') == 'rate_limit':
-            print(f"Rate limit exceeded for {ticker} RSI, skipping")
-            continue
-        rsi = Decimal(str(rsi)) if rsi is not None else None
+        # Sharded dispatch collects position IDs on the ticker's run registration
+        position_ids = get_registered_positions(state_table, run_id, ticker)
+        if 'resume' in body:
+            outcome = resume_position_updates(ticker, position_ids, run_id, body['resume'], loop)
+        else:
+            outcome = process_ticker_message(ticker, position_ids, run_id, loop)
 
-        print(f"Fetching MA50 for {ticker}")
-        ma50 = fetch_indicator(ticker, 'sma', 50)
-        if isinstance(ma50, dict) and ma50.get('error') == 'rate_limit':
-            print(f"Rate limit exceeded for {ticker} MA50, skipping")
+        if outcome == CONTINUED:
             continue
-        ma50 = Decimal(str(ma50)) if ma50 is not None else None
 
-        current_timestamp = datetime.now().isoformat()
-
-        # Insert new record into ticker-data table
-        print(f"DEBUG: Writing to {TICKER_DATA_TABLE} (INSERT operation)")
-        item = {
-            'ticker': ticker,
-            'timestamp': current_timestamp,
-            'price': price_value,
-            'asOf': as_of,
-            'ma50': ma50,
-            'rsi': rsi
-        }
-        ticker_data_table.put_item(Item=item)
-        print(f"✓ Inserted new ticker-data record for {ticker}")
-
-        # Update all associated positions
-        if position_ids:
-            update_position_prices(ticker, price_value, as_of, position_ids)
-        else:
-            print(f"No position IDs to update for {ticker}")
-
-        print(f"Completed processing ticker: {ticker}")
+        try:
+            notify_landed(ticker, run_id, outcome)
+        except Exception as e:
+            # The analyzePortfolios backstop schedule picks up anything missed here
+            print(f"ERROR notifying completion barrier for {ticker}: {e}")
 
     print("=" * 80)
     print("Ticker processing complete")
     print("=" * 80)
-    return {'status': 'success'}
\ No newline at end of file
+    # Records not started before the deadline are redelivered by SQS
+    return {'status': 'success', **batch_item_failures(loop.remainder)}
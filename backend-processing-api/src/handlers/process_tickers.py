@@ -2,100 +2,363 @@
 AWS Lambda function to process tickers from portfolio-positions DynamoDB table
 and send messages to SQS delay queue.
 
-Scans the positions table for ticker symbols, creates messages with each ticker,
-and sends them to an SQS queue with a 2-minute delay.
+This is the only nightly ingestion: the run refreshes the deduplicated union
+of the tickers of every source in TICKER_SOURCES (see
+src/utils/ticker_sources.py), including the legacy api/ portfolios table, so
+the legacy analyzePortfolio reads the same ticker-data records and each
+ticker is fetched from Polygon once.
+
+Dispatch is sharded so it keeps up as the positions table grows. The scheduled
+invocation is the coordinator: it splits the positions table into shards (one
+DynamoDB parallel-scan segment each, sized from the table's item count) and
+invokes this function asynchronously once per shard. Each shard scans its
+segment of every source and registers its tickers with the run's completion barrier (see
+src/utils/pipeline_runs.py), adding the positions referencing each ticker and
+their marketValue, then reports its totals to the run summary record.
+
+The last shard to finish enqueues the run's tickers in priority order, so the
+tickers that matter most are refreshed first within the Polygon rate budget.
+A ticker's priority weighs the number of positions referencing it and their
+aggregate marketValue, each relative to the largest in the run. Tickers a
+legacy api/ portfolio lists get PRIORITY_LEGACY_WEIGHT on top: that analysis
+runs at a fixed time instead of waiting for the completion barrier, so its
+tickers must land early however large the universe grows. Tickers are
+spaced TICKER_SPACING_SECONDS apart; beyond the 15 minute SQS delay limit a
+message carries a not_before time and process_ticker delays it again.
+
+The risk benchmark index (RISK_BENCHMARK_TICKER) is registered with every
+run even though no position holds it, so its price history accumulates for
+computePortfolioRisk.
+
+Messages carry no position IDs; process_ticker reads them from the ticker's
+registration. Each run is dispatched once; pass a different run_id to
+dispatch again on the same day.
+
+A shard or enqueue that nears its deadline (see src/utils/work_loop.py)
+invokes itself again with a start_at cursor for the rest, and only the final
+invocation of a shard reports to the run summary.
 
 Required environment variables:
 - POSITIONS_TABLE (DynamoDB table name for portfolio positions)
 - SQS_QUEUE_URL (SQS queue URL for delayed processing)
+- PIPELINE_STATE_TABLE (DynamoDB table holding run state)
+
+Optional environment variables:
+- POSITIONS_PER_SHARD (positions per dispatcher shard, default 5000)
+- MAX_DISPATCH_SHARDS (upper bound on shards, default 100)
+- PRIORITY_POSITION_WEIGHT / PRIORITY_VALUE_WEIGHT (priority weights, default 0.5 each)
+- PRIORITY_LEGACY_WEIGHT (priority added for legacy portfolio tickers, default 2.0)
+- ANALYZE_PORTFOLIOS_FUNCTION (invoked if a run has no tickers to refresh)
+- RISK_BENCHMARK_TICKER (index refreshed with every run, default ^SPX)
+- TICKER_SOURCES (comma-separated ticker sources, default positions)
+- LEGACY_PORTFOLIOS_TABLE (legacy api/ portfolios table, for the legacyPortfolios source)
+- TICKER_SPACING_SECONDS (seconds between ticker messages, default 75)
 """
 
-import boto3
 import json
+import math
 import os
+import time
+
+from src.utils.aws import lazy_client, lazy_resource, lazy_table
+from src.utils.pipeline_runs import (
+    add_run_totals,
+    current_run_id,
+    finish_shard,
+    get_run_tickers,
+    register_ticker,
+    start_dispatch,
+    start_enqueue
+)
+from src.utils.profiling import profiled
+from src.utils.ticker_sources import enabled_sources, read_shard
+from src.utils.work_loop import WorkLoop, continue_via_invoke
 
 # Environment variables
 POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
 SQS_QUEUE_URL = os.environ.get('SQS_QUEUE_URL')
+PIPELINE_STATE_TABLE = os.environ.get('PIPELINE_STATE_TABLE')
+ANALYZE_PORTFOLIOS_FUNCTION = os.environ.get('ANALYZE_PORTFOLIOS_FUNCTION')
+POSITIONS_PER_SHARD = int(os.environ.get('POSITIONS_PER_SHARD', '5000'))
+MAX_DISPATCH_SHARDS = int(os.environ.get('MAX_DISPATCH_SHARDS', '100'))
+PRIORITY_POSITION_WEIGHT = float(os.environ.get('PRIORITY_POSITION_WEIGHT', '0.5'))
+PRIORITY_VALUE_WEIGHT = float(os.environ.get('PRIORITY_VALUE_WEIGHT', '0.5'))
+# Above the 1.0 the other two weights can add up to, so legacy tickers go first
+PRIORITY_LEGACY_WEIGHT = float(os.environ.get('PRIORITY_LEGACY_WEIGHT', '2.0'))
+RISK_BENCHMARK_TICKER = os.environ.get('RISK_BENCHMARK_TICKER', '^SPX')
+SOURCES = enabled_sources(os.environ.get('TICKER_SOURCES'))
+# Spacing between ticker messages: 1 minute 15s for rate limit with polygon.io
+TICKER_SPACING_SECONDS = int(os.environ.get('TICKER_SPACING_SECONDS', '75'))
 
-# DynamoDB and SQS clients
-dynamodb = boto3.resource('dynamodb')
-sqs = boto3.client('sqs')
-positions_table = dynamodb.Table(POSITIONS_TABLE)
 
-def lambda_handler(event, context):
+# SQS caps DelaySeconds at 15 minutes
+MAX_SQS_DELAY_SECONDS = 900
+
+# send_message_batch accepts at most 10 messages
+SEND_BATCH_SIZE = 10
+
+# AWS clients, built on first use (see src/utils/aws.py)
+dynamodb = lazy_resource('dynamodb')
+sqs = lazy_client('sqs')
+lambda_client = lazy_client('lambda')
+# Wire-format items for the source scans, decoded by src/utils/ddb.py
+raw_client = lazy_client('dynamodb')
+state_table = lazy_table(PIPELINE_STATE_TABLE)
+
+def shard_count():
     """
-    AWS Lambda handler function.
+    Number of dispatcher shards for the current size of the positions table.
+
+    Uses the table's approximate item count (refreshed by DynamoDB about every
+    six hours), which is plenty to keep each shard's slice roughly constant.
+
+    Returns:
+        int: Shard count between 1 and MAX_DISPATCH_SHARDS
+    """
+    item_count = dynamodb.meta.client.describe_table(TableName=POSITIONS_TABLE)['Table']['ItemCount']
+    return max(1, min(MAX_DISPATCH_SHARDS, math.ceil(item_count / POSITIONS_PER_SHARD)))
+
+def register_shard(run_id, shard, total_shards, loop, start_at=None):
+    """
+    Register the tickers of one shard of every ticker source.
 
-    Scans portfolio-positions table for tickers and sends delayed SQS messages.
+    Tickers are handled in sorted order so a continuation can start at the
+    first ticker this invocation did not reach.
 
     Args:
-        event (dict): Event data (not used)
-        context: Lambda context (not used)
+        run_id (str): The ingestion run ID
+        shard (int): Shard number
+        total_shards (int): Total number of shards
+        loop (WorkLoop): Deadline tracker for the invocation
+        start_at (str): First ticker to handle, for continuations
 
     Returns:
-        dict: Success message with count of messages sent
+        tuple: (shard totals, first ticker left for a continuation or None)
     """
-    print("=" * 80)
-    print("Starting portfolio ticker processing")
-    print(f"DEBUG: Reading from table: {POSITIONS_TABLE}")
-    print(f"DEBUG: Sending to SQS queue: {SQS_QUEUE_URL}")
-    print("=" * 80)
+    # Unique tickers with their portfolio IDs and {position_id: marketValue}
+    scanned, holdings = read_shard(raw_client, SOURCES, shard, total_shards)
+    print(f"Shard {shard}/{total_shards}: scanned {scanned}, found {len(holdings)} unique tickers")
 
-    # Scan positions table for all items
-    response = positions_table.scan()
-    items = response['Items']
+    errors = 0
+    tickers = sorted(t for t in holdings if start_at is None or t >= start_at)
+    for ticker in loop.iterate(tickers):
+        holding = holdings[ticker]
+        position_values = holding['positions']
+        try:
+            register_ticker(state_table, run_id, ticker, holding['portfolios'], position_values, position_values,
+                            shard, holding['legacy'])
+        except Exception as e:
+            errors += 1
+            print(f"  ✗ ERROR registering {ticker}: {e}")
 
-    # Handle pagination if needed
-    while 'LastEvaluatedKey' in response:
-        response = positions_table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-        items.extend(response['Items'])
+    stats = {f'{name}Scanned': count for name, count in scanned.items()}
+    stats.update({
+        'tickersSeen': len(holdings),
+        'registerErrors': errors
+    })
+    return stats, (loop.remainder[0] if loop.remainder else None)
 
-    print(f"Found {len(items)} position items")
+def prioritize(tickers):
+    """
+    Order a run's tickers by refresh priority, highest first.
 
-    # Collect unique tickers with their position IDs
-    ticker_positions = {}  # {ticker: [position_ids]}
-    for item in items:
-        if 'ticker' in item:
-            ticker = item['ticker']
-            position_id = item.get('id', 'unknown')
-            if ticker not in ticker_positions:
-                ticker_positions[ticker] = []
-            ticker_positions[ticker].append(position_id)
+    Args:
+        tickers (list): Dicts with ticker, positionCount, marketValue and legacy
 
-    unique_tickers = list(ticker_positions.keys())
-    print(f"Found {len(unique_tickers)} unique tickers: {unique_tickers}")
+    Returns:
+        list: The same dicts with a priority, sorted (ties by ticker)
+    """
+    max_positions = max((t['positionCount'] for t in tickers), default=0) or 1
+    max_value = max((float(t['marketValue']) for t in tickers), default=0) or 1
+    for t in tickers:
+        t['priority'] = (
+            PRIORITY_POSITION_WEIGHT * t['positionCount'] / max_positions
+            + PRIORITY_VALUE_WEIGHT * max(float(t['marketValue']), 0) / max_value
+            + (PRIORITY_LEGACY_WEIGHT if t.get('legacy') else 0)
+        )
+    return sorted(tickers, key=lambda t: (-t['priority'], t['ticker']))
 
-    for ticker, position_ids in ticker_positions.items():
-        print(f"  {ticker}: {len(position_ids)} position(s) - {position_ids}")
+def ticker_message(ticker, run_id, sequence, started_at, now):
+    """
+    SQS message scheduling a ticker's refresh in its priority slot.
 
-    messages_sent = 0
+    Args:
+        ticker (str): The ticker symbol
+        run_id (str): The ingestion run ID
+        sequence (int): Position in the priority order
+        started_at (int): Epoch seconds the run's enqueue started
+        now (int): Current epoch seconds
+
+    Returns:
+        dict: send_message_batch entry
+    """
+    slot = started_at + sequence * TICKER_SPACING_SECONDS
+    delay_seconds = max(0, slot - now)
+    message = {
+        'ticker': ticker,
+        'source': 'portfolio_processor',
+        'run_id': run_id
+    }
+    if delay_seconds > MAX_SQS_DELAY_SECONDS:
+        # process_ticker re-delays the message until its slot comes up
+        message['not_before'] = slot
+    return {
+        'Id': str(sequence),
+        'MessageBody': json.dumps(message),
+        'DelaySeconds': min(delay_seconds, MAX_SQS_DELAY_SECONDS)
+    }
 
-    # Send message for each unique ticker
-    for ticker in unique_tickers:
-        print(f"Processing ticker: {ticker}")
+def enqueue_run(run_id, context, start_at=0):
+    """
+    Send the run's ticker messages in priority order.
 
-        # Create message with position IDs for later update
-        message = {
-            'ticker': ticker,
-            'source': 'portfolio_processor',
-            'position_ids': ticker_positions[ticker]
-        }
+    Args:
+        run_id (str): The ingestion run ID
+        context: Lambda context
+        start_at (int): Position in the priority order to resume from
 
-        # Send to SQS with staggered delay for rate limiting
+    Returns:
+        dict: Enqueue totals
+    """
+    tickers = prioritize(get_run_tickers(state_table, run_id))
+    started_at = start_enqueue(state_table, run_id)
+    print(f"Enqueueing {len(tickers) - start_at} of {len(tickers)} tickers for run {run_id} in priority order")
+    for sequence, t in enumerate(tickers[start_at:start_at + 10], start_at):
+        print(f"  #{sequence} {t['ticker']}: priority {t['priority']:.3f} "
+              f"({t['positionCount']} position(s), value {t['marketValue']})")
+
+    if not tickers:
+        # Nothing to refresh, so the run is already complete
+        print(f"Run {run_id} has no tickers, invoking {ANALYZE_PORTFOLIOS_FUNCTION}")
+        lambda_client.invoke(
+            FunctionName=ANALYZE_PORTFOLIOS_FUNCTION,
+            InvocationType='Event',
+            Payload=json.dumps({'run_id': run_id, 'trigger': 'run_complete'})
+        )
+        return {'messagesSent': 0, 'sendErrors': 0}
+
+    messages_sent = 0
+    errors = 0
+    loop = WorkLoop(context)
+    batch_starts = range(start_at, len(tickers), SEND_BATCH_SIZE)
+    for batch_start in loop.iterate(batch_starts):
+        now = int(time.time())
+        entries = [
+            ticker_message(t['ticker'], run_id, sequence, started_at, now)
+            for sequence, t in enumerate(tickers[batch_start:batch_start + SEND_BATCH_SIZE], batch_start)
+        ]
         try:
-            delay_seconds = messages_sent * 75  # staggered 1 minute 15s for rate limit with polygon.io
-            sqs.send_message(
-                QueueUrl=SQS_QUEUE_URL,
-                MessageBody=json.dumps(message),
-                DelaySeconds=delay_seconds
-            )
-            messages_sent += 1
-            print(f"  ✓ Sent message for {ticker} to SQS (delay: {delay_seconds}s)")
+            response = sqs.send_message_batch(QueueUrl=SQS_QUEUE_URL, Entries=entries)
+            messages_sent += len(response.get('Successful', []))
+            for failure in response.get('Failed', []):
+                errors += 1
+                print(f"  ✗ ERROR sending message #{failure['Id']}: {failure.get('Message')}")
         except Exception as e:
-            print(f"  ✗ ERROR sending message for {ticker}: {e}")
+            errors += len(entries)
+            print(f"  ✗ ERROR sending messages #{batch_start}-#{batch_start + len(entries) - 1}: {e}")
+
+    totals = {'messagesSent': messages_sent, 'sendErrors': errors}
+    add_run_totals(state_table, run_id, totals)
+
+    if loop.remainder:
+        continue_via_invoke(lambda_client, context.function_name, {
+            'run_id': run_id,
+            'enqueue': True,
+            'start_at': loop.remainder[0]
+        })
+    return totals
+
+def run_shard(run_id, shard, total_shards, context, start_at=None, carried=None):
+    """
+    Register one shard and report it to the run summary, or hand the rest of
+    the shard to a continuation if the deadline approaches. The last shard to
+    finish enqueues the run.
+
+    Args:
+        run_id (str): The ingestion run ID
+        shard (int): Shard number
+        total_shards (int): Total number of shards
+        context: Lambda context
+        start_at (str): First ticker to handle, for continuations
+        carried (dict): Error totals of earlier invocations of the shard
+
+    Returns:
+        dict: Shard totals
+    """
+    stats, next_ticker = register_shard(run_id, shard, total_shards, WorkLoop(context), start_at)
+    stats['registerErrors'] += (carried or {}).get('registerErrors', 0)
+
+    if next_ticker is not None:
+        continue_via_invoke(lambda_client, context.function_name, {
+            'run_id': run_id,
+            'shard': shard,
+            'total_shards': total_shards,
+            'start_at': next_ticker,
+            'carried': {'registerErrors': stats['registerErrors']}
+        })
+        return stats
+
+    if finish_shard(state_table, run_id, shard, stats):
+        print(f"Shard {shard} was the last to finish, enqueueing run {run_id}")
+        stats.update(enqueue_run(run_id, context))
+    return stats
+
+@profiled
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function.
+
+    Without a shard in the event, acts as the coordinator and fans out one
+    invocation per shard. With {"shard": n, "total_shards": m}, registers
+    that shard. With {"enqueue": true}, continues enqueueing the run.
+
+    Args:
+        event (dict): Event data, optionally with run_id, shard, total_shards,
+                      enqueue and start_at
+        context: Lambda context; without one (local runs) shards run in-process
+
+    Returns:
+        dict: Success message with the shard count or the shard's totals
+    """
+    event = event or {}
+    run_id = event.get('run_id') or current_run_id()
+
+    if event.get('enqueue'):
+        totals = enqueue_run(run_id, context, int(event.get('start_at') or 0))
+        return {'status': 'success', 'run_id': run_id, **totals}
+
+    if 'shard' in event:
+        shard = int(event['shard'])
+        total_shards = int(event['total_shards'])
+        stats = run_shard(run_id, shard, total_shards, context, event.get('start_at'), event.get('carried'))
+        print(f"Completed shard {shard}/{total_shards}: registered {stats['tickersSeen']} tickers")
+        return {'status': 'success', 'run_id': run_id, 'shard': shard, **stats}
+
+    total_shards = int(event.get('total_shards') or shard_count())
+
+    print("=" * 80)
+    print(f"Starting portfolio ticker processing (run: {run_id}, shards: {total_shards})")
+    print(f"Sources: {', '.join(SOURCES)}; sending to {SQS_QUEUE_URL}")
+    print("=" * 80)
+
+    if not start_dispatch(state_table, run_id, total_shards):
+        print(f"Run {run_id} was already dispatched, nothing to do")
+        return {'status': 'skipped', 'run_id': run_id, 'shards': 0}
+
+    # Held by no position, so refreshed last
+    register_ticker(state_table, run_id, RISK_BENCHMARK_TICKER, [], [])
+
+    for shard in range(total_shards):
+        if context is None:
+            run_shard(run_id, shard, total_shards, context)
+            continue
+        lambda_client.invoke(
+            FunctionName=context.function_name,
+            InvocationType='Event',
+            Payload=json.dumps({'run_id': run_id, 'shard': shard, 'total_shards': total_shards})
+        )
 
     print("=" * 80)
-    print(f"Completed processing: sent {messages_sent} messages to SQS queue")
+    print(f"Dispatched {total_shards} shard(s) for run {run_id}")
     print("=" * 80)
-    return {'status': 'success', 'messages_sent': messages_sent, 'unique_tickers': len(unique_tickers)}
\ No newline at end of file
+    return {'status': 'success', 'run_id': run_id, 'shards': total_shards}
@@ -0,0 +1,378 @@
+"""
+AWS Lambda function to revalue every position against the latest prices.
+
+Loads all positions (id, ticker, shares, costBasis and the stored valuation)
+into columns with one projected scan, joins them to a vector of the latest
+ticker-data price per ticker, and computes marketValue and unrealizedPL for
+the whole book in one NumPy pass. Only rows whose price or valuation changed
+are written back, with batched PartiQL updates.
+
+The NumPy pass runs in float64 and is only used to find what changed. The
+valuation inputs are decoded as Decimal straight from the stored numbers, so
+the values written are computed exactly (as process_ticker does), and each
+is reconciled against the float result; rows that disagree beyond
+RECONCILE_TOLERANCE are reported, and the Decimal value is what is stored.
+
+A PartiQL batch that raises, or whose statements are throttled, is retried
+up to WRITE_ATTEMPTS times; rows that still fail keep their stored values
+and the run goes on to the next batch and the aggregates.
+
+Once every position is written, each portfolio's aggregate in the
+portfolio-metrics table is rebuilt from its positions, correcting any drift
+from positions changed outside the pipeline, and its snapshot for the latest
+market date is refreshed (see src/utils/portfolio_metrics.py).
+
+Required environment variables:
+- POSITIONS_TABLE (DynamoDB table name for portfolio positions)
+- TICKER_DATA_TABLE (DynamoDB table name for ticker data)
+- PORTFOLIO_METRICS_TABLE (DynamoDB table for portfolio aggregates and history)
+"""
+
+import numpy as np
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+from src.utils.aws import Lazy, lazy_client, lazy_resource, lazy_table
+from src.utils.ddb import Position, scan_items
+from src.utils.portfolio_metrics import record_snapshot, set_aggregate
+from src.utils.profiling import profiled
+from src.utils.work_loop import WorkLoop, continue_via_invoke
+
+# Environment variables
+POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
+TICKER_DATA_TABLE = os.environ.get('TICKER_DATA_TABLE')
+PORTFOLIO_METRICS_TABLE = os.environ.get('PORTFOLIO_METRICS_TABLE')
+
+# batch_execute_statement accepts at most 25 statements
+STATEMENT_BATCH_SIZE = 25
+# Tries per batch, and the delay before the first retry (doubled each time)
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_SECONDS = 0.5
+# Statement error codes worth retrying
+RETRYABLE_ERRORS = {
+    'ProvisionedThroughputExceeded', 'RequestLimitExceeded', 'ThrottlingError',
+    'InternalServerError', 'TransactionConflict'
+}
+# Concurrent latest-price queries
+PRICE_LOOKUP_WORKERS = 16
+# Relative difference between the float and Decimal results that is reported
+RECONCILE_TOLERANCE = 1e-9
+# Stored values closer than this to the new ones are left alone
+CHANGE_TOLERANCE = 0.005
+
+UPDATE_STATEMENT = (
+    f'UPDATE "{POSITIONS_TABLE}" '
+    'SET currentPrice = ? SET marketValue = ? SET unrealizedPL = ? SET updatedAt = ? '
+    'WHERE id = ?'
+)
+
+# Position columns and the Position attributes they are loaded from
+POSITION_COLUMNS = {
+    'id': 'id',
+    'portfolioId': 'portfolio_id',
+    'ticker': 'ticker',
+    'shares': 'shares',
+    'costBasis': 'cost_basis',
+    'currentPrice': 'current_price',
+    'marketValue': 'market_value',
+    'unrealizedPL': 'unrealized_pl'
+}
+
+# AWS clients, built on first use (see src/utils/aws.py)
+dynamodb = lazy_resource('dynamodb')
+# Wire-format items for the full scan, decoded by src/utils/ddb.py
+raw_client = lazy_client('dynamodb')
+metrics_table = lazy_table(PORTFOLIO_METRICS_TABLE)
+# The resource's client is thread-safe and converts attribute values like the Table API
+ddb_client = Lazy(lambda: dynamodb.meta.client)
+lambda_client = lazy_client('lambda')
+
+def load_positions():
+    """
+    Load the valuation inputs of every position into columns.
+
+    Items are decoded from the low-level client straight into Position
+    records (see src/utils/ddb.py), with numbers as exact Decimals.
+
+    Returns:
+        dict: Lists keyed by id, portfolioId, ticker, shares, costBasis,
+              currentPrice, marketValue, unrealizedPL (None where missing)
+    """
+    columns = {field: [] for field in POSITION_COLUMNS}
+    for item in scan_items(raw_client, TableName=POSITIONS_TABLE, ProjectionExpression=Position.PROJECTION):
+        position = Position.from_item(item, number=Decimal)
+        if position.id is None or position.ticker is None:
+            continue
+        for field, attribute in POSITION_COLUMNS.items():
+            columns[field].append(getattr(position, attribute))
+    return columns
+
+def get_latest_price(ticker):
+    """
+    Latest stored price for a ticker.
+
+    Returns:
+        tuple: (Decimal price, asOf), or (None, None) if the ticker has no data
+    """
+    response = ddb_client.query(
+        TableName=TICKER_DATA_TABLE,
+        KeyConditionExpression='ticker = :ticker',
+        ExpressionAttributeValues={':ticker': ticker},
+        ProjectionExpression='price, asOf',
+        ScanIndexForward=False,
+        Limit=1
+    )
+    items = response['Items']
+    if not items or items[0].get('price') is None:
+        return None, None
+    return items[0]['price'], items[0].get('asOf')
+
+def load_prices(tickers):
+    """
+    Latest price of each ticker, looked up concurrently.
+
+    Args:
+        tickers (list): Unique ticker symbols
+
+    Returns:
+        list: (Decimal price or None, asOf) for each ticker, in order
+    """
+    with ThreadPoolExecutor(max_workers=PRICE_LOOKUP_WORKERS) as executor:
+        return list(executor.map(get_latest_price, tickers))
+
+def as_float_array(values):
+    return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+def find_changed(columns, tickers, prices):
+    """
+    Revalue the whole book in one vectorized pass and find rows to update.
+
+    Args:
+        columns (dict): Position columns from load_positions
+        tickers (list): Unique tickers
+        prices (list): Latest price per ticker (None if unknown)
+
+    Returns:
+        tuple: (indices of positions to update, float market values, float P&L)
+    """
+    ticker_index = {ticker: i for i, ticker in enumerate(tickers)}
+    price_vector = as_float_array(prices)
+    position_prices = price_vector[np.array([ticker_index[t] for t in columns['ticker']], dtype=np.intp)]
+
+    shares = np.nan_to_num(as_float_array(columns['shares']))
+    cost_basis = np.nan_to_num(as_float_array(columns['costBasis']))
+    market_value = shares * position_prices
+    unrealized_pl = market_value - cost_basis
+
+    stored_price = as_float_array(columns['currentPrice'])
+    stored_value = as_float_array(columns['marketValue'])
+    stored_pl = as_float_array(columns['unrealizedPL'])
+
+    # NaN comparisons are False, so missing stored values count as changed
+    unchanged = (
+        (np.abs(stored_price - position_prices) < CHANGE_TOLERANCE)
+        & (np.abs(stored_value - market_value) < CHANGE_TOLERANCE)
+        & (np.abs(stored_pl - unrealized_pl) < CHANGE_TOLERANCE)
+    )
+    changed = ~unchanged & ~np.isnan(position_prices)
+    return np.flatnonzero(changed), market_value, unrealized_pl
+
+def exact_update(columns, index, price, float_value, float_pl):
+    """
+    Exact Decimal valuation of one position, reconciled with the float pass.
+
+    Returns:
+        tuple: (PartiQL parameters, True if the float result disagreed)
+    """
+    shares = columns['shares'][index] or Decimal('0')
+    cost_basis = columns['costBasis'][index] or Decimal('0')
+    market_value = shares * price
+    unrealized_pl = market_value - cost_basis
+
+    mismatch = (
+        abs(float(market_value) - float_value) > RECONCILE_TOLERANCE * max(1.0, abs(float(market_value)))
+        or abs(float(unrealized_pl) - float_pl) > RECONCILE_TOLERANCE * max(1.0, abs(float(unrealized_pl)))
+    )
+    parameters = [price, market_value, unrealized_pl, datetime.now().isoformat(), columns['id'][index]]
+    return parameters, mismatch
+
+def execute_batch(batch):
+    """
+    Execute one PartiQL batch, retrying it if the call fails and retrying
+    statements that were throttled.
+
+    Args:
+        batch (list): PartiQL parameters of each update statement
+
+    Returns:
+        dict: {position ID: error message} for rows that were not written
+    """
+    pending = batch
+    errors = {}
+    for attempt in range(WRITE_ATTEMPTS):
+        if attempt:
+            time.sleep(WRITE_RETRY_SECONDS * 2 ** (attempt - 1))
+        try:
+            response = ddb_client.batch_execute_statement(
+                Statements=[{'Statement': UPDATE_STATEMENT, 'Parameters': params} for params in pending]
+            )
+        except Exception as e:
+            print(f"  WARNING: batch of {len(pending)} update(s) failed (attempt {attempt + 1}): {e}")
+            errors.update((params[-1], str(e)) for params in pending)
+            continue
+        retry = []
+        for params, result in zip(pending, response['Responses']):
+            error = result.get('Error')
+            if error is None:
+                errors.pop(params[-1], None)
+                continue
+            errors[params[-1]] = error.get('Message') or error.get('Code')
+            if error.get('Code') in RETRYABLE_ERRORS:
+                retry.append(params)
+        pending = retry
+        if not pending:
+            break
+    return errors
+
+def write_updates(statements, loop):
+    """
+    Execute update statements in PartiQL batches until the deadline approaches.
+
+    Returns:
+        tuple: (rows written, set of position IDs that failed, True if
+                statements were left over)
+    """
+    written = 0
+    failed = set()
+    batch_starts = range(0, len(statements), STATEMENT_BATCH_SIZE)
+    for start in loop.iterate(batch_starts):
+        batch = statements[start:start + STATEMENT_BATCH_SIZE]
+        errors = execute_batch(batch)
+        for position_id, message in errors.items():
+            print(f"  ✗ ERROR updating position {position_id}: {message}")
+        failed.update(errors)
+        written += len(batch) - len(errors)
+    return written, failed, bool(loop.remainder)
+
+def portfolio_totals(columns, written, as_of_by_ticker):
+    """
+    Exact totals of each portfolio's priced positions after the write pass.
+
+    Args:
+        columns (dict): Position columns from load_positions
+        written (dict): {position index: (market value, unrealized P&L)} for
+                        rows rewritten in this run
+        as_of_by_ticker (dict): asOf of each ticker's latest price
+
+    Returns:
+        dict: {portfolio_id: [market value, unrealized P&L, cost basis, latest asOf]}
+    """
+    totals = {}
+    for index, portfolio_id in enumerate(columns['portfolioId']):
+        if not portfolio_id:
+            continue
+        entry = totals.setdefault(portfolio_id, [Decimal('0'), Decimal('0'), Decimal('0'), ''])
+        if index in written:
+            market_value, unrealized_pl = written[index]
+        else:
+            market_value, unrealized_pl = columns['marketValue'][index], columns['unrealizedPL'][index]
+            if market_value is None or unrealized_pl is None:
+                continue
+        entry[0] += market_value
+        entry[1] += unrealized_pl
+        entry[2] += market_value - unrealized_pl
+        entry[3] = max(entry[3], as_of_by_ticker.get(columns['ticker'][index]) or '')
+    return totals
+
+def rebuild_aggregates(totals, loop, start_at=None):
+    """
+    Overwrite portfolio aggregates and their latest snapshots, in ID order.
+
+    Returns:
+        tuple: (aggregates rebuilt, first portfolio ID left over or None)
+    """
+    portfolio_ids = sorted(pid for pid in totals if not start_at or pid >= start_at)
+    rebuilt = 0
+    for portfolio_id in loop.iterate(portfolio_ids):
+        market_value, unrealized_pl, cost_basis, as_of = totals[portfolio_id]
+        aggregate = set_aggregate(metrics_table, portfolio_id, market_value, unrealized_pl, cost_basis)
+        if as_of:
+            record_snapshot(metrics_table, portfolio_id, aggregate, as_of[:10])
+        rebuilt += 1
+    return rebuilt, loop.remainder[0] if loop.remainder else None
+
+@profiled
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function.
+
+    Revalues all positions, writes the ones that changed and rebuilds the
+    portfolio aggregates.
+
+    Args:
+        event (dict): Lambda event; a continuation carries aggregates_from
+        context: Lambda context
+
+    Returns:
+        dict: Status with counts of positions revalued, written and reconciled
+    """
+    event = event or {}
+    started = datetime.now()
+    columns = load_positions()
+    tickers = sorted(set(columns['ticker']))
+    print(f"Loaded {len(columns['id'])} positions across {len(tickers)} tickers")
+
+    quotes = load_prices(tickers)
+    prices = [price for price, _ in quotes]
+    as_of_by_ticker = {ticker: as_of for ticker, (_, as_of) in zip(tickers, quotes)}
+    missing = [ticker for ticker, price in zip(tickers, prices) if price is None]
+    if missing:
+        print(f"No price data for {len(missing)} ticker(s): {missing[:20]}")
+
+    changed, market_value, unrealized_pl = find_changed(columns, tickers, prices)
+    print(f"{len(changed)} position(s) changed (book value {np.nansum(market_value):.2f})")
+
+    price_by_ticker = dict(zip(tickers, prices))
+    statements = []
+    written_values = {}
+    mismatches = 0
+    for index in changed:
+        params, mismatch = exact_update(
+            columns, index, price_by_ticker[columns['ticker'][index]], market_value[index], unrealized_pl[index]
+        )
+        if mismatch:
+            mismatches += 1
+            print(f"  WARNING: float and Decimal valuation disagree for position {columns['id'][index]}")
+        statements.append(params)
+        written_values[index] = (params[1], params[2])
+
+    loop = WorkLoop(context)
+    written, failed, unfinished = write_updates(statements, loop)
+    rebuilt = 0
+    if unfinished:
+        # Rows already written no longer differ, so a rerun picks up only the rest
+        continue_via_invoke(lambda_client, context.function_name, {})
+    else:
+        # Positions that failed to write keep their stored values
+        written_values = {i: v for i, v in written_values.items() if columns['id'][i] not in failed}
+        totals = portfolio_totals(columns, written_values, as_of_by_ticker)
+        rebuilt, next_portfolio = rebuild_aggregates(totals, loop, event.get('aggregates_from'))
+        if next_portfolio:
+            continue_via_invoke(lambda_client, context.function_name, {'aggregates_from': next_portfolio})
+
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"Revaluation complete in {elapsed:.1f}s. Written: {written}, Failed: {len(failed)}, "
+          f"Mismatches: {mismatches}, Aggregates rebuilt: {rebuilt}")
+    return {
+        'status': 'success',
+        'positions': len(columns['id']),
+        'changed': len(changed),
+        'written': written,
+        'failed': len(failed),
+        'reconcile_mismatches': mismatches,
+        'aggregates_rebuilt': rebuilt,
+        'unpriced_tickers': len(missing)
+    }
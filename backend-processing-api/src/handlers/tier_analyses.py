@@ -0,0 +1,164 @@
+"""
+AWS Lambda function to tier old portfolio analyses out of DynamoDB.
+
+Scans the portfolio-analyses table for items older than the retention period,
+writes each one as a compressed JSON archive to blob storage and deletes it
+from the table. Latest-pointer items, the analysis each pointer references and
+the newest item of every partition (with or without a pointer) are always
+kept, so every portfolio still has a current analysis, risk and error item.
+
+If the invocation nears its deadline (see src/utils/work_loop.py) it invokes
+itself again for the rest; archived items are gone from the table, so the
+continuation's scan only finds what is left.
+
+Required environment variables:
+- ANALYSES_TABLE (DynamoDB table name for analyses)
+- ANALYSIS_BLOB_BUCKET (S3 bucket for archives; ANALYSIS_BLOB_DIR for local runs)
+
+Optional environment variables:
+- ANALYSIS_RETENTION_DAYS (days analyses stay in DynamoDB, default 90)
+"""
+
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from src.utils.analysis_format import LATEST_PARTITION_SUFFIX, LATEST_SORT_KEY
+from src.utils.aws import lazy_client, lazy_table
+from src.utils.blob_store import compress, default_codec, get_blob_store
+from src.utils.profiling import profiled
+from src.utils.work_loop import WorkLoop, continue_via_invoke
+
+# Environment variables
+ANALYSES_TABLE = os.environ.get('ANALYSES_TABLE')
+ANALYSIS_RETENTION_DAYS = int(os.environ.get('ANALYSIS_RETENTION_DAYS', '90'))
+
+ARCHIVE_PREFIX = 'archive/analyses/'
+
+# AWS clients, built on first use (see src/utils/aws.py)
+lambda_client = lazy_client('lambda')
+analyses_table = lazy_table(ANALYSES_TABLE)
+
+def encode_value(value):
+    """
+    JSON encoder for DynamoDB attribute types.
+    """
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, set):
+        return sorted(value)
+    raw = getattr(value, 'value', value)
+    if isinstance(raw, (bytes, bytearray)):
+        return {'$binary': base64.b64encode(bytes(raw)).decode('ascii')}
+    raise TypeError(f'Cannot archive value of type {type(value).__name__}')
+
+def archive_key(item, codec):
+    return f"{ARCHIVE_PREFIX}{item['portfolio']}/{item['timestamp']}.json.{codec}"
+
+def find_expired_keys(cutoff):
+    """
+    Collect keys of analyses older than the cutoff, excluding current ones.
+
+    The newest item of every partition is kept whether or not a latest
+    pointer references it: portfolios analyzed before pointers existed (read
+    through the API's query fallback) and the latest #risk and #errors items
+    of idle portfolios stay in the table. So does any analysis a pointer
+    references. The scan reads only keys and reads the whole table either
+    way, since a filter would not lower its cost.
+
+    Args:
+        cutoff (str): ISO timestamp; older analyses are expired
+
+    Returns:
+        list: Keys ({portfolio, timestamp}) to archive
+    """
+    scan_kwargs = {
+        'ProjectionExpression': '#p, #t, analysisTimestamp',
+        'ExpressionAttributeNames': {'#p': 'portfolio', '#t': 'timestamp'}
+    }
+    response = analyses_table.scan(**scan_kwargs)
+    items = response['Items']
+    while 'LastEvaluatedKey' in response:
+        response = analyses_table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+        items.extend(response['Items'])
+
+    current = set()
+    newest = {}
+    for item in items:
+        portfolio, timestamp = item['portfolio'], item['timestamp']
+        if timestamp == LATEST_SORT_KEY:
+            if portfolio.endswith(LATEST_PARTITION_SUFFIX):
+                current.add((portfolio[:-len(LATEST_PARTITION_SUFFIX)], item.get('analysisTimestamp')))
+        elif timestamp > newest.get(portfolio, ''):
+            newest[portfolio] = timestamp
+    current.update(newest.items())
+
+    return [
+        {'portfolio': item['portfolio'], 'timestamp': item['timestamp']}
+        for item in items
+        if item['timestamp'] != LATEST_SORT_KEY
+        and item['timestamp'] < cutoff
+        and (item['portfolio'], item['timestamp']) not in current
+    ]
+
+def archive_analysis(key, store, codec):
+    """
+    Archive one analysis item to blob storage and delete it from the table.
+
+    Returns:
+        bool: True if the item was archived
+    """
+    item = analyses_table.get_item(Key=key, ConsistentRead=True).get('Item')
+    if not item:
+        return False
+
+    data = json.dumps(item, default=encode_value, separators=(',', ':')).encode('utf-8')
+    store.put_object(archive_key(item, codec), compress(data, codec))
+    analyses_table.delete_item(Key=key)
+    return True
+
+@profiled
+def lambda_handler(event, context):
+    """
+    AWS Lambda handler function.
+
+    Archives and deletes analyses older than ANALYSIS_RETENTION_DAYS.
+
+    Args:
+        event (dict): Optional retention_days override
+        context: Lambda context
+
+    Returns:
+        dict: Status with count of analyses archived
+    """
+    store = get_blob_store()
+    if store is None:
+        print("ERROR: No blob store configured (ANALYSIS_BLOB_BUCKET / ANALYSIS_BLOB_DIR)")
+        return {'status': 'error', 'message': 'blob store not configured'}
+
+    retention_days = int((event or {}).get('retention_days', ANALYSIS_RETENTION_DAYS))
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).isoformat()
+    print(f"Tiering analyses older than {cutoff} ({retention_days} days)")
+
+    keys = find_expired_keys(cutoff)
+    print(f"Found {len(keys)} expired analyses")
+
+    codec = default_codec()
+    archived = 0
+    errors = 0
+    loop = WorkLoop(context)
+    for key in loop.iterate(keys):
+        try:
+            if archive_analysis(key, store, codec):
+                archived += 1
+        except Exception as e:
+            errors += 1
+            print(f"ERROR archiving {key['portfolio']} @ {key['timestamp']}: {e}")
+
+    if loop.remainder:
+        continue_via_invoke(lambda_client, context.function_name, {'retention_days': retention_days})
+
+    print(f"Tiering complete. Archived: {archived}, Errors: {errors}")
+    return {'status': 'success', 'archived': archived, 'errors': errors, 'remaining': len(loop.remainder)}
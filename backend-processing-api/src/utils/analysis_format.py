@@ -0,0 +1,330 @@
+"""
+Extraction, validation and compact encoding of model analysis output.
+
+The model is asked for per-ticker JSON (ticker, score, price, rsi, ma50,
+asOf, reason) but replies in free text: the JSON may be wrapped in markdown
+fences or prose, nested under a key, keyed by ticker, or use varying field
+names. This module turns that reply into a normalized list of entries once,
+at write time, and encodes it compactly so readers can serve the stored bytes
+without parsing them again.
+
+A copy of this module lives in api/analysis_format.py for the legacy
+pipeline; keep the two in sync.
+"""
+
+import itertools
+import json
+import math
+import re
+
+# Bumped whenever the stored parsed_data layout changes
+SCHEMA_VERSION = 1
+
+SCORE_MIN = -10
+SCORE_MAX = 10
+
+FIELDS = ('ticker', 'score', 'price', 'rsi', 'ma50', 'asOf', 'reason')
+
+# Accepted spellings, keyed by the field name lower-cased with non-alphanumerics removed
+FIELD_ALIASES = {
+    'ticker': 'ticker',
+    'symbol': 'ticker',
+    'score': 'score',
+    'opportunityscore': 'score',
+    'price': 'price',
+    'currentprice': 'price',
+    'rsi': 'rsi',
+    'rsi14': 'rsi',
+    'ma50': 'ma50',
+    'sma50': 'ma50',
+    'movingaverage50': 'ma50',
+    'asof': 'asOf',
+    'dataasof': 'asOf',
+    'dataasofdate': 'asOf',
+    'asofdate': 'asOf',
+    'date': 'asOf',
+    'reason': 'reason',
+    'rationale': 'reason',
+}
+
+# Per-portfolio pointer to the latest good analysis. It lives in the analyses
+# table under its own partition, so it never shows up in a portfolio's
+# timestamp-ordered query results, and can be fetched with batch_get_item.
+LATEST_PARTITION_SUFFIX = '#latest'
+LATEST_SORT_KEY = 'LATEST'
+
+# Attributes copied onto the pointer; the large prompt and raw text stay behind
+SUMMARY_FIELDS = ('portfolioName', 'model', 'dataAsOf', 'parsed_data', 'schemaVersion', 'parseError',
+                  'positionsFingerprint', 'inputFingerprint')
+
+# Keys under which models tend to nest the per-ticker list
+CONTAINER_KEYS = ('tickers', 'results', 'analysis', 'scores', 'opportunities', 'data')
+
+_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+_KEY_RE = re.compile(r'[^a-z0-9]')
+
+
+class AnalysisFormatError(ValueError):
+    """Raised when model output cannot be turned into valid ticker entries."""
+
+
+def json_candidates(text):
+    """
+    Decode the candidate JSON documents of a model reply, most likely first.
+
+    Fenced blocks come first, then the whole reply, then every array or
+    object embedded in the prose, in the order they appear.
+
+    Args:
+        text (str): Raw model output
+
+    Yields:
+        Each decodable JSON value
+
+    Raises:
+        AnalysisFormatError: If the reply is empty
+    """
+    if not isinstance(text, str) or not text.strip():
+        raise AnalysisFormatError('Empty analysis')
+
+    decoder = json.JSONDecoder()
+    fenced = (match.group(1) for match in _FENCE_RE.finditer(text))
+    for candidate in itertools.chain(fenced, [text]):
+        candidate = candidate.strip()
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            pass
+        else:
+            # Release the block's text while the caller validates the value
+            candidate = None
+            yield value
+            continue
+        # Arrays/objects embedded in prose, e.g. "see [1]" before the real payload
+        for match in re.finditer(r'[\[{]', candidate):
+            try:
+                value, _ = decoder.raw_decode(candidate, match.start())
+            except json.JSONDecodeError:
+                continue
+            if isinstance(value, (list, dict)) and value:
+                yield value
+
+
+def extract_json(text):
+    """
+    Find and decode the first JSON document in a model reply.
+
+    Args:
+        text (str): Raw model output
+
+    Returns:
+        The decoded JSON value
+
+    Raises:
+        AnalysisFormatError: If no JSON document can be found
+    """
+    for value in json_candidates(text):
+        return value
+    raise AnalysisFormatError('No JSON found in analysis')
+
+
+def _entries_from(data):
+    """
+    Locate the list of per-ticker entries in a decoded JSON value.
+    """
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key.lower() in CONTAINER_KEYS and isinstance(value, (list, dict)):
+                return _entries_from(value)
+        # A single entry, or a mapping of ticker -> entry
+        if any(FIELD_ALIASES.get(_KEY_RE.sub('', key.lower())) == 'score' for key in data):
+            return [data]
+        if data and all(isinstance(value, dict) for value in data.values()):
+            return [{'ticker': ticker, **value} for ticker, value in data.items()]
+    raise AnalysisFormatError('Analysis JSON does not contain a list of tickers')
+
+
+def _number(value, field, required=False):
+    if value is None or value == '':
+        if required:
+            raise AnalysisFormatError(f'Missing {field}')
+        return None
+    if isinstance(value, bool):
+        raise AnalysisFormatError(f'Invalid {field}: {value!r}')
+    if isinstance(value, str):
+        try:
+            value = float(value.strip().lstrip('$').replace(',', ''))
+        except ValueError:
+            raise AnalysisFormatError(f'Invalid {field}: {value!r}')
+    if not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise AnalysisFormatError(f'Invalid {field}: {value!r}')
+    if float(value).is_integer():
+        return int(value)
+    return round(float(value), 4)
+
+
+def validate_entry(raw):
+    """
+    Normalize one per-ticker entry to the canonical field set.
+
+    Args:
+        raw (dict): Entry as produced by the model
+
+    Returns:
+        dict: Entry with exactly the keys in FIELDS
+
+    Raises:
+        AnalysisFormatError: If the entry is missing or has invalid required fields
+    """
+    if not isinstance(raw, dict):
+        raise AnalysisFormatError(f'Ticker entry is not an object: {raw!r}')
+
+    fields = {}
+    for key, value in raw.items():
+        field = FIELD_ALIASES.get(_KEY_RE.sub('', str(key).lower()))
+        if field and field not in fields:
+            fields[field] = value
+
+    ticker = fields.get('ticker')
+    if not isinstance(ticker, str) or not ticker.strip():
+        raise AnalysisFormatError(f'Missing ticker in entry: {raw!r}')
+
+    score = _number(fields.get('score'), 'score', required=True)
+    if not SCORE_MIN <= score <= SCORE_MAX:
+        raise AnalysisFormatError(f'Score out of range for {ticker}: {score}')
+
+    as_of = fields.get('asOf')
+    reason = fields.get('reason')
+    return {
+        'ticker': ticker.strip().upper(),
+        'score': score,
+        'price': _number(fields.get('price'), 'price'),
+        'rsi': _number(fields.get('rsi'), 'rsi'),
+        'ma50': _number(fields.get('ma50'), 'ma50'),
+        'asOf': str(as_of) if as_of is not None else None,
+        'reason': str(reason).strip() if reason is not None else '',
+    }
+
+
+def _valid_entries(data, skipped):
+    """
+    Validated entries of one candidate document, skipping invalid ones.
+    """
+    entries = []
+    seen = set()
+    for raw in _entries_from(data):
+        try:
+            entry = validate_entry(raw)
+        except AnalysisFormatError as e:
+            skipped.append(str(e))
+            continue
+        if entry['ticker'] in seen:
+            skipped.append(f"Duplicate ticker in analysis: {entry['ticker']}")
+            continue
+        seen.add(entry['ticker'])
+        entries.append(entry)
+    return entries
+
+
+def parse_analysis(text, skipped=None):
+    """
+    Extract and validate the per-ticker entries from a model reply.
+
+    Every candidate document is tried in turn (see json_candidates) and the
+    first with at least one valid entry wins. Invalid or duplicate entries
+    in it are left out.
+
+    Args:
+        text (str): Raw model output
+        skipped (list): Optional list that receives a message per left-out entry
+
+    Returns:
+        list: Validated entries, one per ticker, in the model's order
+
+    Raises:
+        AnalysisFormatError: If no candidate has a valid ticker entry
+    """
+    error = None
+    for data in json_candidates(text):
+        candidate_skipped = []
+        try:
+            entries = _valid_entries(data, candidate_skipped)
+        except AnalysisFormatError as e:
+            error = error or e
+            continue
+        if entries:
+            if skipped is not None:
+                skipped.extend(candidate_skipped)
+            return entries
+        error = error or AnalysisFormatError(
+            f"Analysis contains no valid tickers: {'; '.join(candidate_skipped[:3])}"
+            if candidate_skipped else 'Analysis contains no tickers'
+        )
+    raise error or AnalysisFormatError('No JSON found in analysis')
+
+
+def dumps_compact(entries):
+    """
+    Serialize validated entries in the compact stored form.
+    """
+    return json.dumps(entries, separators=(',', ':'), ensure_ascii=False)
+
+
+def parsed_fields(text):
+    """
+    Item attributes recording the parsed form of a model reply.
+
+    Args:
+        text (str): Raw model output
+
+    Returns:
+        dict: parsed_data and schemaVersion on success, with entryErrors for
+              entries that were left out, or parseError
+    """
+    skipped = []
+    try:
+        entries = parse_analysis(text, skipped)
+    except AnalysisFormatError as e:
+        return {'parseError': str(e)}
+    fields = {'parsed_data': dumps_compact(entries), 'schemaVersion': SCHEMA_VERSION}
+    if skipped:
+        fields['entryErrors'] = skipped
+    return fields
+
+
+def latest_pointer_key(portfolio):
+    """
+    Key of the latest-analysis pointer item for a portfolio.
+    """
+    return {'portfolio': f'{portfolio}{LATEST_PARTITION_SUFFIX}', 'timestamp': LATEST_SORT_KEY}
+
+
+def put_latest_pointer(table, item):
+    """
+    Point a portfolio's latest-analysis item at a newly stored analysis.
+
+    The write is conditional on the analysis being newer than the one already
+    referenced, so out-of-order writers never move the pointer backwards.
+
+    Args:
+        table: boto3 analyses Table resource
+        item (dict): The analysis item that was just stored
+
+    Returns:
+        bool: True if the pointer was updated
+    """
+    pointer = {field: item[field] for field in SUMMARY_FIELDS if field in item}
+    pointer.update(latest_pointer_key(item['portfolio']))
+    pointer['analysisTimestamp'] = item['timestamp']
+    try:
+        table.put_item(
+            Item=pointer,
+            ConditionExpression='attribute_not_exists(analysisTimestamp) OR analysisTimestamp < :ts',
+            ExpressionAttributeValues={':ts': item['timestamp']}
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Latest pointer for {item['portfolio']} already references a newer analysis")
+        return False
@@ -0,0 +1,108 @@
+"""
+Lazily constructed, cached AWS clients.
+
+Importing boto3 and building a DynamoDB resource costs a few hundred
+milliseconds of Lambda init, paid even by invocations that return before
+touching AWS (an empty SQS batch, a duplicate run). Handlers instead declare
+module-level stand-ins that build the real object on first attribute access:
+
+    lambda_client = lazy_client('lambda')
+    positions_table = lazy_table(POSITIONS_TABLE)
+    positions_table.scan(...)  # boto3 is imported and the table built here
+
+Each client, resource and table is built once per container and shared
+(construction is serialized, since boto3's default session is not
+thread-safe; the built clients are). Key and Attr build boto3 condition
+expressions without importing boto3 at module load.
+
+A copy of this module lives in api/aws.py for the legacy pipeline; keep the
+two in sync.
+"""
+
+import threading
+
+_lock = threading.RLock()
+_cache = {}
+
+
+def _cached(key, factory):
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+    with _lock:
+        if key not in _cache:
+            _cache[key] = factory()
+        return _cache[key]
+
+
+def client(service):
+    """
+    The shared boto3 client of a service.
+    """
+    def build():
+        import boto3
+        return boto3.client(service)
+    return _cached(('client', service), build)
+
+
+def resource(service='dynamodb'):
+    """
+    The shared boto3 resource of a service.
+    """
+    def build():
+        import boto3
+        return boto3.resource(service)
+    return _cached(('resource', service), build)
+
+
+def table(name):
+    """
+    The shared DynamoDB Table resource of a table.
+    """
+    return _cached(('table', name), lambda: resource('dynamodb').Table(name))
+
+
+class Lazy:
+    """
+    Stand-in for an object built on first attribute access.
+
+    Attributes set on the stand-in itself (e.g. a stub in a test) take
+    precedence over the built object's.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __getattr__(self, name):
+        if name == '_factory':
+            raise AttributeError(name)
+        return getattr(self._factory(), name)
+
+
+def lazy_client(service):
+    return Lazy(lambda: client(service))
+
+
+def lazy_resource(service='dynamodb'):
+    return Lazy(lambda: resource(service))
+
+
+def lazy_table(name):
+    return Lazy(lambda: table(name))
+
+
+def Key(name):
+    """
+    boto3.dynamodb.conditions.Key, imported on first use.
+    """
+    from boto3.dynamodb.conditions import Key
+    return Key(name)
+
+
+def Attr(name):
+    """
+    boto3.dynamodb.conditions.Attr, imported on first use.
+    """
+    from boto3.dynamodb.conditions import Attr
+    return Attr(name)
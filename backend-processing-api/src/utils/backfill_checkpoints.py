@@ -0,0 +1,147 @@
+"""
+Per-ticker checkpoints of the historical bar backfill, in the pipeline-state table.
+
+Each ticker that needs history gets an item under partition `backfill`:
+
+- sk ticker#{ticker}
+- status: pending (requested), in_progress (some pages written) or done
+- fromDate / toDate: the date range being backfilled
+- nextUrl: Polygon cursor of the next page to fetch (without the API key)
+- barsWritten: bars stored so far
+- failures / lastError: consecutive failed attempts and the last error
+
+backfillHistory saves the cursor after every page it writes, so an
+interrupted backfill resumes at the first page it had not stored. Items do
+not expire: a done checkpoint is what stops a ticker being backfilled again.
+"""
+
+from datetime import datetime
+
+from src.utils.aws import Attr, Key
+
+BACKFILL_PARTITION = 'backfill'
+TICKER_PREFIX = 'ticker#'
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+
+
+def _key(ticker):
+    return {'pk': BACKFILL_PARTITION, 'sk': f'{TICKER_PREFIX}{ticker}'}
+
+
+def request_backfill(table, ticker, from_date, to_date, restart=False):
+    """
+    Ask for a ticker's history to be backfilled.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        ticker (str): The ticker symbol
+        from_date (str): First date to backfill (YYYY-MM-DD)
+        to_date (str): Last date to backfill (YYYY-MM-DD)
+        restart (bool): Replace an existing checkpoint, even a finished one
+
+    Returns:
+        bool: True if a new checkpoint was created
+    """
+    item = {
+        **_key(ticker),
+        'status': PENDING,
+        'fromDate': from_date,
+        'toDate': to_date,
+        'barsWritten': 0,
+        'requestedAt': datetime.utcnow().isoformat()
+    }
+    if restart:
+        table.put_item(Item=item)
+        return True
+    try:
+        table.put_item(Item=item, ConditionExpression='attribute_not_exists(sk)')
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def get_checkpoint(table, ticker):
+    """
+    A ticker's checkpoint item, or None if it was never requested.
+    """
+    item = table.get_item(Key=_key(ticker)).get('Item')
+    if item:
+        item['ticker'] = ticker
+    return item
+
+
+def get_open_checkpoints(table):
+    """
+    Checkpoints of every ticker whose backfill is not done.
+
+    Returns:
+        list: Checkpoint items, in ticker order
+    """
+    query_kwargs = {
+        'KeyConditionExpression': (
+            Key('pk').eq(BACKFILL_PARTITION)
+            & Key('sk').begins_with(TICKER_PREFIX)
+        ),
+        'FilterExpression': Attr('status').ne(DONE)
+    }
+    response = table.query(**query_kwargs)
+    items = response['Items']
+    while 'LastEvaluatedKey' in response:
+        response = table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **query_kwargs)
+        items.extend(response['Items'])
+    for item in items:
+        item['ticker'] = item['sk'][len(TICKER_PREFIX):]
+    return items
+
+
+def save_progress(table, ticker, next_url, bars):
+    """
+    Record a stored page and the cursor of the next one.
+    """
+    table.update_item(
+        Key=_key(ticker),
+        UpdateExpression='SET #status = :status, nextUrl = :next, updatedAt = :now, failures = :zero '
+                         'ADD barsWritten :bars',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={
+            ':status': IN_PROGRESS,
+            ':next': next_url,
+            ':zero': 0,
+            ':bars': bars,
+            ':now': datetime.utcnow().isoformat()
+        }
+    )
+
+
+def complete_backfill(table, ticker, bars):
+    """
+    Mark a ticker's backfill as done after storing its last page.
+    """
+    table.update_item(
+        Key=_key(ticker),
+        UpdateExpression='SET #status = :status, completedAt = :now REMOVE nextUrl ADD barsWritten :bars',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={
+            ':status': DONE,
+            ':bars': bars,
+            ':now': datetime.utcnow().isoformat()
+        }
+    )
+
+
+def record_failure(table, ticker, error):
+    """
+    Record a failed backfill attempt; the checkpoint keeps its cursor.
+
+    Returns:
+        int: Consecutive failures so far
+    """
+    return int(table.update_item(
+        Key=_key(ticker),
+        UpdateExpression='SET lastError = :error, updatedAt = :now ADD failures :one',
+        ExpressionAttributeValues={':error': str(error)[:500], ':one': 1, ':now': datetime.utcnow().isoformat()},
+        ReturnValues='UPDATED_NEW'
+    )['Attributes']['failures'])
@@ -0,0 +1,208 @@
+"""
+Compression and content-addressed offloading of large item attributes.
+
+Analysis items carry large text attributes (the prompt, with its JSON dump of
+all ticker data, and the raw model reply) that every read of the item pays
+for, and that push large portfolios toward the 400 KB item limit. Such fields
+are replaced by a `{field}Blob` map:
+
+- small fields are left alone
+- medium fields are compressed and kept inline:
+    {'codec': 'zlib', 'size': <raw bytes>, 'data': <Binary>}
+- large fields are compressed and moved to blob storage under their content hash:
+    {'codec': 'zlib', 'size': <raw bytes>, 'ref': 'sha256:<hex>'}
+
+resolve_field() reverses this lazily, only for callers that need the text.
+
+Blob storage is S3 (ANALYSIS_BLOB_BUCKET) or, for local runs, a directory
+(ANALYSIS_BLOB_DIR). zstd is used when BLOB_CODEC=zstd and the optional
+zstandard package is installed; zlib otherwise.
+"""
+
+import hashlib
+import os
+import zlib
+
+from src.utils.aws import lazy_client
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+ANALYSIS_BLOB_BUCKET = os.environ.get('ANALYSIS_BLOB_BUCKET')
+ANALYSIS_BLOB_DIR = os.environ.get('ANALYSIS_BLOB_DIR')
+BLOB_CODEC = os.environ.get('BLOB_CODEC', 'zlib')
+
+# Fields smaller than this are stored as plain strings
+COMPRESS_MIN_BYTES = int(os.environ.get('BLOB_COMPRESS_MIN_BYTES', '1024'))
+# Compressed fields larger than this go to blob storage (when configured)
+INLINE_MAX_BYTES = int(os.environ.get('BLOB_INLINE_MAX_BYTES', '16384'))
+
+BLOB_PREFIX = 'blobs/'
+REF_SCHEME = 'sha256:'
+
+
+def compress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstd codec requires the zstandard package')
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == 'zlib':
+        return zlib.compress(data, 9)
+    raise ValueError(f'Unknown blob codec: {codec}')
+
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstd codec requires the zstandard package')
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    raise ValueError(f'Unknown blob codec: {codec}')
+
+
+def default_codec():
+    if BLOB_CODEC == 'zstd' and zstandard is None:
+        print("WARNING: BLOB_CODEC=zstd but zstandard is not installed, using zlib")
+        return 'zlib'
+    return BLOB_CODEC
+
+
+def content_ref(data):
+    """
+    Content-hash reference for a blob.
+    """
+    return REF_SCHEME + hashlib.sha256(data).hexdigest()
+
+
+def blob_key(ref):
+    digest = ref[len(REF_SCHEME):]
+    return f'{BLOB_PREFIX}{digest[:2]}/{digest}'
+
+
+class S3BlobStore:
+    """
+    Blob storage in an S3 bucket.
+    """
+
+    def __init__(self, bucket, s3_client=None):
+        self.bucket = bucket
+        self.s3 = s3_client or lazy_client('s3')
+
+    def put_object(self, key, data):
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def get_object(self, key):
+        return self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    def put(self, data):
+        ref = content_ref(data)
+        self.put_object(blob_key(ref), data)
+        return ref
+
+    def get(self, ref):
+        return self.get_object(blob_key(ref))
+
+
+class LocalBlobStore:
+    """
+    Blob storage in a local directory, standing in for S3 in local runs.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def put_object(self, key, data):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def get_object(self, key):
+        with open(os.path.join(self.root, key), 'rb') as f:
+            return f.read()
+
+    def put(self, data):
+        ref = content_ref(data)
+        self.put_object(blob_key(ref), data)
+        return ref
+
+    def get(self, ref):
+        return self.get_object(blob_key(ref))
+
+
+def get_blob_store():
+    """
+    Blob store configured by the environment, or None to only compress inline.
+    """
+    if ANALYSIS_BLOB_BUCKET:
+        return S3BlobStore(ANALYSIS_BLOB_BUCKET)
+    if ANALYSIS_BLOB_DIR:
+        return LocalBlobStore(ANALYSIS_BLOB_DIR)
+    return None
+
+
+def offload_fields(item, fields, store):
+    """
+    Compress and, when large, offload text attributes of an item in place.
+
+    Args:
+        item (dict): DynamoDB item about to be written
+        fields (tuple): Names of string attributes to consider
+        store: Blob store, or None to keep everything inline
+
+    Returns:
+        dict: The same item
+    """
+    codec = default_codec()
+    for field in fields:
+        value = item.get(field)
+        if not isinstance(value, str):
+            continue
+        raw = value.encode('utf-8')
+        if len(raw) < COMPRESS_MIN_BYTES:
+            continue
+
+        compressed = compress(raw, codec)
+        blob = {'codec': codec, 'size': len(raw)}
+        if store is not None and len(compressed) > INLINE_MAX_BYTES:
+            blob['ref'] = store.put(compressed)
+        else:
+            blob['data'] = compressed
+        item[f'{field}Blob'] = blob
+        del item[field]
+    return item
+
+
+def resolve_field(item, field, store=None):
+    """
+    Get the text of an attribute that may have been compressed or offloaded.
+
+    Args:
+        item (dict): DynamoDB item
+        field (str): Attribute name
+        store: Blob store for offloaded fields (defaults to the configured one)
+
+    Returns:
+        str or None: The attribute text, or None if the item has no such field
+    """
+    if field in item:
+        return item[field]
+    blob = item.get(f'{field}Blob')
+    if not blob:
+        return None
+
+    if 'data' in blob:
+        data = blob['data']
+        # boto3 returns Binary wrappers for binary attributes
+        data = getattr(data, 'value', data)
+    else:
+        store = store or get_blob_store()
+        if store is None:
+            raise RuntimeError(f'{field} is offloaded to blob storage but no blob store is configured')
+        data = store.get(blob['ref'])
+        if content_ref(data) != blob['ref']:
+            raise ValueError(f"Blob {blob['ref']} failed its content hash check")
+    return decompress(data, blob['codec']).decode('utf-8')
@@ -0,0 +1,247 @@
+"""
+Circuit breaker with state shared across Lambda workers.
+
+Tracks consecutive failures of an upstream dependency (e.g. the XAI endpoint)
+in a single state record, so every concurrent worker sees the same state.
+After `failure_threshold` consecutive failures the circuit opens and callers
+fail fast until `reset_timeout` seconds have passed. Then exactly one worker
+is let through as a half-open probe: success closes the circuit, failure
+re-opens it.
+
+State is kept in the pipeline-state DynamoDB table (DynamoCircuitStore) or,
+for local runs and tests, in process memory (InMemoryCircuitStore). Updates
+use optimistic versioning so concurrent workers never overwrite each other.
+"""
+
+import time
+from decimal import Decimal
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Optimistic-concurrency retries before giving up on a state transition
+MAX_TRANSITION_ATTEMPTS = 5
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Circuit '{name}' is open, retry after {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class InMemoryCircuitStore:
+    """
+    Process-local circuit state store for local runs and tests.
+    """
+
+    def __init__(self):
+        self._states = {}
+
+    def load(self, name):
+        state = self._states.get(name)
+        return dict(state) if state else None
+
+    def save(self, name, state, expected_version):
+        current = self._states.get(name)
+        current_version = current['version'] if current else None
+        if current_version != expected_version:
+            return False
+        self._states[name] = dict(state)
+        return True
+
+
+class DynamoCircuitStore:
+    """
+    Circuit state store backed by the pipeline-state table (pk/sk keys).
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    @staticmethod
+    def _key(name):
+        return {'pk': f'circuit#{name}', 'sk': 'state'}
+
+    def load(self, name):
+        response = self.table.get_item(Key=self._key(name), ConsistentRead=True)
+        item = response.get('Item')
+        if not item:
+            return None
+        return {
+            'state': item['state'],
+            'failures': int(item.get('failures', 0)),
+            'openedAt': float(item.get('openedAt', 0)),
+            'probeUntil': float(item.get('probeUntil', 0)),
+            'version': int(item['version'])
+        }
+
+    def save(self, name, state, expected_version):
+        item = {
+            **self._key(name),
+            'state': state['state'],
+            'failures': state['failures'],
+            'openedAt': Decimal(str(state['openedAt'])),
+            'probeUntil': Decimal(str(state['probeUntil'])),
+            'version': state['version']
+        }
+        try:
+            if expected_version is None:
+                self.table.put_item(Item=item, ConditionExpression='attribute_not_exists(pk)')
+            else:
+                self.table.put_item(
+                    Item=item,
+                    ConditionExpression='#version = :expected',
+                    ExpressionAttributeNames={'#version': 'version'},
+                    ExpressionAttributeValues={':expected': expected_version}
+                )
+            return True
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Usage:
+        breaker.before_call()        # raises CircuitOpenError when open
+        try:
+            result = call_upstream()
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+    """
+
+    def __init__(self, name, store, failure_threshold=5, reset_timeout=300,
+                 probe_timeout=330, clock=time.time):
+        """
+        Args:
+            name (str): Name of the protected dependency
+            store: InMemoryCircuitStore or DynamoCircuitStore
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_timeout (int): Seconds to stay open before a half-open probe
+            probe_timeout (int): Seconds a probe may take before another worker
+                may take over (covers probes killed by a Lambda timeout)
+            clock (callable): Time source, overridable for tests
+        """
+        self.name = name
+        self.store = store
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+
+    def _load(self):
+        state = self.store.load(self.name)
+        if state is None:
+            return {'state': CLOSED, 'failures': 0, 'openedAt': 0, 'probeUntil': 0, 'version': None}
+        return state
+
+    def _transition(self, mutate):
+        """
+        Apply `mutate` to the current state with optimistic concurrency.
+
+        `mutate` receives a copy of the current state and returns the new state,
+        or None when no change is needed.
+
+        Returns:
+            tuple: (state after the call, True if this caller wrote it)
+        """
+        for _ in range(MAX_TRANSITION_ATTEMPTS):
+            current = self._load()
+            new_state = mutate(dict(current))
+            if new_state is None:
+                return current, False
+            expected_version = current['version']
+            new_state['version'] = (expected_version or 0) + 1
+            if self.store.save(self.name, new_state, expected_version):
+                return new_state, True
+        print(f"WARNING: circuit '{self.name}' state contended, giving up on transition")
+        return self._load(), False
+
+    def before_call(self):
+        """
+        Check whether a call may proceed.
+
+        Returns when the circuit is closed, or when this caller won the single
+        half-open probe.
+
+        Raises:
+            CircuitOpenError: If the call must fail fast
+        """
+        now = self.clock()
+
+        def mutate(state):
+            if state['state'] == CLOSED:
+                return None
+            if state['state'] == OPEN and now < state['openedAt'] + self.reset_timeout:
+                return None
+            if state['state'] == HALF_OPEN and now < state['probeUntil']:
+                return None
+            # Open long enough (or a previous probe went silent): become the probe
+            state['state'] = HALF_OPEN
+            state['probeUntil'] = now + self.probe_timeout
+            return state
+
+        state, acquired = self._transition(mutate)
+        if state['state'] == CLOSED:
+            return
+        if acquired:
+            print(f"Circuit '{self.name}' half-open, sending probe request")
+            return
+        raise CircuitOpenError(self.name, self.retry_after(state, now))
+
+    def record_success(self):
+        def mutate(state):
+            if state['state'] == CLOSED and state['failures'] == 0:
+                return None
+            return {'state': CLOSED, 'failures': 0, 'openedAt': 0, 'probeUntil': 0}
+
+        state, changed = self._transition(mutate)
+        if changed:
+            print(f"Circuit '{self.name}' closed")
+        return state
+
+    def record_failure(self):
+        """
+        Count a failed call, opening the circuit when the threshold is reached.
+
+        Returns:
+            dict: The circuit state after the failure was recorded
+        """
+        now = self.clock()
+
+        def mutate(state):
+            if state['state'] == OPEN:
+                return None
+            failures = state['failures'] + 1
+            if state['state'] == HALF_OPEN or failures >= self.failure_threshold:
+                return {'state': OPEN, 'failures': failures, 'openedAt': now, 'probeUntil': 0}
+            state['failures'] = failures
+            return state
+
+        state, changed = self._transition(mutate)
+        if changed and state['state'] == OPEN:
+            print(f"Circuit '{self.name}' opened after {state['failures']} consecutive failure(s)")
+        return state
+
+    def is_open(self, state=None):
+        state = state or self._load()
+        return state['state'] != CLOSED
+
+    def retry_after(self, state=None, now=None):
+        """
+        Seconds until the next call could be let through as a probe.
+        """
+        state = state or self._load()
+        now = self.clock() if now is None else now
+        if state['state'] == OPEN:
+            return max(1, int(state['openedAt'] + self.reset_timeout - now) + 1)
+        if state['state'] == HALF_OPEN:
+            return max(1, int(state['probeUntil'] - now) + 1)
+        return 0
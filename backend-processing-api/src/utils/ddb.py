@@ -0,0 +1,241 @@
+"""
+Thin data access on the low-level DynamoDB client, with a fast codec and
+compact record types for hot paths.
+
+boto3's Table resources deserialize every attribute through TypeDeserializer
+into dicts of Decimal, which the analytics then turn back into floats. Here
+items come straight from the low-level client (boto3.client('dynamodb')) in
+wire format ({'S': ...}, {'N': ...}) and are decoded in one pass:
+
+- decode_item / decode_value: whole items, numbers as float by default (or
+  any callable taking the number's string, e.g. Decimal)
+- encode_value / encode_item: the reverse, for writes through the client
+- Position, TickerSnapshot, Analysis: slotted dataclasses built directly
+  from wire-format items with only the attributes the hot paths use, so a
+  scan of hundreds of thousands of positions holds small objects instead of
+  dicts of Decimal
+- scan_items / query_items: paginate a scan or query, yielding raw items
+
+Usage:
+    client = boto3.client('dynamodb')
+    for item in scan_items(client, TableName=POSITIONS_TABLE, ProjectionExpression=Position.PROJECTION):
+        position = Position.from_item(item)
+
+benchmarks/bench_ddb_codec.py compares this path with the resource path.
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+
+
+# --- Codec -----------------------------------------------------------------
+
+def decode_value(value, number=float):
+    """
+    Python value of a wire-format attribute value.
+
+    Args:
+        value (dict): e.g. {'N': '1.5'}
+        number (callable): Converts a number's string (float, int, Decimal)
+
+    Returns:
+        str, number, bool, None, bytes, list, dict or set
+    """
+    (kind, data), = value.items()
+    if kind == 'S':
+        return data
+    if kind == 'N':
+        return number(data)
+    if kind == 'BOOL':
+        return data
+    if kind == 'NULL':
+        return None
+    if kind == 'M':
+        return {k: decode_value(v, number) for k, v in data.items()}
+    if kind == 'L':
+        return [decode_value(v, number) for v in data]
+    if kind == 'SS':
+        return set(data)
+    if kind == 'NS':
+        return {number(v) for v in data}
+    if kind == 'B':
+        return data
+    if kind == 'BS':
+        return set(data)
+    raise ValueError(f'Unknown DynamoDB type: {kind}')
+
+
+def decode_item(item, number=float):
+    """
+    Plain dict of a wire-format item.
+    """
+    return {name: decode_value(value, number) for name, value in item.items()}
+
+
+def encode_value(value):
+    """
+    Wire-format attribute value of a Python value.
+    """
+    if value is None:
+        return {'NULL': True}
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, str):
+        return {'S': value}
+    if isinstance(value, (int, float, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, (bytes, bytearray)):
+        return {'B': bytes(value)}
+    if isinstance(value, dict):
+        return {'M': {k: encode_value(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {'L': [encode_value(v) for v in value]}
+    if isinstance(value, (set, frozenset)):
+        if all(isinstance(v, str) for v in value):
+            return {'SS': list(value)}
+        if all(isinstance(v, (bytes, bytearray)) for v in value):
+            return {'BS': [bytes(v) for v in value]}
+        if all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in value):
+            return {'NS': [str(v) for v in value]}
+        raise TypeError('DynamoDB sets hold only strings, only numbers or only binary values')
+    raise TypeError(f'Cannot encode {type(value).__name__} for DynamoDB')
+
+
+def encode_item(item):
+    """
+    Wire-format item of a dict, leaving out None values.
+    """
+    return {name: encode_value(value) for name, value in item.items() if value is not None}
+
+
+def _string(item, name):
+    value = item.get(name)
+    return value['S'] if value is not None and 'S' in value else None
+
+
+def _number(item, name, number=float):
+    value = item.get(name)
+    return number(value['N']) if value is not None and 'N' in value else None
+
+
+# --- Records ---------------------------------------------------------------
+
+@dataclass(slots=True)
+class Position:
+    """
+    The valuation inputs of one portfolio position.
+    """
+    PROJECTION = 'id, portfolioId, ticker, shares, costBasis, currentPrice, marketValue, unrealizedPL'
+
+    id: str
+    portfolio_id: str = None
+    ticker: str = None
+    shares: float = None
+    cost_basis: float = None
+    current_price: float = None
+    market_value: float = None
+    unrealized_pl: float = None
+
+    @classmethod
+    def from_item(cls, item, number=float):
+        """
+        Position of a wire-format item; pass number=Decimal for exact values.
+        """
+        return cls(
+            _string(item, 'id'),
+            _string(item, 'portfolioId'),
+            _string(item, 'ticker'),
+            _number(item, 'shares', number),
+            _number(item, 'costBasis', number),
+            _number(item, 'currentPrice', number),
+            _number(item, 'marketValue', number),
+            _number(item, 'unrealizedPL', number)
+        )
+
+
+@dataclass(slots=True)
+class TickerSnapshot:
+    """
+    One ticker-data record.
+    """
+    PROJECTION = 'ticker, #ts, asOf, price, high, low, volume, rsi, ma50'
+    NAMES = {'#ts': 'timestamp'}
+
+    ticker: str
+    timestamp: str = None
+    as_of: str = None
+    price: float = None
+    high: float = None
+    low: float = None
+    volume: float = None
+    rsi: float = None
+    ma50: float = None
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(
+            _string(item, 'ticker'),
+            _string(item, 'timestamp'),
+            _string(item, 'asOf'),
+            _number(item, 'price'),
+            _number(item, 'high'),
+            _number(item, 'low'),
+            _number(item, 'volume'),
+            _number(item, 'rsi'),
+            _number(item, 'ma50')
+        )
+
+
+@dataclass(slots=True)
+class Analysis:
+    """
+    The scoring fields of one stored portfolio analysis.
+    """
+    PROJECTION = '#p, #ts, parsed_data, dataAsOf'
+    NAMES = {'#p': 'portfolio', '#ts': 'timestamp'}
+
+    portfolio: str
+    timestamp: str = None
+    data_as_of: str = None
+    parsed_data: str = None
+
+    @classmethod
+    def from_item(cls, item):
+        return cls(
+            _string(item, 'portfolio'),
+            _string(item, 'timestamp'),
+            _string(item, 'dataAsOf'),
+            _string(item, 'parsed_data')
+        )
+
+    @property
+    def is_analysis(self):
+        """
+        False for pointer, error and risk partitions (`{portfolio}#...`).
+        """
+        return '#' not in self.portfolio
+
+
+# --- Pagination ------------------------------------------------------------
+
+def _paginate(operation, kwargs):
+    response = operation(**kwargs)
+    while True:
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        response = operation(ExclusiveStartKey=response['LastEvaluatedKey'], **kwargs)
+
+
+def scan_items(client, **kwargs):
+    """
+    Every wire-format item of a scan (kwargs as for client.scan).
+    """
+    return _paginate(client.scan, kwargs)
+
+
+def query_items(client, **kwargs):
+    """
+    Every wire-format item of a query (kwargs as for client.query).
+    """
+    return _paginate(client.query, kwargs)
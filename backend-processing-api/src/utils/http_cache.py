@@ -0,0 +1,151 @@
+"""
+Response cache for market data API calls.
+
+Reruns of processTicker (retries, redeliveries, manual kicks, a second
+stage) ask Polygon for responses that cannot have changed, and symbols
+Polygon has no data for are asked about every night. ResponseCache keeps
+responses keyed on (endpoint, ticker, params):
+
+- in memory, for the life of a warm container
+- optionally shared through a DynamoDB table with pk/sk keys and an
+  expiresAt TTL attribute (the pipeline-state table), under partition
+  `httpcache` with sk `{endpoint}#{ticker}#{hash of params}`
+
+Callers choose each response's expiry (see polygon.bar_expiry). Empty
+responses are cached as negative entries: the first for
+NEGATIVE_BASE_SECONDS, doubling with every further empty response up to
+NEGATIVE_MAX_SECONDS, so a delisted symbol ends up being asked about
+monthly. A response with data clears the count.
+
+Usage:
+    cache = ResponseCache(state_table)
+    entry = cache.lookup('aggs', ticker, params)
+    if entry is None:
+        data = ...fetch...
+        cache.store('aggs', ticker, params, data, expires_at)  # or cache.store_empty(...)
+    elif entry['empty']:
+        ...known to have no data
+"""
+
+import hashlib
+import json
+import time
+
+CACHE_PARTITION = 'httpcache'
+
+# Expiry of the first empty response for a key; doubles with each further one
+NEGATIVE_BASE_SECONDS = 6 * 3600
+NEGATIVE_MAX_SECONDS = 30 * 86400
+# Shared entries are kept this long after they expire, so negative entries
+# remember their count of empty responses between attempts
+RETAIN_SECONDS = 2 * NEGATIVE_MAX_SECONDS
+
+# Parameters that never belong in a key
+SECRET_PARAMS = ('apiKey',)
+
+
+def cache_key(endpoint, ticker, params):
+    """
+    Stable key of a request, ignoring secrets and parameter order.
+    """
+    public = {k: v for k, v in sorted((params or {}).items()) if k not in SECRET_PARAMS}
+    digest = hashlib.sha256(json.dumps(public, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f'{endpoint}#{ticker}#{digest}'
+
+
+def negative_ttl(misses):
+    """
+    Seconds a key with this many consecutive empty responses stays negative.
+    """
+    return min(NEGATIVE_BASE_SECONDS * 2 ** (max(misses, 1) - 1), NEGATIVE_MAX_SECONDS)
+
+
+class ResponseCache:
+    """
+    Two-level cache of JSON responses: process memory, then an optional table.
+
+    Entries are dicts with `data` (the response, None for negative entries),
+    `empty`, `misses` and `validUntil` (epoch seconds).
+    """
+
+    def __init__(self, table=None, clock=time.time):
+        self.table = table
+        self.clock = clock
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, key):
+        if key in self.entries:
+            return self.entries[key]
+        if self.table is None:
+            return None
+        try:
+            item = self.table.get_item(Key={'pk': CACHE_PARTITION, 'sk': key}).get('Item')
+        except Exception as e:
+            print(f"Response cache read failed for {key}: {e}")
+            return None
+        if not item:
+            return None
+        entry = {
+            'data': json.loads(item['body']) if item.get('body') else None,
+            'empty': bool(item.get('empty')),
+            'misses': int(item.get('misses', 0)),
+            'validUntil': float(item['validUntil'])
+        }
+        self.entries[key] = entry
+        return entry
+
+    def _save(self, key, entry):
+        self.entries[key] = entry
+        if self.table is None:
+            return
+        item = {
+            'pk': CACHE_PARTITION,
+            'sk': key,
+            'empty': entry['empty'],
+            'misses': entry['misses'],
+            'validUntil': int(entry['validUntil']),
+            'expiresAt': int(entry['validUntil'] + RETAIN_SECONDS)
+        }
+        if entry['data'] is not None:
+            item['body'] = json.dumps(entry['data'], separators=(',', ':'))
+        try:
+            self.table.put_item(Item=item)
+        except Exception as e:
+            print(f"Response cache write failed for {key}: {e}")
+
+    def lookup(self, endpoint, ticker, params):
+        """
+        The current entry for a request.
+
+        Returns:
+            dict or None: The entry, or None if the request has to be made
+        """
+        entry = self._load(cache_key(endpoint, ticker, params))
+        if entry is None or entry['validUntil'] <= self.clock():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, endpoint, ticker, params, data, valid_until):
+        """
+        Cache a response with data until an expiry (epoch seconds).
+        """
+        entry = {'data': data, 'empty': False, 'misses': 0, 'validUntil': valid_until}
+        self._save(cache_key(endpoint, ticker, params), entry)
+
+    def store_empty(self, endpoint, ticker, params):
+        """
+        Cache an empty response, backing off exponentially.
+
+        Returns:
+            float: Epoch seconds until which the request is not made again
+        """
+        key = cache_key(endpoint, ticker, params)
+        previous = self._load(key)
+        misses = (previous['misses'] if previous and previous['empty'] else 0) + 1
+        valid_until = self.clock() + negative_ttl(misses)
+        self._save(key, {'data': None, 'empty': True, 'misses': misses, 'validUntil': valid_until})
+        return valid_until
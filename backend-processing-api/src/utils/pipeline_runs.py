@@ -0,0 +1,492 @@
+"""
+Run-scoped pipeline state kept in the pipeline-state table.
+
+Each nightly ingestion run is identified by its UTC date (run_id), which
+processTickers stamps on every ticker message. Records for a run live under
+partition `run#{run_id}`:
+
+- dirty#{ticker}: the ticker received new market data during the run
+- ticker#{ticker}: the ticker was dispatched; holds the count and aggregate
+  marketValue of the positions referencing it and whether a legacy portfolio
+  lists it (used to order refreshes) and, once processed, a landed flag
+- members#{ticker}#{shard}#{page}: up to REGISTRATION_PAGE_SIZE of the
+  portfolio and position IDs one dispatcher shard found referencing the
+  ticker, so no item grows with the size of the book
+- portfolio#{portfolio_id}: outstanding (not yet landed) registrations of the
+  portfolio's tickers (one per members page listing it), and how many of
+  its landed ones were dirty
+- summary: outstanding ticker count for the whole run, dispatcher shards still
+  running (shardsPending), when enqueueing started and per-shard totals
+- shard#{shard}: the dispatcher shard finished (written once per shard)
+- queued#{portfolio_id}: the portfolio was queued for analysis in this run
+
+Together the counters form a completion barrier: process_ticker calls
+ticker_landed() when it finishes a ticker, which reports the portfolios whose
+last ticker just landed and whether the whole run is complete, so analysis
+can start as soon as its inputs are fresh. The run is only complete once every
+dispatcher shard has finished registering its tickers.
+
+Records expire after RUN_STATE_TTL_DAYS through the table's expiresAt TTL.
+
+Also provides the fingerprints used to decide whether a portfolio's analysis
+inputs changed since it was last analyzed.
+"""
+
+import hashlib
+import time
+from datetime import datetime
+
+from src.utils.aws import Key
+
+RUN_STATE_TTL_DAYS = 7
+
+# Portfolio and position IDs per members page; 1000 of each keeps a page
+# around 100 KB, well within DynamoDB's 400 KB item limit
+REGISTRATION_PAGE_SIZE = 1000
+
+DIRTY_PREFIX = 'dirty#'
+TICKER_PREFIX = 'ticker#'
+MEMBERS_PREFIX = 'members#'
+PORTFOLIO_PREFIX = 'portfolio#'
+QUEUED_PREFIX = 'queued#'
+SHARD_PREFIX = 'shard#'
+SUMMARY_SK = 'summary'
+
+
+def current_run_id(now=None):
+    """
+    Run ID for the ingestion run in progress (its UTC date).
+    """
+    return (now or datetime.utcnow()).strftime('%Y-%m-%d')
+
+
+def run_partition(run_id):
+    return f'run#{run_id}'
+
+
+def expires_at(days=RUN_STATE_TTL_DAYS):
+    return int(time.time()) + days * 86400
+
+
+def _query_all(table, **query_kwargs):
+    """
+    Every item of a query, following pagination.
+    """
+    response = table.query(**query_kwargs)
+    yield from response['Items']
+    while 'LastEvaluatedKey' in response:
+        response = table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **query_kwargs)
+        yield from response['Items']
+
+
+def mark_ticker_dirty(table, run_id, ticker, as_of):
+    """
+    Record that a ticker received new market data during a run.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        run_id (str): The ingestion run ID
+        ticker (str): The ticker symbol
+        as_of (str): Timestamp of the new data
+    """
+    table.put_item(
+        Item={
+            'pk': run_partition(run_id),
+            'sk': f'{DIRTY_PREFIX}{ticker}',
+            'asOf': as_of,
+            'expiresAt': expires_at()
+        }
+    )
+
+
+def get_dirty_tickers(table, run_id):
+    """
+    Get the tickers that received new market data during a run.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        run_id (str): The ingestion run ID
+
+    Returns:
+        set: Ticker symbols
+    """
+    query_kwargs = {
+        'KeyConditionExpression': (
+            Key('pk').eq(run_partition(run_id))
+            & Key('sk').begins_with(DIRTY_PREFIX)
+        ),
+        'ProjectionExpression': 'sk'
+    }
+    return {item['sk'][len(DIRTY_PREFIX):] for item in _query_all(table, **query_kwargs)}
+
+
+def _add_outstanding(table, run_id, sk, delta, extra_dirty=0):
+    """
+    Atomically adjust a run counter item.
+
+    Returns:
+        dict: The counter's attributes after the update
+    """
+    return table.update_item(
+        Key={'pk': run_partition(run_id), 'sk': sk},
+        UpdateExpression='ADD outstanding :delta, dirty :dirty SET expiresAt = :expires',
+        ExpressionAttributeValues={':delta': delta, ':dirty': extra_dirty, ':expires': expires_at()},
+        ReturnValues='ALL_NEW'
+    )['Attributes']
+
+
+def _members_prefix(ticker):
+    # Tickers never contain '#', so the prefix matches this ticker only
+    return f'{MEMBERS_PREFIX}{ticker}#'
+
+
+def _pages(ids):
+    ids = sorted(ids)
+    return [ids[i:i + REGISTRATION_PAGE_SIZE] for i in range(0, len(ids), REGISTRATION_PAGE_SIZE)]
+
+
+def register_ticker(table, run_id, ticker, portfolio_ids, position_ids, position_values=None, shard=0,
+                    legacy=False):
+    """
+    Register a dispatched ticker with the run's completion barrier.
+
+    Idempotent and safe to call concurrently for the same ticker from several
+    dispatcher shards: the ticker is counted once per run, and the IDs each
+    shard found are stored on that shard's members pages, counted the first
+    time they are added to a page.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        run_id (str): The ingestion run ID
+        ticker (str): The ticker symbol
+        portfolio_ids (iterable): Portfolios holding the ticker
+        position_ids (iterable): Positions referencing the ticker
+        position_values (dict): Optional {position_id: marketValue (Decimal)}
+        shard (int): Dispatcher shard the IDs were read from
+        legacy (bool): Whether a legacy api/ portfolio lists the ticker
+
+    Returns:
+        bool: True if this call registered the ticker for the first time
+    """
+    expression = 'SET expiresAt = :expires, registered = :true'
+    if legacy:
+        expression += ', legacy = :true'
+    old = table.update_item(
+        Key={'pk': run_partition(run_id), 'sk': f'{TICKER_PREFIX}{ticker}'},
+        UpdateExpression=expression,
+        ExpressionAttributeValues={':expires': expires_at(), ':true': True},
+        ReturnValues='ALL_OLD'
+    ).get('Attributes', {})
+
+    is_new = not old.get('registered')
+    if is_new:
+        _add_outstanding(table, run_id, SUMMARY_SK, 1)
+
+    portfolio_pages = _pages(set(portfolio_ids))
+    position_pages = _pages(set(position_ids))
+    new_positions = set()
+    for page in range(max(len(portfolio_pages), len(position_pages))):
+        portfolios = set(portfolio_pages[page]) if page < len(portfolio_pages) else set()
+        positions = set(position_pages[page]) if page < len(position_pages) else set()
+        adds = []
+        values = {':expires': expires_at()}
+        # DynamoDB rejects empty sets
+        if portfolios:
+            adds.append('portfolioIds :portfolios')
+            values[':portfolios'] = portfolios
+        if positions:
+            adds.append('positionIds :positions')
+            values[':positions'] = positions
+        old_page = table.update_item(
+            Key={'pk': run_partition(run_id), 'sk': f'{_members_prefix(ticker)}{shard}#{page}'},
+            UpdateExpression='SET expiresAt = :expires ADD ' + ', '.join(adds),
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_OLD'
+        ).get('Attributes', {})
+        # Landing decrements each portfolio once per page listing it
+        for portfolio_id in portfolios - set(old_page.get('portfolioIds', set())):
+            _add_outstanding(table, run_id, f'{PORTFOLIO_PREFIX}{portfolio_id}', 1)
+        # Each position lives in one shard, so only a retried shard re-registers it
+        new_positions |= positions - set(old_page.get('positionIds', set()))
+
+    if new_positions:
+        market_value = sum((position_values or {}).get(pid, 0) for pid in new_positions)
+        table.update_item(
+            Key={'pk': run_partition(run_id), 'sk': f'{TICKER_PREFIX}{ticker}'},
+            UpdateExpression='ADD positionCount :count, marketValue :value',
+            ExpressionAttributeValues={':count': len(new_positions), ':value': market_value}
+        )
+    return is_new
+
+
+def get_run_tickers(table, run_id):
+    """
+    Get every ticker registered for a run with its priority inputs.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        run_id (str): The ingestion run ID
+
+    Returns:
+        list: Dicts with ticker, positionCount, marketValue and legacy
+    """
+    query_kwargs = {
+        'KeyConditionExpression': (
+            Key('pk').eq(run_partition(run_id))
+            & Key('sk').begins_with(TICKER_PREFIX)
+        ),
+        'ProjectionExpression': 'sk, positionCount, marketValue, legacy'
+    }
+    return [
+        {
+            'ticker': item['sk'][len(TICKER_PREFIX):],
+            'positionCount': int(item.get('positionCount', 0)),
+            'marketValue': item.get('marketValue', 0),
+            'legacy': bool(item.get('legacy'))
+        }
+        for item in _query_all(table, **query_kwargs)
+    ]
+
+
+def get_registered_positions(table, run_id, ticker):
+    """
+    Get the positions registered for a ticker in a run.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        run_id (str): The ingestion run ID
+        ticker (str): The ticker symbol
+
+    Returns:
+        list: Sorted position IDs from every shard's members pages
+    """
+    items = _query_all(
+        table,
+        KeyConditionExpression=(
+            Key('pk').eq(run_partition(run_id))
+            & Key('sk').begins_with(_members_prefix(ticker))
+        ),
+        ProjectionExpression='positionIds',
+        ConsistentRead=True
+    )
+    return sorted({pid for item in items for pid in item.get('positionIds', set())})
+
+
+def get_run_portfolio_tickers(table, run_id):
+    """
+    Map every portfolio registered for a run to the tickers it holds.
+
+    Built from the run's members pages, so readers need not scan the
+    positions table to learn what each portfolio holds.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        run_id (str): The ingestion run ID
+
+    Returns:
+        dict: {portfolio_id: set of tickers}, empty if the run registered no portfolios
+    """
+    items = _query_all(
+        table,
+        KeyConditionExpression=(
+            Key('pk').eq(run_partition(run_id))
+            & Key('sk').begins_with(MEMBERS_PREFIX)
+        ),
+        ProjectionExpression='sk, portfolioIds'
+    )
+    portfolio_tickers = {}
+    for item in items:
+        ticker = item['sk'][len(MEMBERS_PREFIX):].split('#', 1)[0]
+        for portfolio_id in item.get('portfolioIds', set()):
+            portfolio_tickers.setdefault(portfolio_id, set()).add(ticker)
+    return portfolio_tickers
+
+
+def ticker_landed(table, run_id, ticker, dirty):
+    """
+    Report that a registered ticker finished processing for a run.
+
+    Only the first report for a ticker counts, so SQS redeliveries cannot
+    release the barrier early.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        run_id (str): The ingestion run ID
+        ticker (str): The ticker symbol
+        dirty (bool): Whether the ticker received new data
+
+    Returns:
+        tuple: (list of portfolio IDs whose last outstanding ticker this was and
+                that hold at least one dirty ticker, True if the run is complete)
+    """
+    try:
+        table.update_item(
+            Key={'pk': run_partition(run_id), 'sk': f'{TICKER_PREFIX}{ticker}'},
+            UpdateExpression='SET landed = :true',
+            ConditionExpression='attribute_exists(registered) AND attribute_not_exists(landed)',
+            ExpressionAttributeValues={':true': True}
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Ticker {ticker} not registered for run {run_id} or already landed")
+        return [], False
+
+    pages = _query_all(
+        table,
+        KeyConditionExpression=(
+            Key('pk').eq(run_partition(run_id))
+            & Key('sk').begins_with(_members_prefix(ticker))
+        ),
+        ProjectionExpression='portfolioIds',
+        ConsistentRead=True
+    )
+    ready = []
+    for page in pages:
+        for portfolio_id in page.get('portfolioIds', set()):
+            counter = _add_outstanding(table, run_id, f'{PORTFOLIO_PREFIX}{portfolio_id}', -1, 1 if dirty else 0)
+            if counter['outstanding'] <= 0 and counter['dirty'] > 0:
+                ready.append(portfolio_id)
+
+    summary = _add_outstanding(table, run_id, SUMMARY_SK, -1)
+    return ready, summary['outstanding'] <= 0 and summary.get('shardsPending', 0) <= 0
+
+
+def claim_analysis(table, run_id, portfolio_id):
+    """
+    Claim the right to queue a portfolio's analysis for a run.
+
+    Returns:
+        bool: True for the first caller only
+    """
+    try:
+        table.put_item(
+            Item={
+                'pk': run_partition(run_id),
+                'sk': f'{QUEUED_PREFIX}{portfolio_id}',
+                'expiresAt': expires_at()
+            },
+            ConditionExpression='attribute_not_exists(sk)'
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def start_dispatch(table, run_id, total_shards):
+    """
+    Record that a run's ticker dispatch was split into shards.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        run_id (str): The ingestion run ID
+        total_shards (int): Number of dispatcher shards about to start
+
+    Returns:
+        bool: False if the run was already dispatched
+    """
+    try:
+        table.update_item(
+            Key={'pk': run_partition(run_id), 'sk': SUMMARY_SK},
+            UpdateExpression='ADD shardsPending :shards, outstanding :zero SET shardsTotal = :shards, expiresAt = :expires',
+            ConditionExpression='attribute_not_exists(shardsTotal)',
+            ExpressionAttributeValues={':shards': total_shards, ':zero': 0, ':expires': expires_at()}
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def start_enqueue(table, run_id, now=None):
+    """
+    Record when the run's tickers started being enqueued.
+
+    The first call wins, so continuations of the enqueue schedule every
+    ticker relative to the same start.
+
+    Returns:
+        int: Epoch seconds the enqueue started
+    """
+    now = int(now if now is not None else time.time())
+    response = table.update_item(
+        Key={'pk': run_partition(run_id), 'sk': SUMMARY_SK},
+        UpdateExpression='SET enqueueStartedAt = if_not_exists(enqueueStartedAt, :now), expiresAt = :expires',
+        ExpressionAttributeValues={':now': now, ':expires': expires_at()},
+        ReturnValues='ALL_NEW'
+    )
+    return int(response['Attributes']['enqueueStartedAt'])
+
+
+def add_run_totals(table, run_id, totals):
+    """
+    Add integer totals (e.g. messagesSent) to the run summary.
+    """
+    table.update_item(
+        Key={'pk': run_partition(run_id), 'sk': SUMMARY_SK},
+        UpdateExpression='ADD ' + ', '.join(f'{name} :{name}' for name in totals),
+        ExpressionAttributeValues={f':{name}': value for name, value in totals.items()}
+    )
+
+
+def finish_shard(table, run_id, shard, stats):
+    """
+    Report a dispatcher shard's results to the run summary.
+
+    Idempotent per shard, so a retried shard invocation is only counted once.
+
+    Args:
+        table: boto3 pipeline-state Table resource
+        run_id (str): The ingestion run ID
+        shard (int): The shard number
+        stats (dict): Integer totals to add to the summary (e.g. positionsScanned)
+
+    Returns:
+        bool: True if this was the last shard to finish
+    """
+    try:
+        table.put_item(
+            Item={
+                'pk': run_partition(run_id),
+                'sk': f'{SHARD_PREFIX}{shard}',
+                'expiresAt': expires_at(),
+                **stats
+            },
+            ConditionExpression='attribute_not_exists(sk)'
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f"Shard {shard} of run {run_id} already reported")
+        return False
+
+    adds = ', '.join(f'{name} :{name}' for name in stats)
+    values = {f':{name}': value for name, value in stats.items()}
+    values.update({':done': -1, ':expires': expires_at()})
+    summary = table.update_item(
+        Key={'pk': run_partition(run_id), 'sk': SUMMARY_SK},
+        UpdateExpression=f"ADD shardsPending :done{', ' + adds if adds else ''} SET expiresAt = :expires",
+        ExpressionAttributeValues=values,
+        ReturnValues='ALL_NEW'
+    )['Attributes']
+    return summary['shardsPending'] <= 0
+
+
+def _digest(lines):
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()[:32]
+
+
+def positions_fingerprint(tickers):
+    """
+    Fingerprint of a portfolio's position list (the set of tickers it holds).
+    """
+    return _digest(sorted(set(tickers)))
+
+
+def input_fingerprint(ticker_as_of, model):
+    """
+    Fingerprint of everything an analysis was computed from.
+
+    Args:
+        ticker_as_of (dict): {ticker: asOf of the ticker data used}
+        model (str): Model name
+
+    Returns:
+        str: Hex digest
+    """
+    return _digest([model] + [f'{ticker}={as_of}' for ticker, as_of in sorted(ticker_as_of.items())])
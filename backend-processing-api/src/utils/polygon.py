@@ -0,0 +1,136 @@
+"""
+Polygon.io helpers shared by the handlers that call it.
+
+- get_ticker_type: maps our ticker symbols to Polygon's (indices are
+  `^`-prefixed here and `I:` there, crypto pairs are `X:`)
+- aggs_url: daily range aggregates endpoint for a ticker
+- RateLimiter: spaces requests made from several threads to stay inside the
+  plan's per-minute request budget
+- bar_expiry: until when a response whose latest bar is a given day stays current
+
+POLYGON_BASE_URL points the handlers at another server, e.g. the fake
+Polygon of tests/harness/.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+POLYGON_BASE_URL = os.environ.get('POLYGON_BASE_URL', 'https://api.polygon.io')
+
+# US session close (4 PM ET) in UTC, taking the later EST offset so it is never early
+SESSION_CLOSE_UTC_HOUR = 21
+# Time Polygon takes to publish a closed session's daily bar
+BAR_SETTLE_MINUTES = 60
+# Shortest validity of a response, e.g. while its latest bar is still forming
+MIN_BAR_TTL_SECONDS = 15 * 60
+
+
+def get_ticker_type(ticker):
+    """
+    Determine the asset type and format the ticker for Polygon API.
+
+    Args:
+        ticker (str): The ticker symbol
+
+    Returns:
+        tuple: (asset_type, formatted_ticker)
+    """
+    if ticker.startswith('^'):
+        return 'index', f'I:{ticker[1:]}'
+    elif '-USD' in ticker:
+        return 'crypto', f'X:{ticker}'
+    else:
+        return 'stock', ticker
+
+
+def aggs_url(ticker, from_str, to_str):
+    """
+    URL of the daily range aggregates of a ticker between two dates (YYYY-MM-DD).
+    """
+    ttype, pticker = get_ticker_type(ticker)
+    version = 'v3' if ttype == 'crypto' else 'v2'
+    return f'{POLYGON_BASE_URL}/{version}/aggs/ticker/{pticker}/range/1/day/{from_str}/{to_str}'
+
+
+def _session_close(day, asset_type):
+    """
+    When the daily bar of a day is final (session close plus settle time), in UTC.
+    """
+    midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    if asset_type == 'crypto':
+        # Crypto bars cover the UTC day
+        close = midnight + timedelta(days=1)
+    else:
+        close = midnight + timedelta(hours=SESSION_CLOSE_UTC_HOUR)
+    return close + timedelta(minutes=BAR_SETTLE_MINUTES)
+
+
+def _next_session(day, asset_type):
+    day += timedelta(days=1)
+    if asset_type != 'crypto':
+        # Weekends only: a holiday just means one early refetch
+        while day.weekday() >= 5:
+            day += timedelta(days=1)
+    return day
+
+
+def bar_expiry(bar_timestamp_ms, asset_type, now=None):
+    """
+    Epoch seconds until which a response ending with a daily bar stays current.
+
+    A finished bar is only superseded by the next session's bar, so the
+    response is valid until that session closes. A bar whose own session has
+    not closed yet is still changing and gets MIN_BAR_TTL_SECONDS.
+
+    Args:
+        bar_timestamp_ms (int): Polygon bar timestamp (`t`, ms since epoch)
+        asset_type (str): From get_ticker_type
+        now (float): Epoch seconds (default: the current time)
+
+    Returns:
+        float: Expiry in epoch seconds
+    """
+    now = time.time() if now is None else now
+    day = datetime.fromtimestamp(bar_timestamp_ms / 1000, tz=timezone.utc).date()
+    if _session_close(day, asset_type).timestamp() > now:
+        return now + MIN_BAR_TTL_SECONDS
+    expiry = _session_close(_next_session(day, asset_type), asset_type).timestamp()
+    return max(expiry, now + MIN_BAR_TTL_SECONDS)
+
+
+class RateLimiter:
+    """
+    Thread-safe request spacing for a per-minute budget.
+
+    Usage:
+        limiter = RateLimiter(5)
+        limiter.acquire()  # blocks until the next request slot
+        requests.get(...)
+    """
+
+    def __init__(self, requests_per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60.0 / requests_per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def acquire(self):
+        """
+        Wait for and take the next request slot.
+        """
+        with self.lock:
+            now = self.clock()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            self.sleep(slot - now)
+
+    def penalize(self, seconds):
+        """
+        Push every later slot back, e.g. after a 429 response.
+        """
+        with self.lock:
+            self.next_slot = max(self.next_slot, self.clock() + seconds)
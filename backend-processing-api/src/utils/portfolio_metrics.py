@@ -0,0 +1,184 @@
+"""
+Per-portfolio aggregates and daily value history in the portfolio-metrics table.
+
+Portfolio totals used to be recomputed by summing every position on each
+read, and nothing recorded a portfolio's value over time. Instead, whoever
+reprices a position applies the change in its valuation as an atomic ADD to
+the portfolio's aggregate, and keeps one snapshot row per day. Items live
+under partition key portfolioId:
+
+- AGG: running marketValue, unrealizedPL and costBasis of the portfolio's
+  priced positions, with a revision counter bumped by every change
+- DAY#{YYYY-MM-DD}: the aggregate as it stood at the end of that market date
+
+A portfolio summary is then a single GetItem and a value-history chart a
+Query on the DAY# range.
+
+Aggregates only see the price updates made by the pipeline; positions
+added, edited or deleted through the portfolio API are folded in when
+revaluePositions rebuilds every aggregate from the positions table each
+night (set_aggregate).
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+from src.utils.aws import Key
+
+AGGREGATE_SK = 'AGG'
+DAY_PREFIX = 'DAY#'
+
+ZERO = Decimal('0')
+
+
+def snapshot_sk(date):
+    """
+    Sort key of a portfolio's snapshot for a date (YYYY-MM-DD).
+    """
+    return f'{DAY_PREFIX}{date}'
+
+
+def position_delta(old, market_value, unrealized_pl):
+    """
+    Change in a position's contribution to its portfolio aggregate.
+
+    Args:
+        old (dict): The position's previous marketValue and unrealizedPL
+                    (missing if it was never priced)
+        market_value (Decimal): New market value
+        unrealized_pl (Decimal): New unrealized P&L
+
+    Returns:
+        tuple: (market value delta, unrealized P&L delta, cost basis delta)
+    """
+    old_value = old.get('marketValue')
+    old_pl = old.get('unrealizedPL')
+    if old_value is None or old_pl is None:
+        # Not counted in the aggregate yet
+        old_value = old_pl = ZERO
+        old_cost = ZERO
+    else:
+        old_cost = old_value - old_pl
+    value_delta = market_value - old_value
+    pl_delta = unrealized_pl - old_pl
+    cost_delta = (market_value - unrealized_pl) - old_cost
+    return value_delta, pl_delta, cost_delta
+
+
+def apply_position_delta(table, portfolio_id, value_delta, pl_delta, cost_delta, now=None):
+    """
+    Atomically add a position's valuation change to its portfolio aggregate.
+
+    Args:
+        table: boto3 portfolio-metrics Table resource
+        portfolio_id (str): The portfolio ID
+        value_delta (Decimal): Change in market value
+        pl_delta (Decimal): Change in unrealized P&L
+        cost_delta (Decimal): Change in priced cost basis
+
+    Returns:
+        dict: The aggregate after the change
+    """
+    return table.update_item(
+        Key={'portfolioId': portfolio_id, 'sk': AGGREGATE_SK},
+        UpdateExpression='ADD marketValue :mv, unrealizedPL :pl, costBasis :cb, revision :one '
+                         'SET updatedAt = :now',
+        ExpressionAttributeValues={
+            ':mv': value_delta,
+            ':pl': pl_delta,
+            ':cb': cost_delta,
+            ':one': 1,
+            ':now': (now or datetime.now()).isoformat()
+        },
+        ReturnValues='ALL_NEW'
+    )['Attributes']
+
+
+def set_aggregate(table, portfolio_id, market_value, unrealized_pl, cost_basis, now=None):
+    """
+    Overwrite a portfolio aggregate with totals recomputed from its positions.
+
+    Returns:
+        dict: The new aggregate
+    """
+    return table.update_item(
+        Key={'portfolioId': portfolio_id, 'sk': AGGREGATE_SK},
+        UpdateExpression='SET marketValue = :mv, unrealizedPL = :pl, costBasis = :cb, updatedAt = :now '
+                         'ADD revision :one',
+        ExpressionAttributeValues={
+            ':mv': market_value,
+            ':pl': unrealized_pl,
+            ':cb': cost_basis,
+            ':one': 1,
+            ':now': (now or datetime.now()).isoformat()
+        },
+        ReturnValues='ALL_NEW'
+    )['Attributes']
+
+
+def record_snapshot(table, portfolio_id, aggregate, date):
+    """
+    Record an aggregate as the portfolio's snapshot for a date.
+
+    Writers race across tickers, so a snapshot only replaces one taken from
+    an older revision of the aggregate.
+
+    Args:
+        table: boto3 portfolio-metrics Table resource
+        portfolio_id (str): The portfolio ID
+        aggregate (dict): Aggregate returned by apply_position_delta or set_aggregate
+        date (str): Market date (YYYY-MM-DD)
+
+    Returns:
+        bool: False if a newer snapshot was already recorded
+    """
+    try:
+        table.update_item(
+            Key={'portfolioId': portfolio_id, 'sk': snapshot_sk(date)},
+            UpdateExpression='SET marketValue = :mv, unrealizedPL = :pl, costBasis = :cb, revision = :rev',
+            ConditionExpression='attribute_not_exists(revision) OR revision < :rev',
+            ExpressionAttributeValues={
+                ':mv': aggregate.get('marketValue', ZERO),
+                ':pl': aggregate.get('unrealizedPL', ZERO),
+                ':cb': aggregate.get('costBasis', ZERO),
+                ':rev': aggregate['revision']
+            }
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def get_aggregate(table, portfolio_id):
+    """
+    Current totals of a portfolio, or None if none were recorded.
+    """
+    return table.get_item(Key={'portfolioId': portfolio_id, 'sk': AGGREGATE_SK}).get('Item')
+
+
+def get_value_history(table, portfolio_id, start_date, end_date):
+    """
+    Daily snapshots of a portfolio between two dates, inclusive, oldest first.
+
+    Returns:
+        list: Items with date, marketValue, unrealizedPL and costBasis
+    """
+    key = Key('portfolioId').eq(portfolio_id) & Key('sk').between(snapshot_sk(start_date), snapshot_sk(end_date))
+    response = table.query(KeyConditionExpression=key)
+    items = response['Items']
+    while 'LastEvaluatedKey' in response:
+        response = table.query(KeyConditionExpression=key, ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response['Items'])
+    for item in items:
+        item['date'] = item['sk'][len(DAY_PREFIX):]
+    return items
+
+
+def pl_percent(aggregate):
+    """
+    Unrealized P&L as a percentage of priced cost basis (None without cost).
+    """
+    cost_basis = aggregate.get('costBasis') or ZERO
+    if cost_basis == 0:
+        return None
+    return aggregate.get('unrealizedPL', ZERO) / cost_basis * 100
@@ -0,0 +1,132 @@
+"""
+Pluggable readers of the ticker universe refreshed by the nightly ingestion run.
+
+processTickers refreshes the deduplicated union of the tickers of every
+enabled source, so one Polygon fetch and one ticker-data write serve every
+consumer of a ticker. Sources are DynamoDB tables read in parallel-scan
+segments, one per dispatcher shard:
+
+- positions: the portfolio-positions table. Tickers carry the portfolios and
+  positions holding them (with marketValue), which feed the completion
+  barrier and refresh priority.
+- legacyPortfolios: the `tickers` lists of the legacy api/ portfolios table
+  (LEGACY_PORTFOLIOS_TABLE), whose analyzePortfolio reads the same
+  ticker-data table. Its tickers carry no portfolios or positions, only a
+  legacy flag, since that analysis runs at a fixed time rather than on the
+  completion barrier.
+
+A reader is registered with @register_source(name) and called with
+(low-level DynamoDB client, shard, total_shards); items are decoded with
+src/utils/ddb.py. It returns (items scanned,
+{ticker: {'portfolios': set of portfolio IDs, 'positions': {position ID: marketValue},
+'legacy': bool}}).
+"""
+
+import os
+from decimal import Decimal
+
+from src.utils.ddb import Position, decode_value, scan_items
+
+POSITIONS_TABLE = os.environ.get('POSITIONS_TABLE')
+LEGACY_PORTFOLIOS_TABLE = os.environ.get('LEGACY_PORTFOLIOS_TABLE')
+
+# name -> reader
+SOURCES = {}
+
+DEFAULT_SOURCES = ('positions',)
+
+
+def register_source(name):
+    """
+    Register a ticker source reader under a name.
+    """
+    def decorator(func):
+        SOURCES[name] = func
+        return func
+    return decorator
+
+
+def scan_segment(client, table_name, projection, shard, total_shards, names=None):
+    """
+    Every wire-format item of one parallel-scan segment of a table.
+    """
+    scan_kwargs = {
+        'TableName': table_name,
+        'ProjectionExpression': projection,
+        'Segment': shard,
+        'TotalSegments': total_shards
+    }
+    if names:
+        scan_kwargs['ExpressionAttributeNames'] = names
+    return scan_items(client, **scan_kwargs)
+
+
+def _holding(holdings, ticker):
+    return holdings.setdefault(ticker, {'portfolios': set(), 'positions': {}, 'legacy': False})
+
+
+@register_source('positions')
+def positions_source(client, shard, total_shards):
+    items = scan_segment(client, POSITIONS_TABLE, 'id, portfolioId, ticker, marketValue', shard, total_shards)
+    holdings = {}
+    scanned = 0
+    for item in items:
+        scanned += 1
+        position = Position.from_item(item)
+        if position.ticker is None:
+            continue
+        holding = _holding(holdings, position.ticker)
+        holding['positions'][position.id or 'unknown'] = Decimal(str(position.market_value or 0))
+        if position.portfolio_id:
+            holding['portfolios'].add(position.portfolio_id)
+    return scanned, holdings
+
+
+@register_source('legacyPortfolios')
+def legacy_portfolios_source(client, shard, total_shards):
+    items = scan_segment(
+        client, LEGACY_PORTFOLIOS_TABLE, '#ticker, tickers', shard, total_shards, {'#ticker': 'ticker'}
+    )
+    holdings = {}
+    scanned = 0
+    for item in items:
+        scanned += 1
+        # Items hold a `tickers` list (or string set), or a single `ticker`
+        value = item.get('ticker') or item.get('tickers')
+        tickers = decode_value(value) if value else []
+        if isinstance(tickers, str):
+            tickers = [tickers]
+        for ticker in tickers:
+            _holding(holdings, ticker)['legacy'] = True
+    return scanned, holdings
+
+
+def enabled_sources(names):
+    """
+    Source names from a comma-separated setting, keeping registered ones.
+    """
+    selected = [name.strip() for name in (names or '').split(',') if name.strip()] or list(DEFAULT_SOURCES)
+    unknown = [name for name in selected if name not in SOURCES]
+    if unknown:
+        print(f"Ignoring unknown ticker sources: {unknown}")
+    return [name for name in selected if name in SOURCES]
+
+
+def read_shard(client, names, shard, total_shards):
+    """
+    The union of one shard of every named source.
+
+    Returns:
+        tuple: ({source name: items scanned}, merged {ticker: holding})
+    """
+    scanned = {}
+    merged = {}
+    for name in names:
+        count, holdings = SOURCES[name](client, shard, total_shards)
+        scanned[name] = count
+        for ticker, holding in holdings.items():
+            target = _holding(merged, ticker)
+            target['portfolios'] |= holding['portfolios']
+            target['positions'].update(holding['positions'])
+            target['legacy'] = target['legacy'] or holding['legacy']
+    return scanned, merged
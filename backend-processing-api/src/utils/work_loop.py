@@ -0,0 +1,126 @@
+"""
+Deadline-aware processing of item lists inside a Lambda invocation.
+
+Handlers that loop over tickers, positions, portfolios or scan pages used to
+run until Lambda killed them, losing the partial batch and retrying the whole
+message from scratch. A WorkLoop instead stops taking new items once the time
+left in the invocation drops below a reserve plus the longest item seen so
+far, and hands back the items it did not start. The handler then persists a
+continuation cursor (in an SQS message, an async self-invocation payload or
+the SQS partial batch response) so only the remainder is retried.
+
+Without a Lambda context (local runs, tests) there is no deadline.
+"""
+
+import json
+import os
+import time
+
+# Time kept free for writing the continuation and returning
+WORK_LOOP_RESERVE_MS = int(os.environ.get('WORK_LOOP_RESERVE_MS', '10000'))
+
+
+class WorkLoop:
+    """
+    Tracks the invocation deadline and the cost of the items processed so far.
+
+    Usage:
+        loop = WorkLoop(context)
+        for item in loop.iterate(items):
+            ...process item
+        if loop.remainder:
+            ...persist a cursor and re-enqueue the remainder
+    """
+
+    def __init__(self, context, reserve_ms=WORK_LOOP_RESERVE_MS, clock=time.monotonic):
+        self.context = context
+        self.reserve_ms = reserve_ms
+        self.clock = clock
+        self.longest_item_ms = 0
+        self.items_done = 0
+        self.remainder = []
+
+    def remaining_ms(self):
+        """
+        Milliseconds left in the invocation, or None without a deadline.
+        """
+        if self.context is None:
+            return None
+        return self.context.get_remaining_time_in_millis()
+
+    def has_time(self, needed_ms=0):
+        """
+        Whether there is time for another item (or for needed_ms more work).
+
+        Args:
+            needed_ms (int): Expected duration of the next step; defaults to the
+                             longest item processed so far
+
+        Returns:
+            bool: False once the deadline is too close
+        """
+        remaining = self.remaining_ms()
+        if remaining is None:
+            return True
+        return remaining > self.reserve_ms + max(needed_ms, self.longest_item_ms)
+
+    def iterate(self, items):
+        """
+        Yield items until the deadline approaches.
+
+        The time between yields is taken as the cost of an item. Items not
+        yielded are left in self.remainder once the loop ends. Loops may be
+        nested (e.g. positions within records); read self.remainder right
+        after the loop it belongs to.
+
+        Args:
+            items (iterable): Items to process, in order
+
+        Yields:
+            The next item to process
+        """
+        items = list(items)
+        self.remainder = []
+        for index, item in enumerate(items):
+            if not self.has_time():
+                print(f"Deadline approaching after {self.items_done} item(s), "
+                      f"{len(items) - index} left for a continuation")
+                self.remainder = items[index:]
+                return
+            started = self.clock()
+            yield item
+            self.longest_item_ms = max(self.longest_item_ms, (self.clock() - started) * 1000)
+            self.items_done += 1
+        self.remainder = []
+
+
+def continue_via_invoke(lambda_client, function_name, payload):
+    """
+    Continue the remaining work in a fresh asynchronous invocation.
+
+    Args:
+        lambda_client: boto3 Lambda client
+        function_name (str): Function to invoke (usually context.function_name)
+        payload (dict): Event for the continuation, including its cursor
+    """
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps(payload)
+    )
+    print(f"Continuing in a new invocation of {function_name}")
+
+
+def batch_item_failures(records):
+    """
+    SQS partial batch response asking for the given records to be redelivered.
+
+    Requires functionResponseType ReportBatchItemFailures on the event source.
+
+    Args:
+        records (list): SQS records that were not processed
+
+    Returns:
+        dict: Handler response
+    """
+    return {'batchItemFailures': [{'itemIdentifier': record['messageId']} for record in records]}
@@ -0,0 +1,55 @@
+"""
+Shared fixtures for unit tests of handlers and utilities against moto.
+
+`aws` starts moto's DynamoDB and SQS with every pipeline table and queue
+(tests/harness/local_aws.py), points the environment at them and makes
+src.* modules import afresh, so module-level settings and lazy clients
+pick them up:
+
+    def test_something(aws):
+        tier_analyses = aws.load('src.handlers.tier_analyses')
+        aws.table('ANALYSES_TABLE').put_item(Item={...})
+"""
+
+import importlib
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+
+def _forget_src_modules():
+    for name in list(sys.modules):
+        if name == 'src' or name.startswith('src.'):
+            del sys.modules[name]
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    moto = pytest.importorskip('moto')
+    import boto3
+    from harness.local_aws import AWS_ENVIRONMENT, create_queues, create_tables
+
+    for name, value in AWS_ENVIRONMENT.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        boto3.setup_default_session()
+        ddb = boto3.client('dynamodb')
+        tables = create_tables(ddb)
+        queues = create_queues(boto3.client('sqs'))
+        for name, value in {**tables, **queues}.items():
+            monkeypatch.setenv(name, value)
+        _forget_src_modules()
+        resource = boto3.resource('dynamodb')
+        try:
+            yield SimpleNamespace(
+                ddb=ddb,
+                tables=tables,
+                queues=queues,
+                table=lambda var: resource.Table(tables[var]),
+                load=importlib.import_module,
+                setenv=lambda name, value: monkeypatch.setenv(name, value)
+            )
+        finally:
+            _forget_src_modules()
+            boto3.DEFAULT_SESSION = None
@@ -0,0 +1,107 @@
+"""
+Fake OpenAI-compatible chat completions server (POST /v1/chat/completions)
+standing in for the XAI API.
+
+The reply scores every ticker of the "Portfolio Data:" JSON at the end of
+analyzePortfolio's prompt from its RSI and distance to its 50-day average,
+as a fenced JSON list in the format the prompt asks for. Token usage is
+estimated at four characters per token, like the tokenizers of the models
+the prompt is written for.
+
+Every Nth request (fail_every) is answered 500, for exercising the XAI
+circuit breaker; requests without a bearer token get 401.
+"""
+
+import json
+
+from harness.fake_server import FakeServer
+
+PROMPT_DATA_MARKER = 'Portfolio Data:\n'
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def score(data):
+    """
+    Opportunity score from -10 to 10: oversold and below the average is good.
+    """
+    rsi = data.get('rsi')
+    price = data.get('price')
+    ma50 = data.get('ma50')
+    value = 0.0
+    if rsi is not None:
+        value += (50 - rsi) / 4
+    if price and ma50:
+        value += (ma50 - price) / price * 50
+    return max(-10, min(10, round(value)))
+
+
+class FakeLLM(FakeServer):
+    """
+    Answers chat completions with a deterministic analysis of the prompt's tickers.
+
+    Args:
+        latency_ms (float): Delay added to every request
+        fail_every (int): Answer every Nth request with 500 (0 never)
+    """
+
+    def __init__(self, latency_ms=0, fail_every=0):
+        super().__init__(latency_ms, fail_every, 500)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def endpoint(self, method, path):
+        return 'chat/completions' if path.rstrip('/').endswith('/chat/completions') else 'unknown'
+
+    def failure(self, status):
+        return {'error': {'message': 'The server had an error while processing your request', 'type': 'server_error'}}
+
+    def respond(self, method, path, query, headers, body):
+        if method != 'POST' or self.endpoint(method, path) == 'unknown':
+            return 404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}}
+        if not (headers.get('Authorization') or '').startswith('Bearer '):
+            return 401, {'error': {'message': 'Missing bearer token', 'type': 'invalid_request_error'}}
+
+        request = json.loads(body)
+        prompt = request['messages'][-1]['content']
+        portfolio = json.loads(prompt.split(PROMPT_DATA_MARKER, 1)[1]) if PROMPT_DATA_MARKER in prompt else {}
+        entries = [
+            {
+                'ticker': ticker,
+                'score': score(data),
+                'price': data.get('price'),
+                'rsi': data.get('rsi'),
+                'ma50': data.get('ma50'),
+                'asOf': data.get('asOf'),
+                'reason': f"RSI {data.get('rsi')} against price {data.get('price')} and MA50 {data.get('ma50')}"
+            }
+            for ticker, data in sorted(portfolio.get('tickers', {}).items())
+        ]
+        content = f"Here is the analysis:\n```json\n{json.dumps(entries, indent=2)}\n```"
+
+        usage = {'prompt_tokens': estimate_tokens(prompt), 'completion_tokens': estimate_tokens(content)}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        with self.lock:
+            self.prompt_tokens += usage['prompt_tokens']
+            self.completion_tokens += usage['completion_tokens']
+        return 200, {
+            'id': 'chatcmpl-harness',
+            'object': 'chat.completion',
+            'model': request.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': usage
+        }
+
+    def reset(self):
+        super().reset()
+        with self.lock:
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def stats(self):
+        stats = super().stats()
+        with self.lock:
+            stats.update(prompt_tokens=self.prompt_tokens, completion_tokens=self.completion_tokens)
+        return stats
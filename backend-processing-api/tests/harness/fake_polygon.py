@@ -0,0 +1,112 @@
+"""
+Fake Polygon.io serving the two endpoints the ingestion pipeline calls:
+
+- GET /v2/aggs/ticker/{ticker}/range/1/day/{from}/{to} (v3 for crypto)
+- GET /v1/indicators/{rsi|sma}/{ticker}
+
+Tickers in recordings/polygon.json (keyed by Polygon symbol, e.g. AAPL,
+X:BTC-USD, I:SPX) are answered with their recorded responses. Any other
+ticker gets a deterministic synthetic daily bar and indicator value derived
+from its symbol, stamped with the latest weekday, so universes of any size
+can be served.
+
+Every Nth request (rate_limit_every) is answered 429 like the plan's
+per-minute limit, and requests without an apiKey get 401.
+"""
+
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from harness.fake_server import FakeServer
+
+RECORDINGS = Path(__file__).resolve().parent / 'recordings' / 'polygon.json'
+
+RATE_LIMIT_MESSAGE = ("You've exceeded the maximum requests per minute, please wait or upgrade your "
+                      "subscription to continue. https://polygon.io/pricing")
+
+
+def latest_weekday(now=None):
+    """
+    Midnight UTC of the most recent weekday before now, in epoch milliseconds.
+    """
+    day = (now or datetime.now(timezone.utc)).date() - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class FakePolygon(FakeServer):
+    """
+    Replays recorded Polygon responses and synthesizes the rest.
+
+    Args:
+        latency_ms (float): Delay added to every request
+        rate_limit_every (int): Answer every Nth request with 429 (0 never)
+        recordings (Path): Recorded responses file
+    """
+
+    def __init__(self, latency_ms=0, rate_limit_every=0, recordings=RECORDINGS):
+        super().__init__(latency_ms, rate_limit_every, 429)
+        self.recordings = json.loads(Path(recordings).read_text())
+        self.bar_timestamp = latest_weekday()
+
+    def endpoint(self, method, path):
+        parts = path.strip('/').split('/')
+        if len(parts) >= 4 and parts[1] == 'aggs':
+            return 'aggs'
+        if len(parts) >= 4 and parts[1] == 'indicators':
+            return parts[2]
+        return 'unknown'
+
+    def failure(self, status):
+        return {'status': 'ERROR', 'request_id': 'harness', 'error': RATE_LIMIT_MESSAGE}
+
+    def respond(self, method, path, query, headers, body):
+        if not query.get('apiKey'):
+            return 401, {'status': 'ERROR', 'request_id': 'harness', 'error': 'API Key was not provided'}
+        endpoint = self.endpoint(method, path)
+        if endpoint == 'unknown':
+            return 404, {'status': 'NOT_FOUND', 'request_id': 'harness', 'message': 'Not found'}
+        parts = path.strip('/').split('/')
+        ticker = parts[3]
+        recorded = self.recordings.get(ticker, {}).get(endpoint)
+        if recorded is not None:
+            return 200, recorded
+        if endpoint == 'aggs':
+            return 200, self.synthetic_aggs(ticker)
+        return 200, self.synthetic_indicator(ticker, endpoint, int(query.get('window') or 14))
+
+    def _base_price(self, ticker):
+        return 5 + zlib.crc32(ticker.encode()) % 50000 / 100
+
+    def synthetic_aggs(self, ticker):
+        seed = zlib.crc32(ticker.encode())
+        close = self._base_price(ticker)
+        bar = {
+            'v': 100000 + seed % 5000000,
+            'vw': round(close * 1.001, 4),
+            'o': round(close * (1 + (seed % 7 - 3) / 200), 4),
+            'c': close,
+            'h': round(close * 1.02, 4),
+            'l': round(close * 0.98, 4),
+            't': self.bar_timestamp,
+            'n': 1000 + seed % 90000
+        }
+        return {'ticker': ticker, 'queryCount': 5, 'resultsCount': 1, 'adjusted': True, 'results': [bar],
+                'status': 'OK', 'request_id': f'harness-{seed:08x}', 'count': 1}
+
+    def synthetic_indicator(self, ticker, indicator, window):
+        seed = zlib.crc32(f'{ticker}/{indicator}/{window}'.encode())
+        if indicator == 'rsi':
+            value = 20 + seed % 6000 / 100
+        else:
+            value = round(self._base_price(ticker) * (0.9 + seed % 2000 / 10000), 4)
+        return {'results': {'values': [{'timestamp': self.bar_timestamp, 'value': value}]},
+                'status': 'OK', 'request_id': f'harness-{seed:08x}'}
+
+    def stats(self):
+        stats = super().stats()
+        stats['rate_limited'] = stats['statuses'].get(429, 0)
+        return stats
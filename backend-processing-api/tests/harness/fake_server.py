@@ -0,0 +1,135 @@
+"""
+Base of the local HTTP fakes the pipeline harness points the handlers at.
+
+A FakeServer runs a ThreadingHTTPServer on an ephemeral 127.0.0.1 port in a
+background thread, adds a fixed latency to every request, fails every Nth
+request with a configured status, and counts requests by endpoint and
+responses by status code. Subclasses implement respond().
+
+Usage:
+    with FakePolygon(latency_ms=50) as polygon:
+        os.environ['POLYGON_BASE_URL'] = polygon.url
+        ...
+        polygon.stats()
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _serve(self, method):
+        fake = self.server.fake
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, payload = fake.handle(method, parts.path, query, dict(self.headers), body)
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._serve('GET')
+
+    def do_POST(self):
+        self._serve('POST')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeServer:
+    """
+    Threaded local HTTP server with latency, injected failures and counters.
+
+    Args:
+        latency_ms (float): Delay added to every request
+        fail_every (int): Fail every Nth request (0 never)
+        fail_status (int): Status of the injected failures
+    """
+
+    def __init__(self, latency_ms=0, fail_every=0, fail_status=500):
+        self.latency_ms = latency_ms
+        self.fail_every = fail_every
+        self.fail_status = fail_status
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.statuses = Counter()
+        self._count = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.statuses.clear()
+            self._count = 0
+
+    def handle(self, method, path, query, headers, body):
+        """
+        Status and JSON payload of one request, after latency and injected failures.
+        """
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        endpoint = self.endpoint(method, path)
+        with self.lock:
+            self._count += 1
+            inject = bool(self.fail_every) and self._count % self.fail_every == 0
+            self.requests[endpoint] += 1
+        if inject:
+            status, payload = self.fail_status, self.failure(self.fail_status)
+        else:
+            status, payload = self.respond(method, path, query, headers, body)
+        with self.lock:
+            self.statuses[status] += 1
+        return status, payload
+
+    def endpoint(self, method, path):
+        """
+        Name a request is counted under.
+        """
+        return path
+
+    def failure(self, status):
+        return {'error': f'Injected failure ({status})'}
+
+    def respond(self, method, path, query, headers, body):
+        raise NotImplementedError
+
+    def stats(self):
+        with self.lock:
+            return {'requests': dict(self.requests), 'statuses': dict(self.statuses)}
@@ -0,0 +1,276 @@
+"""
+In-memory AWS for the pipeline harness: moto's DynamoDB and SQS, a local
+Lambda that queues invocations for the runner, and a meter of the DynamoDB
+capacity and SQS messages the handlers use.
+
+The meter hooks the events of boto3's default session, which every handler
+client is built from (src/utils/aws.py, api/aws.py). The harness seeds and
+drains through its own session, so only handler traffic is counted.
+
+Capacity units are estimated from item sizes the way DynamoDB bills them:
+reads at 4 KB per unit (halved when eventually consistent, query and scan
+rounding the page total), writes at 1 KB per unit on the larger of the old
+and new item, transactions at double. Sizes come from what is on the wire,
+so reads with a projection and updates that return nothing are lower bounds.
+"""
+
+import json
+import math
+import threading
+from collections import Counter, defaultdict, deque
+
+REGION = 'us-east-1'
+
+AWS_ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': REGION,
+    'AWS_ACCESS_KEY_ID': 'harness',
+    'AWS_SECRET_ACCESS_KEY': 'harness',
+    'AWS_SECURITY_TOKEN': 'harness',
+    'AWS_SESSION_TOKEN': 'harness'
+}
+
+# env var -> (table name, key schema, GSI of (index name, hash key) or None), as in serverless.yml
+TABLES = {
+    'TICKER_DATA_TABLE': ('ticker-data', (('ticker', 'HASH'), ('timestamp', 'RANGE')), None),
+    'PORTFOLIOS_TABLE': ('user-portfolios', (('id', 'HASH'),), None),
+    'LEGACY_PORTFOLIOS_TABLE': ('portfolios', (('portfolio_name', 'HASH'),), None),
+    'POSITIONS_TABLE': ('portfolio-positions', (('id', 'HASH'),), ('PortfolioIdIndex', 'portfolioId')),
+    'ANALYSES_TABLE': ('portfolio-analyses', (('portfolio', 'HASH'), ('timestamp', 'RANGE')), None),
+    'PIPELINE_STATE_TABLE': ('pipeline-state', (('pk', 'HASH'), ('sk', 'RANGE')), None),
+    'PORTFOLIO_METRICS_TABLE': ('portfolio-metrics', (('portfolioId', 'HASH'), ('sk', 'RANGE')), None)
+}
+
+# env var -> queue name
+QUEUES = {
+    'SQS_QUEUE_URL': 'portfolio-queue',
+    'ANALYSIS_QUEUE_URL': 'portfolio-analysis-queue'
+}
+
+READ_UNIT_BYTES = 4096
+WRITE_UNIT_BYTES = 1024
+
+
+def create_tables(client):
+    """
+    Create every pipeline table; returns {env var: table name}.
+    """
+    for name, keys, gsi in TABLES.values():
+        definitions = [{'AttributeName': key, 'AttributeType': 'S'} for key, _ in keys]
+        kwargs = {}
+        if gsi:
+            index_name, hash_key = gsi
+            definitions.append({'AttributeName': hash_key, 'AttributeType': 'S'})
+            kwargs['GlobalSecondaryIndexes'] = [{
+                'IndexName': index_name,
+                'KeySchema': [{'AttributeName': hash_key, 'KeyType': 'HASH'}],
+                'Projection': {'ProjectionType': 'ALL'}
+            }]
+        client.create_table(
+            TableName=name,
+            KeySchema=[{'AttributeName': key, 'KeyType': kind} for key, kind in keys],
+            AttributeDefinitions=definitions,
+            BillingMode='PAY_PER_REQUEST',
+            **kwargs
+        )
+    return {var: spec[0] for var, spec in TABLES.items()}
+
+
+def create_queues(client):
+    """
+    Create the pipeline queues; returns {env var: queue URL}.
+    """
+    return {var: client.create_queue(QueueName=name)['QueueUrl'] for var, name in QUEUES.items()}
+
+
+def batch_write(client, table_name, items):
+    """
+    Write wire-format items 25 at a time, retrying unprocessed ones.
+    """
+    for start in range(0, len(items), 25):
+        request = {table_name: [{'PutRequest': {'Item': item}} for item in items[start:start + 25]]}
+        while request:
+            request = client.batch_write_item(RequestItems=request).get('UnprocessedItems')
+
+
+def value_size(value):
+    """
+    Approximate DynamoDB size in bytes of a wire-format attribute value.
+    """
+    (kind, data), = value.items()
+    if kind == 'S':
+        return len(data.encode('utf-8'))
+    if kind == 'N':
+        return len(data.lstrip('-').replace('.', '')) // 2 + 2
+    if kind in ('B', 'BOOL', 'NULL'):
+        return len(data) if kind == 'B' else 1
+    if kind == 'M':
+        return 3 + sum(len(k.encode('utf-8')) + value_size(v) for k, v in data.items())
+    if kind == 'L':
+        return 3 + sum(1 + value_size(v) for v in data)
+    if kind == 'SS':
+        return sum(len(v.encode('utf-8')) for v in data)
+    if kind == 'NS':
+        return sum(len(v) // 2 + 2 for v in data)
+    return sum(len(v) for v in data)
+
+
+def item_size(item):
+    return sum(len(name.encode('utf-8')) + value_size(value) for name, value in (item or {}).items())
+
+
+def read_units(size, consistent=False):
+    return max(1, math.ceil(size / READ_UNIT_BYTES)) * (1 if consistent else 0.5)
+
+
+def write_units(size):
+    return max(1, math.ceil(size / WRITE_UNIT_BYTES))
+
+
+class CapacityMeter:
+    """
+    Counts DynamoDB operations and estimated capacity units per table, and
+    SQS messages sent per queue, from boto3 session events.
+
+    Usage:
+        meter = CapacityMeter()
+        meter.register(boto3.DEFAULT_SESSION)
+        ...
+        meter.summary()
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.ops = defaultdict(Counter)
+        self.errors = defaultdict(Counter)
+        self.rcu = Counter()
+        self.wcu = Counter()
+        self.sqs_sent = Counter()
+        self.sqs_calls = Counter()
+
+    def register(self, session):
+        session.events.register('before-call.dynamodb', self._before_dynamodb)
+        session.events.register('after-call.dynamodb', self._after_dynamodb)
+        session.events.register('before-parameter-build.sqs', self._before_sqs)
+
+    def _before_dynamodb(self, model, params, context, **kwargs):
+        body = params.get('body') or b'{}'
+        context['harness_request'] = json.loads(body)
+
+    def _after_dynamodb(self, http_response, model, context, **kwargs):
+        request = context.get('harness_request') or {}
+        ok = http_response.status_code == 200
+        response = json.loads(http_response.content or b'{}') if ok else {}
+        tables = request.get('TableName') or ''
+        with self.lock:
+            if 'RequestItems' in request:
+                tables = ','.join(request['RequestItems'])
+            elif 'TransactItems' in request:
+                tables = ','.join(sorted({
+                    next(iter(item.values())).get('TableName', '') for item in request['TransactItems']
+                }))
+            for table in tables.split(','):
+                self.ops[table][model.name] += 1
+                if not ok:
+                    code = (json.loads(http_response.content or b'{}').get('__type') or '').split('#')[-1]
+                    self.errors[table][code or str(http_response.status_code)] += 1
+            self._charge(model.name, request, response, ok)
+
+    def _charge(self, operation, request, response, ok):
+        table = request.get('TableName')
+        consistent = bool(request.get('ConsistentRead'))
+        if operation == 'GetItem':
+            self.rcu[table] += read_units(item_size(response.get('Item')), consistent) if ok else 0
+        elif operation in ('Query', 'Scan'):
+            if ok:
+                self.rcu[table] += read_units(sum(item_size(item) for item in response.get('Items', [])), consistent)
+        elif operation == 'BatchGetItem':
+            for name, items in response.get('Responses', {}).items():
+                consistent = bool(request['RequestItems'].get(name, {}).get('ConsistentRead'))
+                self.rcu[name] += sum(read_units(item_size(item), consistent) for item in items)
+        elif operation == 'TransactGetItems':
+            for entry in request['TransactItems']:
+                self.rcu[entry['Get']['TableName']] += 2 * read_units(item_size(entry['Get']['Key']), True)
+        elif operation == 'PutItem':
+            self.wcu[table] += write_units(max(item_size(request['Item']), item_size(response.get('Attributes'))))
+        elif operation == 'UpdateItem':
+            written = item_size(request['Key']) + item_size(request.get('ExpressionAttributeValues'))
+            self.wcu[table] += write_units(max(written, item_size(response.get('Attributes'))))
+        elif operation == 'DeleteItem':
+            self.wcu[table] += write_units(max(item_size(request['Key']), item_size(response.get('Attributes'))))
+        elif operation == 'BatchWriteItem':
+            for name, entries in request['RequestItems'].items():
+                for entry in entries:
+                    written = entry.get('PutRequest', {}).get('Item') or entry.get('DeleteRequest', {}).get('Key')
+                    self.wcu[name] += write_units(item_size(written))
+        elif operation == 'TransactWriteItems':
+            for entry in request['TransactItems']:
+                kind, action = next(iter(entry.items()))
+                written = action.get('Item') or action.get('Key')
+                if kind == 'Update':
+                    written = {**action['Key'], **action.get('ExpressionAttributeValues', {})}
+                self.wcu[action['TableName']] += 2 * write_units(item_size(written))
+
+    def _before_sqs(self, params, model, **kwargs):
+        with self.lock:
+            self.sqs_calls[model.name] += 1
+            queue = (params.get('QueueUrl') or '').rsplit('/', 1)[-1]
+            if model.name == 'SendMessage':
+                self.sqs_sent[queue] += 1
+            elif model.name == 'SendMessageBatch':
+                self.sqs_sent[queue] += len(params.get('Entries', []))
+
+    def summary(self):
+        """
+        {'dynamodb': {table: {'ops', 'errors', 'rcu', 'wcu'}}, 'sqs': {'sent', 'calls'}}
+        """
+        with self.lock:
+            tables = sorted(set(self.ops) | set(self.rcu) | set(self.wcu))
+            return {
+                'dynamodb': {
+                    table: {
+                        'ops': dict(self.ops[table]),
+                        'errors': dict(self.errors[table]),
+                        'rcu': self.rcu[table],
+                        'wcu': self.wcu[table]
+                    }
+                    for table in tables
+                },
+                'sqs': {'sent': dict(self.sqs_sent), 'calls': dict(self.sqs_calls)}
+            }
+
+
+class LocalLambda:
+    """
+    Stand-in for the handlers' Lambda client: invocations are queued for the
+    harness runner instead of being sent to AWS.
+    """
+
+    def __init__(self):
+        self.pending = deque()
+        self.invokes = Counter()
+
+    def invoke(self, FunctionName, InvocationType='RequestResponse', Payload='{}', **kwargs):
+        self.invokes[FunctionName] += 1
+        self.pending.append((FunctionName, json.loads(Payload or '{}')))
+        return {'StatusCode': 202 if InvocationType == 'Event' else 200}
+
+
+def sqs_record(message, queue_url):
+    """
+    Lambda SQS event record of a received message.
+    """
+    queue = queue_url.rsplit('/', 1)[-1]
+    return {
+        'messageId': message['MessageId'],
+        'receiptHandle': message['ReceiptHandle'],
+        'body': message['Body'],
+        'attributes': message.get('Attributes', {}),
+        'messageAttributes': message.get('MessageAttributes', {}),
+        'md5OfBody': message.get('MD5OfBody'),
+        'eventSource': 'aws:sqs',
+        'eventSourceARN': f'arn:aws:sqs:{REGION}:123456789012:{queue}',
+        'awsRegion': REGION
+    }
@@ -0,0 +1,383 @@
+"""
+Offline end-to-end run of the nightly pipeline, in-process:
+
+    processTickers -> processTicker -> analyzePortfolios -> analyzePortfolio
+    -> getPortfolioAnalysis (api/)
+
+DynamoDB and SQS are moto's in-memory implementations, Lambda invocations
+(shard fan-out, continuations, run_complete) are queued by LocalLambda and
+run by the harness, Polygon is FakePolygon and the XAI API is FakeLLM. The
+handler modules are imported afresh for every Pipeline, after the
+environment points them at the fakes, so module-level settings and caches
+start clean.
+
+The runner plays Lambda's part: every invocation gets a FakeContext with the
+function's serverless.yml timeout, SQS messages are delivered one per
+invocation (batchSize 1) and deleted unless reported as batch item failures,
+and a message received MAX_RECEIVES times is dropped as SQS would move it to
+a dead-letter queue.
+
+The book is either a simple generated universe (build_universe) or a
+dataset of api/tools/generate_portfolios.py, whose Zipf ticker popularity
+and legacy portfolios exercise the dedupe of the ingestion run.
+
+Usage (from backend-processing-api/, with tests/ on sys.path):
+    with Pipeline(tickers=100, positions=100) as pipeline:
+        report = pipeline.run()
+
+    with Pipeline(dataset=generate_dataset(users=100)) as pipeline:
+        report = pipeline.run()
+"""
+
+import contextlib
+import importlib
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal
+from pathlib import Path
+
+from harness.fake_llm import FakeLLM
+from harness.fake_polygon import FakePolygon
+from harness.local_aws import (
+    AWS_ENVIRONMENT,
+    CapacityMeter,
+    LocalLambda,
+    batch_write,
+    create_queues,
+    create_tables,
+    sqs_record
+)
+
+ROOT = Path(__file__).resolve().parents[2]
+API_DIR = ROOT.parent / 'api'
+
+# Local function name -> (module, handler, timeout seconds as in serverless.yml)
+FUNCTIONS = {
+    'processTickers': ('src.handlers.process_tickers', 'lambda_handler', 60),
+    'processTicker': ('src.handlers.process_ticker', 'lambda_handler', 300),
+    'analyzePortfolios': ('src.handlers.analyze_portfolios', 'lambda_handler', 60),
+    'analyzePortfolio': ('src.handlers.analyze_portfolio', 'lambda_handler', 300),
+    'getPortfolioAnalysis': ('get_portfolio_analysis', 'lambda_handler', 30),
+    'getPortfolioAnalysesBulk': ('get_portfolio_analysis', 'bulk_lambda_handler', 30)
+}
+
+# Queue env var -> function it triggers
+QUEUE_FUNCTIONS = {
+    'SQS_QUEUE_URL': 'processTicker',
+    'ANALYSIS_QUEUE_URL': 'analyzePortfolio'
+}
+
+# Modules imported afresh per Pipeline (besides src.*)
+API_MODULES = ('aws', 'analysis_format', 'get_portfolio_analysis')
+
+MAX_RECEIVES = 3
+BULK_READ_SIZE = 100
+
+# Symbols in recordings/polygon.json that have data, used before synthetic ones
+RECORDED_TICKERS = ('AAPL', 'MSFT', 'NVDA', 'AMZN', 'BTC-USD')
+
+
+class FakeContext:
+    """
+    Lambda context with a deadline timeout_seconds after creation.
+    """
+
+    def __init__(self, function_name, timeout_seconds):
+        self.function_name = function_name
+        self.deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+
+def build_universe(tickers, positions, positions_per_portfolio=10):
+    """
+    Deterministic tickers, portfolios and positions for a run.
+
+    Positions cycle through the tickers, so each ticker is held by about
+    positions / tickers positions, and are grouped positions_per_portfolio
+    to a portfolio.
+
+    Returns:
+        tuple: (ticker symbols, portfolio dicts, position dicts)
+    """
+    symbols = list(RECORDED_TICKERS[:tickers])
+    symbols += [f'SYN{i:05d}' for i in range(tickers - len(symbols))]
+    portfolio_count = max(1, -(-positions // positions_per_portfolio))
+    portfolios = [
+        {'id': f'pf-{i:05d}', 'name': f'Harness portfolio {i}', 'isActive': True, 'userId': f'user-{i % 97:03d}'}
+        for i in range(portfolio_count)
+    ]
+    holdings = []
+    for i in range(positions):
+        shares = 1 + i % 50
+        average_cost = 10 + (i * 7919) % 40000 / 100
+        holdings.append({
+            'id': f'pos-{i:06d}',
+            'portfolioId': portfolios[i // positions_per_portfolio]['id'],
+            'ticker': symbols[i % len(symbols)],
+            'shares': shares,
+            'averageCost': average_cost,
+            'costBasis': round(shares * average_cost, 2),
+            'marketValue': round(shares * average_cost, 2)
+        })
+    return symbols, portfolios, holdings
+
+
+def _wire_value(value):
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, (int, float, Decimal)):
+        return {'N': str(value)}
+    if isinstance(value, (list, tuple)):
+        return {'L': [_wire_value(v) for v in value]}
+    return {'S': value}
+
+
+def _wire(item):
+    return {k: _wire_value(v) for k, v in item.items() if v is not None}
+
+
+class Pipeline:
+    """
+    One seeded offline environment the pipeline can be run in.
+
+    Args:
+        tickers (int): Distinct tickers held
+        positions (int): Positions (portfolios hold positions_per_portfolio each)
+        positions_per_portfolio (int): Positions per portfolio
+        polygon (FakePolygon): Polygon fake (default: no latency, no 429s)
+        llm (FakeLLM): XAI fake (default: no latency, no failures)
+        verbose (bool): Let the handlers' output through
+        dataset (dict): Book from generate_portfolios.generate_dataset, used
+                        instead of a generated universe
+    """
+
+    def __init__(self, tickers=10, positions=10, positions_per_portfolio=10, polygon=None, llm=None, verbose=False,
+                 dataset=None):
+        if dataset is None:
+            self.universe = build_universe(tickers, positions, positions_per_portfolio)
+            self.legacy = []
+        else:
+            symbols = {p['ticker'] for p in dataset['positions']}
+            symbols.update(t for item in dataset['legacy'] for t in item['tickers'])
+            self.universe = (sorted(symbols), dataset['portfolios'], dataset['positions'])
+            self.legacy = dataset['legacy']
+        self.polygon = polygon or FakePolygon()
+        self.llm = llm or FakeLLM()
+        self.verbose = verbose
+        self.meter = CapacityMeter()
+        self.lambda_client = LocalLambda()
+        self.functions = defaultdict(lambda: {'invocations': 0, 'seconds': 0.0, 'errors': 0})
+        self.dropped = Counter()
+        self._stack = None
+
+    # --- Environment -------------------------------------------------------
+
+    def __enter__(self):
+        from moto import mock_aws
+        import boto3
+
+        self._stack = contextlib.ExitStack()
+        saved = dict(os.environ)
+        self._stack.callback(lambda: (os.environ.clear(), os.environ.update(saved)))
+        saved_path = list(sys.path)
+        self._stack.callback(lambda: sys.path.__setitem__(slice(None), saved_path))
+        self._stack.callback(self._forget_modules)
+
+        os.environ.update(AWS_ENVIRONMENT)
+        self._stack.enter_context(mock_aws())
+        self._stack.enter_context(self.polygon)
+        self._stack.enter_context(self.llm)
+
+        # Harness traffic goes through its own session and is not metered
+        self.session = boto3.session.Session()
+        self.ddb = self.session.client('dynamodb')
+        self.sqs = self.session.client('sqs')
+        tables = create_tables(self.ddb)
+        self.queues = create_queues(self.sqs)
+        os.environ.update(tables)
+        os.environ.update(self.queues)
+        os.environ.update({
+            'POLYGON_API_KEY': 'harness',
+            'POLYGON_BASE_URL': self.polygon.url,
+            'XAI_API_URL': f'{self.llm.url}/v1/chat/completions',
+            'XAI_API_KEY': 'harness',
+            'HTTP_CACHE_TABLE': tables['PIPELINE_STATE_TABLE'],
+            'ANALYZE_PORTFOLIOS_FUNCTION': 'analyzePortfolios',
+            'TICKER_SOURCES': 'positions,legacyPortfolios',
+            'TICKER_SPACING_SECONDS': '0',
+            'NO_PROXY': '127.0.0.1,localhost'
+        })
+        self.tables = tables
+        self._seed()
+
+        # Handler clients come from the default session, where the meter listens
+        boto3.setup_default_session()
+        self._stack.callback(lambda: setattr(boto3, 'DEFAULT_SESSION', None))
+        self.meter.register(boto3.DEFAULT_SESSION)
+        self._load_modules()
+        return self
+
+    def __exit__(self, *exc):
+        self._stack.close()
+
+    def _seed(self):
+        _, portfolios, positions = self.universe
+        batch_write(self.ddb, self.tables['PORTFOLIOS_TABLE'], [_wire(p) for p in portfolios])
+        batch_write(self.ddb, self.tables['POSITIONS_TABLE'], [_wire(p) for p in positions])
+        batch_write(self.ddb, self.tables['LEGACY_PORTFOLIOS_TABLE'], [_wire(p) for p in self.legacy])
+
+    def _forget_modules(self):
+        for name in list(sys.modules):
+            if name == 'src' or name.startswith('src.') or name in API_MODULES:
+                del sys.modules[name]
+
+    def _load_modules(self):
+        for path in (str(ROOT), str(API_DIR)):
+            if path not in sys.path:
+                sys.path.insert(0, path)
+        self._forget_modules()
+        self.modules = {}
+        for module_name, _, _ in FUNCTIONS.values():
+            if module_name not in self.modules:
+                module = importlib.import_module(module_name)
+                # Invocations come back to the runner instead of going to AWS
+                if hasattr(module, 'lambda_client'):
+                    module.lambda_client = self.lambda_client
+                self.modules[module_name] = module
+
+    # --- Running -----------------------------------------------------------
+
+    def invoke(self, function_name, event):
+        """
+        Run one invocation of a function as Lambda would, timing it.
+        """
+        module_name, handler, timeout = FUNCTIONS[function_name]
+        context = FakeContext(function_name, timeout)
+        stats = self.functions[function_name]
+        output = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+        started = time.perf_counter()
+        try:
+            with output as stream:
+                try:
+                    return getattr(self.modules[module_name], handler)(event, context)
+                finally:
+                    if stream is not None:
+                        stream.close()
+        except Exception as e:
+            stats['errors'] += 1
+            print(f"  ✗ ERROR in {function_name}: {e!r}", file=sys.stderr)
+            return None
+        finally:
+            stats['invocations'] += 1
+            stats['seconds'] += time.perf_counter() - started
+
+    def _deliver(self, queue_var):
+        """
+        Deliver one message of a queue to its function; False if the queue is empty.
+        """
+        url = self.queues[queue_var]
+        messages = self.sqs.receive_message(
+            QueueUrl=url, MaxNumberOfMessages=1, VisibilityTimeout=0, AttributeNames=['All']
+        ).get('Messages', [])
+        if not messages:
+            return False
+        message = messages[0]
+        result = self.invoke(QUEUE_FUNCTIONS[queue_var], {'Records': [sqs_record(message, url)]})
+        failed = result is None or any(
+            failure['itemIdentifier'] == message['MessageId'] for failure in result.get('batchItemFailures', [])
+        )
+        receives = int(message['Attributes'].get('ApproximateReceiveCount', 1))
+        if not failed or receives >= MAX_RECEIVES:
+            if failed:
+                self.dropped[QUEUE_FUNCTIONS[queue_var]] += 1
+            self.sqs.delete_message(QueueUrl=url, ReceiptHandle=message['ReceiptHandle'])
+        return True
+
+    def drain(self):
+        """
+        Run queued invocations and deliver queued messages until all are done.
+
+        Invocations go first (they fan out and continue work), then the
+        ticker queue, then the analysis queue.
+        """
+        while True:
+            if self.lambda_client.pending:
+                self.invoke(*self.lambda_client.pending.popleft())
+            elif not (self._deliver('SQS_QUEUE_URL') or self._deliver('ANALYSIS_QUEUE_URL')):
+                return
+
+    def read_analyses(self):
+        """
+        Read every portfolio's analysis through getPortfolioAnalysis, one by
+        one and in bulk requests.
+
+        Returns:
+            dict: {'single': {status: count}, 'bulk': {status: count}, 'served': portfolios with an analysis}
+        """
+        _, portfolios, _ = self.universe
+        ids = [p['id'] for p in portfolios]
+        headers = {'Accept-Encoding': 'gzip'}
+        single = Counter()
+        for pid in ids:
+            response = self.invoke('getPortfolioAnalysis', {
+                'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': {'portfolio_name': pid}
+            })
+            single[response['statusCode'] if response else 'error'] += 1
+        bulk = Counter()
+        for start in range(0, len(ids), BULK_READ_SIZE):
+            response = self.invoke('getPortfolioAnalysesBulk', {
+                'httpMethod': 'GET', 'headers': headers,
+                'queryStringParameters': {'portfolio_ids': ','.join(ids[start:start + BULK_READ_SIZE])}
+            })
+            bulk[response['statusCode'] if response else 'error'] += 1
+        return {'single': dict(single), 'bulk': dict(bulk), 'served': single.get(200, 0)}
+
+    def run(self, run_id='harness-run', read=True):
+        """
+        Run the pipeline once from the processTickers dispatch to the reads.
+
+        Returns:
+            dict: Report of the run (see report())
+        """
+        self.meter.reset()
+        self.polygon.reset()
+        self.llm.reset()
+        self.lambda_client.invokes.clear()
+        self.functions.clear()
+        self.dropped.clear()
+
+        started = time.perf_counter()
+        self.invoke('processTickers', {'run_id': run_id})
+        self.drain()
+        reads = self.read_analyses() if read else None
+        return self.report(time.perf_counter() - started, reads)
+
+    def report(self, wall_seconds, reads):
+        """
+        Totals of a run: wall time, per-function time, Polygon and LLM
+        traffic, DynamoDB operations and capacity, SQS messages and invokes.
+        """
+        tickers, portfolios, positions = self.universe
+        capacity = self.meter.summary()
+        llm = self.llm.stats()
+        return {
+            'universe': {'tickers': len(tickers), 'positions': len(positions), 'portfolios': len(portfolios)},
+            'wall_seconds': wall_seconds,
+            'functions': {name: dict(stats) for name, stats in self.functions.items()},
+            'dropped_messages': dict(self.dropped),
+            'polygon': self.polygon.stats(),
+            'llm': {
+                'calls': llm['requests'].get('chat/completions', 0),
+                'failures': sum(n for status, n in llm['statuses'].items() if status != 200),
+                'prompt_tokens': llm['prompt_tokens'],
+                'completion_tokens': llm['completion_tokens']
+            },
+            'dynamodb': capacity['dynamodb'],
+            'sqs': capacity['sqs'],
+            'lambda_invokes': dict(self.lambda_client.invokes),
+            'reads': reads
+        }
@@ -0,0 +1,111 @@
+"""
+Parsing model replies into ticker entries (src/utils/analysis_format.py and
+its copy in api/analysis_format.py, both tested here).
+
+Run from backend-processing-api/:
+    python -m pytest -q tests/test_analysis_format.py
+"""
+
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+
+from src.utils import analysis_format as backend_format
+
+API_COPY = Path(__file__).resolve().parents[2] / 'api' / 'analysis_format.py'
+
+
+def load_api_copy():
+    spec = importlib.util.spec_from_file_location('api_analysis_format', API_COPY)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(params=['backend', 'api'])
+def fmt(request):
+    if request.param == 'backend':
+        return backend_format
+    if not API_COPY.exists():
+        pytest.skip('api/ is not checked out')
+    return load_api_copy()
+
+
+ENTRY = {'ticker': 'aapl', 'score': 4, 'price': '$230.50', 'rsi': 61.2, 'ma50': 221, 'asOf': '2026-10-16',
+         'reason': ' Momentum '}
+NORMALIZED = {'ticker': 'AAPL', 'score': 4, 'price': 230.5, 'rsi': 61.2, 'ma50': 221, 'asOf': '2026-10-16',
+              'reason': 'Momentum'}
+
+
+def test_fenced_json(fmt):
+    reply = f'Here is the analysis.\n```json\n{json.dumps([ENTRY])}\n```\nScores reflect momentum.'
+
+    assert fmt.parse_analysis(reply) == [NORMALIZED]
+
+
+def test_stray_brackets_in_prose_before_the_payload(fmt):
+    reply = (f'Scores use the usual scale (see [1]) and {{"note": "ignored"}}: '
+             f'{json.dumps([ENTRY])} Hope this helps [2].')
+
+    assert fmt.parse_analysis(reply) == [NORMALIZED]
+
+
+def test_fence_without_entries_falls_through_to_later_candidates(fmt):
+    reply = f'```\n[1, 2, 3]\n```\nThe scores: {json.dumps([ENTRY])}'
+
+    assert fmt.parse_analysis(reply) == [NORMALIZED]
+
+
+@pytest.mark.parametrize('key', backend_format.CONTAINER_KEYS)
+def test_container_keys(fmt, key):
+    reply = json.dumps({'summary': 'ok', key: [ENTRY]})
+
+    assert fmt.parse_analysis(reply) == [NORMALIZED]
+
+
+def test_mapping_of_ticker_to_entry_with_aliased_fields(fmt):
+    reply = json.dumps({'MSFT': {'Opportunity Score': '-2', 'current_price': 410, 'Rationale': 'Stretched'}})
+
+    entry, = fmt.parse_analysis(reply)
+    assert (entry['ticker'], entry['score'], entry['price'], entry['reason']) == ('MSFT', -2, 410, 'Stretched')
+
+
+def test_invalid_entries_are_skipped_and_recorded(fmt):
+    entries = [ENTRY, 'not an entry', {'ticker': 'TSLA', 'score': 42}, {'score': 1},
+               {**ENTRY, 'score': 3}, {'ticker': 'NVDA', 'score': 'high'}]
+
+    fields = fmt.parsed_fields(json.dumps(entries))
+
+    assert json.loads(fields['parsed_data']) == [NORMALIZED]
+    assert len(fields['entryErrors']) == 5
+    assert any('Score out of range for TSLA' in error for error in fields['entryErrors'])
+    assert any('Duplicate ticker' in error for error in fields['entryErrors'])
+
+
+def test_no_valid_entries_is_a_parse_error(fmt):
+    fields = fmt.parsed_fields(json.dumps([{'ticker': 'TSLA', 'score': 42}]))
+
+    assert fields == {'parseError': 'Analysis contains no valid tickers: Score out of range for TSLA: 42'}
+
+
+@pytest.mark.parametrize('reply, error', [
+    ('', 'Empty analysis'),
+    ('   \n', 'Empty analysis'),
+    (None, 'Empty analysis'),
+    ('No scores today.', 'No JSON found in analysis'),
+    ('[]', 'Analysis contains no tickers'),
+    ('{"status": "ok"}', 'Analysis JSON does not contain a list of tickers')
+])
+def test_empty_and_entry_less_replies(fmt, reply, error):
+    with pytest.raises(fmt.AnalysisFormatError, match=error):
+        fmt.parse_analysis(reply)
+
+
+def test_compact_round_trip(fmt):
+    fields = fmt.parsed_fields(json.dumps([ENTRY]))
+
+    assert fields['schemaVersion'] == fmt.SCHEMA_VERSION
+    assert fields['parsed_data'] == fmt.dumps_compact([NORMALIZED])
+    assert 'entryErrors' not in fields
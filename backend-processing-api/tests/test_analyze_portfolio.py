@@ -0,0 +1,69 @@
+"""
+How analyzePortfolio stores model replies (src/handlers/analyze_portfolio.py).
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_analyze_portfolio.py
+"""
+
+from decimal import Decimal
+
+import pytest
+
+GOOD_REPLY = '```json\n[{"ticker": "AAPL", "score": 4, "reason": "Momentum"}]\n```'
+BAD_REPLY = 'The markets were closed, so I cannot score these tickers.'
+
+
+@pytest.fixture
+def analyzer(aws, monkeypatch):
+    analyze_portfolio = aws.load('src.handlers.analyze_portfolio')
+    aws.table('PORTFOLIOS_TABLE').put_item(Item={'id': 'portfolio-1', 'name': 'Growth'})
+    aws.table('POSITIONS_TABLE').put_item(Item={'id': 'position-1', 'portfolioId': 'portfolio-1', 'ticker': 'AAPL'})
+    replies = []
+    monkeypatch.setattr(analyze_portfolio, 'call_xai', lambda prompt: replies.pop(0))
+
+    def land(as_of):
+        aws.table('TICKER_DATA_TABLE').put_item(Item={
+            'ticker': 'AAPL', 'timestamp': as_of, 'asOf': as_of, 'price': Decimal('230.5')
+        })
+
+    def run(reply):
+        replies.append(reply)
+        return analyze_portfolio.process_portfolio_analysis('portfolio-1')
+
+    def pointer():
+        return aws.table('ANALYSES_TABLE').get_item(
+            Key={'portfolio': 'portfolio-1#latest', 'timestamp': 'LATEST'}).get('Item')
+
+    return analyze_portfolio, land, run, pointer, replies
+
+
+def test_unparseable_reply_keeps_the_last_good_analysis(analyzer, aws):
+    _, land, run, pointer, _ = analyzer
+    land('2026-10-15T16:00:00')
+    assert run(GOOD_REPLY)['status'] == 'success'
+    good = pointer()
+
+    land('2026-10-16T16:00:00')
+    result = run(BAD_REPLY)
+
+    assert result['status'] == 'error' and 'No JSON' in result['error']
+    assert pointer() == good
+    items = aws.table('ANALYSES_TABLE').scan()['Items']
+    failed = [item for item in items if item['portfolio'] == 'portfolio-1#errors']
+    assert len(failed) == 1
+    assert 'parseError' in failed[0] and 'inputFingerprint' not in failed[0]
+    # The portfolio's own partition only holds the good analysis
+    assert [item['timestamp'] for item in items if item['portfolio'] == 'portfolio-1'] == [good['analysisTimestamp']]
+
+
+def test_unparseable_reply_is_retried_with_the_same_inputs(analyzer):
+    _, land, run, pointer, replies = analyzer
+    land('2026-10-16T16:00:00')
+    run(BAD_REPLY)
+
+    result = run(GOOD_REPLY)
+
+    assert result['status'] == 'success' and not replies
+    assert pointer()['parsed_data'].startswith('[{"ticker":"AAPL"')
+    # Now fingerprinted, so unchanged inputs are skipped
+    assert run(GOOD_REPLY)['status'] == 'skipped'
@@ -0,0 +1,100 @@
+"""
+Which portfolios analyzePortfolios queues (src/handlers/analyze_portfolios.py)
+against moto.
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_analyze_portfolios.py
+"""
+
+import json
+
+import pytest
+
+RUN_ID = '2026-10-19'
+
+
+@pytest.fixture
+def fan_out(aws):
+    analyze_portfolios = aws.load('src.handlers.analyze_portfolios')
+    pipeline_runs = aws.load('src.utils.pipeline_runs')
+    state = aws.table('PIPELINE_STATE_TABLE')
+    portfolios = aws.table('PORTFOLIOS_TABLE')
+    for portfolio_id in ('p1', 'p2', 'p3', 'p4'):
+        portfolios.put_item(Item={'id': portfolio_id, 'name': portfolio_id.upper()})
+    portfolios.put_item(Item={'id': 'p5', 'name': 'Closed', 'isActive': False})
+    holdings = {'p1': {'AAPL', 'MSFT'}, 'p2': {'MSFT'}, 'p3': {'TSLA'}, 'p4': {'NVDA'}}
+    positions = aws.table('POSITIONS_TABLE')
+    for portfolio_id, tickers in holdings.items():
+        for ticker in tickers:
+            positions.put_item(Item={'id': f'{portfolio_id}-{ticker}', 'portfolioId': portfolio_id, 'ticker': ticker})
+    # p3 and p4 were analyzed with their current positions
+    analyses = aws.table('ANALYSES_TABLE')
+    for portfolio_id in ('p3', 'p4'):
+        analyses.put_item(Item={
+            'portfolio': f'{portfolio_id}#latest', 'timestamp': 'LATEST',
+            'positionsFingerprint': pipeline_runs.positions_fingerprint(holdings[portfolio_id])
+        })
+
+    def register():
+        for ticker in ('AAPL', 'MSFT', 'TSLA', 'NVDA'):
+            held_by = [pid for pid, tickers in holdings.items() if ticker in tickers]
+            pipeline_runs.register_ticker(state, RUN_ID, ticker, held_by, [f'{pid}-{ticker}' for pid in held_by])
+
+    def run(**event):
+        return analyze_portfolios.lambda_handler({'run_id': RUN_ID, **event}, None)
+
+    return analyze_portfolios, pipeline_runs, state, register, run
+
+
+def queued(aws):
+    import boto3
+    messages = boto3.client('sqs').receive_message(
+        QueueUrl=aws.queues['ANALYSIS_QUEUE_URL'], MaxNumberOfMessages=10).get('Messages', [])
+    return sorted(json.loads(message['Body'])['portfolio_id'] for message in messages)
+
+
+def test_registered_run_is_fanned_out_without_scanning_positions(fan_out, aws, monkeypatch):
+    analyze_portfolios, pipeline_runs, state, register, run = fan_out
+    register()
+    pipeline_runs.mark_ticker_dirty(state, RUN_ID, 'TSLA', '2026-10-19T16:00:00')
+
+    def scan_positions():
+        raise AssertionError('positions table scanned')
+    monkeypatch.setattr(analyze_portfolios, 'get_portfolio_tickers', scan_positions)
+
+    result = run()
+
+    # p1 and p2 were never analyzed, p3 holds a dirty ticker, p4 is unchanged
+    assert queued(aws) == ['p1', 'p2', 'p3']
+    assert result['portfolios_unchanged'] == 1 and result['portfolios_skipped'] == 1
+
+
+def test_portfolios_are_queued_once_per_run(fan_out, aws):
+    _, _, _, register, run = fan_out
+    register()
+    run()
+
+    result = run(trigger='run_complete')
+
+    assert result['portfolios_queued'] == 0 and result['portfolios_already_queued'] == 2
+    assert queued(aws) == ['p1', 'p2']
+
+
+def test_run_without_registrations_reads_positions(fan_out, aws):
+    *_, run = fan_out
+
+    result = run()
+
+    assert result['portfolios_queued'] == 2
+    assert queued(aws) == ['p1', 'p2']
+
+
+def test_run_portfolio_tickers_from_members_pages(fan_out, monkeypatch):
+    _, pipeline_runs, state, register, _ = fan_out
+    monkeypatch.setattr(pipeline_runs, 'REGISTRATION_PAGE_SIZE', 1)
+    register()
+
+    assert pipeline_runs.get_run_portfolio_tickers(state, RUN_ID) == {
+        'p1': {'AAPL', 'MSFT'}, 'p2': {'MSFT'}, 'p3': {'TSLA'}, 'p4': {'NVDA'}
+    }
+    assert pipeline_runs.get_run_portfolio_tickers(state, '2026-10-20') == {}
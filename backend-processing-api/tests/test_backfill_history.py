@@ -0,0 +1,183 @@
+"""
+The historical bar backfill (src/handlers/backfill_history.py) and its
+checkpoints (src/utils/backfill_checkpoints.py) against moto.
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_backfill_history.py
+"""
+
+import pytest
+
+DAY_MS = 86400 * 1000
+# 2026-10-01T00:00:00 UTC
+OCTOBER_1_MS = 1790812800000
+
+
+def bar(day, close=100):
+    return {'t': OCTOBER_1_MS + day * DAY_MS, 'c': close, 'h': close + 1, 'l': close - 1, 'v': 1000}
+
+
+@pytest.fixture
+def backfill(aws, monkeypatch):
+    backfill_history = aws.load('src.handlers.backfill_history')
+    monkeypatch.setattr(backfill_history.time, 'sleep', lambda seconds: None)
+    return backfill_history
+
+
+class Throttled:
+    """
+    batch_write_item that leaves the first item of every request unprocessed
+    for `rounds` calls, then writes through to the real client.
+    """
+
+    def __init__(self, client, rounds):
+        self.client = client
+        self.rounds = rounds
+        self.calls = 0
+
+    def batch_write_item(self, RequestItems):
+        self.calls += 1
+        if self.calls <= self.rounds:
+            table, requests = next(iter(RequestItems.items()))
+            if requests[1:]:
+                self.client.batch_write_item(RequestItems={table: requests[1:]})
+            return {'UnprocessedItems': {table: requests[:1]}}
+        return self.client.batch_write_item(RequestItems=RequestItems)
+
+
+def stored_bars(aws, ticker):
+    return aws.table('TICKER_DATA_TABLE').query(
+        KeyConditionExpression='ticker = :ticker', ExpressionAttributeValues={':ticker': ticker})['Items']
+
+
+def test_unprocessed_bars_are_retried(backfill, aws, monkeypatch):
+    throttled = Throttled(backfill.ddb_client, rounds=2)
+    monkeypatch.setattr(backfill, 'ddb_client', throttled)
+
+    backfill.write_bars('AAPL', [bar(day) for day in range(3)])
+
+    assert throttled.calls == 3
+    assert len(stored_bars(aws, 'AAPL')) == 3
+
+
+def test_persistently_unprocessed_bars_fail_the_page(backfill, aws, monkeypatch):
+    throttled = Throttled(backfill.ddb_client, rounds=backfill.WRITE_ATTEMPTS)
+    monkeypatch.setattr(backfill, 'ddb_client', throttled)
+    sleeps = []
+    monkeypatch.setattr(backfill.time, 'sleep', sleeps.append)
+
+    with pytest.raises(RuntimeError, match='still unprocessed'):
+        backfill.write_bars('AAPL', [bar(day) for day in range(3)])
+
+    assert throttled.calls == backfill.WRITE_ATTEMPTS
+    assert sleeps == [backfill.WRITE_RETRY_SECONDS * 2 ** attempt for attempt in range(backfill.WRITE_ATTEMPTS - 1)]
+
+
+def test_write_failure_is_recorded_on_the_checkpoint(backfill, aws, monkeypatch):
+    checkpoints = aws.load('src.utils.backfill_checkpoints')
+    state = aws.table('PIPELINE_STATE_TABLE')
+    checkpoints.request_backfill(state, 'AAPL', '2026-10-01', '2026-10-10')
+    monkeypatch.setattr(backfill, 'fetch_page', lambda url, params: {'results': [bar(0)]})
+    monkeypatch.setattr(backfill, 'ddb_client', Throttled(backfill.ddb_client, rounds=backfill.WRITE_ATTEMPTS))
+
+    result = backfill.lambda_handler({}, None)
+
+    assert result['tickers_failed'] == 1
+    checkpoint, = checkpoints.get_open_checkpoints(state)
+    assert checkpoint['failures'] == 1 and 'still unprocessed' in checkpoint['lastError']
+
+
+def test_checkpoint_lifecycle(aws):
+    checkpoints = aws.load('src.utils.backfill_checkpoints')
+    state = aws.table('PIPELINE_STATE_TABLE')
+
+    assert checkpoints.request_backfill(state, 'AAPL', '2021-10-01', '2026-09-30')
+    assert not checkpoints.request_backfill(state, 'AAPL', '2020-10-01', '2026-09-30')
+    assert checkpoints.get_checkpoint(state, 'MSFT') is None
+
+    checkpoints.record_failure(state, 'AAPL', RuntimeError('timeout'))
+    assert checkpoints.record_failure(state, 'AAPL', RuntimeError('timeout')) == 2
+    checkpoints.save_progress(state, 'AAPL', 'https://api.polygon.io/next?cursor=a', 500)
+    checkpoint = checkpoints.get_checkpoint(state, 'AAPL')
+    # A stored page clears the failure streak; the window is the first request's
+    assert checkpoint['status'] == checkpoints.IN_PROGRESS and checkpoint['failures'] == 0
+    assert checkpoint['barsWritten'] == 500 and checkpoint['fromDate'] == '2021-10-01'
+
+    checkpoints.complete_backfill(state, 'AAPL', 20)
+    checkpoint = checkpoints.get_checkpoint(state, 'AAPL')
+    assert checkpoint['status'] == checkpoints.DONE and checkpoint['barsWritten'] == 520
+    assert 'nextUrl' not in checkpoint
+    assert checkpoints.get_open_checkpoints(state) == []
+
+    # Restarting replaces even a finished checkpoint
+    assert checkpoints.request_backfill(state, 'AAPL', '2021-10-01', '2026-09-30', restart=True)
+    open_checkpoint, = checkpoints.get_open_checkpoints(state)
+    assert open_checkpoint['ticker'] == 'AAPL' and open_checkpoint['barsWritten'] == 0
+
+
+class Pages:
+    """
+    fetch_page stand-in serving aggregates pages by URL.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def __call__(self, url, params):
+        self.requests.append((url, params))
+        page = self.pages[url.split('/range/')[-1] if '/range/' in url else url]
+        if isinstance(page, Exception):
+            raise page
+        return page
+
+
+def test_interrupted_backfill_resumes_from_next_url(backfill, aws, monkeypatch):
+    checkpoints = aws.load('src.utils.backfill_checkpoints')
+    state = aws.table('PIPELINE_STATE_TABLE')
+    checkpoints.request_backfill(state, 'AAPL', '2026-10-01', '2026-10-04')
+    cursor = 'https://api.polygon.io/v2/aggs/next?cursor=page2'
+    pages = Pages({
+        '1/day/2026-10-01/2026-10-04': {'results': [bar(0), bar(1)], 'next_url': cursor},
+        cursor: RuntimeError('connection reset')
+    })
+    monkeypatch.setattr(backfill, 'fetch_page', pages)
+
+    assert backfill.lambda_handler({}, None)['tickers_failed'] == 1
+    checkpoint = checkpoints.get_checkpoint(state, 'AAPL')
+    assert checkpoint['nextUrl'] == cursor and checkpoint['barsWritten'] == 2
+
+    pages.pages[cursor] = {'results': [bar(2), bar(3)]}
+    result = backfill.lambda_handler({}, None)
+
+    # Only the page after the cursor is fetched again, without the first page's params
+    assert pages.requests[-1] == (cursor, {})
+    assert len(pages.requests) == 3
+    assert result['tickers_completed'] == 1 and result['bars_stored'] == 2
+    assert checkpoints.get_checkpoint(state, 'AAPL')['barsWritten'] == 4
+    assert len(stored_bars(aws, 'AAPL')) == 4
+
+
+def test_restart_redoes_the_original_window(backfill, aws, monkeypatch):
+    checkpoints = aws.load('src.utils.backfill_checkpoints')
+    state = aws.table('PIPELINE_STATE_TABLE')
+    aws.table('TICKER_DATA_TABLE').put_item(Item={
+        'ticker': 'AAPL', 'timestamp': '2026-10-10T20:00:00', 'asOf': '2026-10-10T16:00:00'
+    })
+    window = '1/day/2025-10-09/2026-10-09'
+    pages = Pages({window: {'results': [bar(-300), bar(-200), bar(-100)]}})
+    monkeypatch.setattr(backfill, 'fetch_page', pages)
+
+    backfill.lambda_handler({'tickers': ['AAPL'], 'years': 1}, None)
+    assert len(stored_bars(aws, 'AAPL')) == 4
+
+    result = backfill.lambda_handler({'tickers': ['AAPL'], 'years': 1, 'restart': True}, None)
+
+    assert result['tickers_completed'] == 1
+    assert [url.split('/range/')[-1] for url, _ in pages.requests] == [window, window]
+    checkpoint = checkpoints.get_checkpoint(state, 'AAPL')
+    assert (checkpoint['fromDate'], checkpoint['toDate']) == ('2025-10-09', '2026-10-09')
+
+    # Without the checkpoint, backfilled bars still don't count as the first record
+    state.delete_item(Key={'pk': 'backfill', 'sk': 'ticker#AAPL'})
+    assert backfill.backfill_range('AAPL', 1) == ('2025-10-09', '2026-10-09')
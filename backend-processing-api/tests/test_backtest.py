@@ -0,0 +1,180 @@
+"""
+Backtests of opportunity scores (src/analytics/backtest.py): the score and
+forward-return grids, hit rate, rank IC and buckets, and a run against
+scores and history stored in moto.
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_backtest.py
+"""
+
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from src.analytics.backtest import (
+    BUCKET_LABELS,
+    _average_ranks,
+    evaluate,
+    forward_returns,
+    score_matrix
+)
+
+nan = np.nan
+
+
+def test_forward_returns_run_to_the_end_of_history():
+    prices = np.array([[100.0, nan], [110.0, 50.0], [121.0, 55.0], [133.1, 44.0]])
+
+    forward = forward_returns(prices, horizons=(1, 2, 4))
+
+    np.testing.assert_allclose(forward[0], [[0.1, nan], [0.1, 0.1], [0.1, -0.2], [nan, nan]])
+    np.testing.assert_allclose(forward[1], [[0.21, nan], [0.21, -0.12], [nan, nan], [nan, nan]])
+    # A horizon as long as the history has no forward returns at all
+    assert np.isnan(forward[2]).all()
+
+
+def test_scores_land_on_the_last_price_date_and_are_averaged():
+    dates = ['2026-10-12', '2026-10-13', '2026-10-15']
+    scores = [
+        ('AAPL', '2026-10-14', 4.0),
+        # Two portfolios scored MSFT on the same date
+        ('MSFT', '2026-10-15', 2.0),
+        ('MSFT', '2026-10-15', 6.0),
+        ('MSFT', '2026-10-11', 9.0),
+        ('TSLA', '2026-10-12', -3.0)
+    ]
+
+    grid = score_matrix(scores, ['AAPL', 'MSFT'], dates)
+
+    np.testing.assert_array_equal(grid, [[nan, nan], [4.0, nan], [nan, 4.0]])
+
+
+def test_ties_share_their_average_rank():
+    values = np.array([[3.0, 1.0, 3.0, nan, 2.0]])
+
+    ranks = _average_ranks(values, ~np.isnan(values))
+
+    np.testing.assert_array_equal(ranks[0, [1, 4, 0, 2]], [0, 1, 2.5, 2.5])
+
+
+def test_hit_rate_ic_and_buckets():
+    scores = np.array([
+        [-6.0, -2.0, 0.0, 3.0, 8.0],
+        [5.0, -1.0, 1.0, -7.0, nan]
+    ])
+    returns = np.array([
+        [-0.02, 0.01, 0.005, 0.03, 0.04],
+        [0.01, 0.02, 0.0, -0.01, 0.5]
+    ])
+
+    result = evaluate(scores, returns)
+
+    assert result['observations'] == 9
+    # Zero scores and flat returns carry no sign: 3 of 4 on the first date, 2 of 3 on the second
+    assert result['hit_rate'] == pytest.approx(5 / 7)
+    # Only the first date scores MIN_IC_TICKERS tickers; one pair of ranks is swapped
+    assert result['ic_dates'] == 1
+    assert result['ic'] == pytest.approx(np.corrcoef([0, 1, 2, 3, 4], [0, 2, 1, 3, 4])[0, 1])
+    assert len(result['bucket_returns']) == len(BUCKET_LABELS)
+    np.testing.assert_allclose(result['bucket_returns'], [-0.015, 0.01, 0.0125, 0.015, 0.025])
+    np.testing.assert_array_equal(result['bucket_counts'], [2, 1, 2, 2, 2])
+
+
+def test_batched_grid_matches_each_parameter_set():
+    rng = np.random.default_rng(39)
+    scores = rng.integers(-10, 11, (3, 30, 8)).astype(float)
+    scores[rng.random(scores.shape) < 0.2] = nan
+    returns = rng.normal(0, 0.02, (30, 8))
+    returns[-5:] = nan
+
+    batched = evaluate(scores, returns)
+
+    for g in range(len(scores)):
+        single = evaluate(scores[g], returns)
+        for key, value in single.items():
+            np.testing.assert_allclose(batched[key][g], value, err_msg=key)
+
+
+# Daily drift of each ticker; the model scores 100x the drift, so every
+# score has the sign of every forward return and the same ordering
+DRIFTS = {'AAPL': 0.01, 'AMZN': -0.03, 'MSFT': 0.02, 'NVDA': 0.04, 'TSLA': -0.01, 'X:BTCUSD': 0.005}
+DAYS = 30
+
+
+@pytest.fixture
+def stored_history(aws):
+    start = datetime.now() - timedelta(days=DAYS)
+    dates = [(start + timedelta(days=day)).strftime('%Y-%m-%d') for day in range(1, DAYS)]
+    ticker_data = aws.table('TICKER_DATA_TABLE')
+    for ticker, drift in DRIFTS.items():
+        for day, date in enumerate(dates):
+            price = Decimal(str(round(100 * (1 + drift) ** day, 6)))
+            ticker_data.put_item(Item={
+                'ticker': ticker, 'timestamp': f'{date}T20:00:00', 'asOf': f'{date}T16:00:00',
+                'price': price, 'rsi': Decimal(50 - 500 * drift), 'ma50': price * Decimal(1 - drift)
+            })
+
+    analyses = aws.table('ANALYSES_TABLE')
+    entries = [{'ticker': ticker, 'score': Decimal(str(100 * drift))} for ticker, drift in DRIFTS.items()]
+    for date in dates:
+        analyses.put_item(Item={
+            'portfolio': 'p1', 'timestamp': f'{date}T21:00:00', 'dataAsOf': f'{date}T16:00:00',
+            'parsed_data': json.dumps(entries, default=str)
+        })
+    # Pointer partitions repeat an analysis and must not be counted twice
+    analyses.put_item(Item={
+        'portfolio': 'p1#latest', 'timestamp': 'LATEST', 'parsed_data': json.dumps(entries, default=str)
+    })
+    # An entry's own asOf wins over the analysis's
+    analyses.put_item(Item={
+        'portfolio': 'p2', 'timestamp': f'{dates[-1]}T21:00:00', 'dataAsOf': f'{dates[-1]}T16:00:00',
+        'parsed_data': json.dumps([{'ticker': 'AAPL', 'score': 1.2, 'asOf': f'{dates[0]}T16:00:00'}])
+    })
+    return dates
+
+
+def test_load_model_scores_skips_pointer_partitions(aws, stored_history):
+    backtest = aws.load('src.analytics.backtest')
+
+    scores = backtest.load_model_scores(aws.ddb, aws.tables['ANALYSES_TABLE'], stored_history[0])
+
+    assert len(scores) == len(stored_history) * len(DRIFTS) + 1
+    assert ('AAPL', stored_history[0], 1.2) in scores
+    assert ('NVDA', stored_history[-1], 4.0) in scores
+
+
+def test_run_backtest_over_stored_scores_and_history(aws, stored_history):
+    backtest = aws.load('src.analytics.backtest')
+    scoring = aws.load('src.analytics.scoring')
+    grid = scoring.parameter_grid([30, 45], [55, 70], [0.0, 0.05])
+
+    report = backtest.run_backtest(
+        aws.ddb, aws.tables['ANALYSES_TABLE'], aws.tables['TICKER_DATA_TABLE'], DAYS + 1,
+        horizons=(1, 5), grid=grid
+    )
+
+    one_day = report['model'][1]
+    assert one_day['observations'] == (len(stored_history) - 1) * len(DRIFTS)
+    assert one_day['hit_rate'] == 1.0
+    assert one_day['ic'] == pytest.approx(1.0) and one_day['ic_dates'] == len(stored_history) - 1
+    assert report['model'][5]['observations'] == (len(stored_history) - 5) * len(DRIFTS)
+    assert one_day['buckets']['[-1,1)']['count'] == 2 * (len(stored_history) - 1)
+    assert one_day['buckets']['[-10,-5)']['mean_return'] is None
+
+    assert (report['default_rule']['rsi_low'], report['default_rule']['rsi_high']) == scoring.DEFAULT_RSI_BAND
+    assert len(report['rule_grid']) == len(grid['rsi_low'])
+    ics = [row['horizons'][1]['ic'] for row in report['rule_grid']]
+    # Best first; parameter sets scoring nothing (no IC) last
+    ranked = [ic for ic in ics if ic is not None]
+    assert ranked and ics == sorted(ranked, reverse=True) + [None] * (len(ics) - len(ranked))
+
+
+def test_run_backtest_without_scores(aws):
+    backtest = aws.load('src.analytics.backtest')
+
+    report = backtest.run_backtest(aws.ddb, aws.tables['ANALYSES_TABLE'], aws.tables['TICKER_DATA_TABLE'], 30)
+
+    assert report == {'model': {}, 'default_rule': {}, 'rule_grid': []}
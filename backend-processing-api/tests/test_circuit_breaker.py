@@ -0,0 +1,161 @@
+"""
+Circuit breaker state transitions (src/utils/circuit_breaker.py) against
+InMemoryCircuitStore with a fake clock.
+
+Run from backend-processing-api/:
+    python -m pytest -q tests/test_circuit_breaker.py
+"""
+
+import pytest
+
+from src.utils.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    MAX_TRANSITION_ATTEMPTS,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    InMemoryCircuitStore
+)
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class RacingStore(InMemoryCircuitStore):
+    """
+    Store where another worker writes just before each of the first `races` saves.
+    """
+
+    def __init__(self, races, competing_state):
+        super().__init__()
+        self.races = races
+        self.competing_state = competing_state
+        self.saves = 0
+
+    def save(self, name, state, expected_version):
+        self.saves += 1
+        if self.races:
+            self.races -= 1
+            current = self.load(name)
+            version = current['version'] if current else None
+            super().save(name, {**self.competing_state, 'version': (version or 0) + 1}, version)
+        return super().save(name, state, expected_version)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def breaker(store, clock, **kwargs):
+    return CircuitBreaker('xai', store, failure_threshold=3, reset_timeout=300, probe_timeout=330,
+                          clock=clock, **kwargs)
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    circuit = breaker(InMemoryCircuitStore(), clock)
+    circuit.record_failure()
+    circuit.record_success()
+    for _ in range(2):
+        assert circuit.record_failure()['state'] == CLOSED
+    circuit.before_call()
+
+    assert circuit.record_failure()['state'] == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        circuit.before_call()
+    assert error.value.retry_after == 301
+
+
+def test_one_half_open_probe_after_reset_timeout(clock):
+    store = InMemoryCircuitStore()
+    first, second = breaker(store, clock), breaker(store, clock)
+    for _ in range(3):
+        first.record_failure()
+
+    clock.now += 299
+    with pytest.raises(CircuitOpenError):
+        first.before_call()
+
+    clock.now += 1
+    first.before_call()
+    assert store.load('xai')['state'] == HALF_OPEN
+    # Only one worker probes
+    with pytest.raises(CircuitOpenError) as error:
+        second.before_call()
+    assert error.value.retry_after == 331
+
+
+def test_probe_success_closes_and_failure_reopens(clock):
+    store = InMemoryCircuitStore()
+    circuit = breaker(store, clock)
+    for _ in range(3):
+        circuit.record_failure()
+    clock.now += 300
+    circuit.before_call()
+
+    # A half-open failure re-opens at once, whatever the count
+    reopened = circuit.record_failure()
+    assert reopened['state'] == OPEN and reopened['openedAt'] == clock.now
+
+    clock.now += 300
+    circuit.before_call()
+    assert circuit.record_success()['state'] == CLOSED
+    circuit.before_call()
+    assert store.load('xai')['failures'] == 0
+
+
+def test_silent_probe_is_taken_over_after_probe_timeout(clock):
+    store = InMemoryCircuitStore()
+    first, second = breaker(store, clock), breaker(store, clock)
+    for _ in range(3):
+        first.record_failure()
+    clock.now += 300
+    first.before_call()
+
+    clock.now += 330
+    second.before_call()
+    assert store.load('xai')['probeUntil'] == clock.now + 330
+
+
+def test_version_conflict_reapplies_on_the_winning_state(clock):
+    # Another worker counts a failure between this worker's load and save
+    store = RacingStore(races=1, competing_state={'state': CLOSED, 'failures': 2, 'openedAt': 0, 'probeUntil': 0})
+    circuit = breaker(store, clock)
+
+    state = circuit.record_failure()
+
+    assert store.saves == 2
+    assert state['state'] == OPEN and state['failures'] == 3
+    assert store.load('xai')['version'] == 2
+
+
+def test_contended_transition_gives_up(clock):
+    store = RacingStore(races=MAX_TRANSITION_ATTEMPTS,
+                        competing_state={'state': CLOSED, 'failures': 0, 'openedAt': 0, 'probeUntil': 0})
+    circuit = breaker(store, clock)
+
+    state = circuit.record_failure()
+
+    assert store.saves == MAX_TRANSITION_ATTEMPTS
+    assert state['failures'] == 0 and state['version'] == MAX_TRANSITION_ATTEMPTS
+
+
+def test_retry_after(clock):
+    circuit = breaker(InMemoryCircuitStore(), clock)
+    assert circuit.retry_after() == 0
+
+    for _ in range(3):
+        circuit.record_failure()
+    clock.now += 100.5
+    assert circuit.retry_after() == 200
+    assert circuit.is_open()
+
+    # Never below one second, even once the probe is overdue
+    clock.now += 1000
+    assert circuit.retry_after() == 1
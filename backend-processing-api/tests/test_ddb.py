@@ -0,0 +1,115 @@
+"""
+The wire-format codec and records of src/utils/ddb.py, round-tripped
+through moto and checked against boto3's own (de)serializer.
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_ddb.py
+"""
+
+from decimal import Decimal
+
+import pytest
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+
+from src.utils.ddb import Position, decode_item, decode_value, encode_item, encode_value, scan_items
+
+ITEM = {
+    'ticker': 'AAPL',
+    'timestamp': '2026-10-16T20:00:00',
+    'price': Decimal('227.48'),
+    'shares': Decimal('0.000001'),
+    'volume': Decimal('48291734'),
+    'tiny': Decimal('1E-30'),
+    'huge': Decimal('9.99999999999999999999999999999999999E+125'),
+    'negative': Decimal('-17.5'),
+    'isActive': True,
+    'archived': False,
+    'note': None,
+    'tags': {'tech', 'mega-cap'},
+    'windows': {Decimal(14), Decimal(50), Decimal('0.5')},
+    'blob': b'\x00\xffgzip',
+    'chunks': {b'\x01', b'\x02\x03'},
+    'bars': [{'c': Decimal('227.48'), 't': Decimal(1792108800000)}, [Decimal(1), 'x', None]],
+    'meta': {'source': 'polygon', 'flags': {'split': False, 'ratio': Decimal('0.25')}, 'empty': {}}
+}
+
+
+def test_encoding_matches_boto3():
+    serializer = TypeSerializer()
+
+    for name, value in ITEM.items():
+        encoded = encode_value(value)
+        expected = serializer.serialize(value)
+        if 'SS' in expected or 'NS' in expected or 'BS' in expected:
+            # Set order is arbitrary
+            (kind, members), = encoded.items()
+            (expected_kind, expected_members), = expected.items()
+            assert kind == expected_kind, name
+            assert sorted(members) == sorted(bytes(m) if isinstance(m, Binary) else m for m in expected_members), name
+        else:
+            assert encoded == expected, name
+
+
+def test_decimal_decoding_matches_boto3():
+    deserializer = TypeDeserializer()
+    wire = {name: TypeSerializer().serialize(value) for name, value in ITEM.items()}
+
+    decoded = decode_item(wire, number=Decimal)
+
+    expected = {name: deserializer.deserialize(value) for name, value in wire.items()}
+    expected['blob'] = bytes(expected['blob'])
+    expected['chunks'] = {bytes(chunk) for chunk in expected['chunks']}
+    assert decoded == expected == ITEM
+
+
+def test_float_decoding():
+    assert decode_value({'N': '227.48'}) == 227.48
+    assert decode_value({'NS': ['1', '2.5']}) == {1.0, 2.5}
+    assert decode_value({'L': [{'N': '3'}]}, number=int) == [3]
+    with pytest.raises(ValueError, match='Unknown DynamoDB type'):
+        decode_value({'X': 'y'})
+
+
+def test_encoding_rejects_what_dynamodb_cannot_store():
+    with pytest.raises(TypeError):
+        encode_value(object())
+    with pytest.raises(TypeError):
+        encode_value({'a', 1})
+    # None attributes are left out rather than written as NULL
+    assert encode_item({'id': 'a', 'note': None}) == {'id': {'S': 'a'}}
+
+
+def test_round_trip_through_dynamodb(aws):
+    table_name = aws.tables['TICKER_DATA_TABLE']
+    aws.ddb.put_item(TableName=table_name, Item=encode_item(ITEM))
+
+    item = aws.ddb.get_item(TableName=table_name, Key=encode_item({
+        'ticker': ITEM['ticker'], 'timestamp': ITEM['timestamp']
+    }))['Item']
+
+    expected = {name: value for name, value in ITEM.items() if value is not None}
+    assert decode_item(item, number=Decimal) == expected
+    # And what the resource API reads back
+    resource_item = aws.table('TICKER_DATA_TABLE').get_item(Key={
+        'ticker': ITEM['ticker'], 'timestamp': ITEM['timestamp']
+    })['Item']
+    resource_item['blob'] = bytes(resource_item['blob'])
+    resource_item['chunks'] = {bytes(chunk) for chunk in resource_item['chunks']}
+    assert resource_item == expected
+
+
+def test_position_records_from_a_scan(aws, monkeypatch):
+    positions = aws.table('POSITIONS_TABLE')
+    for i in range(5):
+        positions.put_item(Item={
+            'id': f'a{i}', 'portfolioId': 'p1', 'ticker': 'AAPL', 'shares': Decimal('0.1') * (i + 1),
+            'costBasis': Decimal(100), 'notes': 'not projected'
+        })
+
+    items = scan_items(aws.ddb, TableName=aws.tables['POSITIONS_TABLE'], Limit=2,
+                       ProjectionExpression=Position.PROJECTION)
+    records = sorted((Position.from_item(item, number=Decimal) for item in items), key=lambda p: p.id)
+
+    # Every page is read; exact values survive with number=Decimal
+    assert [p.shares for p in records] == [Decimal('0.1') * (i + 1) for i in range(5)]
+    assert records[0].cost_basis == 100 and records[0].market_value is None
@@ -0,0 +1,189 @@
+"""
+The Polygon response cache (src/utils/http_cache.py), response expiry
+(polygon.bar_expiry) and their use by processTicker's fetches, against moto.
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_http_cache.py
+"""
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from src.utils.http_cache import (
+    CACHE_PARTITION,
+    NEGATIVE_BASE_SECONDS,
+    NEGATIVE_MAX_SECONDS,
+    RETAIN_SECONDS,
+    ResponseCache,
+    cache_key,
+    negative_ttl
+)
+from src.utils.polygon import BAR_SETTLE_MINUTES, MIN_BAR_TTL_SECONDS, bar_expiry
+
+PARAMS = {'apiKey': 'secret', 'limit': 1, 'sort': 'desc'}
+BODY = {'results': [{'t': 1, 'c': 100.0}]}
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_key_ignores_secrets_and_parameter_order():
+    key = cache_key('aggs', 'AAPL', PARAMS)
+
+    assert key.startswith('aggs#AAPL#')
+    assert cache_key('aggs', 'AAPL', {'sort': 'desc', 'limit': 1, 'apiKey': 'other'}) == key
+    assert cache_key('aggs', 'AAPL', {**PARAMS, 'limit': 2}) != key
+    assert cache_key('aggs', 'MSFT', PARAMS) != key
+
+
+def test_negative_ttl_doubles_up_to_the_cap():
+    assert [negative_ttl(misses) for misses in (0, 1, 2, 3)] == [
+        NEGATIVE_BASE_SECONDS, NEGATIVE_BASE_SECONDS, 2 * NEGATIVE_BASE_SECONDS, 4 * NEGATIVE_BASE_SECONDS
+    ]
+    assert negative_ttl(50) == NEGATIVE_MAX_SECONDS
+
+
+def test_entries_are_served_until_they_expire():
+    clock = Clock()
+    cache = ResponseCache(clock=clock)
+
+    assert cache.lookup('aggs', 'AAPL', PARAMS) is None
+    cache.store('aggs', 'AAPL', PARAMS, BODY, clock.now + 60)
+    assert cache.lookup('aggs', 'AAPL', PARAMS)['data'] == BODY
+
+    clock.now += 60
+    assert cache.lookup('aggs', 'AAPL', PARAMS) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_empty_responses_back_off_until_data_returns():
+    clock = Clock()
+    cache = ResponseCache(clock=clock)
+
+    expiries = []
+    for _ in range(3):
+        expiries.append(cache.store_empty('aggs', 'DELISTED', PARAMS) - clock.now)
+    assert expiries == [negative_ttl(1), negative_ttl(2), negative_ttl(3)]
+    assert cache.lookup('aggs', 'DELISTED', PARAMS)['empty']
+
+    cache.store('aggs', 'DELISTED', PARAMS, BODY, clock.now + 60)
+    # Data clears the count: the next empty response starts over
+    assert cache.store_empty('aggs', 'DELISTED', PARAMS) - clock.now == NEGATIVE_BASE_SECONDS
+
+
+def test_entries_are_shared_through_the_table(aws):
+    state = aws.table('PIPELINE_STATE_TABLE')
+    clock = Clock()
+    writer = ResponseCache(state, clock=clock)
+    writer.store('aggs', 'AAPL', PARAMS, BODY, clock.now + 3600)
+    writer.store_empty('aggs', 'DELISTED', PARAMS)
+    writer.store_empty('aggs', 'DELISTED', PARAMS)
+
+    # A cold container finds both, the negative entry with its count
+    reader = ResponseCache(state, clock=clock)
+    assert reader.lookup('aggs', 'AAPL', PARAMS)['data'] == BODY
+    assert reader.store_empty('aggs', 'DELISTED', PARAMS) == clock.now + negative_ttl(3)
+
+    item = state.get_item(Key={'pk': CACHE_PARTITION, 'sk': cache_key('aggs', 'DELISTED', PARAMS)})['Item']
+    assert 'body' not in item and item['misses'] == 3
+    assert item['expiresAt'] == item['validUntil'] + RETAIN_SECONDS
+    assert 'secret' not in str(state.scan()['Items'])
+
+
+class BrokenTable:
+    def get_item(self, **kwargs):
+        raise RuntimeError('throttled')
+
+    def put_item(self, **kwargs):
+        raise RuntimeError('throttled')
+
+
+def test_table_failures_fall_back_to_memory():
+    clock = Clock()
+    cache = ResponseCache(BrokenTable(), clock=clock)
+
+    assert cache.lookup('aggs', 'AAPL', PARAMS) is None
+    cache.store('aggs', 'AAPL', PARAMS, BODY, clock.now + 60)
+    assert cache.lookup('aggs', 'AAPL', PARAMS)['data'] == BODY
+
+
+def bar_ms(*day):
+    return int(utc(*day) * 1000)
+
+
+def test_finished_bar_is_current_until_the_next_session_closes():
+    settle = BAR_SETTLE_MINUTES * 60
+    friday = bar_ms(2026, 10, 16)
+    saturday_noon = utc(2026, 10, 17, 12)
+
+    # Friday's bar is only superseded by Monday's
+    assert bar_expiry(friday, 'stock', now=saturday_noon) == utc(2026, 10, 19, 21) + settle
+    # Crypto trades through the weekend and its bars cover the UTC day
+    assert bar_expiry(friday, 'crypto', now=saturday_noon) == utc(2026, 10, 18) + settle
+
+
+def test_forming_or_overdue_bars_get_the_minimum_ttl():
+    friday = bar_ms(2026, 10, 16)
+    before_close = utc(2026, 10, 16, 18)
+    after_next_close = utc(2026, 10, 20, 12)
+
+    assert bar_expiry(friday, 'stock', now=before_close) == before_close + MIN_BAR_TTL_SECONDS
+    # Monday's bar should exist by now; ask again soon rather than never
+    assert bar_expiry(friday, 'stock', now=after_next_close) == after_next_close + MIN_BAR_TTL_SECONDS
+
+
+class Polygon:
+    """
+    requests.get stand-in counting calls and replying with fixed JSON.
+    """
+
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+        self.calls = 0
+
+    def __call__(self, url, params=None):
+        self.calls += 1
+        return SimpleNamespace(status_code=self.status_code, json=lambda: self.body)
+
+
+def test_fetch_price_reuses_responses_across_containers(aws, monkeypatch):
+    aws.setenv('HTTP_CACHE_TABLE', aws.tables['PIPELINE_STATE_TABLE'])
+    process_ticker = aws.load('src.handlers.process_ticker')
+    polygon = Polygon({'results': [{'t': bar_ms(2026, 10, 16), 'c': 100.0}]})
+    monkeypatch.setattr(process_ticker.requests, 'get', polygon)
+    process_ticker.polygon_cache.clock = Clock(utc(2026, 10, 17, 12))
+
+    assert process_ticker.fetch_price('AAPL')[0] == 100.0
+    # A fresh container on Sunday reads the shared entry
+    monkeypatch.setattr(process_ticker, 'polygon_cache',
+                        ResponseCache(process_ticker.polygon_cache.table, clock=Clock(utc(2026, 10, 18, 12))))
+    assert process_ticker.fetch_price('AAPL')[0] == 100.0
+    assert polygon.calls == 1
+
+    # Once Monday's bar is due, Polygon is asked again
+    process_ticker.polygon_cache.clock.now = utc(2026, 10, 19, 23)
+    process_ticker.fetch_price('AAPL')
+    assert polygon.calls == 2
+
+
+@pytest.mark.parametrize('status_code', [200, 404])
+def test_fetch_indicator_remembers_missing_values(aws, monkeypatch, status_code):
+    process_ticker = aws.load('src.handlers.process_ticker')
+    polygon = Polygon({'results': {}}, status_code)
+    monkeypatch.setattr(process_ticker.requests, 'get', polygon)
+
+    assert process_ticker.fetch_indicator('NEWCO', 'rsi', 14) is None
+    assert process_ticker.fetch_indicator('NEWCO', 'rsi', 14) is None
+    assert polygon.calls == 1
@@ -0,0 +1,84 @@
+"""
+Import-time budget of every Lambda handler module.
+
+Handlers build their AWS clients on first use (src/utils/aws.py), so
+importing one must not import boto3 and stays well under the few hundred
+milliseconds that boto3 and a DynamoDB resource cost at init. Each module is
+imported in a fresh interpreter under `python -X importtime` and its
+cumulative import time is checked against a budget.
+
+Run from backend-processing-api/:
+    python -m pytest -q tests/test_import_time.py
+
+IMPORT_BUDGET_SCALE multiplies every budget (e.g. 3 on a slow CI runner).
+"""
+
+import functools
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+HANDLERS = sorted(path.stem for path in (ROOT / 'src' / 'handlers').glob('*.py'))
+
+# Milliseconds of cumulative import time per handler module
+DEFAULT_BUDGET_MS = 60
+# Handlers that need NumPy (and requests) at import
+BUDGETS_MS = {
+    'backfill_history': 250,
+    'compute_indicators': 250,
+    'compute_portfolio_risk': 250,
+    'export_history': 250,
+    'process_ticker': 300,
+    'revalue_positions': 250
+}
+BUDGET_SCALE = float(os.environ.get('IMPORT_BUDGET_SCALE', '1'))
+
+# Modules whose import means AWS clients are no longer built lazily
+EAGER_MODULES = ('boto3', 'botocore')
+
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'POSITIONS_TABLE': 'positions',
+    'PORTFOLIOS_TABLE': 'portfolios',
+    'TICKER_DATA_TABLE': 'ticker-data',
+    'ANALYSES_TABLE': 'analyses',
+    'PIPELINE_STATE_TABLE': 'pipeline-state',
+    'PORTFOLIO_METRICS_TABLE': 'portfolio-metrics'
+}
+
+
+@functools.lru_cache(maxsize=None)
+def import_profile(module):
+    """
+    {imported module: cumulative microseconds} of importing a module afresh.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, env={**os.environ, **ENVIRONMENT}, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+@pytest.mark.parametrize('handler', HANDLERS)
+def test_handler_builds_clients_lazily(handler):
+    profile = import_profile(f'src.handlers.{handler}')
+    assert not [name for name in EAGER_MODULES if name in profile]
+
+
+@pytest.mark.parametrize('handler', HANDLERS)
+def test_handler_import_within_budget(handler):
+    module = f'src.handlers.{handler}'
+    elapsed_ms = import_profile(module)[module] / 1000
+    budget_ms = BUDGETS_MS.get(handler, DEFAULT_BUDGET_MS) * BUDGET_SCALE
+    assert elapsed_ms <= budget_ms, f'{module} took {elapsed_ms:.0f} ms to import (budget {budget_ms:.0f} ms)'
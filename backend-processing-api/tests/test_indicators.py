@@ -0,0 +1,103 @@
+"""
+Indicator math on small fixed series (src/analytics/indicators.py).
+
+Run from backend-processing-api/:
+    python -m pytest -q tests/test_indicators.py
+"""
+
+import numpy as np
+import pytest
+
+from src.analytics.indicators import (
+    average_true_range,
+    ema,
+    exponential_mean,
+    inputs_from_records,
+    relative_strength_index,
+    rolling_mean
+)
+
+nan = np.nan
+
+# Wilder's RSI example series (New Concepts in Technical Trading Systems)
+WILDER_CLOSE = [44.34, 44.09, 44.15, 43.61, 44.33, 44.83, 45.10, 45.42, 45.84, 46.08,
+                45.89, 46.03, 45.61, 46.28, 46.28, 46.00, 46.03, 46.41, 46.22, 45.64]
+
+
+def column(values):
+    return np.array(values, dtype=np.float64)[:, None]
+
+
+def test_rolling_mean_warm_up_and_gaps():
+    values = column([1, 2, 3, 4, 5, nan, 7, 8, 9])
+
+    result = rolling_mean(values, 3)[:, 0]
+
+    # NaN until a full window, and for every window holding a missing value
+    np.testing.assert_array_equal(result, [nan, nan, 2, 3, 4, nan, nan, nan, 8])
+
+
+def test_rolling_mean_shorter_than_window():
+    assert np.isnan(rolling_mean(column([1, 2]), 3)).all()
+
+
+def test_ema_warm_up():
+    # span 3 is alpha 0.5, seeded with the first value; a gap carries the mean forward
+    result = ema(column([nan, 2, 4, nan, 8]), 3)[:, 0]
+
+    np.testing.assert_array_equal(result, [nan, 2, 3, 3, 5.5])
+
+
+def test_exponential_mean_seeds_each_column():
+    values = np.array([[1, nan], [3, 10], [5, 20]], dtype=np.float64)
+
+    result = exponential_mean(values, 0.25)
+
+    np.testing.assert_allclose(result, [[1, nan], [1.5, 10], [2.375, 12.5]])
+
+
+def test_rsi14_by_hand():
+    rsi = relative_strength_index(column(WILDER_CLOSE))['rsi14'][:, 0]
+
+    # The first 14 changes gain 3.34 and lose 1.40 in total
+    average_gain, average_loss = 3.34 / 14, 1.40 / 14
+    expected = [100 - 100 / (1 + average_gain / average_loss)]
+    for change in np.diff(WILDER_CLOSE)[14:]:
+        average_gain = (average_gain * 13 + max(change, 0)) / 14
+        average_loss = (average_loss * 13 + max(-change, 0)) / 14
+        expected.append(100 - 100 / (1 + average_gain / average_loss))
+
+    assert np.isnan(rsi[:14]).all()
+    np.testing.assert_allclose(rsi[14:], expected)
+    assert rsi[14] == pytest.approx(70.46, abs=0.01)
+
+
+def test_rsi_without_losses_is_100():
+    rsi = relative_strength_index(column(range(1, 17)))['rsi14'][:, 0]
+
+    np.testing.assert_array_equal(rsi[14:], [100, 100])
+
+
+def test_average_true_range_by_hand():
+    high, low, close = column([10, 12, 11, 13]), column([8, 9, 7, 10]), column([9, 11, 8, 12])
+
+    atr = average_true_range(high, low, close, period=2)['atr14'][:, 0]
+
+    # True ranges 2, 3, 4 (gap down from 11 to a low of 7), 5 (gap up from 8 to 13)
+    np.testing.assert_array_equal(atr, [nan, 2.5, 3.25, 4.125])
+
+
+def test_inputs_from_records_pads_shorter_histories():
+    records = {
+        'AAPL': {'2026-10-14': {'price': 10, 'volume': 100},
+                 '2026-10-15': {'price': 11},
+                 '2026-10-16': {'price': 12, 'volume': 300}},
+        'X:BTCUSD': {'2026-10-16': {'price': 60000}}
+    }
+
+    inputs = inputs_from_records(records, ['AAPL', 'X:BTCUSD', 'NEW'])
+
+    np.testing.assert_array_equal(inputs['close'], [[10, nan, nan], [11, nan, nan], [12, 60000, nan]])
+    np.testing.assert_array_equal(inputs['volume'], [[100, nan, nan], [nan, nan, nan], [300, nan, nan]])
+    # No record has high or low
+    assert inputs['high'] is None and inputs['low'] is None
@@ -0,0 +1,84 @@
+"""
+End-to-end runs of the nightly pipeline on the offline harness
+(tests/harness/pipeline.py), from the processTickers dispatch to reading the
+analyses through api/get_portfolio_analysis.py.
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_pipeline_e2e.py
+"""
+
+import sys
+
+import pytest
+
+pytest.importorskip('moto')
+
+from harness.fake_polygon import FakePolygon  # noqa: E402
+from harness.pipeline import API_DIR, Pipeline  # noqa: E402
+
+sys.path.insert(0, str(API_DIR / 'tools'))
+from generate_portfolios import generate_dataset  # noqa: E402
+
+TICKERS = 10
+POSITIONS = 20
+PORTFOLIOS = 2
+
+
+def assert_clean(report):
+    assert all(stats['errors'] == 0 for stats in report['functions'].values()), report['functions']
+    assert report['dropped_messages'] == {}
+
+
+def test_every_portfolio_is_analyzed_and_served():
+    with Pipeline(TICKERS, POSITIONS) as pipeline:
+        report = pipeline.run()
+
+    assert_clean(report)
+    # Every held ticker plus the risk benchmark index, each fetched once
+    assert report['polygon']['requests']['aggs'] == TICKERS + 1
+    assert report['sqs']['sent']['portfolio-queue'] == TICKERS + 1
+    assert report['lambda_invokes'] == {'processTickers': 1, 'analyzePortfolios': 1}
+    assert report['llm']['calls'] == PORTFOLIOS
+    assert report['llm']['prompt_tokens'] > 0
+    assert report['reads'] == {'single': {200: PORTFOLIOS}, 'bulk': {200: 1}, 'served': PORTFOLIOS}
+    positions = report['dynamodb']['portfolio-positions']
+    assert positions['ops']['UpdateItem'] == POSITIONS
+    assert positions['wcu'] >= POSITIONS
+
+
+def test_rate_limited_tickers_still_complete_the_run():
+    with Pipeline(TICKERS, POSITIONS, polygon=FakePolygon(rate_limit_every=4)) as pipeline:
+        report = pipeline.run()
+
+    assert_clean(report)
+    assert report['polygon']['rate_limited'] > 0
+    # Rate-limited tickers count as landed, so the run completes and the
+    # portfolios are analyzed with the data that did arrive
+    assert report['lambda_invokes']['analyzePortfolios'] == 1
+    assert report['reads']['served'] == PORTFOLIOS
+
+
+def test_rerun_reuses_cached_responses_and_analyses():
+    with Pipeline(TICKERS, POSITIONS) as pipeline:
+        pipeline.run('harness-run-1')
+        report = pipeline.run('harness-run-2')
+
+    assert_clean(report)
+    assert report['polygon']['requests'] == {}
+    assert report['llm']['calls'] == 0
+    assert report['reads']['served'] == PORTFOLIOS
+
+
+def test_generated_book_fetches_each_shared_ticker_once():
+    dataset = generate_dataset(3, positions_per_portfolio=5, tickers=40, legacy_portfolios=2, seed=11)
+    held = {p['ticker'] for p in dataset['positions']}
+    legacy = {t for item in dataset['legacy'] for t in item['tickers']}
+    assert held & legacy
+
+    with Pipeline(dataset=dataset) as pipeline:
+        report = pipeline.run()
+
+    assert_clean(report)
+    # Positions and legacy portfolios share one fetch per ticker, plus the risk benchmark
+    assert report['polygon']['requests']['aggs'] == len(held | legacy) + 1
+    assert report['reads']['served'] >= sum(1 for p in dataset['portfolios'] if p['isActive'])
@@ -0,0 +1,105 @@
+"""
+The run completion barrier of src/utils/pipeline_runs.py against moto.
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_pipeline_runs.py
+"""
+
+import pytest
+
+RUN_ID = '2026-10-19'
+
+
+@pytest.fixture
+def runs(aws):
+    pipeline_runs = aws.load('src.utils.pipeline_runs')
+    return pipeline_runs, aws.table('PIPELINE_STATE_TABLE')
+
+
+def test_registrations_are_paged_per_shard(runs, monkeypatch):
+    pipeline_runs, table = runs
+    monkeypatch.setattr(pipeline_runs, 'REGISTRATION_PAGE_SIZE', 3)
+    # Portfolio p0 holds the ticker in both shards
+    shards = {
+        0: ({'p0', 'p1', 'p2', 'p3'}, {f'a{i}': 10 for i in range(7)}),
+        1: ({'p0', 'p4'}, {f'b{i}': 1 for i in range(2)})
+    }
+    for shard, (portfolios, positions) in shards.items():
+        pipeline_runs.register_ticker(table, RUN_ID, 'AAPL', portfolios, positions, positions, shard)
+
+    items = table.scan()['Items']
+    pages = [item for item in items if item['sk'].startswith('members#AAPL#')]
+    assert len(pages) == 4
+    assert all(len(page.get('portfolioIds', ())) <= 3 and len(page.get('positionIds', ())) <= 3
+               for page in pages)
+    assert pipeline_runs.get_run_tickers(table, RUN_ID) == [
+        {'ticker': 'AAPL', 'positionCount': 9, 'marketValue': 72, 'legacy': False}
+    ]
+    assert pipeline_runs.get_registered_positions(table, RUN_ID, 'AAPL') == sorted(
+        [f'a{i}' for i in range(7)] + ['b0', 'b1'])
+
+    ready, _ = pipeline_runs.ticker_landed(table, RUN_ID, 'AAPL', True)
+
+    # p0 is released once, after the pages of both shards landed
+    assert sorted(ready) == ['p0', 'p1', 'p2', 'p3', 'p4']
+
+
+def dispatch(pipeline_runs, table, shards=1):
+    assert pipeline_runs.start_dispatch(table, RUN_ID, shards)
+    pipeline_runs.register_ticker(table, RUN_ID, 'AAPL', ['p1', 'p2'], ['a1', 'a2'])
+    pipeline_runs.register_ticker(table, RUN_ID, 'MSFT', ['p1'], ['m1'])
+
+
+def test_duplicate_landing_is_ignored(runs):
+    pipeline_runs, table = runs
+    dispatch(pipeline_runs, table)
+    assert pipeline_runs.finish_shard(table, RUN_ID, 0, {'positionsScanned': 3})
+
+    assert pipeline_runs.ticker_landed(table, RUN_ID, 'AAPL', True) == (['p2'], False)
+    # An SQS redelivery of the same ticker must not count MSFT as landed
+    assert pipeline_runs.ticker_landed(table, RUN_ID, 'AAPL', True) == ([], False)
+
+    assert pipeline_runs.ticker_landed(table, RUN_ID, 'MSFT', False) == (['p1'], True)
+
+
+def test_unregistered_ticker_does_not_land(runs):
+    pipeline_runs, table = runs
+    dispatch(pipeline_runs, table)
+
+    assert pipeline_runs.ticker_landed(table, RUN_ID, 'TSLA', True) == ([], False)
+
+
+def test_redelivered_shard_is_counted_once(runs):
+    pipeline_runs, table = runs
+    dispatch(pipeline_runs, table, shards=2)
+
+    assert not pipeline_runs.finish_shard(table, RUN_ID, 0, {'positionsScanned': 3})
+    assert not pipeline_runs.finish_shard(table, RUN_ID, 0, {'positionsScanned': 3})
+    # Re-registering the redelivered shard's tickers adds nothing
+    pipeline_runs.register_ticker(table, RUN_ID, 'AAPL', ['p1', 'p2'], ['a1', 'a2'])
+    pipeline_runs.ticker_landed(table, RUN_ID, 'AAPL', True)
+    pipeline_runs.ticker_landed(table, RUN_ID, 'MSFT', True)
+
+    summary = table.get_item(Key={'pk': f'run#{RUN_ID}', 'sk': 'summary'})['Item']
+    assert summary['positionsScanned'] == 3 and summary['shardsPending'] == 1 and summary['outstanding'] == 0
+    # The run only completes once the other shard reports
+    assert pipeline_runs.finish_shard(table, RUN_ID, 1, {'positionsScanned': 0})
+
+
+def test_dirty_free_portfolio_is_not_released(runs):
+    pipeline_runs, table = runs
+    dispatch(pipeline_runs, table)
+    pipeline_runs.finish_shard(table, RUN_ID, 0, {})
+
+    assert pipeline_runs.ticker_landed(table, RUN_ID, 'AAPL', False) == ([], False)
+    assert pipeline_runs.ticker_landed(table, RUN_ID, 'MSFT', False) == ([], True)
+
+
+def test_second_claim_in_the_same_run_fails(runs):
+    pipeline_runs, table = runs
+
+    assert pipeline_runs.claim_analysis(table, RUN_ID, 'p1')
+    assert not pipeline_runs.claim_analysis(table, RUN_ID, 'p1')
+    # Claims are per run and per portfolio
+    assert pipeline_runs.claim_analysis(table, RUN_ID, 'p2')
+    assert pipeline_runs.claim_analysis(table, '2026-10-20', 'p1')
@@ -0,0 +1,140 @@
+"""
+Incremental portfolio aggregates and daily snapshots
+(src/utils/portfolio_metrics.py, fed by process_ticker) against moto.
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_portfolio_metrics.py
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from src.utils.portfolio_metrics import position_delta
+
+AS_OF = '2026-10-16T16:00:00'
+
+
+@pytest.fixture
+def metrics(aws):
+    return aws.load('src.utils.portfolio_metrics'), aws.table('PORTFOLIO_METRICS_TABLE')
+
+
+@pytest.fixture
+def repricer(aws, metrics):
+    process_ticker = aws.load('src.handlers.process_ticker')
+    positions = aws.table('POSITIONS_TABLE')
+    positions.put_item(Item={'id': 'a1', 'portfolioId': 'p1', 'ticker': 'AAPL',
+                             'shares': Decimal(2), 'costBasis': Decimal(150)})
+    positions.put_item(Item={'id': 'a2', 'portfolioId': 'p1', 'ticker': 'AAPL',
+                             'shares': Decimal(1), 'costBasis': Decimal(90)})
+    positions.put_item(Item={'id': 'a3', 'portfolioId': 'p2', 'ticker': 'AAPL',
+                             'shares': Decimal(10), 'costBasis': Decimal(1000)})
+
+    def reprice(price, ids=('a1', 'a2', 'a3'), as_of=AS_OF):
+        process_ticker.update_position_prices('AAPL', Decimal(price), as_of, list(ids))
+
+    return reprice, positions
+
+
+def aggregate(metrics, portfolio_id):
+    portfolio_metrics, table = metrics
+    return portfolio_metrics.get_aggregate(table, portfolio_id)
+
+
+def totals(item):
+    return item['marketValue'], item['unrealizedPL'], item['costBasis']
+
+
+def test_position_delta():
+    # Never priced: the whole valuation enters the aggregate
+    assert position_delta({}, Decimal(120), Decimal(20)) == (120, 20, 100)
+    assert position_delta({'marketValue': Decimal(120), 'unrealizedPL': Decimal(20)},
+                          Decimal(150), Decimal(50)) == (30, 30, 0)
+
+
+def test_repricing_adds_deltas_from_the_replaced_values(metrics, repricer):
+    reprice, _ = repricer
+
+    reprice('100')
+    assert totals(aggregate(metrics, 'p1')) == (300, 60, 240)
+    assert totals(aggregate(metrics, 'p2')) == (1000, 0, 1000)
+
+    reprice('110')
+    # Only the change since the last price is added, not the full value again
+    assert totals(aggregate(metrics, 'p1')) == (330, 90, 240)
+    assert totals(aggregate(metrics, 'p2')) == (1100, 100, 1000)
+
+
+class RacedTable:
+    """
+    positions table where another writer reprices each position right after
+    it is read, applying its own delta to the aggregate as process_ticker does.
+    """
+
+    def __init__(self, table, metrics, price):
+        self.table = table
+        self.metrics = metrics
+        self.price = price
+
+    def get_item(self, Key):
+        item = self.table.get_item(Key=Key)
+        portfolio_metrics, metrics_table = self.metrics
+        shares, cost = item['Item']['shares'], item['Item']['costBasis']
+        old = self.table.update_item(
+            Key=Key, UpdateExpression='SET marketValue = :mv, unrealizedPL = :pl',
+            ExpressionAttributeValues={':mv': shares * self.price, ':pl': shares * self.price - cost},
+            ReturnValues='ALL_OLD'
+        )['Attributes']
+        deltas = portfolio_metrics.position_delta(old, shares * self.price, shares * self.price - cost)
+        portfolio_metrics.apply_position_delta(metrics_table, item['Item']['portfolioId'], *deltas)
+        return item
+
+    def update_item(self, **kwargs):
+        return self.table.update_item(**kwargs)
+
+
+def test_delta_comes_from_the_write_not_the_read(metrics, repricer, aws, monkeypatch):
+    reprice, positions = repricer
+    reprice('100', ids=['a1'])
+    process_ticker = aws.load('src.handlers.process_ticker')
+    monkeypatch.setattr(process_ticker, 'positions_table', RacedTable(positions, metrics, Decimal(105)))
+
+    process_ticker.update_position_prices('AAPL', Decimal(110), AS_OF, ['a1'])
+
+    # 200 -> 210 by the other writer, then 210 -> 220; a delta from the read would give 230
+    assert totals(aggregate(metrics, 'p1')) == (220, 70, 150)
+    assert positions.get_item(Key={'id': 'a1'})['Item']['marketValue'] == 220
+
+
+def test_snapshot_only_moves_forward_in_revisions(metrics):
+    portfolio_metrics, table = metrics
+    first = portfolio_metrics.apply_position_delta(table, 'p1', Decimal(100), Decimal(10), Decimal(90))
+    second = portfolio_metrics.apply_position_delta(table, 'p1', Decimal(50), Decimal(5), Decimal(45))
+    assert (first['revision'], second['revision']) == (1, 2)
+
+    assert portfolio_metrics.record_snapshot(table, 'p1', second, '2026-10-16')
+    # A writer that read the aggregate earlier loses the race
+    assert not portfolio_metrics.record_snapshot(table, 'p1', first, '2026-10-16')
+    rebuilt = portfolio_metrics.set_aggregate(table, 'p1', Decimal(140), Decimal(20), Decimal(120))
+    assert portfolio_metrics.record_snapshot(table, 'p1', rebuilt, '2026-10-16')
+    assert portfolio_metrics.record_snapshot(table, 'p1', first, '2026-10-15')
+
+    history = portfolio_metrics.get_value_history(table, 'p1', '2026-10-01', '2026-10-31')
+    assert [(item['date'], item['marketValue'], item['revision']) for item in history] == [
+        ('2026-10-15', 100, 1), ('2026-10-16', 140, 3)
+    ]
+    assert portfolio_metrics.pl_percent(rebuilt) == pytest.approx(Decimal(20) / 120 * 100)
+    assert portfolio_metrics.pl_percent({'costBasis': Decimal(0)}) is None
+
+
+def test_repricing_snapshots_each_portfolio_for_the_market_date(metrics, repricer):
+    portfolio_metrics, table = metrics
+    reprice, _ = repricer
+
+    reprice('100')
+    reprice('110', ids=['a1'], as_of='2026-10-17T16:00:00')
+
+    history = portfolio_metrics.get_value_history(table, 'p1', '2026-10-16', '2026-10-17')
+    assert [(item['date'], item['marketValue']) for item in history] == [('2026-10-16', 300), ('2026-10-17', 320)]
+    assert history[-1]['revision'] == aggregate(metrics, 'p1')['revision']
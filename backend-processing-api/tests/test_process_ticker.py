@@ -0,0 +1,48 @@
+"""
+Continuations of process_ticker's position repricing (src/handlers/process_ticker.py).
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_process_ticker.py
+"""
+
+import json
+from decimal import Decimal
+
+RUN_ID = '2026-10-19'
+POSITION_IDS = [f'position-{i}' for i in range(5)]
+
+
+class Deadline:
+    """
+    Lambda context with time for the first `checks` WorkLoop checks only.
+    """
+
+    def __init__(self, checks):
+        self.checks = checks
+
+    def get_remaining_time_in_millis(self):
+        self.checks -= 1
+        return 60000 if self.checks >= 0 else 0
+
+
+def test_continuation_resumes_from_a_cursor(aws):
+    pipeline_runs = aws.load('src.utils.pipeline_runs')
+    process_ticker = aws.load('src.handlers.process_ticker')
+    pipeline_runs.register_ticker(aws.table('PIPELINE_STATE_TABLE'), RUN_ID, 'AAPL', ['portfolio-1'], POSITION_IDS)
+    positions = aws.table('POSITIONS_TABLE')
+    for position_id in POSITION_IDS:
+        positions.put_item(Item={'id': position_id, 'portfolioId': 'portfolio-1', 'ticker': 'AAPL',
+                                 'shares': Decimal(2), 'costBasis': Decimal(10)})
+    resume = {'price': '12.5', 'as_of': '2026-10-16T16:00:00', 'outcome': 'updated', 'start_at': 'position-1'}
+    event = {'Records': [{'messageId': '1', 'body': json.dumps(
+        {'ticker': 'AAPL', 'source': 'continuation', 'run_id': RUN_ID, 'resume': resume})}]}
+
+    # Time for the record and two positions
+    process_ticker.lambda_handler(event, Deadline(3))
+
+    repriced = sorted(item['id'] for item in positions.scan()['Items'] if 'currentPrice' in item)
+    assert repriced == ['position-1', 'position-2']
+    messages = process_ticker.sqs.receive_message(QueueUrl=aws.queues['SQS_QUEUE_URL'])['Messages']
+    body = json.loads(messages[0]['Body'])
+    assert 'position_ids' not in body
+    assert body['resume'] == {**resume, 'start_at': 'position-3'}
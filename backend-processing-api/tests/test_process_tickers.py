@@ -0,0 +1,142 @@
+"""
+Refresh priority of the run's tickers, and the sharded dispatch against moto
+(src/handlers/process_tickers.py).
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_process_tickers.py
+"""
+
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from src.handlers.process_tickers import prioritize
+
+RUN_ID = '2026-10-19'
+
+
+def registered(ticker, positions=0, value=0, legacy=False):
+    return {'ticker': ticker, 'positionCount': positions, 'marketValue': Decimal(value), 'legacy': legacy}
+
+
+def test_legacy_tickers_are_refreshed_first():
+    tickers = [
+        registered('AAPL', 900, 5000000),
+        registered('MSFT', 400, 2000000),
+        registered('ZSM', legacy=True),
+        registered('NVDA', 10, 1000, legacy=True)
+    ]
+
+    ordered = [t['ticker'] for t in prioritize(tickers)]
+
+    assert ordered == ['NVDA', 'ZSM', 'AAPL', 'MSFT']
+
+
+def test_tickers_without_positions_go_last():
+    ordered = [t['ticker'] for t in prioritize([registered('^SPX'), registered('AAPL', 1, 10)])]
+    assert ordered == ['AAPL', '^SPX']
+
+
+class Invocations:
+    """
+    Records lambda_client.invoke calls instead of invoking anything.
+    """
+
+    def __init__(self):
+        self.payloads = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.payloads.append(json.loads(Payload))
+
+
+@pytest.fixture
+def dispatcher(aws, monkeypatch):
+    process_tickers = aws.load('src.handlers.process_tickers')
+    invocations = Invocations()
+    monkeypatch.setattr(process_tickers, 'lambda_client', invocations)
+    monkeypatch.setattr(process_tickers, 'TICKER_SPACING_SECONDS', 0)
+    context = SimpleNamespace(function_name='processTickers', get_remaining_time_in_millis=lambda: 60000)
+    positions = aws.table('POSITIONS_TABLE')
+    for i in range(20):
+        positions.put_item(Item={'id': f'aapl-{i}', 'portfolioId': f'p{i % 4}', 'ticker': 'AAPL',
+                                 'marketValue': Decimal(100)})
+    positions.put_item(Item={'id': 'msft-0', 'portfolioId': 'p1', 'ticker': 'MSFT', 'marketValue': Decimal(50)})
+    return process_tickers, invocations, context
+
+
+def enqueued(aws):
+    import boto3
+    sqs = boto3.client('sqs')
+    tickers = []
+    while True:
+        messages = sqs.receive_message(QueueUrl=aws.queues['SQS_QUEUE_URL'], MaxNumberOfMessages=10).get('Messages', [])
+        if not messages:
+            return sorted(tickers)
+        tickers += [json.loads(message['Body'])['ticker'] for message in messages]
+        sqs.delete_message_batch(QueueUrl=aws.queues['SQS_QUEUE_URL'], Entries=[
+            {'Id': str(i), 'ReceiptHandle': message['ReceiptHandle']} for i, message in enumerate(messages)
+        ])
+
+
+def summary(aws):
+    return aws.table('PIPELINE_STATE_TABLE').get_item(Key={'pk': f'run#{RUN_ID}', 'sk': 'summary'})['Item']
+
+
+def test_last_shard_enqueues_the_run(dispatcher, aws):
+    process_tickers, invocations, context = dispatcher
+
+    result = process_tickers.lambda_handler({'run_id': RUN_ID, 'total_shards': 2}, context)
+
+    assert result['shards'] == 2
+    assert invocations.payloads == [{'run_id': RUN_ID, 'shard': shard, 'total_shards': 2} for shard in (0, 1)]
+
+    first = process_tickers.lambda_handler(invocations.payloads[0], context)
+    assert 'messagesSent' not in first and enqueued(aws) == []
+
+    last = process_tickers.lambda_handler(invocations.payloads[1], context)
+    assert last['messagesSent'] == 3 and last['sendErrors'] == 0
+    assert enqueued(aws) == ['AAPL', 'MSFT', '^SPX']
+    assert summary(aws)['positionsScanned'] == 21 and summary(aws)['messagesSent'] == 3
+
+
+def test_reinvoked_shard_does_not_enqueue_again(dispatcher, aws):
+    process_tickers, invocations, context = dispatcher
+    process_tickers.lambda_handler({'run_id': RUN_ID, 'total_shards': 2}, context)
+    shard0, shard1 = invocations.payloads
+
+    # An async retry of a shard that already reported
+    process_tickers.lambda_handler(shard0, context)
+    assert 'messagesSent' not in process_tickers.lambda_handler(shard0, context)
+    assert summary(aws)['shardsPending'] == 1
+
+    process_tickers.lambda_handler(shard1, context)
+    assert 'messagesSent' not in process_tickers.lambda_handler(shard1, context)
+
+    assert enqueued(aws) == ['AAPL', 'MSFT', '^SPX']
+    assert summary(aws)['messagesSent'] == 3
+    # Dispatching the same run again is a no-op
+    assert process_tickers.lambda_handler({'run_id': RUN_ID, 'total_shards': 2}, context)['status'] == 'skipped'
+    assert len(invocations.payloads) == 2
+
+
+def test_ticker_held_in_every_shard_is_enqueued_and_released_once(dispatcher, aws):
+    process_tickers, _, _ = dispatcher
+    pipeline_runs = aws.load('src.utils.pipeline_runs')
+    state = aws.table('PIPELINE_STATE_TABLE')
+    # Both scan segments hold AAPL positions of the same portfolios
+    for shard in (0, 1):
+        _, holdings = process_tickers.read_shard(process_tickers.raw_client, ['positions'], shard, 2)
+        assert holdings['AAPL']['portfolios']
+
+    # Without a context, the coordinator runs its shards in-process
+    process_tickers.lambda_handler({'run_id': RUN_ID, 'total_shards': 2}, None)
+
+    assert enqueued(aws) == ['AAPL', 'MSFT', '^SPX']
+    assert len(pipeline_runs.get_registered_positions(state, RUN_ID, 'AAPL')) == 20
+    ready, _ = pipeline_runs.ticker_landed(state, RUN_ID, 'AAPL', True)
+    assert sorted(ready) == ['p0', 'p2', 'p3']
+    # A redelivered AAPL message releases nothing again
+    assert pipeline_runs.ticker_landed(state, RUN_ID, 'AAPL', True) == ([], False)
+    assert pipeline_runs.ticker_landed(state, RUN_ID, 'MSFT', False) == (['p1'], False)
@@ -0,0 +1,126 @@
+"""
+On-demand profiling of handler invocations (src/utils/profiling.py).
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_profiling.py
+"""
+
+import json
+
+import pytest
+import requests
+
+from harness.fake_polygon import FakePolygon
+from src.utils import profiling
+
+ARTIFACTS = {'profile.pstats', 'profile.txt', 'memory.txt', 'calls.json'}
+
+
+class Context:
+    function_name = 'zsmseven-backend-test-processTicker'
+    aws_request_id = 'request-1'
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(profiling, 'PROFILE_INVOCATIONS', False)
+    monkeypatch.setattr(profiling, 'PROFILE_BUCKET', None)
+    return tmp_path
+
+
+def written_profiles(root):
+    return sorted(path for path in root.glob('*/*') if path.is_dir())
+
+
+def test_unrequested_invocations_are_not_profiled(profile_dir):
+    handler = profiling.profiled(lambda event, context: {'statusCode': 200})
+
+    assert handler({'Records': [{'body': '{}', 'messageAttributes': {}}]}, Context()) == {'statusCode': 200}
+    assert handler({'profile': 'yes'}, None) == {'statusCode': 200}
+    assert written_profiles(profile_dir) == []
+
+
+def test_message_attribute_profiles_the_batch(profile_dir):
+    @profiling.profiled
+    def handler(event, context):
+        with FakePolygon() as polygon:
+            requests.get(f'{polygon.url}/v2/aggs/ticker/AAPL/range/1/day/2026-10-01/2026-10-16',
+                         params={'apiKey': 'secret-key'}, timeout=5)
+        return sum(range(1000))
+
+    event = {'Records': [
+        {'body': '{}', 'messageAttributes': {}},
+        {'body': '{}', 'messageAttributes': {'profile': {'stringValue': 'true', 'dataType': 'String'}}}
+    ]}
+    assert handler(event, Context()) == sum(range(1000))
+
+    profile, = written_profiles(profile_dir)
+    assert profile.parent.name == Context.function_name
+    assert profile.name.endswith('-request-1')
+    assert {path.name for path in profile.iterdir()} == ARTIFACTS
+    assert 'cumulative' in (profile / 'profile.txt').read_text()
+    assert (profile / 'memory.txt').read_text().startswith('Peak traced memory')
+
+    calls = json.loads((profile / 'calls.json').read_text())
+    assert calls['error'] is None
+    assert calls['calls']['count'] == 1
+    call, = calls['calls']['calls']
+    assert call['kind'] == 'requests'
+    assert call['target'].startswith('GET 127.0.0.1:')
+    assert call['outcome'] == 200
+    assert 'secret-key' not in (profile / 'calls.json').read_text()
+
+    # Patches are undone after the invocation
+    assert requests.Session.send.__name__ == 'send'
+    assert requests.Session.send.__module__ == 'requests.sessions'
+
+
+def test_failed_invocation_still_writes_its_profile(profile_dir, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_INVOCATIONS', True)
+
+    @profiling.profiled
+    def handler(event, context):
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError, match='boom'):
+        handler({}, None)
+
+    profile, = written_profiles(profile_dir)
+    assert profile.name.endswith('-local')
+    assert json.loads((profile / 'calls.json').read_text())['error'] == 'RuntimeError: boom'
+
+
+def test_boto3_calls_are_timed_and_artifacts_uploaded(profile_dir, monkeypatch):
+    moto = pytest.importorskip('moto')
+    from harness.local_aws import AWS_ENVIRONMENT
+
+    for name, value in AWS_ENVIRONMENT.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        import boto3
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket='profiles')
+        sqs = boto3.client('sqs')
+        queue_url = sqs.create_queue(QueueName='portfolio-queue')['QueueUrl']
+        monkeypatch.setattr(profiling, 'PROFILE_BUCKET', 'profiles')
+        monkeypatch.setattr(profiling, 's3', s3)
+
+        @profiling.profiled
+        def handler(event, context):
+            sqs.send_message(QueueUrl=queue_url, MessageBody='{}')
+            with pytest.raises(sqs.exceptions.QueueDoesNotExist):
+                sqs.get_queue_url(QueueName='missing')
+            return 'done'
+
+        assert handler({'profile': True}, Context()) == 'done'
+        keys = [item['Key'] for item in s3.list_objects_v2(Bucket='profiles')['Contents']]
+
+    assert {key.rsplit('/', 1)[-1] for key in keys} == ARTIFACTS
+    assert all(key.startswith(f'profiles/{Context.function_name}/') for key in keys)
+
+    profile, = written_profiles(profile_dir)
+    by_target = {stats['target']: stats for stats in
+                 json.loads((profile / 'calls.json').read_text())['calls']['byTarget']}
+    assert by_target['sqs.SendMessage']['outcomes'] == {'ok': 1}
+    assert by_target['sqs.GetQueueUrl']['outcomes'] == {'AWS.SimpleQueueService.NonExistentQueue': 1}
@@ -0,0 +1,90 @@
+"""
+Exact valuation and write retries of revaluePositions (src/handlers/revalue_positions.py).
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_revalue_positions.py
+"""
+
+from decimal import Decimal
+
+import pytest
+
+
+class StatementClient:
+    """
+    Records batch_execute_statement calls, raising for the first `failures`.
+
+    moto's PartiQL parser does not accept the repeated SET clauses of
+    UPDATE_STATEMENT, so the statements are checked here instead.
+    """
+
+    def __init__(self, client, failures=0):
+        self.client = client
+        self.failures = failures
+        self.calls = 0
+        self.written = {}
+
+    def batch_execute_statement(self, Statements):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError('connection reset')
+        for statement in Statements:
+            _, market_value, unrealized_pl, _, position_id = statement['Parameters']
+            self.written[position_id] = (market_value, unrealized_pl)
+        return {'Responses': [{} for _ in Statements]}
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+@pytest.fixture
+def revalue(aws, monkeypatch):
+    revalue_positions = aws.load('src.handlers.revalue_positions')
+    monkeypatch.setattr(revalue_positions, 'WRITE_RETRY_SECONDS', 0)
+    aws.table('TICKER_DATA_TABLE').put_item(Item={
+        'ticker': 'AAPL', 'timestamp': '2026-10-16T20:00:00', 'asOf': '2026-10-16T16:00:00', 'price': Decimal('3.3')
+    })
+    positions = aws.table('POSITIONS_TABLE')
+    for i in range(30):
+        positions.put_item(Item={'id': f'position-{i:02d}', 'portfolioId': 'portfolio-1', 'ticker': 'AAPL',
+                                 'shares': Decimal('0.1'), 'costBasis': Decimal('0.2')})
+    return revalue_positions, aws
+
+
+def use_client(revalue_positions, monkeypatch, failures=0):
+    client = StatementClient(revalue_positions.ddb_client, failures)
+    monkeypatch.setattr(revalue_positions, 'ddb_client', client)
+    return client
+
+
+def test_values_are_exact_decimals(revalue, monkeypatch):
+    revalue_positions, _ = revalue
+    client = use_client(revalue_positions, monkeypatch)
+
+    revalue_positions.lambda_handler({}, None)
+
+    # 0.1 * 3.3 is 0.33000000000000007 in floats
+    assert client.written['position-00'] == (Decimal('0.33'), Decimal('0.13'))
+
+
+def test_failed_batch_is_retried_and_aggregates_rebuilt(revalue, monkeypatch):
+    revalue_positions, aws = revalue
+    use_client(revalue_positions, monkeypatch, failures=1)
+
+    result = revalue_positions.lambda_handler({}, None)
+
+    assert result['written'] == 30 and result['failed'] == 0
+    assert result['aggregates_rebuilt'] == 1
+    aggregates = aws.table('PORTFOLIO_METRICS_TABLE').scan()['Items']
+    assert any(item.get('marketValue') == Decimal('9.90') for item in aggregates)
+
+
+def test_batch_failing_every_attempt_does_not_stop_the_run(revalue, monkeypatch):
+    revalue_positions, _ = revalue
+    use_client(revalue_positions, monkeypatch, failures=revalue_positions.WRITE_ATTEMPTS)
+
+    result = revalue_positions.lambda_handler({}, None)
+
+    # The first batch of 25 gave up; the second was written
+    assert result['written'] == 5 and result['failed'] == 25
+    assert result['aggregates_rebuilt'] == 1
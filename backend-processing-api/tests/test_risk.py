@@ -0,0 +1,110 @@
+"""
+Risk metrics over gappy price history (src/analytics/risk.py,
+src/analytics/history.py and compute_book_risk): a ticker without history
+on a date is masked, never counted as a flat day.
+
+Run from backend-processing-api/:
+    python -m pytest -q tests/test_risk.py
+"""
+
+import numpy as np
+import pytest
+
+from src.analytics.history import price_matrix, returns_matrix
+from src.analytics.risk import (
+    beta,
+    covariance,
+    historical_var_cvar,
+    max_drawdown,
+    portfolio_returns,
+    volatility,
+    weight_matrix
+)
+
+nan = np.nan
+
+
+def test_price_matrix_fills_forward_but_not_before_the_first_close():
+    histories = {
+        'AAPL': {'2026-10-12': 100, '2026-10-13': 110, '2026-10-15': 121},
+        'X:BTCUSD': {'2026-10-13': 60000, '2026-10-14': 66000, '2026-10-15': 66000}
+    }
+
+    dates, prices = price_matrix(histories, ['AAPL', 'X:BTCUSD'])
+    returns = returns_matrix(prices)
+
+    assert dates == ['2026-10-12', '2026-10-13', '2026-10-14', '2026-10-15']
+    np.testing.assert_array_equal(prices, [[100, nan], [110, 60000], [110, 66000], [121, 66000]])
+    np.testing.assert_allclose(returns, [[0.1, nan], [0, 0.1], [0.1, 0]])
+
+
+def test_portfolio_returns_reweight_over_tickers_with_history():
+    returns = np.array([[0.02, nan], [0.04, nan], [0.01, 0.03], [-0.02, 0.00]])
+    _, weights = weight_matrix({'both': {'A': 50, 'B': 50}, 'new': {'B': 10}}, ['A', 'B'])
+
+    daily = portfolio_returns(returns, weights)
+
+    # Before B has history, "both" moves with A alone rather than half of it
+    np.testing.assert_allclose(daily[:, 0], [0.02, 0.04, 0.02, -0.01])
+    np.testing.assert_array_equal(daily[:, 1], [nan, nan, 0.03, 0.00])
+
+
+def test_new_ticker_does_not_dampen_volatility():
+    rng = np.random.default_rng(38)
+    returns = rng.normal(0, 0.02, (120, 2))
+    returns[:60, 1] = nan
+    _, weights = weight_matrix({'p': {'OLD': 1, 'NEW': 1}}, ['OLD', 'NEW'])
+
+    daily = portfolio_returns(returns, weights)[:, 0]
+
+    # The first 60 days are OLD's own returns, not half of them
+    np.testing.assert_allclose(daily[:60], returns[:60, 0])
+    assert volatility(daily[:, None])[0] == pytest.approx(np.std(daily, ddof=1) * np.sqrt(252))
+
+
+def test_covariance_uses_the_days_both_tickers_have():
+    rng = np.random.default_rng(7)
+    returns = rng.normal(0, 0.01, (50, 3))
+    returns[:10, 2] = nan
+    shared = slice(10, None)
+
+    cov, corr = covariance(returns)
+
+    assert cov[0, 2] == pytest.approx(np.cov(returns[shared, 0], returns[shared, 2])[0, 1])
+    assert corr[0, 2] == pytest.approx(np.corrcoef(returns[shared, 0], returns[shared, 2])[0, 1])
+    assert cov[2, 2] == pytest.approx(np.var(returns[shared, 2], ddof=1))
+    assert cov[0, 0] == pytest.approx(np.var(returns[:, 0], ddof=1))
+    np.testing.assert_allclose(np.diag(corr), 1)
+
+
+def test_var_beta_and_drawdown_skip_missing_days():
+    daily = np.array([[nan], [-0.05], [0.02], [-0.01], [0.03], [nan], [-0.10]])
+    benchmark = np.array([0.01, -0.025, 0.01, nan, 0.015, 0.02, -0.05])
+
+    var, cvar = historical_var_cvar(daily, confidence=0.8)
+    shared = ~np.isnan(daily[:, 0]) & ~np.isnan(benchmark)
+
+    assert var[0] == pytest.approx(-np.quantile(daily[~np.isnan(daily[:, 0]), 0], 0.2))
+    assert cvar[0] == pytest.approx(0.10)
+    expected_beta = np.cov(daily[shared, 0], benchmark[shared])[0, 1] / np.var(benchmark[shared], ddof=1)
+    assert beta(daily, benchmark)[0] == pytest.approx(expected_beta)
+    # Flat across the gaps; the value never regains its starting 1.0 before the last day's fall
+    assert max_drawdown(daily)[0] == pytest.approx(1 - 0.95 * 1.02 * 0.99 * 1.03 * 0.9)
+
+
+def test_book_risk_counts_each_portfolios_own_days(aws):
+    compute_portfolio_risk = aws.load('src.handlers.compute_portfolio_risk')
+    rng = np.random.default_rng(3)
+    dates = [f'2026-{month:02d}-{day:02d}' for month in (7, 8, 9) for day in range(1, 29)]
+    closes = {ticker: 100 * np.cumprod(1 + rng.normal(0, 0.01, len(dates))) for ticker in ('OLD', 'NEW', '^SPX')}
+    histories = {ticker: dict(zip(dates, prices)) for ticker, prices in closes.items()}
+    # NEW listed 40 days in
+    histories['NEW'] = dict(list(histories['NEW'].items())[40:])
+
+    _, results = compute_portfolio_risk.compute_book_risk(
+        {'old': {'OLD': 100}, 'new': {'NEW': 100}, 'mixed': {'OLD': 50, 'NEW': 50}}, histories, ['NEW', 'OLD'])
+
+    assert results['old']['observations'] == results['mixed']['observations'] == len(dates) - 1
+    assert results['new']['observations'] == len(dates) - 41
+    new_returns = np.diff(closes['NEW'][40:]) / closes['NEW'][40:-1]
+    assert results['new']['volatility'] == pytest.approx(np.std(new_returns, ddof=1) * np.sqrt(252))
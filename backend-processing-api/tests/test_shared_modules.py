@@ -0,0 +1,42 @@
+"""
+Modules copied into api/ for the legacy pipeline stay identical to their
+sources in src/utils/.
+
+Each Serverless service packages only its own directory, so api/ carries
+copies of analysis_format.py, aws.py and profiling.py. They may differ only
+in the note naming the other copy and in import paths (`from src.utils.aws`
+here, `from aws` in api/); any other change has to be made to both.
+
+Run from backend-processing-api/:
+    python -m pytest -q tests/test_shared_modules.py
+"""
+
+import difflib
+import re
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SHARED_MODULES = ('analysis_format', 'aws', 'profiling')
+
+COPY_NOTE = re.compile(r'A copy of this module lives in .*?in sync\.\n', re.DOTALL)
+SOURCE_IMPORT = re.compile(r'^from src\.utils\.(\w+) import', re.MULTILINE)
+
+
+def normalized(path):
+    text = COPY_NOTE.sub('', path.read_text())
+    return SOURCE_IMPORT.sub(r'from \1 import', text).splitlines(keepends=True)
+
+
+@pytest.mark.parametrize('module', SHARED_MODULES)
+def test_api_copy_matches_source(module):
+    source = ROOT / 'backend-processing-api' / 'src' / 'utils' / f'{module}.py'
+    copy = ROOT / 'api' / f'{module}.py'
+    if not copy.exists():
+        pytest.skip('api/ is not checked out')
+    assert COPY_NOTE.search(source.read_text()) and COPY_NOTE.search(copy.read_text())
+
+    diff = ''.join(difflib.unified_diff(normalized(source), normalized(copy), str(source), str(copy)))
+
+    assert not diff, f'api/{module}.py has drifted from its source; apply the change to both:\n{diff}'
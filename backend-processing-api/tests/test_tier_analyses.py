@@ -0,0 +1,66 @@
+"""
+Which analyses tierAnalyses archives (src/handlers/tier_analyses.py).
+
+Run from backend-processing-api/ with requirements-dev.txt installed:
+    python -m pytest -q tests/test_tier_analyses.py
+"""
+
+import pytest
+
+CUTOFF = '2026-07-01T00:00:00'
+OLD = ('2026-03-02T09:00:00', '2026-04-06T09:00:00', '2026-05-04T09:00:00')
+
+
+@pytest.fixture
+def tiering(aws, tmp_path):
+    aws.setenv('ANALYSIS_BLOB_DIR', str(tmp_path))
+    table = aws.table('ANALYSES_TABLE')
+
+    def put(portfolio, timestamp, **attributes):
+        table.put_item(Item={'portfolio': portfolio, 'timestamp': timestamp, **attributes})
+
+    def remaining():
+        return sorted((item['portfolio'], item['timestamp']) for item in table.scan()['Items'])
+
+    return aws.load('src.handlers.tier_analyses'), put, remaining
+
+
+def test_pointerless_portfolio_keeps_its_only_analysis(tiering):
+    tier_analyses, put, _ = tiering
+    # Written before latest pointers existed and not re-analyzed since
+    put('legacy', OLD[0], analysis='[]')
+
+    assert tier_analyses.find_expired_keys(CUTOFF) == []
+
+
+def test_newest_item_of_every_partition_is_kept(tiering):
+    tier_analyses, put, remaining = tiering
+    for timestamp in OLD:
+        put('idle', timestamp, analysis='[]')
+        put('idle#risk', timestamp)
+        put('idle#errors', timestamp)
+    put('active', OLD[0], analysis='[]')
+    put('active', '2026-10-16T09:00:00', analysis='[]')
+    put('active#latest', 'LATEST', analysisTimestamp='2026-10-16T09:00:00')
+
+    result = tier_analyses.lambda_handler({}, None)
+
+    assert result['archived'] == 7
+    assert remaining() == [
+        ('active', '2026-10-16T09:00:00'),
+        ('active#latest', 'LATEST'),
+        ('idle', OLD[-1]),
+        ('idle#errors', OLD[-1]),
+        ('idle#risk', OLD[-1])
+    ]
+
+
+def test_analysis_referenced_by_a_pointer_is_kept(tiering):
+    tier_analyses, put, _ = tiering
+    # The pointer still references an older analysis than the newest item
+    put('growth', OLD[0], analysis='[]')
+    put('growth', OLD[1], analysis='[]')
+    put('growth', OLD[2], parseError='no tickers')
+    put('growth#latest', 'LATEST', analysisTimestamp=OLD[1])
+
+    assert tier_analyses.find_expired_keys(CUTOFF) == [{'portfolio': 'growth', 'timestamp': OLD[0]}]
@@ -1,4 +1,5 @@
 import { APIGatewayProxyEvent, APIGatewayProxyResult } from 'aws-lambda';
+import { inflateSync } from 'zlib';
 import { DynamoDBClient } from '@aws-sdk/client-dynamodb';
 import { DynamoDBDocumentClient, QueryCommand } from '@aws-sdk/lib-dynamodb';
 import { getPortfolio } from '../utils/dynamodb';
@@ -33,6 +34,26 @@ async function getPortfolioAnalyses(
   return (response.Items || []) as PortfolioAnalysis[];
 }
 
+/**
+ * Resolve a text attribute that the backend may have stored compressed.
+ * Large attributes are replaced by a `${field}Blob` map holding either
+ * zlib-compressed data inline or a content-hash reference to S3; the
+ * reference is returned as-is since the text lives outside the table.
+ */
+function resolveBlobField(analysis: any, field: string): { text?: string; ref?: string } {
+  if (typeof analysis[field] === 'string') {
+    return { text: analysis[field] };
+  }
+  const blob = analysis[`${field}Blob`];
+  if (!blob) {
+    return {};
+  }
+  if (blob.data && blob.codec === 'zlib') {
+    return { text: inflateSync(Buffer.from(blob.data)).toString('utf-8') };
+  }
+  return { ref: blob.ref };
+}
+
 /**
  * GET /api/portfolios/:portfolioId/analysis
  * Get portfolio analysis results
@@ -121,8 +142,12 @@ export const handler = async (
       }
 
       if (includeDetails) {
-        baseResponse.analysis = analysis.analysis;
-        baseResponse.prompt = analysis.prompt;
+        const analysisText = resolveBlobField(analysis, 'analysis');
+        const promptText = resolveBlobField(analysis, 'prompt');
+        baseResponse.analysis = analysisText.text;
+        baseResponse.prompt = promptText.text;
+        if (analysisText.ref) baseResponse.analysisRef = analysisText.ref;
+        if (promptText.ref) baseResponse.promptRef = promptText.ref;
         baseResponse.parsed_data = parsedData;
       } else {
         // Only include parsed data for summary view